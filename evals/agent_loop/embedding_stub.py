@@ -0,0 +1,63 @@
+"""Deterministic embedding stand-in for the agent-loop benchmarks.
+
+``LexiconEmbeddings`` stands in for the fastembed model where it cannot be
+downloaded, so the embedding path of the selectors is always measured.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "the and for with that this what which when where who why how did does are was were our you your from into "
+    "after before about any all can may must need one two some them they their there then than too very just".split()
+)
+_SUFFIXES = ("ing", "ed", "es", "s")
+
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+class LexiconEmbeddings:
+    """Deterministic bag-of-concepts embeddings.
+
+    Words are lower-cased and stemmed by stripping a few suffixes.  Each of
+    *synonyms* is a space-separated group of words that share a dimension,
+    standing in for what a real model learns about paraphrases; every other
+    word gets its own.  Dimensions are hashed into *dims* buckets.  The stub
+    knows only the synonyms it is given, so its recall measures the selection
+    pipeline with a model of known reach, not the quality of a real model.
+    """
+
+    model = "lexicon-stub"
+
+    def __init__(self, synonyms: list[str], dims: int = 512) -> None:
+        self._concepts: dict[str, str] = {}
+        for group in synonyms:
+            words = group.split()
+            for word in words:
+                self._concepts[word] = self._concepts[_stem(word)] = words[0]
+        self._dims = dims
+
+    def _vector(self, text: str) -> list[float]:
+        vector = [0.0] * self._dims
+        for word in _WORD_RE.findall(text.lower()):
+            if len(word) < 3 or word in _STOPWORDS:
+                continue
+            stem = _stem(word)
+            concept = self._concepts.get(word) or self._concepts.get(stem) or stem
+            bucket = int.from_bytes(hashlib.sha256(concept.encode()).digest()[:4], "big") % self._dims
+            vector[bucket] += 1.0
+        return vector
+
+    async def embed(self, text: str) -> list[float]:
+        return self._vector(text)
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return [self._vector(t) for t in texts]
@@ -0,0 +1,279 @@
+"""Long-conversation recall benchmark for relevance-based history selection.
+
+Builds a synthetic research thread: a dozen turns that each establish one
+fact, buried under a few hundred turns of unrelated chat and tool noise
+(file reads with long outputs).  For every fact a follow-up question is
+asked, paraphrased so it shares few words with the original turn, and the
+history is cut to a fixed token budget several ways:
+
+- **recent**: the newest messages that fit (what truncation keeps);
+- **terms**: ``HistorySelector`` ranking by term overlap (no embeddings);
+- **stub**: ``HistorySelector`` with ``LexiconEmbeddings``, a deterministic
+  stand-in that knows the paraphrases in ``_SYNONYMS`` and nothing else;
+- **embeddings**: ``HistorySelector`` with the local fastembed model
+  (BAAI/bge-small-en-v1.5; only when fastembed and the model are available).
+
+Recall is the share of questions whose fact-bearing answer was sent.
+Selection must beat truncation, and embedding rankings must recall most facts.
+
+Run:
+    pytest evals/agent_loop/test_history_selection_benchmark.py -v -s
+    ANTEROOM_BENCH_NOISE_TURNS=600 ANTEROOM_BENCH_BUDGET=4000 pytest evals/agent_loop/ -s -k history
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+from typing import Any
+
+from anteroom.services.history_selection import HistorySelector, clear_embedding_cache
+from anteroom.services.token_counter import get_token_counter
+from evals.agent_loop.embedding_stub import LexiconEmbeddings
+
+_NOISE_TURNS = int(os.environ.get("ANTEROOM_BENCH_NOISE_TURNS", "300"))
+_BUDGET = int(os.environ.get("ANTEROOM_BENCH_BUDGET", "3000"))
+_RECENT_TURNS = 3
+
+# (turn that establishes the fact, answer containing it, paraphrased follow-up)
+_FACTS = [
+    (
+        "How many records does the ingest worker write per flush?",
+        "FACT-01: the ingest worker flushes to the warehouse every 512 records.",
+        "What batch size did we settle on for loading rows into the warehouse?",
+    ),
+    (
+        "Which region hosts the primary database?",
+        "FACT-02: the primary Postgres cluster runs in eu-west-1, with a read replica in us-east-2.",
+        "Where geographically is our main Postgres instance deployed?",
+    ),
+    (
+        "What retry policy does the payments client use?",
+        "FACT-03: the payments client retries 5 times with exponential backoff capped at 30 seconds.",
+        "How often does the billing SDK try again after a failed charge request?",
+    ),
+    (
+        "Why did the nightly report job fail last week?",
+        "FACT-04: the nightly report failed because the S3 bucket lifecycle rule deleted its staging files.",
+        "Remind me what broke the overnight reporting pipeline?",
+    ),
+    (
+        "What is the p99 latency target for the search API?",
+        "FACT-05: the search endpoint must answer within 250 ms at the 99th percentile.",
+        "What response-time SLO did we agree for query lookups?",
+    ),
+    (
+        "Which feature flag gates the new checkout flow?",
+        "FACT-06: the redesigned checkout is behind the flag checkout_v2_rollout at 10 percent.",
+        "How are we toggling the purchase page redesign for customers?",
+    ),
+    (
+        "How long are audit logs retained?",
+        "FACT-07: audit logs are kept for 400 days, then archived to cold storage.",
+        "For how many days do we keep compliance event history?",
+    ),
+    (
+        "What caused the memory leak in the websocket gateway?",
+        "FACT-08: the gateway leaked memory because closed sockets stayed in the presence map.",
+        "Why did the realtime connection server keep growing its heap?",
+    ),
+    (
+        "Which Python version does the ML service pin?",
+        "FACT-09: the model-serving service is pinned to Python 3.11 because of the CUDA wheels.",
+        "What interpreter release is the inference backend locked to?",
+    ),
+    (
+        "How is the cache invalidated after a product edit?",
+        "FACT-10: product edits publish an event and the CDN purges the product page by surrogate key.",
+        "After someone changes an item in the catalog, how do stale pages get refreshed?",
+    ),
+    (
+        "Who approves production schema migrations?",
+        "FACT-11: schema migrations in production need sign-off from the data platform on-call.",
+        "Which team must okay database structure changes before they ship?",
+    ),
+    (
+        "What is the maximum upload size for attachments?",
+        "FACT-12: attachments are limited to 25 MB each and 100 MB per message.",
+        "How large can files be when users attach them?",
+    ),
+]
+
+# Paraphrase groups the stub embeddings treat as one concept (fact wording first)
+_SYNONYMS = [
+    "flush batch",
+    "records rows",
+    "ingest loading",
+    "region geographically deployed",
+    "primary main",
+    "cluster instance",
+    "payments billing charge",
+    "client sdk",
+    "retries retry again",
+    "nightly overnight",
+    "report reporting",
+    "job pipeline",
+    "failed broke",
+    "search query lookups",
+    "latency response",
+    "target slo",
+    "checkout purchase",
+    "redesigned redesign",
+    "flag toggling",
+    "audit compliance",
+    "logs history",
+    "retained kept keep",
+    "websocket realtime connection sockets",
+    "gateway server",
+    "memory heap",
+    "leak leaked growing",
+    "python interpreter",
+    "version release",
+    "pinned locked",
+    "model-serving inference",
+    "cache stale",
+    "invalidated refreshed purges",
+    "product item catalog",
+    "edit edits changes",
+    "schema structure",
+    "approves okay sign-off",
+    "production ship",
+    "attachments attach files",
+    "size large",
+]
+
+_NOISE_TOPICS = [
+    "Suggest a name for the team's new Slack channel about coffee.",
+    "Rewrite this paragraph about the company picnic to sound friendlier.",
+    "What are some good icebreakers for a remote meeting?",
+    "Draft a thank-you note to the facilities team for fixing the lights.",
+    "List a few board games that work well for six players.",
+    "Explain the rules of pickleball in two sentences.",
+    "What should go into a welcome packet for summer interns?",
+    "Give me three title ideas for a blog post about productivity.",
+]
+
+
+def _noise_turn(rng: random.Random, n: int) -> list[dict[str, Any]]:
+    if rng.random() < 0.4:
+        call_id = f"noise_{n}"
+        path = f"docs/notes/meeting_{n}.md"
+        return [
+            {"role": "user", "content": f"Open {path} and tidy the formatting."},
+            {
+                "role": "assistant",
+                "content": "",
+                "tool_calls": [
+                    {
+                        "id": call_id,
+                        "type": "function",
+                        "function": {"name": "read_file", "arguments": json.dumps({"path": path})},
+                    }
+                ],
+            },
+            {"role": "tool", "tool_call_id": call_id, "content": "- agenda item, owner, due date\n" * 30},
+            {"role": "assistant", "content": "Reformatted the headings and bullet lists."},
+        ]
+    topic = rng.choice(_NOISE_TOPICS)
+    return [
+        {"role": "user", "content": f"{topic} (#{n})"},
+        {"role": "assistant", "content": "Here are a few ideas that might work well. " * 6},
+    ]
+
+
+def _conversation(seed: int = 7) -> list[dict[str, Any]]:
+    """The thread, with the fact turns spread over its older part."""
+    rng = random.Random(seed)
+    turns: list[list[dict[str, Any]]] = [_noise_turn(rng, n) for n in range(_NOISE_TURNS)]
+    # Never in the recent turns, which are always sent
+    slots = sorted(rng.sample(range(_NOISE_TURNS - 2 * _RECENT_TURNS), len(_FACTS)))
+    for offset, (slot, (question, answer, _)) in enumerate(zip(slots, _FACTS)):
+        turns.insert(slot + offset, [{"role": "user", "content": question}, {"role": "assistant", "content": answer}])
+    return [m for turn in turns for m in turn]
+
+
+def _recent_only(messages: list[dict[str, Any]], budget: int) -> list[dict[str, Any]]:
+    counter = get_token_counter()
+    kept: list[dict[str, Any]] = []
+    used = 0
+    for msg in reversed(messages):
+        used += counter.count_message(msg)
+        if used > budget:
+            break
+        kept.append(msg)
+    kept.reverse()
+    while kept and kept[0].get("role") == "tool":
+        kept.pop(0)
+    return kept
+
+
+def _recall(sent_per_question: list[list[dict[str, Any]]]) -> float:
+    hits = 0
+    for (_, answer, _), sent in zip(_FACTS, sent_per_question):
+        marker = answer.split(":", 1)[0]
+        hits += any(isinstance(m.get("content"), str) and marker in m["content"] for m in sent)
+    return hits / len(_FACTS)
+
+
+async def _select_all(selector: HistorySelector | None, history: list[dict[str, Any]]) -> list[list[dict[str, Any]]]:
+    results = []
+    for _, _, follow_up in _FACTS:
+        messages = [*history, {"role": "user", "content": follow_up}]
+        if selector is None:
+            results.append(_recent_only(messages, _BUDGET))
+        else:
+            results.append(await selector.select(messages, _BUDGET))
+    return results
+
+
+def _local_embeddings() -> Any:
+    try:
+        from anteroom.services.embeddings import LocalEmbeddingService
+    except ImportError:
+        return None
+    svc = LocalEmbeddingService("BAAI/bge-small-en-v1.5")
+    try:
+        if not asyncio.run(svc.embed("probe")):
+            return None
+    except Exception:
+        return None
+    return svc
+
+
+def test_selection_recalls_buried_facts() -> None:
+    history = _conversation()
+    counter = get_token_counter()
+    full_tokens = counter.count_messages(history)
+    clear_embedding_cache()
+
+    rows: list[tuple[str, float, float]] = []
+
+    def _row(name: str, sent: list[list[dict[str, Any]]]) -> float:
+        recall = _recall(sent)
+        avg_tokens = sum(counter.count_messages(s) for s in sent) / len(sent)
+        rows.append((name, recall, avg_tokens))
+        return recall
+
+    recent = _row("recent", asyncio.run(_select_all(None, history)))
+    terms = _row("terms", asyncio.run(_select_all(HistorySelector(counter, recent_turns=_RECENT_TURNS), history)))
+    stub_selector = HistorySelector(counter, recent_turns=_RECENT_TURNS, embedding_service=LexiconEmbeddings(_SYNONYMS))
+    stubbed = _row("stub", asyncio.run(_select_all(stub_selector, history)))
+    embeddings_svc = _local_embeddings()
+    embedded: float | None = None
+    if embeddings_svc is not None:
+        selector = HistorySelector(counter, recent_turns=_RECENT_TURNS, embedding_service=embeddings_svc)
+        embedded = _row("embeddings", asyncio.run(_select_all(selector, history)))
+
+    print(f"\nHistory: {len(history)} messages, {full_tokens:,} tokens; budget {_BUDGET:,} tokens")
+    for name, recall, avg_tokens in rows:
+        print(f"  {name:<11} recall {recall:5.0%}   avg sent {avg_tokens:7,.0f} tokens")
+    if embedded is None:
+        print("  embeddings  not measured: fastembed model unavailable")
+
+    assert terms > recent
+    for recall in (stubbed, embedded):
+        if recall is not None:
+            assert recall >= 0.75
+            assert recall >= terms
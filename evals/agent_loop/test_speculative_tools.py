@@ -0,0 +1,102 @@
+"""Speculative tool execution benchmark.
+
+Drives ``run_agent_loop`` with a scripted provider that streams several
+read-only tool calls per turn (a fixed delay per call, like a model writing
+out arguments) against a tool executor with seeded, varied latencies (some
+searches slow, some quick).  Each scenario runs once with speculation
+and once without; the wall-clock saved per multi-tool turn is printed and
+must be positive.  The last call of a turn is only known once the stream
+ends, so the saving is bounded by how much slower the earlier calls are.
+
+Run:
+    pytest evals/agent_loop/ -v -s
+    ANTEROOM_BENCH_TOOL_MS=200 ANTEROOM_BENCH_STREAM_MS=100 pytest evals/agent_loop/ -s
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import time
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from anteroom.services.agent_loop import run_agent_loop
+
+_TOOL_S = int(os.environ.get("ANTEROOM_BENCH_TOOL_MS", "150")) / 1000
+_STREAM_S = int(os.environ.get("ANTEROOM_BENCH_STREAM_MS", "60")) / 1000
+_TURNS = int(os.environ.get("ANTEROOM_BENCH_TURNS", "3"))
+
+
+class _ScriptedProvider:
+    def __init__(self, calls_per_turn: int, turns: int) -> None:
+        self.config = SimpleNamespace(model="bench-model", provider="openai")
+        self._calls = calls_per_turn
+        self._turns = turns
+        self._turn = 0
+
+    async def stream_chat(self, messages: Any, tools: Any = None, cancel_event: Any = None, **kwargs: Any) -> Any:
+        self._turn += 1
+        if self._turn > self._turns:
+            yield {"event": "token", "data": {"content": "done"}}
+            yield {"event": "done", "data": {}}
+            return
+        calls = [
+            {"id": f"t{self._turn}_{i}", "function_name": "grep", "arguments": {"pattern": f"p{self._turn}_{i}"}}
+            for i in range(self._calls)
+        ]
+        for i, tc in enumerate(calls):
+            await asyncio.sleep(_STREAM_S)
+            if i < len(calls) - 1:
+                # The last call is only known complete when the stream finishes
+                yield {"event": "tool_call_ready", "data": {"index": i, **tc}}
+        for tc in calls:
+            yield {"event": "tool_call", "data": tc}
+
+
+def _latencies(seed: int) -> dict[str, float]:
+    rng = random.Random(seed)
+    return {f"p{t}_{i}": _TOOL_S * rng.uniform(0.25, 2.0) for t in range(1, _TURNS + 1) for i in range(16)}
+
+
+def _executor(latencies: dict[str, float]) -> Any:
+    async def _run_tool(name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+        await asyncio.sleep(latencies[arguments["pattern"]])
+        return {"content": arguments["pattern"]}
+
+    return _run_tool
+
+
+async def _run(calls_per_turn: int, speculate: bool) -> tuple[float, int]:
+    provider = _ScriptedProvider(calls_per_turn, _TURNS)
+    start = time.perf_counter()
+    speculative = 0
+    async for event in run_agent_loop(
+        ai_service=provider,  # type: ignore[arg-type]
+        messages=[{"role": "user", "content": "bench"}],
+        tool_executor=_executor(_latencies(calls_per_turn)),
+        tools_openai=None,
+        max_consecutive_text_only=0,
+        can_speculate=(lambda name, args: True) if speculate else None,
+    ):
+        if event.kind == "tool_call_end" and event.data.get("speculative"):
+            speculative += 1
+    return time.perf_counter() - start, speculative
+
+
+@pytest.mark.parametrize("calls_per_turn", [2, 4, 8])
+def test_speculation_saves_wall_clock(calls_per_turn: int) -> None:
+    baseline, _ = asyncio.run(_run(calls_per_turn, speculate=False))
+    speculative, started = asyncio.run(_run(calls_per_turn, speculate=True))
+    saved_per_turn = (baseline - speculative) / _TURNS
+
+    print(
+        f"\n{calls_per_turn} calls/turn, {_TURNS} turns: baseline {baseline * 1000:.0f}ms, "
+        f"speculative {speculative * 1000:.0f}ms, saved {saved_per_turn * 1000:.0f}ms/turn "
+        f"({started} of {calls_per_turn * _TURNS} calls started early)"
+    )
+    assert started == (calls_per_turn - 1) * _TURNS
+    assert speculative < baseline
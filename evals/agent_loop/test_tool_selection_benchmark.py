@@ -0,0 +1,302 @@
+"""Prompt-token savings and recall benchmark for per-run tool selection.
+
+Builds a large catalog -- the built-in tools plus a dozen MCP-style servers
+(issue trackers, chat, databases, cloud, calendars, monitoring) -- and runs
+a script of requests, each labelled with the tools a correct answer needs.
+For every request the catalog is cut down by ``ToolSelector`` and two
+numbers are recorded:
+
+- **tokens**: tool-schema prompt tokens sent (``json.dumps`` of the tools,
+  counted with the shared token counter) against sending the full catalog;
+- **recall**: the share of needed tools that were sent.
+
+Three rankings are measured: **terms** (term overlap, no embeddings),
+**stub** (``LexiconEmbeddings``, a deterministic stand-in that knows the
+paraphrases in ``_SYNONYMS`` and nothing else) and **embeddings** (the local
+fastembed model BAAI/bge-small-en-v1.5; only when fastembed and the model are
+available).  Some requests follow a tool call
+in the conversation, to exercise the recent-usage bonus.  A request whose
+needed tool is not sent can still reach it through ``load_all_tools``, so
+recall bounds how often that extra step is needed.
+
+Run:
+    pytest evals/agent_loop/test_tool_selection_benchmark.py -v -s
+    ANTEROOM_BENCH_TOP_N=16 pytest evals/agent_loop/ -s -k tool_selection
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import Any
+
+from anteroom.config import AIConfig
+from anteroom.services.history_selection import clear_embedding_cache
+from anteroom.services.token_counter import get_token_counter
+from anteroom.services.tool_selection import ToolSelector
+from anteroom.tools import ToolRegistry, register_default_tools
+from evals.agent_loop.embedding_stub import LexiconEmbeddings
+
+_TOP_N = int(os.environ.get("ANTEROOM_BENCH_TOP_N", "24"))
+
+# server -> [(tool, description, {param: description})]
+_SERVERS: dict[str, list[tuple[str, str, dict[str, str]]]] = {
+    "github": [
+        ("create_pull_request", "Open a pull request from a branch.", {"repo": "owner/name", "head": "Source branch"}),
+        ("list_pull_requests", "List open pull requests in a repository.", {"repo": "owner/name"}),
+        ("merge_pull_request", "Merge an approved pull request.", {"repo": "owner/name", "number": "PR number"}),
+        ("create_issue", "File a GitHub issue.", {"repo": "owner/name", "title": "Issue title"}),
+        ("get_workflow_runs", "List recent GitHub Actions CI workflow runs and their status.", {"repo": "owner/name"}),
+        ("add_review_comment", "Comment on a line of a pull request diff.", {"number": "PR number", "body": "Text"}),
+        ("list_releases", "List published releases and tags.", {"repo": "owner/name"}),
+        ("search_code", "Search code across GitHub repositories.", {"query": "Search query"}),
+    ],
+    "jira": [
+        (
+            "create_ticket",
+            "Create a Jira ticket (bug, story or task) in a project.",
+            {"project": "Key", "summary": "Text"},
+        ),
+        ("search_tickets", "Find Jira tickets with a JQL query.", {"jql": "JQL"}),
+        (
+            "transition_ticket",
+            "Move a Jira ticket to another workflow status.",
+            {"key": "Ticket key", "status": "Target"},
+        ),
+        ("assign_ticket", "Assign a Jira ticket to a person.", {"key": "Ticket key", "assignee": "User"}),
+        ("add_comment", "Add a comment to a Jira ticket.", {"key": "Ticket key", "body": "Text"}),
+        ("get_sprint", "Show the active sprint and its tickets for a board.", {"board": "Board id"}),
+        ("log_work", "Log time spent on a Jira ticket.", {"key": "Ticket key", "hours": "Hours"}),
+    ],
+    "slack": [
+        ("post_message", "Post a message to a Slack channel.", {"channel": "Channel", "text": "Message"}),
+        ("send_dm", "Send a direct message to a Slack user.", {"user": "User", "text": "Message"}),
+        ("search_messages", "Search Slack message history.", {"query": "Search terms"}),
+        ("list_channels", "List Slack channels in the workspace.", {}),
+        ("set_status", "Set your Slack status and emoji.", {"text": "Status text"}),
+        ("upload_file", "Share a file in a Slack channel.", {"channel": "Channel", "path": "File"}),
+    ],
+    "postgres": [
+        ("query", "Run a read-only SQL query on the Postgres database.", {"sql": "SELECT statement"}),
+        ("list_tables", "List tables in a Postgres schema.", {"schema": "Schema name"}),
+        ("describe_table", "Show the columns, types and indexes of a table.", {"table": "Table name"}),
+        ("explain", "Show the query plan (EXPLAIN ANALYZE) for a SQL statement.", {"sql": "Statement"}),
+        ("active_locks", "List blocking locks and the sessions holding them.", {}),
+        ("replication_status", "Show replication lag for each standby server.", {}),
+    ],
+    "kubernetes": [
+        ("get_pods", "List pods and their status in a namespace.", {"namespace": "Namespace"}),
+        ("get_logs", "Fetch container logs from a pod.", {"pod": "Pod name", "tail": "Lines"}),
+        ("describe_deployment", "Describe a deployment's replicas, image and rollout.", {"name": "Deployment"}),
+        ("scale_deployment", "Change the replica count of a deployment.", {"name": "Deployment", "replicas": "Count"}),
+        ("rollout_restart", "Restart a deployment's pods with a rolling update.", {"name": "Deployment"}),
+        ("get_events", "List recent cluster events (crash loops, OOM kills, scheduling).", {"namespace": "Namespace"}),
+        ("apply_manifest", "Apply a YAML manifest to the cluster.", {"manifest": "YAML"}),
+    ],
+    "aws": [
+        ("s3_list_objects", "List objects in an S3 bucket under a prefix.", {"bucket": "Bucket", "prefix": "Prefix"}),
+        ("s3_get_object", "Download an object from S3.", {"bucket": "Bucket", "key": "Key"}),
+        ("s3_put_lifecycle", "Set the lifecycle (expiry) rules of an S3 bucket.", {"bucket": "Bucket"}),
+        ("ec2_describe_instances", "List EC2 virtual machine instances and their state.", {"region": "Region"}),
+        ("cloudwatch_get_metric", "Read a CloudWatch metric time series.", {"metric": "Metric name"}),
+        ("lambda_invoke", "Invoke an AWS Lambda function.", {"function": "Function name"}),
+        ("iam_list_roles", "List IAM roles and attached policies.", {}),
+        ("cost_explorer", "Show AWS spend by service for a date range.", {"start": "Date", "end": "Date"}),
+    ],
+    "calendar": [
+        ("create_event", "Schedule a calendar meeting and invite attendees.", {"title": "Title", "start": "Time"}),
+        ("list_events", "List upcoming meetings on your calendar.", {"days": "Days ahead"}),
+        ("find_free_time", "Find a time slot when all attendees are free.", {"attendees": "People"}),
+        ("cancel_event", "Cancel a scheduled meeting.", {"event_id": "Event"}),
+        ("book_room", "Reserve a meeting room.", {"room": "Room", "start": "Time"}),
+    ],
+    "gmail": [
+        ("send_email", "Send an email.", {"to": "Recipients", "subject": "Subject", "body": "Body"}),
+        ("search_inbox", "Search your email inbox.", {"query": "Gmail query"}),
+        ("draft_reply", "Draft a reply to an email thread.", {"thread": "Thread id", "body": "Text"}),
+        ("label_messages", "Apply a label to email messages.", {"label": "Label"}),
+    ],
+    "datadog": [
+        ("query_metrics", "Query Datadog metrics such as latency, error rate or CPU.", {"query": "Metric query"}),
+        ("list_monitors", "List Datadog monitors and alerts that are firing.", {}),
+        ("search_logs", "Search application logs in Datadog.", {"query": "Log query"}),
+        ("get_dashboard", "Open a Datadog dashboard.", {"id": "Dashboard"}),
+        ("mute_monitor", "Silence a noisy monitor for a while.", {"id": "Monitor", "minutes": "Duration"}),
+    ],
+    "pagerduty": [
+        ("trigger_incident", "Open an incident that pages the on-call responder.", {"service": "Service"}),
+        ("list_incidents", "List open PagerDuty incidents.", {}),
+        ("acknowledge_incident", "Acknowledge a PagerDuty incident.", {"id": "Incident"}),
+        ("get_oncall", "Show who is on call for a schedule.", {"schedule": "Schedule"}),
+    ],
+    "stripe": [
+        ("list_charges", "List recent card payments and charges.", {"customer": "Customer"}),
+        ("refund_charge", "Refund a payment in full or in part.", {"charge": "Charge id", "amount": "Amount"}),
+        ("get_customer", "Look up a billing customer and their subscriptions.", {"email": "Email"}),
+        ("list_invoices", "List invoices for a customer.", {"customer": "Customer"}),
+        ("cancel_subscription", "Cancel a customer's subscription plan.", {"subscription": "Subscription id"}),
+    ],
+    "confluence": [
+        ("search_pages", "Search Confluence wiki pages.", {"query": "CQL or text"}),
+        ("get_page", "Read a Confluence page.", {"page_id": "Page"}),
+        ("create_page", "Write a new Confluence page in a space.", {"space": "Space", "title": "Title"}),
+        ("update_page", "Edit an existing Confluence page.", {"page_id": "Page", "body": "Content"}),
+    ],
+    "sentry": [
+        ("list_issues", "List unresolved Sentry errors for a project, ordered by frequency.", {"project": "Project"}),
+        ("get_issue_events", "Show stack traces of recent events for a Sentry error.", {"issue": "Issue id"}),
+        ("resolve_issue", "Mark a Sentry error as resolved.", {"issue": "Issue id"}),
+    ],
+    "notion": [
+        ("search", "Search Notion pages and databases.", {"query": "Text"}),
+        ("create_page", "Create a Notion page.", {"parent": "Parent page", "title": "Title"}),
+        ("query_database", "Filter rows of a Notion database.", {"database": "Database id"}),
+    ],
+}
+
+
+def _mcp_tool(server: str, name: str, description: str, params: dict[str, str]) -> dict[str, Any]:
+    return {
+        "type": "function",
+        "function": {
+            "name": f"{server}_{name}",
+            "description": description,
+            "parameters": {
+                "type": "object",
+                "properties": {p: {"type": "string", "description": d} for p, d in params.items()},
+                "required": list(params)[:1],
+            },
+        },
+    }
+
+
+def _catalog() -> list[dict[str, Any]]:
+    registry = ToolRegistry()
+    register_default_tools(registry)
+    tools = list(registry.get_openai_tools())
+    for server, entries in _SERVERS.items():
+        tools.extend(_mcp_tool(server, *entry) for entry in entries)
+    return tools
+
+
+# (request, tools a correct answer needs, tool called earlier in the conversation)
+_SCRIPT: list[tuple[str, set[str], str | None]] = [
+    ("Open a PR for my feature branch against main", {"github_create_pull_request"}, None),
+    ("Did the CI pipeline pass on the last push?", {"github_get_workflow_runs"}, None),
+    ("File a bug ticket in the PAY project about double charges", {"jira_create_ticket"}, None),
+    ("Which tickets are in the current sprint for board 12?", {"jira_get_sprint"}, None),
+    ("Move PAY-431 to Done", {"jira_transition_ticket"}, "jira_search_tickets"),
+    ("Tell the #releases channel that 2.3 is out", {"slack_post_message"}, None),
+    ("DM Priya that the review is ready", {"slack_send_dm"}, None),
+    ("How many users signed up yesterday? Check the users table", {"postgres_query"}, None),
+    ("Why is this SELECT so slow? Show me the plan", {"postgres_explain"}, "postgres_query"),
+    ("Something is blocking writes to the orders table", {"postgres_active_locks"}, None),
+    ("Are any pods crash looping in the payments namespace?", {"kubernetes_get_pods", "kubernetes_get_events"}, None),
+    ("Show me the last 200 log lines from the api pod", {"kubernetes_get_logs"}, "kubernetes_get_pods"),
+    ("Bump the checkout deployment to 6 replicas", {"kubernetes_scale_deployment"}, None),
+    ("What's in the reports bucket under 2024/?", {"aws_s3_list_objects"}, None),
+    ("How much did we spend on AWS last month by service?", {"aws_cost_explorer"}, None),
+    ("Set up a 30 minute meeting with Dana and Lee next week", {"calendar_find_free_time"}, None),
+    ("Email the vendor that the invoice is overdue", {"gmail_send_email"}, None),
+    ("What's the p99 latency of the search service right now?", {"datadog_query_metrics"}, None),
+    ("Which monitors are alerting?", {"datadog_list_monitors"}, None),
+    ("Page whoever is on call for the database", {"pagerduty_trigger_incident"}, None),
+    ("Refund the last payment from jo@example.com", {"stripe_refund_charge"}, "stripe_list_charges"),
+    ("Find the runbook page for failovers in the wiki", {"confluence_search_pages"}, None),
+    ("What are the most frequent unresolved errors in the web project?", {"sentry_list_issues"}, None),
+    ("Read src/app.py and fix the typo in the docstring", {"read_file", "edit_file"}, None),
+]
+
+# Paraphrase groups the stub embeddings treat as one concept (tool wording first)
+_SYNONYMS = [
+    "pull pr",
+    "workflow pipeline",
+    "status done",
+    "message tell",
+    "direct dm",
+    "query check",
+    "locks blocking",
+    "replicas bump",
+    "spend cost",
+    "alerts alerting",
+    "pages page",
+    "payment payments",
+    "wiki runbook",
+    "errors frequent",
+    "edit fix typo",
+]
+
+
+def _conversation(request: str, used: str | None) -> list[dict[str, Any]]:
+    messages: list[dict[str, Any]] = []
+    if used:
+        messages += [
+            {"role": "user", "content": "Let's look into this."},
+            {
+                "role": "assistant",
+                "content": "",
+                "tool_calls": [{"id": "c0", "type": "function", "function": {"name": used, "arguments": "{}"}}],
+            },
+            {"role": "tool", "tool_call_id": "c0", "content": "ok"},
+            {"role": "assistant", "content": "Done."},
+        ]
+    messages.append({"role": "user", "content": request})
+    return messages
+
+
+def _run(selector: ToolSelector, catalog: list[dict[str, Any]]) -> tuple[float, float]:
+    """(recall, average tool-schema tokens sent) over the script."""
+    counter = get_token_counter()
+    hits = needed = tokens = 0
+    for request, wanted, used in _SCRIPT:
+        sent = asyncio.run(selector.select(catalog, _conversation(request, used)))
+        names = {t["function"]["name"] for t in sent}
+        hits += len(wanted & names)
+        needed += len(wanted)
+        tokens += counter.count_text(json.dumps(sent))
+    return hits / needed, tokens / len(_SCRIPT)
+
+
+def _local_embeddings() -> Any:
+    try:
+        from anteroom.services.embeddings import LocalEmbeddingService
+    except ImportError:
+        return None
+    svc = LocalEmbeddingService("BAAI/bge-small-en-v1.5")
+    try:
+        if not asyncio.run(svc.embed("probe")):
+            return None
+    except Exception:
+        return None
+    return svc
+
+
+def test_selection_saves_tokens_and_keeps_needed_tools() -> None:
+    catalog = _catalog()
+    full_tokens = get_token_counter().count_text(json.dumps(catalog))
+    clear_embedding_cache()
+    pinned = AIConfig(base_url="", api_key="").tool_selection_pinned
+
+    rows: list[tuple[str, float, float]] = []
+    recall, tokens = _run(ToolSelector(top_n=_TOP_N, pinned=pinned), catalog)
+    rows.append(("terms", recall, tokens))
+    stub = ToolSelector(top_n=_TOP_N, pinned=pinned, embedding_service=LexiconEmbeddings(_SYNONYMS))
+    rows.append(("stub", *_run(stub, catalog)))
+    embeddings_svc = _local_embeddings()
+    if embeddings_svc is not None:
+        selector = ToolSelector(top_n=_TOP_N, pinned=pinned, embedding_service=embeddings_svc)
+        rows.append(("embeddings", *_run(selector, catalog)))
+
+    print(f"\nCatalog: {len(catalog)} tools, {full_tokens:,} schema tokens; top_n {_TOP_N}, {len(_SCRIPT)} requests")
+    for name, recall, tokens in rows:
+        saved = 1 - tokens / full_tokens
+        print(f"  {name:<11} recall {recall:5.0%}   avg sent {tokens:7,.0f} tokens   saved {saved:5.0%}")
+    if embeddings_svc is None:
+        print("  embeddings  not measured: fastembed model unavailable")
+
+    for _, recall, tokens in rows:
+        assert tokens <= 0.6 * full_tokens
+    assert rows[0][1] >= 0.75
+    for _, recall, _ in rows[1:]:
+        assert recall >= 0.85
@@ -0,0 +1,52 @@
+"""Persistent shell latency benchmark.
+
+Runs the same sequence of small commands through the bash tool twice: once
+as one-shot subprocesses (the default) and once through a persistent
+``ShellSession``.  Prints the mean per-command latency of each mode; the
+persistent shell must be faster since it skips process startup.
+
+Run:
+    pytest evals/bash/ -v -s
+    ANTEROOM_BENCH_SHELL_COMMANDS=500 pytest evals/bash/ -s
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+import pytest
+
+from anteroom.tools.bash import handle
+from anteroom.tools.shell_session import ShellSession
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="persistent shells are POSIX only")
+
+_COMMANDS = int(os.environ.get("ANTEROOM_BENCH_SHELL_COMMANDS", "100"))
+
+
+async def _time_commands(session: ShellSession | None) -> float:
+    start = time.perf_counter()
+    for i in range(_COMMANDS):
+        result = await handle(f"echo {i}", _shell_session=session)
+        assert result["stdout"] == f"{i}\n", result
+    return time.perf_counter() - start
+
+
+@pytest.mark.asyncio
+async def test_persistent_shell_latency(tmp_path) -> None:
+    one_shot = await _time_commands(None)
+    session = ShellSession(str(tmp_path))
+    try:
+        persistent = await _time_commands(session)
+    finally:
+        await session.close()
+
+    per_one_shot = one_shot / _COMMANDS * 1000
+    per_persistent = persistent / _COMMANDS * 1000
+    print(
+        f"\n{_COMMANDS} sequential commands: one-shot {per_one_shot:.2f} ms/cmd, "
+        f"persistent {per_persistent:.2f} ms/cmd ({one_shot / persistent:.1f}x)"
+    )
+    assert persistent < one_shot
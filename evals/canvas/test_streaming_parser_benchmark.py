@@ -0,0 +1,92 @@
+"""Canvas streaming parser benchmark.
+
+Streams a canvas tool call of ~200 KB of arguments in 5-byte deltas, the
+way providers deliver ``tool_call_args_delta`` events, and measures the CPU
+spent extracting the ``content`` preview:
+
+- re-parse: ``_extract_streaming_content`` on the accumulated buffer after
+  every delta (the old behaviour, O(n^2)); run on a prefix only, since the
+  full document takes minutes
+- incremental: one ``_StreamingStringField`` fed each delta (O(n))
+
+Both must yield identical text for the prefix; the incremental parser must
+finish the whole document faster than the re-parse handles the prefix.
+
+Run:
+    pytest evals/canvas/ -v -s
+    ANTEROOM_BENCH_CANVAS_KB=500 ANTEROOM_BENCH_REPARSE_KB=40 pytest evals/canvas/ -s
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+import time
+
+from anteroom.routers.chat import _extract_streaming_content, _StreamingStringField
+
+_CANVAS_KB = int(os.environ.get("ANTEROOM_BENCH_CANVAS_KB", "200"))
+_REPARSE_KB = int(os.environ.get("ANTEROOM_BENCH_REPARSE_KB", "10"))
+_DELTA = int(os.environ.get("ANTEROOM_BENCH_DELTA_BYTES", "5"))
+
+
+def _document(size: int) -> str:
+    rng = random.Random(39)
+    words = ["def", "return", "self", "value", '"quoted"', "\\path", "naïve", "\t", "\n", "{}", "→"]
+    out: list[str] = []
+    total = 0
+    while total < size:
+        word = rng.choice(words)
+        out.append(word + " ")
+        total += len(word) + 1
+    return "".join(out)[:size]
+
+
+def _deltas(args: str) -> list[str]:
+    return [args[i : i + _DELTA] for i in range(0, len(args), _DELTA)]
+
+
+def _incremental(deltas: list[str]) -> tuple[str, float]:
+    parser = _StreamingStringField("content")
+    out: list[str] = []
+    start = time.perf_counter()
+    for delta in deltas:
+        piece = parser.feed(delta)
+        if piece:
+            out.append(piece)
+    return "".join(out), time.perf_counter() - start
+
+
+def _reparse(deltas: list[str]) -> tuple[str, float]:
+    accum = ""
+    sent = 0
+    out: list[str] = []
+    start = time.perf_counter()
+    for delta in deltas:
+        accum += delta
+        content = _extract_streaming_content(accum)
+        if content is not None and len(content) > sent:
+            out.append(content[sent:])
+            sent = len(content)
+    return "".join(out), time.perf_counter() - start
+
+
+def test_incremental_canvas_parser() -> None:
+    content = _document(_CANVAS_KB * 1024)
+    args = json.dumps({"title": "Bench", "language": "python", "content": content})
+    deltas = _deltas(args)
+
+    text, incremental_s = _incremental(deltas)
+    assert text == content
+
+    prefix_deltas = deltas[: _REPARSE_KB * 1024 // _DELTA]
+    reparsed, reparse_s = _reparse(prefix_deltas)
+    assert _incremental(prefix_deltas)[0] == reparsed
+
+    print(
+        f"\n{len(args) / 1024:.0f} KB in {len(deltas)} deltas of {_DELTA} bytes: "
+        f"incremental {incremental_s * 1000:.1f} ms total ({incremental_s / len(deltas) * 1e6:.2f} us/delta); "
+        f"re-parse of first {_REPARSE_KB} KB {reparse_s * 1000:.1f} ms"
+    )
+    assert incremental_s < reparse_s
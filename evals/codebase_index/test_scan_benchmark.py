@@ -0,0 +1,81 @@
+"""Codebase index cold-scan benchmark.
+
+Generates a synthetic multi-package Python tree (10k files by default) and
+times a cold ``CodebaseIndexService.scan()`` serially and with the process
+pool, checking that both produce the same map.  A warm re-scan is timed too.
+
+Run:
+    pytest evals/codebase_index/ -v -s
+    ANTEROOM_BENCH_FILES=20000 pytest evals/codebase_index/ -s
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from anteroom.services.codebase_index import CodebaseIndexService, resolve_index_workers
+
+pytest.importorskip("tree_sitter")
+pytest.importorskip("tree_sitter_language_pack")
+
+_FILES = int(os.environ.get("ANTEROOM_BENCH_FILES", "10000"))
+
+_TEMPLATE = '''"""Synthetic module {i}."""
+
+from pkg{dep}.mod{dep_i} import helper_{dep_i}
+
+
+class Model{i}:
+    def __init__(self, value: int) -> None:
+        self.value = value
+
+    def compute(self, other: int) -> int:
+        return helper_{dep_i}(self.value + other)
+
+
+def helper_{i}(x: int) -> int:
+    return x * {i}
+'''
+
+
+@pytest.fixture(scope="module")
+def synthetic_tree(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    root = tmp_path_factory.mktemp("bench")
+    (root / "pyproject.toml").write_text("")
+    packages = max(1, _FILES // 100)
+    for i in range(_FILES):
+        pkg = root / f"pkg{i % packages}"
+        pkg.mkdir(exist_ok=True)
+        dep_i = (i * 7 + 3) % _FILES
+        (pkg / f"mod{i}.py").write_text(_TEMPLATE.format(i=i, dep=dep_i % packages, dep_i=dep_i))
+    return root
+
+
+def _cold(root: Path, workers: int) -> tuple[float, CodebaseIndexService, str]:
+    service = CodebaseIndexService(workers=workers)
+    start = time.perf_counter()
+    cmap = service.scan(str(root))
+    elapsed = time.perf_counter() - start
+    assert not cmap.partial
+    return elapsed, service, service.format_map(cmap, token_budget=4000)
+
+
+def test_cold_scan_serial_vs_parallel(synthetic_tree: Path) -> None:
+    workers = resolve_index_workers(0)
+    serial_s, _, serial_map = _cold(synthetic_tree, workers=1)
+    parallel_s, service, parallel_map = _cold(synthetic_tree, workers=workers)
+
+    start = time.perf_counter()
+    service.scan(str(synthetic_tree))
+    warm_ms = (time.perf_counter() - start) * 1000
+
+    print(f"\nfiles={_FILES} workers={workers}")
+    print(f"  cold serial:   {serial_s:8.2f}s")
+    print(f"  cold parallel: {parallel_s:8.2f}s  ({serial_s / parallel_s:.1f}x)")
+    print(f"  warm:          {warm_ms:8.2f}ms")
+
+    assert parallel_map == serial_map
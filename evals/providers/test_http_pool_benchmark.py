@@ -0,0 +1,123 @@
+"""Shared provider connection pool benchmark.
+
+Starts a local TLS stub of ``/v1/chat/completions`` (self-signed, HTTP/1.1
+keep-alive) and, for several rounds, fans out ten concurrent "subagents".
+Each one builds its own ``AIService`` from a copy of the config, exactly as
+``tools/subagent`` does, and makes a couple of sequential completions.  The
+first response on every new connection is delayed to stand in for the
+TCP+TLS round trips to a remote provider (loopback handshakes are nearly
+free).  The scenario runs once with every service on a private client (the
+previous behaviour) and once through the shared ``http_clients`` registry.
+Prints TLS handshakes and wall-clock for both; the shared pool must open
+fewer connections and finish sooner.
+
+Run:
+    pytest evals/providers/ -v -s
+    ANTEROOM_BENCH_SUBAGENTS=20 ANTEROOM_BENCH_ROUNDS=10 ANTEROOM_BENCH_SETUP_MS=250 pytest evals/providers/ -s
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import datetime
+import os
+import ssl
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+
+from anteroom.config import AIConfig
+from anteroom.services import http_pool
+from anteroom.services.ai_service import AIService
+from tests.unit.conftest import StubHTTPServer, StubRequest, chat_completion, json_response
+
+_SUBAGENTS = int(os.environ.get("ANTEROOM_BENCH_SUBAGENTS", "10"))
+_ROUNDS = int(os.environ.get("ANTEROOM_BENCH_ROUNDS", "5"))
+_CALLS = int(os.environ.get("ANTEROOM_BENCH_CALLS", "2"))
+_SETUP_S = int(os.environ.get("ANTEROOM_BENCH_SETUP_MS", "100")) / 1000
+
+
+def _self_signed_cert(tmp_path: Path) -> ssl.SSLContext:
+    x509 = pytest.importorskip("cryptography.x509")
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = tmp_path / "cert.pem"
+    key_path = tmp_path / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(
+        key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    )
+    ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ctx.load_cert_chain(cert_path, key_path)
+    return ctx
+
+
+async def _respond(request: StubRequest) -> AsyncIterator[bytes]:
+    if request.fresh:
+        await asyncio.sleep(_SETUP_S)
+    yield json_response(chat_completion("ok", model="bench-model"))
+
+
+async def _run_subagents(config: AIConfig) -> None:
+    async def _subagent() -> None:
+        child = AIService(copy.deepcopy(config))
+        for _ in range(_CALLS):
+            assert await child.complete([{"role": "user", "content": "hi"}], max_completion_tokens=5) == "ok"
+
+    for _ in range(_ROUNDS):
+        await asyncio.gather(*(_subagent() for _ in range(_SUBAGENTS)))
+
+
+@pytest.mark.asyncio
+async def test_shared_pool_reuses_tls_connections(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    async with StubHTTPServer(_respond, ssl_context=_self_signed_cert(tmp_path)) as stub:
+        config = AIConfig(
+            base_url=stub.base_url,
+            api_key="bench",
+            model="bench-model",
+            verify_ssl=False,
+            retry_max_attempts=0,
+        )
+        try:
+            with monkeypatch.context() as m:
+                m.setattr(http_pool.http_clients, "get", http_pool._new_client)
+                start = time.perf_counter()
+                await _run_subagents(config)
+                private_s = time.perf_counter() - start
+            private_handshakes = stub.connections
+
+            stub.connections = 0
+            await http_pool.http_clients.warmup(config)
+            start = time.perf_counter()
+            await _run_subagents(config)
+            shared_s = time.perf_counter() - start
+            shared_handshakes = stub.connections
+        finally:
+            await http_pool.http_clients.aclose()
+
+    print(
+        f"\n{_ROUNDS} rounds x {_SUBAGENTS} subagents x {_CALLS} calls: "
+        f"private clients {private_handshakes} TLS handshakes in {private_s * 1000:.0f} ms, "
+        f"shared pool {shared_handshakes} handshakes in {shared_s * 1000:.0f} ms "
+        f"({private_s / shared_s:.1f}x)"
+    )
+    assert shared_handshakes < private_handshakes
+    assert shared_s < private_s
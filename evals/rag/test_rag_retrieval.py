@@ -4,7 +4,8 @@ Measures retrieval quality against a curated dataset with ground-truth
 annotations.  Uses real local embeddings (fastembed BAAI/bge-small-en-v1.5)
 and the production ``retrieve_context()`` code path.
 
-Metrics: recall@k, MRR, nDCG@k, empty-result rate.
+Metrics: recall@k, MRR, nDCG@k, empty-result rate, and injected-context
+tokens with and without MMR / near-duplicate diversification.
 
 Run:
     pytest evals/rag/ -v --tb=short
@@ -14,7 +15,7 @@ from __future__ import annotations
 
 import asyncio
 import math
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from typing import Any
 
 import pytest
@@ -130,7 +131,7 @@ def all_results(
 
     try:
         for q in queries:
-            chunks = loop.run_until_complete(
+            chunks, _ = loop.run_until_complete(
                 retrieve_context(
                     query=q["query"],
                     db=db,
@@ -180,7 +181,7 @@ def space_results(
 
     try:
         for q in queries:
-            chunks = loop.run_until_complete(
+            chunks, _ = loop.run_until_complete(
                 retrieve_context(
                     query=q["query"],
                     db=db,
@@ -522,3 +523,75 @@ def test_space_scoping_aggregate(space_results: list[QueryResult]) -> None:
         assert r.recall > 0, (
             f"[{r.query_id}] space-scoped recall@{r.k}=0 — retrieved {r.retrieved_ids}, expected any of {r.relevant}"
         )
+
+
+# ---------------------------------------------------------------------------
+# Diversification (MMR + near-duplicate collapsing) A/B
+# ---------------------------------------------------------------------------
+
+# Production-like budget so the effect on injected tokens is visible.
+_DIVERSITY_BASE = RagConfig(
+    enabled=True,
+    max_chunks=10,
+    max_tokens=2000,
+    similarity_threshold=2.0,
+    include_sources=True,
+    include_conversations=True,
+    exclude_current=False,
+)
+_DIVERSITY_OFF = replace(_DIVERSITY_BASE, mmr_lambda=1.0, near_duplicate_threshold=-1)
+
+
+def _run_queries(seeded_env: dict[str, Any], embedding_service: Any, queries: list[dict[str, Any]], config: RagConfig):
+    loop = asyncio.new_event_loop()
+    out: list[tuple[dict[str, Any], list[RetrievedChunk]]] = []
+    try:
+        for q in queries:
+            chunks, _ = loop.run_until_complete(
+                retrieve_context(
+                    query=q["query"],
+                    db=seeded_env["db"],
+                    embedding_service=embedding_service,
+                    config=config,
+                    vec_manager=seeded_env["vec_manager"],
+                )
+            )
+            out.append((q, chunks))
+    finally:
+        loop.close()
+    return out
+
+
+def test_diversification_effect(seeded_env: dict[str, Any], embedding_service: Any, dataset: dict[str, Any]) -> None:
+    """Compare recall and injected tokens per turn with diversification off vs. on."""
+    queries = [q for q in dataset["queries"] if q.get("category") != "space_scoping" and q["relevant"]]
+    off = _run_queries(seeded_env, embedding_service, queries, _DIVERSITY_OFF)
+    on = _run_queries(seeded_env, embedding_service, queries, _DIVERSITY_BASE)
+
+    def _summary(runs: list[tuple[dict[str, Any], list[RetrievedChunk]]]) -> tuple[float, float, float]:
+        recalls = [_recall_at_k(_extract_ids(c), q["relevant"], q["k"]) for q, c in runs]
+        ndcgs = [_ndcg_at_k(_extract_ids(c), q["relevant"], q["k"]) for q, c in runs]
+        tokens = [sum(len(ch.content) for ch in c) / 4 for _, c in runs]
+        n = len(runs) or 1
+        return sum(recalls) / n, sum(ndcgs) / n, sum(tokens) / n
+
+    off_recall, off_ndcg, off_tokens = _summary(off)
+    on_recall, on_ndcg, on_tokens = _summary(on)
+    print(
+        "\n".join(
+            [
+                "",
+                "=" * 90,
+                "  RAG Diversification A/B (MMR lambda=0.7, SimHash <= 3 bits)",
+                "=" * 90,
+                f"  {'':<18} {'Recall@k':>9} {'nDCG@k':>8} {'Tokens/turn':>12}",
+                f"  {'off':<18} {off_recall:>9.3f} {off_ndcg:>8.3f} {off_tokens:>12.1f}",
+                f"  {'on':<18} {on_recall:>9.3f} {on_ndcg:>8.3f} {on_tokens:>12.1f}",
+                "=" * 90,
+            ]
+        )
+    )
+
+    # Diversification must not cost meaningful recall and never adds tokens.
+    assert on_recall >= off_recall - 0.05, f"Diversification dropped recall {off_recall:.3f} -> {on_recall:.3f}"
+    assert on_tokens <= off_tokens + 1e-6
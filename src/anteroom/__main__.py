@@ -619,6 +619,7 @@ def _run_usage(
 
     from .db import init_db
     from .services import storage
+    from .services.response_cache import response_cache_stats
 
     db = init_db(config.app.data_dir / "chat.db")
     usage_cfg = config.cli.usage
@@ -647,12 +648,17 @@ def _run_usage(
         total_completion = sum(s.get("completion_tokens", 0) or 0 for s in stats)
         total_tokens = sum(s.get("total_tokens", 0) or 0 for s in stats)
         total_messages = sum(s.get("message_count", 0) or 0 for s in stats)
+        total_cache_read = sum(s.get("cache_read_tokens", 0) or 0 for s in stats)
+        total_cache_write = sum(s.get("cache_write_tokens", 0) or 0 for s in stats)
+        total_hedge = sum(s.get("hedge_tokens", 0) or 0 for s in stats)
 
         total_cost = 0.0
         for s in stats:
             model = s.get("model", "") or ""
             prompt_t = s.get("prompt_tokens", 0) or 0
             completion_t = s.get("completion_tokens", 0) or 0
+            # Prompts of cancelled hedge requests are billed at the input rate
+            prompt_t += s.get("hedge_tokens", 0) or 0
             costs = usage_cfg.model_costs.get(model, {})
             input_rate = costs.get("input", 0.0)
             output_rate = costs.get("output", 0.0)
@@ -662,14 +668,22 @@ def _run_usage(
             "prompt_tokens": total_prompt,
             "completion_tokens": total_completion,
             "total_tokens": total_tokens,
+            "cache_read_tokens": total_cache_read,
+            "cache_write_tokens": total_cache_write,
+            "hedge_tokens": total_hedge,
             "message_count": total_messages,
             "estimated_cost": round(total_cost, 4),
+            # Cached responses are not tied to a conversation
+            "response_cache": None if conversation_id else response_cache_stats(config.app.data_dir, since),
             "by_model": [
                 {
                     "model": s.get("model", "unknown"),
                     "prompt_tokens": s.get("prompt_tokens", 0) or 0,
                     "completion_tokens": s.get("completion_tokens", 0) or 0,
                     "total_tokens": s.get("total_tokens", 0) or 0,
+                    "cache_read_tokens": s.get("cache_read_tokens", 0) or 0,
+                    "cache_write_tokens": s.get("cache_write_tokens", 0) or 0,
+                    "hedge_tokens": s.get("hedge_tokens", 0) or 0,
                     "message_count": s.get("message_count", 0) or 0,
                 }
                 for s in stats
@@ -690,6 +704,14 @@ def _run_usage(
         print(f"    Prompt:     {data['prompt_tokens']:>12,} tokens")
         print(f"    Completion: {data['completion_tokens']:>12,} tokens")
         print(f"    Total:      {data['total_tokens']:>12,} tokens")
+        if data["cache_read_tokens"] or data["cache_write_tokens"]:
+            print(f"    Cache read: {data['cache_read_tokens']:>12,} tokens")
+            print(f"    Cache write:{data['cache_write_tokens']:>12,} tokens")
+        if data["hedge_tokens"]:
+            print(f"    Hedged:     {data['hedge_tokens']:>12,} tokens (duplicate prompts)")
+        if data["response_cache"] and data["response_cache"]["hits"]:
+            rc = data["response_cache"]
+            print(f"    Cached responses: {rc['hits']:,} hits, {rc['tokens_saved']:,} tokens saved")
         if data["estimated_cost"] > 0:
             print(f"    Est. cost:  ${data['estimated_cost']:>11,.4f}")
         if len(data["by_model"]) > 1:
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import hmac
 import ipaddress
@@ -9,6 +10,7 @@ import json
 import logging
 import os
 import secrets
+import sys
 import time
 from collections import OrderedDict
 from collections.abc import Awaitable, Callable
@@ -27,9 +29,12 @@ from .config import AppConfig, SessionConfig, ensure_identity, load_config
 from .db import DatabaseManager, init_db
 from .services.embedding_worker import EmbeddingWorker
 from .services.embeddings import create_embedding_service, get_effective_dimensions
+from .services.endpoint_pool import run_health_checks
 from .services.event_bus import EventBus
+from .services.http_pool import http_clients
 from .services.ip_allowlist import check_ip_allowed
 from .services.mcp_manager import McpManager
+from .services.response_cache import close_response_cache, configure_response_cache
 from .services.session_store import MemorySessionStore, SQLiteSessionStore, create_session_store
 from .tools import ToolRegistry, register_default_tools
 
@@ -160,6 +165,40 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     tool_registry.set_safety_config(config.safety, working_dir=working_dir)
     app.state.tool_registry = tool_registry
     app.state.pending_approvals = {}
+
+    # Concurrency caps are shared by every chat request (and their sub-agents)
+    from .services.tool_scheduler import ToolScheduler
+
+    def _mcp_server_for(tool_name: str) -> str | None:
+        manager = getattr(app.state, "mcp_manager", None)
+        return manager.get_tool_server_name(tool_name) if manager else None
+
+    app.state.tool_scheduler = ToolScheduler.from_config(
+        config, resolve_server=_mcp_server_for, working_dir=working_dir
+    )
+
+    # Sub-agents from every request queue for the same global slots
+    from .services.subagent_scheduler import shared_scheduler
+
+    app.state.subagent_scheduler = shared_scheduler(config.safety.subagent)
+
+    # Persistent bash shells, one per conversation (POSIX only)
+    app.state.shell_sessions = None
+    if config.safety.bash.persistent_shell is True and sys.platform != "win32":
+        from .tools.shell_session import ShellSessionPool
+
+        app.state.shell_sessions = ShellSessionPool(
+            idle_timeout=config.safety.bash.shell_idle_timeout,
+            max_sessions=config.safety.bash.shell_max_sessions,
+        )
+
+    # One codebase index per process; file edits made through tools keep it current.
+    from .services.codebase_index import create_index_service, index_cache_dir
+
+    codebase_index = create_index_service(config, cache_dir=index_cache_dir(config))
+    app.state.codebase_index = codebase_index
+    if codebase_index is not None:
+        tool_registry.add_file_change_listener(codebase_index.notify_changed)
     logger.info(f"Built-in tools: {len(tool_registry.list_tools())} registered (cwd: {working_dir})")
     _write_progress(_progress_path, "tools", "done")
 
@@ -172,6 +211,11 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     if vec_manager.enabled:
         vec_manager.rebuild_from_db(app.state.db)
 
+    # Durable queue for deferred background work; handlers register below, polling starts once they have
+    from .services.job_queue import JobQueue
+
+    app.state.job_queue = JobQueue.from_config(app.state.db, config.storage)
+
     _write_progress(_progress_path, "embeddings", "running")
     # Start embedding service and background worker
     app.state.embedding_service = None
@@ -188,6 +232,7 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             app.state.embedding_service = embedding_service
             if app.state.vec_enabled:
                 worker = EmbeddingWorker(app.state.db, embedding_service, vec_manager=vec_manager)
+                worker.register_jobs(app.state.job_queue)
                 worker.start()
                 app.state.embedding_worker = worker
                 logger.info("Embedding worker started")
@@ -235,6 +280,7 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             check_interval=config.storage.retention_check_interval,
             purge_attachments=config.storage.purge_attachments,
         )
+        retention_worker.register_jobs(app.state.job_queue)
         retention_worker.start()
         app.state.retention_worker = retention_worker
         logger.info("Retention worker started (retention_days=%d)", config.storage.retention_days)
@@ -259,8 +305,6 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     # Start pack refresh worker if configured
     app.state.pack_refresh_worker = None
     if config.pack_sources:
-        import asyncio
-
         from .services.pack_refresh import PackRefreshWorker
 
         def _refresh_derived_singletons(cfg: object) -> None:
@@ -354,6 +398,10 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
                 if skill_reg is not None:
                     skill_reg.load_from_artifacts(registry)
 
+                space_cache = getattr(app.state, "space_registry_cache", None)
+                if space_cache is not None:
+                    space_cache.invalidate()
+
                 logger.info("Config and registries reloaded after pack refresh (config_ok=%s)", config_ok)
             except Exception:
                 logger.warning("Failed to reload after pack refresh", exc_info=True)
@@ -414,8 +462,36 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
 
         app.state.proxy_ai_service = create_ai_service(config.ai)
         logger.info("Proxy AIService created")
+
+    # Shared embedding batcher for /v1/embeddings (reuses the warm embedding service)
+    app.state.proxy_embedding_batcher = None
+    app.state.proxy_embedding_rate_limiter = None
+    if config.proxy.enabled and app.state.embedding_service:
+        from .services.embedding_batcher import EmbeddingBatcher, KeyedRateLimiter
+
+        app.state.proxy_embedding_batcher = EmbeddingBatcher(
+            app.state.embedding_service,
+            max_batch_size=config.proxy.embeddings_max_batch,
+            max_wait_ms=config.proxy.embeddings_batch_wait_ms,
+            cache_size=config.proxy.embeddings_cache_size,
+        )
+        app.state.proxy_embedding_rate_limiter = KeyedRateLimiter(config.proxy.embeddings_rate_limit)
+        logger.info("Proxy embeddings enabled (model=%s)", app.state.embedding_service.model)
     _write_progress(_progress_path, "artifacts", "done")
 
+    app.state.job_queue.start()
+    configure_response_cache(config.ai, config.app.data_dir, encrypt_at_rest=config.storage.encrypt_at_rest)
+
+    # Open the first provider connection in the background so the first chat turn starts warm
+    app.state.http_warmup_task = None
+    if config.ai.warmup_connections:
+        app.state.http_warmup_task = asyncio.create_task(http_clients.warmup(config.ai))
+
+    # Periodic health checks across ai.endpoints (the first round also opens their connections)
+    app.state.endpoint_health_task = None
+    if config.ai.endpoints:
+        app.state.endpoint_health_task = asyncio.create_task(run_health_checks(config.ai))
+
     _write_progress(_progress_path, "ready", "done")
     try:
         yield
@@ -424,12 +500,24 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             _progress_path.unlink(missing_ok=True)
         except OSError:
             pass
+        if getattr(app.state, "job_queue", None):
+            app.state.job_queue.stop()
         if hasattr(app.state, "pack_refresh_worker") and app.state.pack_refresh_worker:
             app.state.pack_refresh_worker.stop()
         if hasattr(app.state, "retention_worker") and app.state.retention_worker:
             app.state.retention_worker.stop()
         if hasattr(app.state, "embedding_worker") and app.state.embedding_worker:
             app.state.embedding_worker.stop()
+        if getattr(app.state, "proxy_embedding_batcher", None):
+            await app.state.proxy_embedding_batcher.close()
+        if getattr(app.state, "shell_sessions", None):
+            await app.state.shell_sessions.close_all()
+        if getattr(app.state, "http_warmup_task", None):
+            app.state.http_warmup_task.cancel()
+        if getattr(app.state, "endpoint_health_task", None):
+            app.state.endpoint_health_task.cancel()
+        await http_clients.aclose()
+        close_response_cache()
         if hasattr(app.state, "vec_manager") and app.state.vec_manager:
             app.state.vec_manager.save_all()
         if hasattr(app.state, "event_bus"):
@@ -840,6 +928,13 @@ def create_app(config: AppConfig | None = None, enforced_fields: list[str] | Non
 
         app.state.injection_detector = InjectionDetector(_inj_cfg)
 
+    # Reusable system-prompt sections and per-space registries shared across chat requests
+    from .services.prompt_sections import PromptSectionCache
+    from .services.registry_cache import SpaceRegistryCache
+
+    app.state.prompt_section_cache = PromptSectionCache()
+    app.state.space_registry_cache = SpaceRegistryCache()
+
     @app.exception_handler(Exception)
     async def global_exception_handler(request: Request, exc: Exception) -> JSONResponse:
         security_logger.exception("Unhandled exception on %s %s", request.method, request.url.path)
@@ -908,6 +1003,7 @@ def create_app(config: AppConfig | None = None, enforced_fields: list[str] | Non
         usage,
     )
     from .routers import artifact_health as artifact_health_router
+    from .routers import jobs as jobs_router
     from .routers import packs as packs_router
     from .routers import spaces as spaces_router
     from .routers import workflows as workflows_router
@@ -929,6 +1025,7 @@ def create_app(config: AppConfig | None = None, enforced_fields: list[str] | Non
     app.include_router(packs_router.router, prefix="/api")
     app.include_router(spaces_router.router, prefix="/api")
     app.include_router(workflows_router.router, prefix="/api")
+    app.include_router(jobs_router.router, prefix="/api")
 
     if config.proxy.enabled:
         from .routers import proxy
@@ -16,6 +16,10 @@ from ..services import storage
 from ..services.agent_loop import run_agent_loop
 from ..services.ai_service import create_ai_service
 from ..services.embeddings import get_effective_dimensions
+from ..services.request_deadline import with_deadline
+from ..services.response_cache import configure_response_cache
+from ..services.subagent_scheduler import PRIORITY_BACKGROUND, shared_scheduler
+from ..services.tool_selection import selector_for
 from ..tools import ToolRegistry, register_default_tools
 from ..tools.subagent import SubagentLimiter
 from .instructions import (
@@ -281,6 +285,7 @@ async def run_exec_mode(
         max_concurrent=sa_config.max_concurrent,
         max_total=sa_config.max_total,
     )
+    subagent_scheduler = shared_scheduler(sa_config)
     _subagent_counter = 0
 
     async def _exec_event_sink(agent_id: str, event: Any) -> None:
@@ -309,6 +314,8 @@ async def run_exec_mode(
                 "_limiter": subagent_limiter,
                 "_confirm_callback": _exec_confirm,
                 "_config": sa_config,
+                # Headless runs are background work; the budget applies to this run's conversation
+                "_schedule": subagent_scheduler.scope(conversation_id=conv["id"], priority=PRIORITY_BACKGROUND),
             }
         elif tool_name == "ask_user":
             arguments = {**arguments, "_ask_callback": _exec_ask_user}
@@ -382,6 +389,7 @@ async def run_exec_mode(
             config.ai.model = space["model"]
 
     ai_service = create_ai_service(config.ai)
+    configure_response_cache(config.ai, config.app.data_dir, encrypt_at_rest=config.storage.encrypt_at_rest)
 
     # Create conversation for persistence
     # Even with --no-conversation, we create a minimal audit conversation for tool call tracking.
@@ -424,19 +432,23 @@ async def run_exec_mode(
 
     async def _run_loop() -> None:
         nonlocal exit_code, output_total_chars, assistant_msg_id
-        async for event in run_agent_loop(
-            ai_service=ai_service,
-            messages=messages,
-            tool_executor=tool_executor,
-            tools_openai=tools_openai_or_none,
-            cancel_event=cancel_event,
-            extra_system_prompt=extra_system_prompt,
-            max_iterations=config.cli.max_tool_iterations,
-            narration_cadence=0,
-            tool_output_max_chars=config.cli.tool_output_max_chars,
-            output_filter=_output_filter,
-            max_consecutive_text_only=config.cli.max_consecutive_text_only,
-            max_line_repeats=config.cli.max_line_repeats,
+        async for event in with_deadline(
+            run_agent_loop(
+                ai_service=ai_service,
+                messages=messages,
+                tool_executor=tool_executor,
+                tools_openai=tools_openai_or_none,
+                cancel_event=cancel_event,
+                extra_system_prompt=extra_system_prompt,
+                max_iterations=config.cli.max_tool_iterations,
+                narration_cadence=0,
+                tool_output_max_chars=config.cli.tool_output_max_chars,
+                output_filter=_output_filter,
+                max_consecutive_text_only=config.cli.max_consecutive_text_only,
+                max_line_repeats=config.cli.max_line_repeats,
+                tool_selector=selector_for(config),
+            ),
+            ai_service.config.request_deadline,
         ):
             if event.kind == "token":
                 if output_total_chars < _MAX_OUTPUT_CHARS:
@@ -6,6 +6,7 @@ import logging
 import os
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Any
 
 logger = logging.getLogger(__name__)
 
@@ -128,6 +129,47 @@ def load_instructions(working_dir: str | None = None) -> str | None:
     return "\n\n".join(parts)
 
 
+def _stat_key(path: Path) -> tuple[str, int, int] | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    if not path.is_file():
+        return None
+    return (str(path), st.st_mtime_ns, st.st_size)
+
+
+def instructions_fingerprint(working_dir: str | None = None) -> tuple[Any, ...]:
+    """Return a change-detection key for ``load_instructions(working_dir)``.
+
+    Performs the same discovery walk as the loaders but only ``stat()``s the
+    candidates, so callers can cache the loaded text and skip disk reads
+    until a file appears, disappears, or changes mtime/size.
+    """
+    from ..config import _resolve_data_dir
+
+    global_key: tuple[str, int, int] | None = None
+    data_dir = _resolve_data_dir()
+    for filename in _SEARCH_FILENAMES:
+        global_key = _stat_key(data_dir / filename)
+        if global_key:
+            break
+
+    project_key: tuple[str, int, int] | None = None
+    current = Path(working_dir or os.getcwd()).resolve()
+    while project_key is None:
+        for filename in _SEARCH_FILENAMES:
+            project_key = _stat_key(current / filename)
+            if project_key:
+                break
+        parent = current.parent
+        if parent == current:
+            break
+        current = parent
+
+    return (global_key, project_key)
+
+
 def discover_conventions(working_dir: str | None = None) -> ConventionsInfo:
     """Discover the active conventions file and return metadata.
 
@@ -5,6 +5,7 @@ from __future__ import annotations
 import asyncio
 import json
 import os
+import re
 import sys
 import time
 from collections import deque
@@ -149,6 +150,8 @@ _THROUGHPUT_WARMUP_SECS: float = 8.0  # don't trigger throughput stall before th
 _tool_start: float = 0
 _tool_ticker_task: asyncio.Task[None] | None = None
 _tool_ticker_summary: str = ""
+_tool_output_line: str = ""  # latest output line of a running command, shown after the timer
+_ANSI_ESCAPE_RE = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]")
 _tool_spinner: Status | None = None
 
 # Dedup tracking for repeated similar tool calls
@@ -1211,13 +1214,14 @@ async def _tool_ticker() -> None:
             await asyncio.sleep(0.5)
             if _tool_start:
                 elapsed = time.monotonic() - _tool_start
+                tail = f"  | {_tool_output_line}" if _tool_output_line else ""
                 if _tool_spinner:
-                    label = f"  [{MUTED}]{escape(_tool_ticker_summary)}  {elapsed:.0f}s[/{MUTED}]"
+                    label = f"  [{MUTED}]{escape(_tool_ticker_summary)}  {elapsed:.0f}s{escape(tail)}[/{MUTED}]"
                     _tool_spinner.update(label)
                 elif _repl_mode and _stdout:
                     muted = _theme.ansi_fg("muted")
                     rst = _theme.ansi_reset
-                    _stdout.write(f"\r\033[2K{muted}  {_tool_ticker_summary}  {elapsed:.0f}s{rst}")
+                    _stdout.write(f"\r\033[2K{muted}  {_tool_ticker_summary}  {elapsed:.0f}s{tail}{rst}")
                     _stdout.flush()
     except asyncio.CancelledError:
         return
@@ -1225,8 +1229,9 @@ async def _tool_ticker() -> None:
 
 def start_tool_ticker(summary: str) -> None:
     """Start a live elapsed timer for the current tool call."""
-    global _tool_ticker_task, _tool_ticker_summary, _tool_spinner
+    global _tool_ticker_task, _tool_ticker_summary, _tool_spinner, _tool_output_line
     _tool_ticker_summary = summary
+    _tool_output_line = ""
     if _tool_ticker_task is not None:
         _tool_ticker_task.cancel()
         _tool_ticker_task = None
@@ -1240,9 +1245,20 @@ def start_tool_ticker(summary: str) -> None:
         _tool_ticker_task = None
 
 
+def update_tool_output(stream: str, text: str) -> None:
+    """Show the newest output line of a running command next to the tool timer."""
+    global _tool_output_line
+    for line in reversed(text.splitlines()):
+        line = "".join(ch for ch in _ANSI_ESCAPE_RE.sub("", line) if ch.isprintable()).strip()
+        if line:
+            _tool_output_line = line if len(line) <= 80 else line[:77] + "..."
+            return
+
+
 def stop_tool_ticker_sync() -> None:
     """Stop the tool ticker synchronously (safe from sync render_tool_call_end)."""
-    global _tool_ticker_task, _tool_spinner
+    global _tool_ticker_task, _tool_spinner, _tool_output_line
+    _tool_output_line = ""
     if _tool_ticker_task is not None:
         _tool_ticker_task.cancel()
         _tool_ticker_task = None
@@ -1892,8 +1908,8 @@ def clear_subagent_state() -> None:
     _active_subagents.clear()
 
 
-def render_subagent_start(agent_id: str, prompt: str, model: str, depth: int) -> None:
-    """Show that a sub-agent has been launched."""
+def render_subagent_start(agent_id: str, prompt: str, model: str, depth: int, queue_wait: float = 0.0) -> None:
+    """Show that a sub-agent has been launched (and how long it queued for a slot)."""
     _active_subagents[agent_id] = {
         "prompt": prompt,
         "model": model,
@@ -1903,7 +1919,8 @@ def render_subagent_start(agent_id: str, prompt: str, model: str, depth: int) ->
     }
     indent = "  " * depth
     truncated_prompt = prompt[:80] + "..." if len(prompt) > 80 else prompt
-    console.print(f"{indent}[{GOLD}]▶ Agent[/] [bold]{escape(agent_id)}[/bold] [{MUTED}]({model})[/{MUTED}]")
+    queued = f" · queued {queue_wait:.1f}s" if queue_wait >= 0.1 else ""
+    console.print(f"{indent}[{GOLD}]▶ Agent[/] [bold]{escape(agent_id)}[/bold] [{MUTED}]({model}){queued}[/{MUTED}]")
     console.print(f"{indent}  [{CHROME}]{escape(truncated_prompt)}[/{CHROME}]")
 
 
@@ -1919,7 +1936,9 @@ def render_subagent_tool(agent_id: str, tool_name: str, arguments: dict[str, Any
     console.print(f"{indent}  [{CHROME}]  ✓ {escape(summary)}[/{CHROME}]")
 
 
-def render_subagent_end(agent_id: str, elapsed: float, tool_calls: list[str], error: str | None = None) -> None:
+def render_subagent_end(
+    agent_id: str, elapsed: float, tool_calls: list[str], error: str | None = None, tokens_used: int = 0
+) -> None:
     """Show sub-agent completion."""
     info = _active_subagents.pop(agent_id, None)
     depth = info.get("depth", 1) if info else 1
@@ -1932,7 +1951,8 @@ def render_subagent_end(agent_id: str, elapsed: float, tool_calls: list[str], er
     else:
         console.print(
             f"{indent}[{_theme.success}]■ Agent {escape(agent_id)}[/{_theme.success}] "
-            f"[{MUTED}]done in {elapsed:.1f}s · {tool_count} tool call{'s' if tool_count != 1 else ''}[/{MUTED}]"
+            f"[{MUTED}]done in {elapsed:.1f}s · {tool_count} tool call{'s' if tool_count != 1 else ''}"
+            f"{f' · {tokens_used:,} tokens' if tokens_used else ''}[/{MUTED}]"
         )
 
 
@@ -28,6 +28,7 @@ from ..services import packs as packs_service
 from ..services import storage
 from ..services.agent_loop import _build_compaction_history, run_agent_loop
 from ..services.ai_service import AIService, create_ai_service
+from ..services.context_compactor import CompactionPolicy, ContextCompactor
 from ..services.context_trust import (
     sanitize_trust_tags,
     trusted_section_marker,
@@ -35,10 +36,25 @@ from ..services.context_trust import (
     wrap_untrusted,
 )
 from ..services.embeddings import get_effective_dimensions
+from ..services.history_selection import HistorySelector
+from ..services.http_pool import http_clients
+from ..services.prompt_sections import turn_context_marker
+from ..services.request_deadline import with_deadline
+from ..services.response_cache import (
+    close_response_cache,
+    configure_response_cache,
+    invalidate_response_cache,
+    response_cache_stats,
+)
 from ..services.rewind import collect_file_paths
 from ..services.rewind import rewind_conversation as rewind_service
 from ..services.slug import is_valid_slug, suggest_unique_slug
+from ..services.task_routing import TASK_MAIN, TASK_SUMMARIZE, task_stats
+from ..services.token_counter import get_token_counter
+from ..services.tool_result_cache import ToolResultCache
+from ..services.tool_selection import ToolSelector, selector_for
 from ..tools import ToolRegistry, register_default_tools
+from ..tools.shell_session import ShellSession
 from . import renderer
 from .instructions import (
     CONVENTIONS_TOKEN_WARNING_THRESHOLD,
@@ -252,52 +268,27 @@ _CONTEXT_WARN_TOKENS = 80_000
 _CONTEXT_AUTO_COMPACT_TOKENS = 100_000
 
 
-_tiktoken_encoding: Any = None
+def _get_tiktoken_encoding(model: str | None = None, provider: str | None = None) -> Any:
+    """Tokenizer for *model* (``cl100k_base`` by default); False when tiktoken is unavailable."""
+    from ..services.token_counter import _get_encoding, encoding_name_for
 
+    return _get_encoding(encoding_name_for(model, provider))
 
-def _get_tiktoken_encoding() -> Any:
-    global _tiktoken_encoding
-    if _tiktoken_encoding is None:
-        try:
-            import tiktoken
 
-            _tiktoken_encoding = tiktoken.get_encoding("cl100k_base")
-        except Exception:
-            _tiktoken_encoding = False  # Signal fallback
-    return _tiktoken_encoding
+def _estimate_tokens(
+    messages: list[dict[str, Any]],
+    model: str | None = None,
+    provider: str | None = None,
+) -> int:
+    """Count tokens using tiktoken, falling back to char estimate.
 
+    Per-message counts are memoised by the shared ``TokenCounter`` for the
+    model's encoding, so repeated calls over a growing history only encode
+    messages that are new or changed.
+    """
+    from ..services.token_counter import get_token_counter
 
-def _estimate_tokens(messages: list[dict[str, Any]]) -> int:
-    """Count tokens using tiktoken, falling back to char estimate."""
-    enc = _get_tiktoken_encoding()
-
-    total = 0
-    for msg in messages:
-        # Per-message overhead (~4 tokens for role/separators)
-        total += 4
-        content = msg.get("content", "")
-        if isinstance(content, str):
-            if enc:
-                total += len(enc.encode(content, allowed_special="all"))
-            else:
-                total += len(content) // 4
-        elif isinstance(content, list):
-            for part in content:
-                text = str(part) if isinstance(part, dict) else ""
-                if enc:
-                    total += len(enc.encode(text, allowed_special="all"))
-                else:
-                    total += len(text) // 4
-        for tc in msg.get("tool_calls", []):
-            if isinstance(tc, dict):
-                func = tc.get("function", {})
-                args = func.get("arguments", "")
-                name = func.get("name", "")
-                if enc:
-                    total += len(enc.encode(args, allowed_special="all")) + len(enc.encode(name, allowed_special="all"))
-                else:
-                    total += (len(args) + len(name)) // 4
-    return total
+    return get_token_counter(model, provider).count_messages(messages)
 
 
 async def _check_for_update(current: str) -> str | None:
@@ -444,7 +435,7 @@ def _show_resume_info(db: Any, conv: dict[str, Any], ai_messages: list[dict[str,
                 renderer.render_rag_sources(sources)
 
 
-def _show_usage_stats(db: Any, config: Any) -> None:
+def _show_usage_stats(db: Any, config: Any, tool_cache: ToolResultCache | None = None) -> None:
     """Display token usage statistics for today, this week, and this month."""
     usage_cfg = config.cli.usage
     now = datetime.now(timezone.utc)
@@ -467,6 +458,9 @@ def _show_usage_stats(db: Any, config: Any) -> None:
         total_completion = sum(s.get("completion_tokens", 0) or 0 for s in stats)
         total_tokens = sum(s.get("total_tokens", 0) or 0 for s in stats)
         total_messages = sum(s.get("message_count", 0) or 0 for s in stats)
+        total_cache_read = sum(s.get("cache_read_tokens", 0) or 0 for s in stats)
+        total_cache_write = sum(s.get("cache_write_tokens", 0) or 0 for s in stats)
+        total_hedge = sum(s.get("hedge_tokens", 0) or 0 for s in stats)
 
         # Calculate cost
         total_cost = 0.0
@@ -474,6 +468,8 @@ def _show_usage_stats(db: Any, config: Any) -> None:
             model = s.get("model", "") or ""
             prompt_t = s.get("prompt_tokens", 0) or 0
             completion_t = s.get("completion_tokens", 0) or 0
+            # Prompts of cancelled hedge requests are billed at the input rate
+            prompt_t += s.get("hedge_tokens", 0) or 0
             costs = usage_cfg.model_costs.get(model, {})
             input_rate = costs.get("input", 0.0)
             output_rate = costs.get("output", 0.0)
@@ -483,6 +479,16 @@ def _show_usage_stats(db: Any, config: Any) -> None:
         renderer.console.print(f"    Prompt:     {total_prompt:>12,} tokens")
         renderer.console.print(f"    Completion: {total_completion:>12,} tokens")
         renderer.console.print(f"    Total:      {total_tokens:>12,} tokens")
+        if total_cache_read or total_cache_write:
+            renderer.console.print(f"    Cache read: {total_cache_read:>12,} tokens")
+            renderer.console.print(f"    Cache write:{total_cache_write:>12,} tokens")
+        if total_hedge:
+            renderer.console.print(f"    Hedged:     {total_hedge:>12,} tokens (duplicate prompts)")
+        cached = response_cache_stats(config.app.data_dir, since)
+        if cached and cached["hits"]:
+            renderer.console.print(
+                f"    Cached responses: {cached['hits']:,} hits, {cached['tokens_saved']:,} tokens saved"
+            )
         if total_cost > 0:
             renderer.console.print(f"    Est. cost:  ${total_cost:>11,.4f}")
 
@@ -494,6 +500,23 @@ def _show_usage_stats(db: Any, config: Any) -> None:
                 t = s.get("total_tokens", 0) or 0
                 renderer.console.print(f"      {model}: {t:,} tokens")
 
+    tasks = task_stats.snapshot()
+    if any(task != TASK_MAIN for task in tasks):
+        renderer.console.print("\n  [bold]This session by task[/bold]")
+        for task, models in tasks.items():
+            for model, entry in models.items():
+                renderer.console.print(
+                    f"    {task:<10} {model}: {entry['calls']:,} calls, {entry['tokens']:,} tokens,"
+                    f" {entry['avg_latency_ms']:,.0f} ms avg, {entry['errors']:,} errors"
+                )
+
+    if tool_cache is not None and tool_cache.lookups:
+        cache_stats = tool_cache.stats()
+        renderer.console.print(
+            f"\n  [bold]Tool result cache[/bold] (this session): {cache_stats['hits']:,} of"
+            f" {cache_stats['lookups']:,} repeated reads answered, {cache_stats['tokens_saved']:,} tokens saved"
+        )
+
     renderer.console.print()
 
 
@@ -1619,10 +1642,25 @@ async def run_cli(
         max_concurrent=_sa_config.max_concurrent,
         max_total=_sa_config.max_total,
     )
+    # The whole REPL session is one scheduling scope: global caps apply across
+    # turns and the token budget accumulates for the session
+    from ..services.subagent_scheduler import PRIORITY_INTERACTIVE, shared_scheduler
+
+    _subagent_schedule = shared_scheduler(_sa_config).scope(
+        conversation_id=conversation_id or "cli-session", priority=PRIORITY_INTERACTIVE
+    )
 
     _rate_limiter = ToolRateLimiter(_cast(_SvcRateLimitConfig, config.safety.tool_rate_limit))
     tool_registry.set_rate_limiter(_rate_limiter)
 
+    from ..services.tool_scheduler import ToolScheduler
+
+    _tool_scheduler = ToolScheduler.from_config(
+        config,
+        resolve_server=lambda name: mcp_manager.get_tool_server_name(name) if mcp_manager else None,
+        working_dir=working_dir,
+    )
+
     # Construct DLP scanner if configured
     _dlp_scanner = None
     if config.safety.dlp.enabled:
@@ -1643,13 +1681,21 @@ async def run_cli(
         data = event.data
         if kind == "subagent_start":
             renderer.render_subagent_start(
-                agent_id, data.get("prompt", ""), data.get("model", ""), data.get("depth", 1)
+                agent_id,
+                data.get("prompt", ""),
+                data.get("model", ""),
+                data.get("depth", 1),
+                queue_wait=data.get("queue_wait_seconds", 0.0),
             )
         elif kind == "tool_call_start":
             renderer.render_subagent_tool(agent_id, data.get("tool_name", ""), data.get("arguments"))
         elif kind == "subagent_end":
             renderer.render_subagent_end(
-                agent_id, data.get("elapsed_seconds", 0), data.get("tool_calls", []), data.get("error")
+                agent_id,
+                data.get("elapsed_seconds", 0),
+                data.get("tool_calls", []),
+                data.get("error"),
+                tokens_used=data.get("tokens_used", 0),
             )
 
     def _audit_tool_call(
@@ -1677,6 +1723,20 @@ async def run_cli(
 
     # Mutable ref so tool_executor can queue skill prompts into the per-turn msg_queue
     _active_msg_queue: list[asyncio.Queue[dict[str, Any]] | None] = [None]
+    # One persistent shell for the session when safety.bash.persistent_shell is on
+    _shell_session: list[ShellSession | None] = [None]
+
+    def _bash_shell_session() -> ShellSession | None:
+        if not config.safety.bash.persistent_shell or _IS_WINDOWS:
+            return None
+        bash_dir = tool_registry._working_dir or working_dir
+        session = _shell_session[0]
+        if session is None or session.working_dir != bash_dir:
+            if session is not None:
+                asyncio.get_running_loop().create_task(session.close())
+            session = ShellSession(bash_dir, idle_timeout=config.safety.bash.shell_idle_timeout)
+            _shell_session[0] = session
+        return session
 
     async def tool_executor(tool_name: str, arguments: dict[str, Any]) -> dict[str, Any]:
         nonlocal _subagent_counter
@@ -1722,9 +1782,17 @@ async def run_cli(
                 "_limiter": _subagent_limiter,
                 "_confirm_callback": _confirm_destructive,
                 "_config": _sa_config,
+                "_tool_scheduler": _tool_scheduler,
+                "_schedule": _subagent_schedule,
             }
         elif tool_name == "ask_user":
             arguments = {**arguments, "_ask_callback": _ask_user_callback}
+        elif tool_name == "bash":
+            arguments = {
+                **arguments,
+                "_output_callback": renderer.update_tool_output,
+                "_shell_session": _bash_shell_session(),
+            }
         elif tool_name == "introspect":
             _rt_info: dict[str, Any] = {"interface": "cli"}
             _rt_space: dict[str, Any] | None = None
@@ -1872,9 +1940,9 @@ async def run_cli(
 
     # Inject codebase index (tree-sitter symbol map) if enabled
     try:
-        from ..services.codebase_index import create_index_service
+        from ..services.codebase_index import create_index_service, index_cache_dir
 
-        _index_service = create_index_service(config)
+        _index_service = create_index_service(config, cache_dir=index_cache_dir(config))
         if _index_service:
             _index_map = _index_service.get_map(working_dir, token_budget=config.codebase_index.map_tokens)
             if _index_map:
@@ -1895,6 +1963,9 @@ async def run_cli(
                 skill_lines.append(f"- {name}: {desc}")
             skill_lines.append("</available_skills>")
             extra_system_prompt += "\n".join(skill_lines)
+    # Everything above stays fixed for the session (a cacheable prefix); per-turn
+    # RAG context and mode changes are appended after this marker
+    extra_system_prompt += turn_context_marker()
     if config.cli.skills.auto_invoke:
         invoke_def = skill_registry.get_invoke_skill_definition()
         if invoke_def:
@@ -1902,8 +1973,9 @@ async def run_cli(
             tools_openai_or_none = tools_openai if tools_openai else None
 
     ai_service = create_ai_service(config.ai)
+    configure_response_cache(config.ai, config.app.data_dir, encrypt_at_rest=config.storage.encrypt_at_rest)
 
-    # Validate connection before proceeding
+    # Validate connection before proceeding (this also opens the first pooled connection)
     with renderer.startup_step("Validating AI connection..."):
         valid, message, _ = await ai_service.validate_connection()
     if not valid:
@@ -1953,6 +2025,7 @@ async def run_cli(
                 dlp_scanner=_dlp_scanner,
                 injection_detector=_injection_detector,
                 output_filter=_output_filter,
+                tool_scheduler=_tool_scheduler,
             )
         else:
             git_branch = _detect_git_branch()
@@ -2029,12 +2102,20 @@ async def run_cli(
                 space=_space,
                 space_instructions=_space_instructions,
                 vec_manager=_vec_manager,
+                tool_scheduler=_tool_scheduler,
+                audit_cache_hit=lambda name, args, stub: _audit_tool_call(
+                    audit_writer, name, args, stub, conversation_id
+                ),
             )
     finally:
         if _vec_manager and _vec_manager.enabled:
             _vec_manager.save_all()
         if retention_worker:
             retention_worker.stop()
+        if _shell_session[0] is not None:
+            await _shell_session[0].close()
+        await http_clients.aclose()
+        close_response_cache()
         if mcp_manager:
             try:
                 await mcp_manager.shutdown()
@@ -2058,6 +2139,7 @@ async def _run_one_shot(
     dlp_scanner: Any | None = None,
     injection_detector: Any | None = None,
     output_filter: Any | None = None,
+    tool_scheduler: Any | None = None,
 ) -> None:
     """Run a single prompt and exit."""
     id_kw = _identity_kwargs(config)
@@ -2102,23 +2184,28 @@ async def _run_one_shot(
             user_attempt += 1
             should_retry = False
 
-            async for event in run_agent_loop(
-                ai_service=ai_service,
-                messages=messages,
-                tool_executor=tool_executor,
-                tools_openai=tools_openai,
-                cancel_event=cancel_event,
-                extra_system_prompt=extra_system_prompt,
-                max_iterations=config.cli.max_tool_iterations,
-                narration_cadence=ai_service.config.narration_cadence,
-                tool_output_max_chars=config.cli.tool_output_max_chars,
-                budget_config=_budget_cfg,
-                get_token_totals=_get_token_totals,
-                dlp_scanner=dlp_scanner,
-                injection_detector=injection_detector,
-                output_filter=output_filter,
-                max_consecutive_text_only=config.cli.max_consecutive_text_only,
-                max_line_repeats=config.cli.max_line_repeats,
+            async for event in with_deadline(
+                run_agent_loop(
+                    ai_service=ai_service,
+                    messages=messages,
+                    tool_executor=tool_executor,
+                    tools_openai=tools_openai,
+                    cancel_event=cancel_event,
+                    extra_system_prompt=extra_system_prompt,
+                    max_iterations=config.cli.max_tool_iterations,
+                    narration_cadence=ai_service.config.narration_cadence,
+                    tool_output_max_chars=config.cli.tool_output_max_chars,
+                    budget_config=_budget_cfg,
+                    get_token_totals=_get_token_totals,
+                    dlp_scanner=dlp_scanner,
+                    injection_detector=injection_detector,
+                    output_filter=output_filter,
+                    max_consecutive_text_only=config.cli.max_consecutive_text_only,
+                    max_line_repeats=config.cli.max_line_repeats,
+                    tool_scheduler=tool_scheduler,
+                    tool_selector=selector_for(config),
+                ),
+                ai_service.config.request_deadline,
             ):
                 if event.kind == "thinking":
                     if not thinking:
@@ -2336,6 +2423,8 @@ async def _run_repl(
     space: dict[str, Any] | None = None,
     space_instructions: str | None = None,
     vec_manager: Any | None = None,
+    tool_scheduler: Any | None = None,
+    audit_cache_hit: Any = None,
 ) -> None:
     """Run the interactive REPL."""
     id_kw = _identity_kwargs(config)
@@ -2693,7 +2782,7 @@ async def _run_repl(
         cn = conv.get("slug") or ""
         _toolbar_cache[:] = renderer.format_status_toolbar(
             model=current_model,
-            current_tokens=_estimate_tokens(ai_messages),
+            current_tokens=_estimate_tokens(ai_messages, current_model, config.ai.provider),
             max_context=config.cli.model_context_window,
             message_count=len(ai_messages),
             approval_mode=config.safety.approval_mode,
@@ -2742,6 +2831,15 @@ async def _run_repl(
     current_model = config.ai.model
     _pending_resume_info = False
     ai_messages: list[dict[str, Any]] = []
+    # Session-scoped so background summaries carry over between turns
+    _session_compactor: list[ContextCompactor | None] = [None]
+    # With compaction.strategy "select": sends each call a relevant subset of the full history
+    _history_selector: list[HistorySelector | None] = [None]
+    # With ai.tool_selection: sends each turn the pinned tools plus the most relevant ones
+    _tool_selector: list[ToolSelector | None] = [None]
+    _tool_selector_config: list[Any] = [None]
+    # Session-scoped so repeated reads are answered from results still in context
+    _result_cache: list[ToolResultCache | None] = [None]
 
     if resume_conversation_id:
         conv_data = storage.get_conversation(db, resume_conversation_id)
@@ -3498,7 +3596,7 @@ async def _run_repl(
                             renderer.console.print()
                     continue
                 elif cmd == "/usage":
-                    _show_usage_stats(db, config)
+                    _show_usage_stats(db, config, tool_cache=_result_cache[0])
                     continue
                 elif cmd == "/help":
                     await _show_help_dialog()
@@ -3562,6 +3660,7 @@ async def _run_repl(
                         renderer.console.print(f"[{CHROME}]Cancelled[/{CHROME}]\n")
                         continue
                     storage.delete_conversation(db, to_delete["id"], config.app.data_dir)
+                    invalidate_response_cache(config.app.data_dir)
                     renderer.console.print(f"[{CHROME}]Deleted: {title}[/{CHROME}]\n")
                     if conv.get("id") == to_delete["id"]:
                         conv = storage.create_conversation(db, working_dir=working_dir, **id_kw)
@@ -5160,7 +5259,7 @@ async def _run_repl(
             )
 
             # Auto-compact if approaching context limit (thresholds from config)
-            token_estimate = _estimate_tokens(ai_messages)
+            token_estimate = _estimate_tokens(ai_messages, current_model, config.ai.provider)
             auto_compact_threshold = config.cli.context_auto_compact_tokens
             warn_threshold = config.cli.context_warn_tokens
             if token_estimate > auto_compact_threshold:
@@ -5243,6 +5342,35 @@ async def _run_repl(
             user_attempt = 0
 
             _budget_cfg = config.cli.usage.budgets
+            if _session_compactor[0] is None or _session_compactor[0].ai_service is not ai_service:
+                _session_compactor[0] = ContextCompactor(
+                    ai_service,
+                    CompactionPolicy.from_config(config),
+                    background=config.cli.compaction.enabled,
+                )
+                if config.cli.compaction.strategy == "select":
+                    _history_selector[0] = HistorySelector(
+                        get_token_counter(ai_service.config.model, ai_service.config.provider),
+                        recent_turns=config.cli.compaction.recent_turns,
+                        embedding_service=await _get_rag_embedding_service(),
+                    )
+            if _tool_selector_config[0] is not config:
+                # Rebuilt after a config reload, which may change ai.tool_selection*
+                _tool_selector_config[0] = config
+                _tool_selector[0] = (
+                    selector_for(config, await _get_rag_embedding_service())
+                    if config.ai.tool_selection is True
+                    else None
+                )
+            if config.cli.tool_result_cache and (
+                _result_cache[0] is None or _result_cache[0].working_dir != working_dir
+            ):
+                _result_cache[0] = ToolResultCache(
+                    working_dir=working_dir,
+                    tier_overrides=config.safety.tool_tiers,
+                    exclude_dirs=config.codebase_index.exclude_dirs,
+                    on_hit=audit_cache_hit,
+                )
 
             async def _get_token_totals() -> tuple[int, int]:
                 return (
@@ -5279,29 +5407,38 @@ async def _run_repl(
                     user_attempt += 1
                     should_retry = False
 
-                    async for event in run_agent_loop(
-                        ai_service=ai_service,
-                        messages=ai_messages,
-                        tool_executor=tool_executor,
-                        tools_openai=tools_openai,
-                        cancel_event=cancel_event,
-                        extra_system_prompt=extra_system_prompt,
-                        max_iterations=config.cli.max_tool_iterations,
-                        message_queue=msg_queue,
-                        narration_cadence=ai_service.config.narration_cadence,
-                        tool_output_max_chars=config.cli.tool_output_max_chars,
-                        auto_plan_threshold=(
-                            config.cli.planning.auto_threshold_tools
-                            if not _plan_active[0] and config.cli.planning.auto_mode != "off"
-                            else 0
+                    async for event in with_deadline(
+                        run_agent_loop(
+                            ai_service=ai_service,
+                            messages=ai_messages,
+                            tool_executor=tool_executor,
+                            tools_openai=tools_openai,
+                            cancel_event=cancel_event,
+                            extra_system_prompt=extra_system_prompt,
+                            max_iterations=config.cli.max_tool_iterations,
+                            message_queue=msg_queue,
+                            narration_cadence=ai_service.config.narration_cadence,
+                            tool_output_max_chars=config.cli.tool_output_max_chars,
+                            auto_plan_threshold=(
+                                config.cli.planning.auto_threshold_tools
+                                if not _plan_active[0] and config.cli.planning.auto_mode != "off"
+                                else 0
+                            ),
+                            budget_config=_budget_cfg,
+                            get_token_totals=_get_token_totals,
+                            dlp_scanner=dlp_scanner,
+                            injection_detector=injection_detector,
+                            output_filter=output_filter,
+                            max_consecutive_text_only=config.cli.max_consecutive_text_only,
+                            max_line_repeats=config.cli.max_line_repeats,
+                            compactor=_session_compactor[0],
+                            history_selector=_history_selector[0],
+                            tool_selector=_tool_selector[0],
+                            can_speculate=tool_registry.can_speculate,
+                            tool_scheduler=tool_scheduler,
+                            result_cache=_result_cache[0],
                         ),
-                        budget_config=_budget_cfg,
-                        get_token_totals=_get_token_totals,
-                        dlp_scanner=dlp_scanner,
-                        injection_detector=injection_detector,
-                        output_filter=output_filter,
-                        max_consecutive_text_only=config.cli.max_consecutive_text_only,
-                        max_line_repeats=config.cli.max_line_repeats,
+                        ai_service.config.request_deadline,
                     ):
                         # Drain input_queue into msg_queue during streaming
                         await _drain_input_to_msg_queue(
@@ -5343,7 +5480,7 @@ async def _run_repl(
                             renderer.increment_thinking_tokens()
                             renderer.increment_streaming_chars(len(event.data.get("content", "")))
                             renderer.update_thinking()
-                            enc = _get_tiktoken_encoding()
+                            enc = _get_tiktoken_encoding(current_model, config.ai.provider)
                             if enc:
                                 response_token_count += len(enc.encode(event.data["content"], allowed_special="all"))
                             else:
@@ -5402,6 +5539,9 @@ async def _run_repl(
                                         _pending_usage.get("completion_tokens", 0),
                                         _pending_usage.get("total_tokens", 0),
                                         _pending_usage.get("model", ""),
+                                        cache_read_tokens=_pending_usage.get("cache_read_tokens"),
+                                        cache_write_tokens=_pending_usage.get("cache_write_tokens"),
+                                        hedge_tokens=_pending_usage.get("hedge_tokens"),
                                     )
                                     _pending_usage = None
                         elif event.kind == "dlp_blocked":
@@ -5502,7 +5642,7 @@ async def _run_repl(
                                 if _rag_chunks:
                                     renderer.render_rag_sources(_rag_chunks)
                                 renderer.render_newline()
-                                context_tokens = _estimate_tokens(ai_messages)
+                                context_tokens = _estimate_tokens(ai_messages, current_model, config.ai.provider)
                                 renderer.render_context_footer(
                                     current_tokens=context_tokens,
                                     max_context=config.cli.model_context_window,
@@ -5639,7 +5779,7 @@ async def _compact_messages(
         return
 
     original_count = len(ai_messages)
-    original_tokens = _estimate_tokens(ai_messages)
+    original_tokens = _estimate_tokens(ai_messages, ai_service.config.model, ai_service.config.provider)
 
     history_text = _build_compaction_history(ai_messages)
 
@@ -5655,13 +5795,15 @@ async def _compact_messages(
 
     try:
         renderer.console.print(f"[{CHROME}]Generating summary...[/{CHROME}]")
-        response = await ai_service.client.chat.completions.create(
-            model=ai_service.config.model,
+        summary = await ai_service.complete(
             messages=[{"role": "user", "content": summary_prompt}],
             max_completion_tokens=1000,
+            cacheable=True,
+            task=TASK_SUMMARIZE,
         )
-        summary = response.choices[0].message.content or "Conversation summary unavailable."
     except Exception:
+        summary = None
+    if summary is None:
         renderer.render_error("Failed to generate summary")
         return
 
@@ -5673,6 +5815,6 @@ async def _compact_messages(
     )
     ai_messages.append({"role": "system", "content": compact_note})
 
-    new_tokens = _estimate_tokens(ai_messages)
+    new_tokens = _estimate_tokens(ai_messages, ai_service.config.model, ai_service.config.provider)
     renderer.render_compact_done(original_count, 1)
     renderer.console.print(f"  [{CHROME}]~{original_tokens:,} -> ~{new_tokens:,} tokens[/{CHROME}]\n")
@@ -299,14 +299,24 @@ class SkillRegistry:
         self.searched_dirs: list[_SearchedDir] = []
         # Maps bare name → list of canonical keys that share it
         self._name_index: dict[str, list[str]] = {}
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        """Monotonic counter bumped whenever the skill set changes (for cache keys)."""
+        return self._version
 
     def _rebuild_name_index(self) -> None:
-        """Rebuild the bare-name → canonical-keys index."""
+        """Rebuild the bare-name → canonical-keys index.
+
+        Called after every mutation of ``_skills``, so it also bumps ``version``.
+        """
         index: dict[str, list[str]] = {}
         for key, skill in self._skills.items():
             bare = skill.name.lower()
             index.setdefault(bare, []).append(key)
         self._name_index = index
+        self._version += 1
 
     def _resolve_key(self, name: str) -> str | None:
         """Resolve a user-provided name to a canonical key.
@@ -64,6 +64,7 @@ def _create_engine(config: AppConfig, db: Any) -> tuple[Any, Any]:
     Returns (engine, event_bus) — caller must call event_bus.stop_polling()
     when done to avoid asyncio task leak warnings on exit.
     """
+    from ..services.subagent_scheduler import shared_scheduler
     from ..services.workflow_engine import WorkflowEngine
     from ..services.workflow_runners import create_default_registry
 
@@ -114,6 +115,7 @@ def _create_engine(config: AppConfig, db: Any) -> tuple[Any, Any]:
         event_bus=event_bus,
         egress_allowed_domains=list(config.ai.allowed_domains) if config.ai.allowed_domains else [],
         egress_block_localhost=config.ai.block_localhost_api,
+        subagent_scheduler=shared_scheduler(config.safety.subagent),
     )
     return engine, event_bus
 
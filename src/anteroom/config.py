@@ -241,6 +241,32 @@ traversal, or other OWASP top 10 issues. If you notice insecure code, fix it imm
 </safety>"""
 
 
+TASK_MODEL_CLASSES = ("title", "summarize", "classify")
+
+# Tools always sent with ai.tool_selection, whatever the request
+_DEFAULT_PINNED_TOOLS = (
+    "read_file",
+    "write_file",
+    "edit_file",
+    "bash",
+    "glob_files",
+    "grep",
+    "ask_user",
+    "invoke_skill",
+)
+
+
+@dataclass
+class TaskModelConfig:
+    """Model (and optionally endpoint) for one auxiliary task class; empty fields inherit from ``ai``."""
+
+    model: str
+    base_url: str = ""
+    provider: str = ""
+    api_key: str = ""
+    fallback: bool = True  # retry on the main model when the routed call fails
+
+
 @dataclass
 class AIConfig:
     base_url: str
@@ -267,6 +293,28 @@ class AIConfig:
     block_localhost_api: bool = False  # when True, reject loopback/localhost base_url
     provider: str = "openai"  # "openai", "anthropic", or "litellm"
     max_output_tokens: int = 4096  # required by Anthropic; used as max_tokens for Anthropic provider
+    prompt_caching: bool = True  # Anthropic cache_control breakpoints on tools, stable system prompt, history
+    http2: bool = True  # negotiate HTTP/2 with the provider when the h2 package is installed
+    http_max_connections: int = 100  # per shared connection pool
+    http_max_keepalive: int = 20  # idle connections kept open per pool
+    http_keepalive_expiry: int = 60  # seconds an idle pooled connection stays open
+    warmup_connections: bool = True  # open a provider connection at startup
+    response_cache: bool = False  # replay identical title/summary/temperature-0 calls from SQLite
+    response_cache_ttl: int = 604_800  # seconds a cached response stays valid (7 days)
+    response_cache_max_entries: int = 10_000
+    task_models: dict[str, TaskModelConfig] = field(default_factory=dict)  # title/summarize/classify routing
+    hedge_requests: bool = False  # send a second request when the first byte is slower than the recent p95
+    hedge_min_delay: float = 2.0  # seconds; never hedge sooner than this
+    hedge_max_rate: float = 0.1  # at most this fraction of recent requests may be hedged
+    request_deadline: int = 0  # seconds per chat turn, shared by model calls, tools and sub-agents; 0 = none
+    endpoints: list[str] = field(default_factory=list)  # extra base URLs equivalent to base_url (load balanced)
+    endpoint_failure_threshold: int = 3  # consecutive failures that open an endpoint's circuit
+    endpoint_cooldown: float = 30.0  # seconds an open circuit waits before a probe request
+    endpoint_health_interval: int = 30  # seconds between endpoint health checks (web server); 0 = disabled
+    endpoint_sticky: bool = True  # keep each conversation on the same endpoint for prefix-cache hits
+    tool_selection: bool = False  # send pinned tools plus the most relevant ones per run, not the whole catalog
+    tool_selection_top_n: int = 24  # unpinned tools sent per run with tool_selection
+    tool_selection_pinned: list[str] = field(default_factory=lambda: list(_DEFAULT_PINNED_TOOLS))
 
 
 @dataclass
@@ -350,6 +398,25 @@ class SkillsConfig:
     auto_invoke: bool = True  # let the AI auto-invoke skills from natural language
 
 
+@dataclass
+class CompactionConfig:
+    enabled: bool = True  # background rolling summaries; False = compact (blocking) only at hard_threshold
+    soft_threshold: float = 0.6  # fraction of model_context_window that starts a background summary
+    hard_threshold: float = 0.85  # fraction at which the agent waits for a summary before calling the model
+    keep_recent_messages: int = 6  # newest messages that are never summarized
+    summary_max_tokens: int = 1000
+    strategy: str = "summarize"  # "summarize" old history, or "select" relevant older messages per call
+    recent_turns: int = 4  # with strategy "select": newest user turns that are always sent
+
+
+@dataclass
+class ToolConcurrencyConfig:
+    max_parallel: int = 8  # tool calls running at once per agent run (0 = unlimited)
+    bash: int = 4  # concurrent bash commands
+    mcp_per_server: int = 4  # concurrent calls to any one MCP server
+    tool_limits: dict[str, int] = field(default_factory=dict)  # per-tool caps, e.g. {"grep": 2}
+
+
 @dataclass
 class CliConfig:
     theme: str = "midnight"
@@ -360,6 +427,7 @@ class CliConfig:
     context_warn_tokens: int = 80_000
     context_auto_compact_tokens: int = 100_000
     tool_dedup: bool = True  # collapse consecutive similar tool calls; False = show all
+    tool_result_cache: bool = True  # answer repeated reads/searches of unchanged files with a short stub
     retry_delay: float = 5.0  # seconds between CLI auto-retry countdown ticks
     max_retries: int = 3  # max CLI auto-retry attempts for retryable errors
     esc_hint_delay: float = 3.0  # seconds before showing "esc to cancel" hint
@@ -369,9 +437,12 @@ class CliConfig:
     tool_output_max_chars: int = 2000  # max chars per tool result before truncation
     file_reference_max_chars: int = 100_000  # max chars from @file references
     model_context_window: int = 128_000  # model context window size for usage bar
+    context_budget: bool = True  # fit RAG, codebase map, sources and canvas into the window left by history
     planning: PlanningConfig = field(default_factory=PlanningConfig)
     usage: UsageConfig = field(default_factory=UsageConfig)
     skills: SkillsConfig = field(default_factory=SkillsConfig)
+    compaction: CompactionConfig = field(default_factory=CompactionConfig)
+    tool_concurrency: ToolConcurrencyConfig = field(default_factory=ToolConcurrencyConfig)
 
 
 @dataclass
@@ -451,6 +522,9 @@ class BashSandboxConfig:
     allow_network: bool = True
     allow_package_install: bool = True
     log_all_commands: bool = False
+    persistent_shell: bool = False  # keep one shell per conversation so cd/export/venv state persists
+    shell_idle_timeout: int = 600  # seconds before an unused persistent shell is closed
+    shell_max_sessions: int = 32  # persistent shells kept open at once (web UI, least recently used closes first)
     sandbox: OsSandboxConfig = field(default_factory=OsSandboxConfig)
 
     _MIN_TIMEOUT: int = field(default=1, init=False, repr=False)
@@ -482,6 +556,10 @@ class SubagentConfig:
     timeout: int = 120
     max_output_chars: int = 4000
     max_prompt_chars: int = 32_000
+    global_max_concurrent: int = 8  # process-wide cap across all requests and users
+    max_concurrent_per_user: int = 4
+    queue_timeout: int = 120  # seconds a sub-agent may wait for a global slot
+    max_tokens_per_conversation: int = 0  # 0 = unlimited
 
 
 @dataclass
@@ -602,12 +680,14 @@ class RagConfig:
 
     enabled: bool = True  # auto-enabled when embeddings are available
     max_chunks: int = 10  # top-K chunks to retrieve per query
-    max_tokens: int = 2000  # token budget for injected context (chars/4 estimate)
+    max_tokens: int = 2000  # token budget for injected context (model tokenizer count)
     similarity_threshold: float = 0.5  # max cosine distance; lower = stricter matching
     include_sources: bool = True  # search source chunks
     include_conversations: bool = True  # search past conversation messages
     exclude_current: bool = True  # exclude current conversation from results
     retrieval_mode: str = "dense"  # "dense", "keyword", or "hybrid"
+    mmr_lambda: float = 0.7  # MMR relevance/diversity trade-off; 1.0 disables diversification
+    near_duplicate_threshold: int = 3  # max SimHash bit distance to collapse chunks; -1 disables
 
 
 @dataclass
@@ -623,34 +703,44 @@ class RerankerConfig:
     cache_dir: str = ""  # custom fastembed cache directory for offline/vendored models
 
 
+# Directories (or name suffixes) skipped when walking a project tree
+DEFAULT_EXCLUDE_DIRS = (
+    "node_modules",
+    ".git",
+    "__pycache__",
+    "venv",
+    ".venv",
+    "dist",
+    "build",
+    ".tox",
+    ".mypy_cache",
+    ".pytest_cache",
+    "egg-info",
+)
+
+
 @dataclass
 class CodebaseIndexConfig:
     """Tree-sitter codebase index settings."""
 
     enabled: bool = True  # auto-enabled; degrades gracefully without tree-sitter
     map_tokens: int = 1000  # token budget for the injected codebase map
+    persist_cache: bool = True  # keep parsed symbols under data_dir/cache/codebase_index
+    refresh_interval: int = 30  # seconds between full (stat-only) re-walks of an indexed root
+    parallel_workers: int = 0  # processes for cold-scan parsing; 0 = one per CPU (max 8), 1 = serial
+    scan_budget: float = 15.0  # seconds a full scan may spend parsing before returning a partial map; 0 = no limit
     languages: list[str] = field(default_factory=list)  # auto-detect if empty
-    exclude_dirs: list[str] = field(
-        default_factory=lambda: [
-            "node_modules",
-            ".git",
-            "__pycache__",
-            "venv",
-            ".venv",
-            "dist",
-            "build",
-            ".tox",
-            ".mypy_cache",
-            ".pytest_cache",
-            "egg-info",
-        ]
-    )
+    exclude_dirs: list[str] = field(default_factory=lambda: list(DEFAULT_EXCLUDE_DIRS))
 
 
 @dataclass
 class ProxyConfig:
     enabled: bool = False  # opt-in; must be explicitly enabled
     allowed_origins: list[str] = field(default_factory=list)
+    embeddings_max_batch: int = 64  # max texts per batched /v1/embeddings model call
+    embeddings_batch_wait_ms: int = 10  # how long to wait for more requests before flushing a batch
+    embeddings_cache_size: int = 2048  # LRU entries keyed by text hash; 0 disables
+    embeddings_rate_limit: int = 600  # /v1/embeddings requests per minute per caller; 0 = unlimited
 
 
 @dataclass
@@ -717,6 +807,10 @@ class StorageConfig:
     purge_embeddings: bool = True  # also purge orphaned embeddings
     encrypt_at_rest: bool = False  # requires sqlcipher3 optional dependency
     encryption_kdf: str = "hkdf-sha256"  # key derivation from identity key
+    job_poll_interval: int = 2  # seconds between background job queue polls
+    job_lease_seconds: int = 120  # a job whose worker stops renewing its lease is retried after this
+    job_max_attempts: int = 5  # attempts before a failing job is dead-lettered
+    job_retention_hours: int = 24  # finished jobs kept for /api/jobs before they are purged
 
     _MIN_RETENTION_INTERVAL: int = field(default=60, init=False, repr=False)
 
@@ -1142,6 +1236,149 @@ def load_config(
     _raw_block_localhost = ai_raw.get("block_localhost_api", os.environ.get("AI_CHAT_BLOCK_LOCALHOST_API", "false"))
     block_localhost_api = str(_raw_block_localhost).lower() not in ("false", "0", "no")
 
+    _raw_prompt_caching = ai_raw.get("prompt_caching", os.environ.get("AI_CHAT_PROMPT_CACHING", "true"))
+    prompt_caching = str(_raw_prompt_caching).lower() not in ("false", "0", "no")
+
+    _raw_http2 = ai_raw.get("http2", os.environ.get("AI_CHAT_HTTP2", "true"))
+    http2 = str(_raw_http2).lower() not in ("false", "0", "no")
+
+    try:
+        _raw_max_conn = ai_raw.get("http_max_connections", os.environ.get("AI_CHAT_HTTP_MAX_CONNECTIONS", 100))
+        http_max_connections = max(1, min(1000, int(_raw_max_conn)))
+    except (ValueError, TypeError):
+        http_max_connections = 100
+
+    try:
+        _raw_max_keepalive = ai_raw.get("http_max_keepalive", os.environ.get("AI_CHAT_HTTP_MAX_KEEPALIVE", 20))
+        http_max_keepalive = max(0, min(http_max_connections, int(_raw_max_keepalive)))
+    except (ValueError, TypeError):
+        http_max_keepalive = min(20, http_max_connections)
+
+    try:
+        _raw_keepalive_expiry = ai_raw.get("http_keepalive_expiry", os.environ.get("AI_CHAT_HTTP_KEEPALIVE_EXPIRY", 60))
+        http_keepalive_expiry = max(1, min(600, int(_raw_keepalive_expiry)))
+    except (ValueError, TypeError):
+        http_keepalive_expiry = 60
+
+    _raw_warmup = ai_raw.get("warmup_connections", os.environ.get("AI_CHAT_WARMUP_CONNECTIONS", "true"))
+    warmup_connections = str(_raw_warmup).lower() not in ("false", "0", "no")
+
+    _raw_response_cache = ai_raw.get("response_cache", os.environ.get("AI_CHAT_RESPONSE_CACHE", "false"))
+    response_cache = str(_raw_response_cache).lower() in ("true", "1", "yes")
+
+    try:
+        _raw_rc_ttl = ai_raw.get("response_cache_ttl", os.environ.get("AI_CHAT_RESPONSE_CACHE_TTL", 604_800))
+        response_cache_ttl = max(60, min(31_536_000, int(_raw_rc_ttl)))
+    except (ValueError, TypeError):
+        response_cache_ttl = 604_800
+
+    try:
+        _raw_rc_max = ai_raw.get(
+            "response_cache_max_entries", os.environ.get("AI_CHAT_RESPONSE_CACHE_MAX_ENTRIES", 10_000)
+        )
+        response_cache_max_entries = max(100, min(1_000_000, int(_raw_rc_max)))
+    except (ValueError, TypeError):
+        response_cache_max_entries = 10_000
+
+    _raw_hedge = ai_raw.get("hedge_requests", os.environ.get("AI_CHAT_HEDGE_REQUESTS", "false"))
+    hedge_requests = str(_raw_hedge).lower() in ("true", "1", "yes")
+
+    try:
+        _raw_hedge_delay = ai_raw.get("hedge_min_delay", os.environ.get("AI_CHAT_HEDGE_MIN_DELAY", 2.0))
+        hedge_min_delay = max(0.1, min(60.0, float(_raw_hedge_delay)))
+    except (ValueError, TypeError):
+        hedge_min_delay = 2.0
+
+    try:
+        _raw_hedge_rate = ai_raw.get("hedge_max_rate", os.environ.get("AI_CHAT_HEDGE_MAX_RATE", 0.1))
+        hedge_max_rate = max(0.0, min(1.0, float(_raw_hedge_rate)))
+    except (ValueError, TypeError):
+        hedge_max_rate = 0.1
+
+    try:
+        _raw_deadline = ai_raw.get("request_deadline", os.environ.get("AI_CHAT_REQUEST_DEADLINE", 0))
+        request_deadline = max(0, min(86_400, int(_raw_deadline)))
+    except (ValueError, TypeError):
+        request_deadline = 0
+
+    _raw_endpoints = ai_raw.get("endpoints", [])
+    if not isinstance(_raw_endpoints, list):
+        logger.warning("ai.endpoints must be a list of base URLs; ignoring")
+        _raw_endpoints = []
+    endpoints = [str(u).strip() for u in _raw_endpoints if u and str(u).strip()]
+    _env_endpoints = os.environ.get("AI_CHAT_ENDPOINTS", "")
+    if _env_endpoints:
+        endpoints = [u.strip() for u in _env_endpoints.split(",") if u.strip()]
+    endpoints = [u for u in dict.fromkeys(endpoints) if u != base_url]
+
+    try:
+        _raw_ep_threshold = ai_raw.get(
+            "endpoint_failure_threshold", os.environ.get("AI_CHAT_ENDPOINT_FAILURE_THRESHOLD", 3)
+        )
+        endpoint_failure_threshold = max(1, min(100, int(_raw_ep_threshold)))
+    except (ValueError, TypeError):
+        endpoint_failure_threshold = 3
+
+    try:
+        _raw_ep_cooldown = ai_raw.get("endpoint_cooldown", os.environ.get("AI_CHAT_ENDPOINT_COOLDOWN", 30.0))
+        endpoint_cooldown = max(1.0, min(3600.0, float(_raw_ep_cooldown)))
+    except (ValueError, TypeError):
+        endpoint_cooldown = 30.0
+
+    try:
+        _raw_ep_health = ai_raw.get("endpoint_health_interval", os.environ.get("AI_CHAT_ENDPOINT_HEALTH_INTERVAL", 30))
+        endpoint_health_interval = max(0, min(3600, int(_raw_ep_health)))
+    except (ValueError, TypeError):
+        endpoint_health_interval = 30
+
+    _raw_ep_sticky = ai_raw.get("endpoint_sticky", os.environ.get("AI_CHAT_ENDPOINT_STICKY", "true"))
+    endpoint_sticky = str(_raw_ep_sticky).lower() not in ("false", "0", "no")
+
+    _raw_tool_selection = ai_raw.get("tool_selection", os.environ.get("AI_CHAT_TOOL_SELECTION", "false"))
+    tool_selection = str(_raw_tool_selection).lower() in ("true", "1", "yes")
+
+    try:
+        _raw_ts_top_n = ai_raw.get("tool_selection_top_n", os.environ.get("AI_CHAT_TOOL_SELECTION_TOP_N", 24))
+        tool_selection_top_n = max(1, min(500, int(_raw_ts_top_n)))
+    except (ValueError, TypeError):
+        tool_selection_top_n = 24
+
+    _raw_ts_pinned = ai_raw.get("tool_selection_pinned", list(_DEFAULT_PINNED_TOOLS))
+    if not isinstance(_raw_ts_pinned, list):
+        logger.warning("ai.tool_selection_pinned must be a list of tool names; using the default")
+        _raw_ts_pinned = list(_DEFAULT_PINNED_TOOLS)
+    tool_selection_pinned = [str(n).strip() for n in _raw_ts_pinned if n and str(n).strip()]
+
+    task_models: dict[str, TaskModelConfig] = {}
+    _raw_task_models = ai_raw.get("task_models") or {}
+    if not isinstance(_raw_task_models, dict):
+        logger.warning("ai.task_models must be a mapping of task class to model; ignoring")
+        _raw_task_models = {}
+    for task_name, task_raw in _raw_task_models.items():
+        if task_name not in TASK_MODEL_CLASSES:
+            logger.warning(
+                "Unknown ai.task_models class '%s' (expected one of: %s); ignoring",
+                task_name,
+                ", ".join(TASK_MODEL_CLASSES),
+            )
+            continue
+        if isinstance(task_raw, str):
+            task_raw = {"model": task_raw}
+        if not isinstance(task_raw, dict) or not str(task_raw.get("model") or "").strip():
+            logger.warning("ai.task_models.%s needs a model name; ignoring", task_name)
+            continue
+        task_provider = str(task_raw.get("provider") or "")
+        if task_provider and task_provider not in ("openai", "anthropic", "litellm"):
+            logger.warning("Invalid ai.task_models.%s provider '%s'; using ai.provider", task_name, task_provider)
+            task_provider = ""
+        task_models[task_name] = TaskModelConfig(
+            model=str(task_raw["model"]).strip(),
+            base_url=str(task_raw.get("base_url") or ""),
+            provider=task_provider,
+            api_key=os.path.expandvars(str(task_raw.get("api_key") or "")),
+            fallback=str(task_raw.get("fallback", "true")).lower() not in ("false", "0", "no"),
+        )
+
     if narration_cadence > 0:
         system_prompt += (
             "\n\n<narration>\n"
@@ -1176,6 +1413,28 @@ def load_config(
         block_localhost_api=block_localhost_api,
         provider=provider,
         max_output_tokens=max_output_tokens,
+        prompt_caching=prompt_caching,
+        http2=http2,
+        http_max_connections=http_max_connections,
+        http_max_keepalive=http_max_keepalive,
+        http_keepalive_expiry=http_keepalive_expiry,
+        warmup_connections=warmup_connections,
+        response_cache=response_cache,
+        response_cache_ttl=response_cache_ttl,
+        response_cache_max_entries=response_cache_max_entries,
+        task_models=task_models,
+        hedge_requests=hedge_requests,
+        hedge_min_delay=hedge_min_delay,
+        hedge_max_rate=hedge_max_rate,
+        request_deadline=request_deadline,
+        endpoints=endpoints,
+        endpoint_failure_threshold=endpoint_failure_threshold,
+        endpoint_cooldown=endpoint_cooldown,
+        endpoint_health_interval=endpoint_health_interval,
+        endpoint_sticky=endpoint_sticky,
+        tool_selection=tool_selection,
+        tool_selection_top_n=tool_selection_top_n,
+        tool_selection_pinned=tool_selection_pinned,
     )
 
     app_raw = raw.get("app", {})
@@ -1284,6 +1543,8 @@ def load_config(
     tool_dedup_env = os.environ.get("AI_CHAT_TOOL_DEDUP")
     tool_dedup_raw = tool_dedup_env if tool_dedup_env is not None else cli_raw.get("tool_dedup", True)
     tool_dedup = str(tool_dedup_raw).lower() not in ("false", "0", "no", "off")
+    tool_result_cache = str(cli_raw.get("tool_result_cache", True)).lower() not in ("false", "0", "no", "off")
+    context_budget = str(cli_raw.get("context_budget", True)).lower() not in ("false", "0", "no", "off")
 
     try:
         retry_delay = max(1.0, min(60.0, float(cli_raw.get("retry_delay", 5.0))))
@@ -1452,12 +1713,80 @@ def load_config(
     skills_auto_invoke = str(skills_raw.get("auto_invoke", "true")).lower() not in ("false", "0", "no")
     skills_config = SkillsConfig(auto_invoke=skills_auto_invoke)
 
+    compaction_raw = cli_raw.get("compaction", {})
+    if not isinstance(compaction_raw, dict):
+        compaction_raw = {}
+    compaction_enabled = str(compaction_raw.get("enabled", "true")).lower() not in ("false", "0", "no")
+    try:
+        compaction_soft = max(0.1, min(0.95, float(compaction_raw.get("soft_threshold", 0.6))))
+    except (ValueError, TypeError):
+        compaction_soft = 0.6
+    try:
+        compaction_hard = max(compaction_soft, min(0.99, float(compaction_raw.get("hard_threshold", 0.85))))
+    except (ValueError, TypeError):
+        compaction_hard = max(compaction_soft, 0.85)
+    try:
+        compaction_keep = max(2, min(100, int(compaction_raw.get("keep_recent_messages", 6))))
+    except (ValueError, TypeError):
+        compaction_keep = 6
+    try:
+        compaction_summary_tokens = max(100, min(8000, int(compaction_raw.get("summary_max_tokens", 1000))))
+    except (ValueError, TypeError):
+        compaction_summary_tokens = 1000
+    compaction_strategy = str(compaction_raw.get("strategy", "summarize")).lower()
+    if compaction_strategy not in ("summarize", "select"):
+        compaction_strategy = "summarize"
+    try:
+        compaction_recent_turns = max(1, min(50, int(compaction_raw.get("recent_turns", 4))))
+    except (ValueError, TypeError):
+        compaction_recent_turns = 4
+    compaction_config = CompactionConfig(
+        enabled=compaction_enabled,
+        soft_threshold=compaction_soft,
+        hard_threshold=compaction_hard,
+        keep_recent_messages=compaction_keep,
+        summary_max_tokens=compaction_summary_tokens,
+        strategy=compaction_strategy,
+        recent_turns=compaction_recent_turns,
+    )
+
+    concurrency_raw = cli_raw.get("tool_concurrency", {})
+    if not isinstance(concurrency_raw, dict):
+        concurrency_raw = {}
+    try:
+        concurrency_max_parallel = max(0, min(256, int(concurrency_raw.get("max_parallel", 8))))
+    except (ValueError, TypeError):
+        concurrency_max_parallel = 8
+    try:
+        concurrency_bash = max(1, min(64, int(concurrency_raw.get("bash", 4))))
+    except (ValueError, TypeError):
+        concurrency_bash = 4
+    try:
+        concurrency_mcp = max(0, min(256, int(concurrency_raw.get("mcp_per_server", 4))))
+    except (ValueError, TypeError):
+        concurrency_mcp = 4
+    concurrency_tool_limits: dict[str, int] = {}
+    tool_limits_raw = concurrency_raw.get("tool_limits", {})
+    if isinstance(tool_limits_raw, dict):
+        for tool_name, limit in tool_limits_raw.items():
+            try:
+                concurrency_tool_limits[str(tool_name)] = max(1, min(256, int(limit)))
+            except (ValueError, TypeError):
+                continue
+    tool_concurrency_config = ToolConcurrencyConfig(
+        max_parallel=concurrency_max_parallel,
+        bash=concurrency_bash,
+        mcp_per_server=concurrency_mcp,
+        tool_limits=concurrency_tool_limits,
+    )
+
     cli_config = CliConfig(
         builtin_tools=cli_raw.get("builtin_tools", True),
         max_tool_iterations=int(cli_raw.get("max_tool_iterations", 50)),
         context_warn_tokens=context_warn_tokens,
         context_auto_compact_tokens=context_auto_compact_tokens,
         tool_dedup=tool_dedup,
+        tool_result_cache=tool_result_cache,
         retry_delay=retry_delay,
         max_retries=max_retries,
         esc_hint_delay=esc_hint_delay,
@@ -1467,9 +1796,12 @@ def load_config(
         tool_output_max_chars=tool_output_max_chars,
         file_reference_max_chars=file_reference_max_chars,
         model_context_window=model_context_window,
+        context_budget=context_budget,
         planning=planning_config,
         usage=usage_config,
         skills=skills_config,
+        compaction=compaction_config,
+        tool_concurrency=tool_concurrency_config,
     )
 
     identity_raw = raw.get("identity", {})
@@ -1588,6 +1920,8 @@ def load_config(
         cpu_time_limit=_sandbox_optional_int("cpu_time_limit", "AI_CHAT_BASH_SANDBOX_CPU_TIME_LIMIT"),
     )
 
+    bash_idle_timeout = max(10, min(86_400, _bash_int("shell_idle_timeout", "AI_CHAT_BASH_SHELL_IDLE_TIMEOUT", 600)))
+    bash_max_sessions = max(1, min(1024, _bash_int("shell_max_sessions", "AI_CHAT_BASH_SHELL_MAX_SESSIONS", 32)))
     bash_sandbox = BashSandboxConfig(
         enabled=bash_safety_enabled,
         timeout=_bash_int("timeout", "AI_CHAT_BASH_TIMEOUT", 120),
@@ -1598,6 +1932,9 @@ def load_config(
         allow_network=_bash_bool("allow_network", "AI_CHAT_BASH_ALLOW_NETWORK", True),
         allow_package_install=_bash_bool("allow_package_install", "AI_CHAT_BASH_ALLOW_PACKAGE_INSTALL", True),
         log_all_commands=_bash_bool("log_all_commands", "AI_CHAT_BASH_LOG_ALL_COMMANDS", False),
+        persistent_shell=_bash_bool("persistent_shell", "AI_CHAT_BASH_PERSISTENT_SHELL", False),
+        shell_idle_timeout=bash_idle_timeout,
+        shell_max_sessions=bash_max_sessions,
         sandbox=os_sandbox,
     )
     wf_raw = safety_raw.get("write_file", {})
@@ -1645,6 +1982,10 @@ def load_config(
         timeout=_sa_int("timeout", 120, 10, 600),
         max_output_chars=_sa_int("max_output_chars", 4000, 100, 100_000),
         max_prompt_chars=_sa_int("max_prompt_chars", 32_000, 100, 100_000),
+        global_max_concurrent=_sa_int("global_max_concurrent", 8, 1, 200),
+        max_concurrent_per_user=_sa_int("max_concurrent_per_user", 4, 1, 200),
+        queue_timeout=_sa_int("queue_timeout", 120, 1, 3600),
+        max_tokens_per_conversation=_sa_int("max_tokens_per_conversation", 0, 0, 100_000_000),
     )
 
     trl_raw = safety_raw.get("tool_rate_limit", {})
@@ -1812,6 +2153,14 @@ def load_config(
         rag_raw.get("retrieval_mode", os.environ.get("AI_CHAT_RAG_RETRIEVAL_MODE", "dense"))
     ).lower()
     rag_retrieval_mode = _raw_retrieval_mode if _raw_retrieval_mode in ("dense", "keyword", "hybrid") else "dense"
+    try:
+        rag_mmr_lambda = max(0.0, min(1.0, float(rag_raw.get("mmr_lambda", 0.7))))
+    except (ValueError, TypeError):
+        rag_mmr_lambda = 0.7
+    try:
+        rag_near_dup = max(-1, min(32, int(rag_raw.get("near_duplicate_threshold", 3))))
+    except (ValueError, TypeError):
+        rag_near_dup = 3
     rag_config = RagConfig(
         enabled=rag_enabled,
         max_chunks=rag_max_chunks,
@@ -1821,6 +2170,8 @@ def load_config(
         include_conversations=rag_include_conversations,
         exclude_current=rag_exclude_current,
         retrieval_mode=rag_retrieval_mode,
+        mmr_lambda=rag_mmr_lambda,
+        near_duplicate_threshold=rag_near_dup,
     )
 
     # Reranker config
@@ -1892,9 +2243,20 @@ def load_config(
             logger.warning("Ignoring invalid proxy allowed_origin: %s", origin)
             continue
         proxy_origins.append(origin)
+
+    def _proxy_int(key: str, default: int, lo: int, hi: int) -> int:
+        try:
+            return max(lo, min(hi, int(proxy_raw.get(key, default))))
+        except (ValueError, TypeError):
+            return default
+
     proxy_config = ProxyConfig(
         enabled=proxy_enabled,
         allowed_origins=proxy_origins,
+        embeddings_max_batch=_proxy_int("embeddings_max_batch", 64, 1, 2048),
+        embeddings_batch_wait_ms=_proxy_int("embeddings_batch_wait_ms", 10, 0, 1000),
+        embeddings_cache_size=_proxy_int("embeddings_cache_size", 2048, 0, 1_000_000),
+        embeddings_rate_limit=_proxy_int("embeddings_rate_limit", 600, 0, 1_000_000),
     )
 
     # References (instructions, rules, skills from team/project configs)
@@ -1937,6 +2299,39 @@ def load_config(
     storage_kdf = str(storage_raw.get("encryption_kdf", "hkdf-sha256"))
     if storage_kdf not in ("hkdf-sha256",):
         storage_kdf = "hkdf-sha256"
+    try:
+        storage_job_poll = max(
+            1,
+            min(60, int(storage_raw.get("job_poll_interval", os.environ.get("AI_CHAT_STORAGE_JOB_POLL_INTERVAL", 2)))),
+        )
+    except (ValueError, TypeError):
+        storage_job_poll = 2
+    try:
+        storage_job_lease = max(
+            10,
+            min(
+                3600,
+                int(storage_raw.get("job_lease_seconds", os.environ.get("AI_CHAT_STORAGE_JOB_LEASE_SECONDS", 120))),
+            ),
+        )
+    except (ValueError, TypeError):
+        storage_job_lease = 120
+    try:
+        storage_job_attempts = max(
+            1, min(50, int(storage_raw.get("job_max_attempts", os.environ.get("AI_CHAT_STORAGE_JOB_MAX_ATTEMPTS", 5))))
+        )
+    except (ValueError, TypeError):
+        storage_job_attempts = 5
+    try:
+        storage_job_retention = max(
+            1,
+            min(
+                8760,
+                int(storage_raw.get("job_retention_hours", os.environ.get("AI_CHAT_STORAGE_JOB_RETENTION_HOURS", 24))),
+            ),
+        )
+    except (ValueError, TypeError):
+        storage_job_retention = 24
     storage_config = StorageConfig(
         retention_days=storage_retention_days,
         retention_check_interval=storage_check_interval,
@@ -1944,6 +2339,10 @@ def load_config(
         purge_embeddings=storage_purge_embeddings,
         encrypt_at_rest=storage_encrypt,
         encryption_kdf=storage_kdf,
+        job_poll_interval=storage_job_poll,
+        job_lease_seconds=storage_job_lease,
+        job_max_attempts=storage_job_attempts,
+        job_retention_hours=storage_job_retention,
     )
 
     # Session config
@@ -2111,6 +2510,19 @@ def load_config(
         ci_raw = {}
     ci_enabled = str(ci_raw.get("enabled", "true")).lower() not in ("false", "0", "no")
     ci_map_tokens = int(ci_raw.get("map_tokens", 1000))
+    ci_persist_cache = str(ci_raw.get("persist_cache", "true")).lower() not in ("false", "0", "no")
+    try:
+        ci_refresh_interval = max(0, min(3600, int(ci_raw.get("refresh_interval", 30))))
+    except (ValueError, TypeError):
+        ci_refresh_interval = 30
+    try:
+        ci_parallel_workers = max(0, min(64, int(ci_raw.get("parallel_workers", 0))))
+    except (ValueError, TypeError):
+        ci_parallel_workers = 0
+    try:
+        ci_scan_budget = max(0.0, min(600.0, float(ci_raw.get("scan_budget", 15.0))))
+    except (ValueError, TypeError):
+        ci_scan_budget = 15.0
     ci_languages = ci_raw.get("languages", [])
     if not isinstance(ci_languages, list):
         ci_languages = []
@@ -2118,6 +2530,10 @@ def load_config(
     ci_config = CodebaseIndexConfig(
         enabled=ci_enabled,
         map_tokens=ci_map_tokens,
+        persist_cache=ci_persist_cache,
+        refresh_interval=ci_refresh_interval,
+        parallel_workers=ci_parallel_workers,
+        scan_budget=ci_scan_budget,
         languages=[str(lang) for lang in ci_languages],
     )
     if ci_exclude_raw is not None and isinstance(ci_exclude_raw, list):
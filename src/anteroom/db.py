@@ -106,6 +106,11 @@ CREATE TABLE IF NOT EXISTS messages (
     total_tokens INTEGER DEFAULT NULL,
     model TEXT DEFAULT NULL,
     metadata TEXT DEFAULT NULL,
+    content_tokens INTEGER DEFAULT NULL,
+    token_encoding TEXT DEFAULT NULL,
+    cache_read_tokens INTEGER DEFAULT NULL,
+    cache_write_tokens INTEGER DEFAULT NULL,
+    hedge_tokens INTEGER DEFAULT NULL,
     FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
 );
 
@@ -146,6 +151,15 @@ CREATE TABLE IF NOT EXISTS canvases (
     FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
 );
 
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    conversation_id TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    upto_position INTEGER NOT NULL,
+    covered_messages INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL,
+    FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
+);
+
 CREATE TABLE IF NOT EXISTS change_log (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     process_id TEXT NOT NULL,
@@ -370,6 +384,25 @@ CREATE TABLE IF NOT EXISTS workflow_locks (
     FOREIGN KEY (run_id) REFERENCES workflow_runs(id) ON DELETE CASCADE
 );
 
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    payload_json TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL CHECK(status IN ('queued', 'running', 'succeeded', 'dead', 'cancelled')),
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    dedupe_key TEXT,
+    run_after TEXT NOT NULL,
+    lease_owner TEXT,
+    lease_expires_at TEXT,
+    last_error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    started_at TEXT,
+    completed_at TEXT
+);
+
 """
 
 _FTS_SCHEMA = """
@@ -589,6 +622,9 @@ def _create_indexes(conn: sqlite3.Connection) -> None:
     conn.execute("CREATE INDEX IF NOT EXISTS idx_folders_space ON folders(space_id)")
     conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_conversations_slug ON conversations(slug)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_type ON conversations(type)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs(status, run_after)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_type_status ON jobs(job_type, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs(job_type, dedupe_key)")
     try:
         conn.execute("CREATE INDEX IF NOT EXISTS idx_workflow_runs_status ON workflow_runs(status)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_workflow_runs_target ON workflow_runs(target_kind, target_ref)")
@@ -909,6 +945,30 @@ def _run_migrations(conn: sqlite3.Connection, vec_dimensions: int = 384) -> None
         conn.execute("ALTER TABLE messages ADD COLUMN model TEXT DEFAULT NULL")
     if "metadata" not in msg_cols:
         conn.execute("ALTER TABLE messages ADD COLUMN metadata TEXT DEFAULT NULL")
+    # Per-message token counts, filled lazily for context-window accounting
+    if "content_tokens" not in msg_cols:
+        conn.execute("ALTER TABLE messages ADD COLUMN content_tokens INTEGER DEFAULT NULL")
+    if "token_encoding" not in msg_cols:
+        conn.execute("ALTER TABLE messages ADD COLUMN token_encoding TEXT DEFAULT NULL")
+    # Prompt-cache reads/writes reported by the provider (part of prompt_tokens)
+    for col in ("cache_read_tokens", "cache_write_tokens"):
+        if col not in msg_cols:
+            conn.execute(f"ALTER TABLE messages ADD COLUMN {col} INTEGER DEFAULT NULL")
+    # Estimated prompt tokens billed for cancelled hedge requests (not part of total_tokens)
+    if "hedge_tokens" not in msg_cols:
+        conn.execute("ALTER TABLE messages ADD COLUMN hedge_tokens INTEGER DEFAULT NULL")
+
+    # Rolling compaction summaries (one per conversation)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS conversation_summaries (
+            conversation_id TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            upto_position INTEGER NOT NULL,
+            covered_messages INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
+        )"""
+    )
 
     # Ensure change_log table exists for cross-process event polling
     conn.execute(
@@ -1169,6 +1229,9 @@ def _run_migrations(conn: sqlite3.Connection, vec_dimensions: int = 384) -> None
                     position INTEGER NOT NULL, prompt_tokens INTEGER DEFAULT NULL,
                     completion_tokens INTEGER DEFAULT NULL, total_tokens INTEGER DEFAULT NULL,
                     model TEXT DEFAULT NULL, metadata TEXT DEFAULT NULL,
+                    content_tokens INTEGER DEFAULT NULL, token_encoding TEXT DEFAULT NULL,
+                    cache_read_tokens INTEGER DEFAULT NULL, cache_write_tokens INTEGER DEFAULT NULL,
+                    hedge_tokens INTEGER DEFAULT NULL,
                     FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
                 )"""
             )
@@ -1421,6 +1484,28 @@ def _run_migrations(conn: sqlite3.Connection, vec_dimensions: int = 384) -> None
         if "heartbeat_at" not in wf_run_cols:
             conn.execute("ALTER TABLE workflow_runs ADD COLUMN heartbeat_at TEXT DEFAULT NULL")
 
+    # Durable background job queue
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            job_type TEXT NOT NULL,
+            payload_json TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL CHECK(status IN ('queued', 'running', 'succeeded', 'dead', 'cancelled')),
+            priority INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            dedupe_key TEXT,
+            run_after TEXT NOT NULL,
+            lease_owner TEXT,
+            lease_expires_at TEXT,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            started_at TEXT,
+            completed_at TEXT
+        )"""
+    )
+
     # Add message-level and source-chunk-level FTS5 tables for hybrid search (#810)
     try:
         fts_tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()}
@@ -83,6 +83,9 @@ async def delete_artifact(
 
     registry = getattr(request.app.state, "artifact_registry", None)
     if registry is not None:
-        registry.remove(fqn)
+        registry.unregister(fqn)
+    space_cache = getattr(request.app.state, "space_registry_cache", None)
+    if space_cache is not None:
+        space_cache.invalidate()
 
     return {"status": "deleted", "fqn": fqn}
@@ -25,8 +25,12 @@ from ..config import CliConfig, build_runtime_context
 from ..models import ChatRequest
 from ..services import storage
 from ..services.ai_service import AIService, create_ai_service
+from ..services.context_budget import budget_for
+from ..services.context_compactor import CompactionPolicy, ContextCompactor, RollingSummary, format_summary_message
 from ..services.context_trust import trusted_section_marker, untrusted_section_marker, wrap_untrusted
-from ..services.space_storage import get_space_local_dirs
+from ..services.history_selection import HistorySelector
+from ..services.token_counter import MESSAGE_OVERHEAD, get_token_counter
+from ..services.tool_selection import selector_for
 from ..tools.path_utils import safe_resolve_pathlib
 
 logger = logging.getLogger(__name__)
@@ -37,84 +41,110 @@ _CANVAS_STREAMING_TOOLS = {"create_canvas", "update_canvas"}
 MAX_CANVAS_ARGS_ACCUM = 100_000 + 1024
 
 
-def _extract_streaming_content(accumulated_args: str) -> str | None:
-    """Extract partial 'content' value from an incomplete JSON argument string.
+_JSON_WS = " \t\n\r"
+_JSON_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", '"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f"}
+_JSON_PLAIN_RUN = re.compile(r'[^"\\]+')
 
-    Parses just enough of the accumulating JSON to pull out the content value
-    as it streams in character-by-character. Returns None if the "content" key
-    hasn't appeared yet.
-    """
-    key = '"content"'
-    key_pos = accumulated_args.find(key)
-    if key_pos == -1:
-        return None
 
-    # Skip past key, optional whitespace, colon, optional whitespace, opening quote
-    pos = key_pos + len(key)
-    length = len(accumulated_args)
+class _StreamingStringField:
+    """Resumable extractor for one string field of a JSON object that arrives in pieces.
 
-    # Skip whitespace
-    while pos < length and accumulated_args[pos] in " \t\n\r":
-        pos += 1
-    # Expect colon
-    if pos >= length or accumulated_args[pos] != ":":
-        return None
-    pos += 1
-    # Skip whitespace
-    while pos < length and accumulated_args[pos] in " \t\n\r":
-        pos += 1
-    # Expect opening quote
-    if pos >= length or accumulated_args[pos] != '"':
-        return None
-    pos += 1
+    ``feed()`` takes each new argument delta and returns only the newly
+    decoded part of the field's value, so streaming a long canvas costs
+    O(total length) instead of re-parsing the whole buffer on every delta.
+    Returns None until the field's opening quote has been seen (and forever
+    if the key is not followed by ``: "``, matching the one-shot parser).
+    """
 
-    # Now decode the JSON string value (handling escape sequences)
-    result: list[str] = []
-    while pos < length:
-        ch = accumulated_args[pos]
-        if ch == '"':
-            # End of string value
-            break
-        if ch == "\\":
-            pos += 1
-            if pos >= length:
+    def __init__(self, field: str = "content") -> None:
+        self._key = f'"{field}"'
+        self._state = "key"  # key -> colon -> quote -> value -> done | invalid
+        self._scan = ""  # unmatched text while looking for the key
+        self._pending = ""  # incomplete escape sequence carried to the next delta
+        self.consumed = 0  # raw characters fed so far
+        self.head = ""  # raw text fed until the first value characters were emitted
+        self.emitted = 0  # decoded characters returned so far
+
+    @property
+    def started(self) -> bool:
+        return self._state in ("value", "done")
+
+    def feed(self, delta: str) -> str | None:
+        self.consumed += len(delta)
+        if not self.emitted:
+            self.head += delta
+        text = delta
+        if self._state == "key":
+            self._scan += text
+            pos = self._scan.find(self._key)
+            if pos == -1:
+                self._scan = self._scan[-(len(self._key) - 1) :]
+                return None
+            text = self._scan[pos + len(self._key) :]
+            self._scan = ""
+            self._state = "colon"
+        while self._state in ("colon", "quote"):
+            text = text.lstrip(_JSON_WS)
+            if not text:
+                return None
+            if text[0] != (":" if self._state == "colon" else '"'):
+                self._state = "invalid"
+                return None
+            text = text[1:]
+            self._state = "quote" if self._state == "colon" else "value"
+        if self._state == "value":
+            out = self._decode(text)
+            self.emitted += len(out)
+            return out
+        return "" if self._state == "done" else None
+
+    def _decode(self, text: str) -> str:
+        if self._pending:
+            text = self._pending + text
+            self._pending = ""
+        out: list[str] = []
+        pos = 0
+        length = len(text)
+        while pos < length:
+            match = _JSON_PLAIN_RUN.match(text, pos)
+            if match:
+                out.append(match.group())
+                pos = match.end()
+                continue
+            if text[pos] == '"':
+                self._state = "done"
                 break
-            esc = accumulated_args[pos]
-            if esc == "n":
-                result.append("\n")
-            elif esc == "t":
-                result.append("\t")
-            elif esc == "r":
-                result.append("\r")
-            elif esc == '"':
-                result.append('"')
-            elif esc == "\\":
-                result.append("\\")
-            elif esc == "/":
-                result.append("/")
-            elif esc == "b":
-                result.append("\b")
-            elif esc == "f":
-                result.append("\f")
-            elif esc == "u":
-                # Unicode escape: \uXXXX
-                hex_str = accumulated_args[pos + 1 : pos + 5]
-                if len(hex_str) == 4:
-                    try:
-                        result.append(chr(int(hex_str, 16)))
-                        pos += 4
-                    except ValueError:
-                        result.append(esc)
-                else:
-                    # Incomplete unicode escape — stop here
+            # Backslash escape
+            if pos + 1 >= length:
+                self._pending = text[pos:]
+                break
+            esc = text[pos + 1]
+            if esc == "u":
+                hex_str = text[pos + 2 : pos + 6]
+                if len(hex_str) < 4:
+                    self._pending = text[pos:]
                     break
-            else:
-                result.append(esc)
-        else:
-            result.append(ch)
-        pos += 1
+                try:
+                    out.append(chr(int(hex_str, 16)))
+                    pos += 6
+                except ValueError:
+                    out.append(esc)
+                    pos += 2
+                continue
+            out.append(_JSON_ESCAPES.get(esc, esc))
+            pos += 2
+        return "".join(out)
 
-    return "".join(result)
+
+def _extract_streaming_content(accumulated_args: str) -> str | None:
+    """Extract partial 'content' value from an incomplete JSON argument string.
+
+    Parses just enough of the accumulating JSON to pull out the content value
+    as it streams in character-by-character. Returns None if the "content" key
+    hasn't appeared yet.  The streaming endpoint keeps a
+    ``_StreamingStringField`` per tool call instead of calling this on every delta.
+    """
+    return _StreamingStringField("content").feed(accumulated_args)
 
 
 def _extract_streaming_language(accumulated_args: str) -> str | None:
@@ -257,9 +287,11 @@ def _get_ai_service(request: Request, model_override: str | None = None) -> AISe
 def _get_request_registries(request: Request, db: Any, space_id: str | None) -> tuple[Any, Any, Any]:
     """Return (artifact_registry, skill_registry, rule_enforcer) scoped to the request.
 
-    When *space_id* is set, builds per-request registries that include
-    both global and space-scoped pack artifacts, skills, and rules.
-    Without a space, returns the app-level globals unchanged.
+    When *space_id* is set, returns registries that include both global and
+    space-scoped pack artifacts, skills, and rules — served from the app's
+    ``SpaceRegistryCache`` when available, so steady-state requests reuse
+    the same (read-only) registries.  Without a space, returns the app-level
+    globals unchanged.
     """
     global_art = getattr(request.app.state, "artifact_registry", None)
     global_skill = getattr(request.app.state, "skill_registry", None)
@@ -268,38 +300,14 @@ def _get_request_registries(request: Request, db: Any, space_id: str | None) ->
     if global_art is None or not space_id:
         return global_art, global_skill, global_rules
 
-    from ..services.artifact_registry import ArtifactRegistry
-    from ..services.artifacts import ArtifactType
-
-    # Derive project_path from the space's first mapped directory
-    project_path: str | None = None
-    local_dirs = get_space_local_dirs(db, space_id)
-    if local_dirs:
-        project_path = local_dirs[0]
-
-    art_reg = ArtifactRegistry()
-    art_reg.load_from_db(db, space_id=space_id, project_path=project_path)
+    from ..services.registry_cache import SpaceRegistryCache, build_space_registries
 
-    # Build per-request skill registry from space-scoped artifacts
-    skill_reg = None
-    if global_skill is not None:
-        from ..cli.skills import SkillRegistry
-
-        skill_reg = SkillRegistry()
-        # Copy global skills first, then overlay space-scoped ones
-        if hasattr(global_skill, "_skills"):
-            skill_reg._skills = dict(global_skill._skills)
-        skill_reg.load_from_artifacts(art_reg)
-
-    # Build per-request rule enforcer from space-scoped artifacts
-    rule_enf = None
-    if global_rules is not None:
-        from ..services.rule_enforcer import RuleEnforcer
-
-        rule_enf = RuleEnforcer()
-        rule_enf.load_rules(art_reg.list_all(artifact_type=ArtifactType.RULE))
-
-    return art_reg, skill_reg, rule_enf
+    cache = getattr(request.app.state, "space_registry_cache", None)
+    if isinstance(cache, SpaceRegistryCache):
+        regs = cache.get(db, space_id, global_skill=global_skill, global_rules=global_rules)
+    else:
+        regs = build_space_registries(db, space_id, global_skill, global_rules)
+    return regs.artifact_registry, regs.skill_registry, regs.rule_enforcer
 
 
 @dataclass(frozen=True)
@@ -321,6 +329,8 @@ def _resolve_sources(
     limit: int = 50_000,
     *,
     space_id: str | None = None,
+    max_tokens: int | None = None,
+    counter: Any = None,
 ) -> SourceResolutionResult:
     """Resolve source references and return content with exclusion metadata.
 
@@ -328,6 +338,9 @@ def _resolve_sources(
     Sources auto-injected by the space resolution layer always pass this check;
     this guard prevents a client from injecting arbitrary source IDs that don't
     belong to the current scope.
+
+    Content is capped at *limit* chars and, when a token *counter* is given,
+    at *max_tokens* tokens.
     """
     # Pre-compute allowed source IDs when scoping is active
     _allowed_ids: set[str] | None = None
@@ -382,17 +395,25 @@ def _resolve_sources(
 
     source_parts: list[str] = []
     total_chars = 0
+    total_tokens = 0
     _truncated = False
     _included_sources: list[dict[str, str]] = []
     for src in _referenced_sources:
         content = src.get("content", "")
         remaining = limit - total_chars
-        if remaining <= 0:
+        tokens_left = max_tokens - total_tokens if max_tokens is not None and counter is not None else None
+        if remaining <= 0 or (tokens_left is not None and tokens_left <= 0):
             _truncated = True
             break
         if len(content) > remaining:
             content = content[:remaining] + "\n[...truncated...]"
             _truncated = True
+        if tokens_left is not None:
+            fitted = counter.truncate(content, tokens_left)
+            if fitted != content:
+                content = fitted + "\n[...truncated...]"
+                _truncated = True
+            total_tokens += counter.count_text(content)
         safe_title = str(src.get("title", ""))[:200]
         src_id = src["id"]
         source_parts.append(f"### {safe_title}\n" + wrap_untrusted(content, f"source:{src_id}", "reference"))
@@ -464,6 +485,64 @@ def _build_tool_list(
     return tools_openai, plan_path, plan_prompt
 
 
+def _render_artifacts(artifact_registry: Any) -> str:
+    parts: list[str] = []
+    for _atype in ("instruction", "rule", "context"):
+        for _art in artifact_registry.list_all(artifact_type=_atype):
+            if _art.content:
+                if _art.source == "built_in":
+                    tag = f'<artifact type="{_atype}" fqn="{_art.fqn}">'
+                    parts.append(f"{tag}\n{_art.content}\n</artifact>")
+                else:
+                    parts.append(wrap_untrusted(_art.content, origin=f"artifact:{_art.fqn}", content_type=_atype))
+    return "\n\n" + "\n".join(parts) if parts else ""
+
+
+def _render_skills(skill_registry: Any) -> str:
+    skill_descs = skill_registry.get_skill_descriptions()
+    if not skill_descs:
+        return ""
+    skill_lines = [
+        "\n<available_skills>",
+        "The following skills are available. When the user's request clearly matches a skill, "
+        "use the invoke_skill tool to run it.",
+    ]
+    for sname, sdesc in skill_descs:
+        skill_lines.append(f"- {sname}: {sdesc}")
+    skill_lines.append("</available_skills>")
+    return "\n".join(skill_lines)
+
+
+def _render_canvas(db: Any, conversation_id: str, max_tokens: int | None = None, counter: Any = None) -> str:
+    """Canvas context, capped at 10K chars and, with *counter*, at *max_tokens* content tokens."""
+    canvas_context_limit = 10_000
+    canvas_data = storage.get_canvas_for_conversation(db, conversation_id)
+    if not canvas_data:
+        return ""
+    content = canvas_data["content"] or ""
+    truncated = len(content) > canvas_context_limit
+    if truncated:
+        content = content[:canvas_context_limit]
+    if max_tokens is not None and counter is not None:
+        fitted = counter.truncate(content, max_tokens)
+        truncated = truncated or fitted != content
+        content = fitted
+    truncation_notice = "[...truncated, full content available via canvas tools...]\n" if truncated else ""
+    # SECURITY-REVIEW: title, language, and content are all user-controlled data.
+    # Wrapped in defensive prompt envelope to mitigate indirect prompt injection.
+    safe_title = str(canvas_data["title"] or "")[:200]
+    safe_lang = str(canvas_data.get("language") or "text")[:50]
+    canvas_body = f"{content}\n{truncation_notice}"
+    return (
+        f"\n\n## Current Canvas\n"
+        f"Title: {safe_title}\n"
+        f"Language: {safe_lang}\n"
+        f"Version: {canvas_data['version']}\n"
+        f"{wrap_untrusted(canvas_body, 'canvas', 'user-data')}\n"
+        f"Use patch_canvas for small targeted edits or update_canvas for full rewrites."
+    )
+
+
 async def _build_chat_system_prompt(
     *,
     ai_service: AIService,
@@ -488,161 +567,244 @@ async def _build_chat_system_prompt(
     space_id: str | None = None,
     attachment_filenames: list[str] | None = None,
     vec_manager: Any | None = None,
+    prompt_cache: Any | None = None,
+    index_service: Any | None = None,
+    context_budget: Any | None = None,
 ) -> tuple[str, dict[str, Any]]:
     """Assemble the extra system prompt from all context sources.
 
-    Returns (extra_prompt, metadata) where metadata includes RAG/source status.
+    The prompt is built as named sections.  When *prompt_cache* (a
+    ``PromptSectionCache``) is given, sections whose inputs are unchanged —
+    runtime context, space instructions, ANTEROOM.md files, artifacts and
+    skills — are reused from earlier requests.  *index_service* is the
+    process-wide ``CodebaseIndexService``; without it a throwaway one is
+    created from *config*.
+
+    Sections that are stable across the conversation come first; canvas,
+    sources, attachments and RAG follow ``turn_context_marker()`` so the
+    prefix stays byte-identical between requests.
+
+    With a *context_budget* (``ContextBudget``), the codebase map, canvas,
+    sources and RAG are fitted into what the window has left after the
+    reserved parts and this prompt's trusted sections; the split is
+    recorded as ``metadata["context_budget"]``.
+
+    Returns (extra_prompt, metadata) where metadata includes RAG/source status
+    and per-section build timings.
     """
+    from ..cli.instructions import instructions_fingerprint
     from ..services.context_trust import sanitize_trust_tags
+    from ..services.prompt_sections import PromptAssembler, turn_context_marker
 
     meta: dict[str, Any] = {}
+    asm = PromptAssembler(prompt_cache)
+    asm.add("trusted_marker", trusted_section_marker)
 
     # Runtime context for self-awareness
-    runtime_ctx = build_runtime_context(
-        model=ai_service.config.model,
-        builtin_tools=list(tool_registry.list_tools()),
-        mcp_servers=mcp_manager.get_server_statuses() if mcp_manager else None,
-        interface="web",
-        tls_enabled=config.app.tls,
+    builtin_tools = list(tool_registry.list_tools())
+    mcp_statuses = mcp_manager.get_server_statuses() if mcp_manager else None
+    asm.cached(
+        "runtime",
+        (
+            id(config),
+            ai_service.config.model,
+            tuple(builtin_tools),
+            json.dumps(mcp_statuses, sort_keys=True, default=str),
+            config.app.tls,
+        ),
+        lambda: build_runtime_context(
+            model=ai_service.config.model,
+            builtin_tools=builtin_tools,
+            mcp_servers=mcp_statuses,
+            interface="web",
+            tls_enabled=config.app.tls,
+        ),
+        pins=(config,),
     )
-    extra = trusted_section_marker() + runtime_ctx
 
     # Space instructions
     if space_instructions:
-        safe_instr = sanitize_trust_tags(space_instructions)
-        extra += "\n\n<space_instructions>\n" + safe_instr + "\n</space_instructions>"
+        asm.cached(
+            "space_instructions",
+            (space_id, space_instructions),
+            lambda: "\n\n<space_instructions>\n" + sanitize_trust_tags(space_instructions) + "\n</space_instructions>",
+        )
+
+    # ANTEROOM.md conventions — keyed on the stat() of every candidate file
+    def _build_instructions() -> str:
+        file_instructions = load_instructions()
+        return "\n\n" + file_instructions if file_instructions else ""
 
-    # ANTEROOM.md conventions
-    file_instructions = load_instructions()
-    if file_instructions:
-        extra += "\n\n" + file_instructions
+    asm.cached("instructions", (id(config), instructions_fingerprint()), _build_instructions, pins=(config,))
 
     # Inject artifacts (instructions, rules, context) from registry
     if artifact_registry is not None:
-        _artifact_parts: list[str] = []
-        for _atype in ("instruction", "rule", "context"):
-            for _art in artifact_registry.list_all(artifact_type=_atype):
-                if _art.content:
-                    if _art.source == "built_in":
-                        tag = f'<artifact type="{_atype}" fqn="{_art.fqn}">'
-                        _artifact_parts.append(f"{tag}\n{_art.content}\n</artifact>")
-                    else:
-                        _artifact_parts.append(
-                            wrap_untrusted(_art.content, origin=f"artifact:{_art.fqn}", content_type=_atype)
-                        )
-        if _artifact_parts:
-            extra += "\n\n" + "\n".join(_artifact_parts)
+        asm.cached(
+            "artifacts",
+            (id(artifact_registry), getattr(artifact_registry, "version", None)),
+            lambda: _render_artifacts(artifact_registry),
+            pins=(artifact_registry,),
+        )
 
     # Skill catalog
     if skill_registry is not None:
-        skill_descs = skill_registry.get_skill_descriptions()
-        if skill_descs:
-            skill_lines = [
-                "\n<available_skills>",
-                "The following skills are available. When the user's request clearly matches a skill, "
-                "use the invoke_skill tool to run it.",
-            ]
-            for sname, sdesc in skill_descs:
-                skill_lines.append(f"- {sname}: {sdesc}")
-            skill_lines.append("</available_skills>")
-            extra += "\n".join(skill_lines)
+        asm.cached(
+            "skills",
+            (id(skill_registry), getattr(skill_registry, "version", None)),
+            lambda: _render_skills(skill_registry),
+            pins=(skill_registry,),
+        )
 
     # Plan mode prompt
     if plan_prompt:
-        extra += plan_prompt
+        asm.add("plan", lambda: plan_prompt)
 
     # Inject canary token into trusted section (before untrusted marker)
     if injection_detector is not None and injection_detector.enabled:
-        _canary_seg = injection_detector.canary_prompt_segment()
-        if _canary_seg:
-            extra += _canary_seg
+        asm.add("canary", lambda: injection_detector.canary_prompt_segment() or "")
 
     # Structural separation: everything below this marker is external/untrusted data
-    extra += untrusted_section_marker()
+    asm.add("untrusted_marker", untrusted_section_marker)
+
+    canvas_text = _render_canvas(db, conversation_id)
+    source_result = _resolve_sources(db, source_ids, source_tag, source_group_id, space_id=space_id)
+
+    rag_config = getattr(config, "rag", None)
+    _rag_mode = getattr(rag_config, "retrieval_mode", "dense") if rag_config else "dense"
+    _rag_uses_keyword = _rag_mode in ("keyword", "hybrid")
+    # Keyword and hybrid modes can run without embeddings; dense requires both.
+    _rag_has_backend = (vec_enabled and embedding_service) or _rag_uses_keyword
+    _rag_wanted = bool(
+        rag_config and rag_config.enabled and not plan_mode and _rag_has_backend and message_text.strip()
+    )
+
+    # Fit the per-turn sections into what the reserved parts left of the window
+    index_config = getattr(config, "codebase_index", None)
+    map_tokens = getattr(index_config, "map_tokens", 1000)
+    budgets: dict[str, int] = {}
+    if context_budget is not None:
+        counter = context_budget.counter
+        base_prompt = getattr(ai_service.config, "system_prompt", "")
+        context_budget.reserve(
+            "system", counter.count_text((base_prompt if isinstance(base_prompt, str) else "") + asm.render())
+        )
+        budgets = context_budget.allocate(
+            {
+                "codebase_map": map_tokens if getattr(index_config, "enabled", False) else 0,
+                "sources": counter.count_text(source_result.content),
+                "canvas": counter.count_text(canvas_text),
+                "rag": rag_config.max_tokens if rag_config is not None and _rag_wanted else 0,
+            }
+        )
+        if budgets["codebase_map"] < map_tokens:
+            # Round down so the map (part of the cacheable prefix) changes rarely
+            map_tokens = budgets["codebase_map"] // 250 * 250
+        if budgets["canvas"] < counter.count_text(canvas_text):
+            canvas_text = _render_canvas(db, conversation_id, budgets["canvas"], counter) if budgets["canvas"] else ""
+        if budgets["sources"] < counter.count_text(source_result.content):
+            source_result = _resolve_sources(
+                db,
+                source_ids,
+                source_tag,
+                source_group_id,
+                space_id=space_id,
+                max_tokens=budgets["sources"],
+                counter=counter,
+            )
+
+    def _sent(name: str, text: str) -> str:
+        if context_budget is not None:
+            context_budget.record(name, text)
+        return text
+
+    # Codebase index
+    def _build_codebase_map() -> str:
+        try:
+            from ..services.codebase_index import create_index_service
+
+            if not config.codebase_index.enabled or ("codebase_map" in budgets and map_tokens <= 0):
+                return ""
+            _index_service = index_service if index_service is not None else create_index_service(config)
+            _index_root = getattr(tool_registry, "_working_dir", None) or os.getcwd()
+            if _index_service:
+                _index_map = _index_service.get_map(_index_root, token_budget=map_tokens)
+                if _index_map:
+                    return "\n" + _index_map
+        except Exception:
+            logger.debug("Codebase index unavailable, continuing without it", exc_info=True)
+        return ""
+
+    # A cold scan parses files; keep it off the event loop.
+    _sent("codebase_map", await asm.add_async("codebase_map", lambda: asyncio.to_thread(_build_codebase_map)))
+
+    # Everything above is stable across the conversation (a cacheable prefix);
+    # the sections below are rebuilt for every request.
+    asm.add("turn_context_marker", turn_context_marker)
 
     # Attachment guidance — placed in the untrusted section because filenames are user-controlled
     if attachment_filenames:
         sanitized = [sanitize_trust_tags(fn) for fn in attachment_filenames]
         names = ", ".join(sanitized)
-        extra += (
-            "\n\n## Attached Files\n"
-            f"The user has attached the following file(s): {names}\n"
-            "Their content has been extracted and included directly in the user's message below. "
-            "Read and use that content to answer the user's request. "
-            "Do NOT use file tools (read_file, pptx, xlsx, docx, glob_files, etc.) to re-read these files — "
-            "the content is already available in the conversation."
+        asm.add(
+            "attachments",
+            lambda: (
+                "\n\n## Attached Files\n"
+                f"The user has attached the following file(s): {names}\n"
+                "Their content has been extracted and included directly in the user's message below. "
+                "Read and use that content to answer the user's request. "
+                "Do NOT use file tools (read_file, pptx, xlsx, docx, glob_files, etc.) to re-read these files — "
+                "the content is already available in the conversation."
+            ),
         )
 
     # Canvas context (cap at 10K chars)
-    canvas_context_limit = 10_000
-    canvas_data = storage.get_canvas_for_conversation(db, conversation_id)
-    if canvas_data:
-        content = canvas_data["content"] or ""
-        truncated = len(content) > canvas_context_limit
-        if truncated:
-            content = content[:canvas_context_limit]
-        truncation_notice = "[...truncated, full content available via canvas tools...]\n" if truncated else ""
-        # SECURITY-REVIEW: title, language, and content are all user-controlled data.
-        # Wrapped in defensive prompt envelope to mitigate indirect prompt injection.
-        safe_title = str(canvas_data["title"] or "")[:200]
-        safe_lang = str(canvas_data.get("language") or "text")[:50]
-        canvas_body = f"{content}\n{truncation_notice}"
-        canvas_context = (
-            f"\n\n## Current Canvas\n"
-            f"Title: {safe_title}\n"
-            f"Language: {safe_lang}\n"
-            f"Version: {canvas_data['version']}\n"
-            f"{wrap_untrusted(canvas_body, 'canvas', 'user-data')}\n"
-            f"Use patch_canvas for small targeted edits or update_canvas for full rewrites."
-        )
-        extra += canvas_context
+    _sent("canvas", asm.add("canvas", lambda: canvas_text))
 
     # Source references
-    source_result = _resolve_sources(db, source_ids, source_tag, source_group_id, space_id=space_id)
-    if source_result.content:
-        extra += source_result.content
+    _sent("sources", asm.add("sources", lambda: source_result.content))
     meta["sources_truncated"] = source_result.truncated
     if source_result.excluded_ids:
         meta["sources_excluded_count"] = len(source_result.excluded_ids)
     meta["sources_attached"] = source_result.included
 
     # RAG context (skip in plan mode)
-    rag_config = getattr(config, "rag", None)
-    _rag_mode = getattr(rag_config, "retrieval_mode", "dense") if rag_config else "dense"
-    _rag_uses_keyword = _rag_mode in ("keyword", "hybrid")
-    # Keyword and hybrid modes can run without embeddings; dense requires both.
-    _rag_has_backend = (vec_enabled and embedding_service) or _rag_uses_keyword
-    if rag_config and rag_config.enabled and not plan_mode and _rag_has_backend and message_text.strip():
-        try:
-            from ..services.rag import format_rag_context, retrieve_context, strip_rag_context
-
-            extra = strip_rag_context(extra)
-            _reranker_cfg = getattr(config, "reranker", None)
-            rag_chunks, rag_reason = await retrieve_context(
-                query=message_text,
-                db=db,
-                embedding_service=embedding_service,
-                config=rag_config,
-                current_conversation_id=conversation_id,
-                space_id=space_id,
-                vec_manager=vec_manager,
-                reranker_service=reranker_service,
-                reranker_config=_reranker_cfg,
-            )
-            meta["rag_status"] = "ok" if rag_chunks else "no_results"
-            meta["rag_chunks"] = len(rag_chunks)
-            if rag_reason:
-                meta["rag_reason"] = rag_reason
-            meta["rag_sources"] = [
-                {"label": c.source_label, "type": c.source_type, "source_id": c.source_id} for c in rag_chunks
-            ]
-            if rag_chunks:
-                extra += format_rag_context(rag_chunks)
-        except Exception:
-            logger.debug("RAG retrieval failed, continuing without context", exc_info=True)
-            meta["rag_status"] = "failed"
-            meta["rag_chunks"] = 0
-            meta["rag_sources"] = []
+    if rag_config is not None and _rag_wanted and (context_budget is None or budgets["rag"] > 0):
+
+        async def _build_rag() -> str:
+            try:
+                from ..services.rag import format_rag_context, retrieve_context, strip_rag_context
+
+                asm.rewrite(strip_rag_context)
+                _reranker_cfg = getattr(config, "reranker", None)
+                rag_chunks, rag_reason = await retrieve_context(
+                    query=message_text,
+                    db=db,
+                    embedding_service=embedding_service,
+                    config=rag_config,
+                    current_conversation_id=conversation_id,
+                    space_id=space_id,
+                    vec_manager=vec_manager,
+                    reranker_service=reranker_service,
+                    reranker_config=_reranker_cfg,
+                    max_tokens=budgets.get("rag"),
+                    token_counter=context_budget.counter if context_budget is not None else None,
+                )
+                meta["rag_status"] = "ok" if rag_chunks else "no_results"
+                meta["rag_chunks"] = len(rag_chunks)
+                if rag_reason:
+                    meta["rag_reason"] = rag_reason
+                meta["rag_sources"] = [
+                    {"label": c.source_label, "type": c.source_type, "source_id": c.source_id} for c in rag_chunks
+                ]
+                return format_rag_context(rag_chunks) if rag_chunks else ""
+            except Exception:
+                logger.debug("RAG retrieval failed, continuing without context", exc_info=True)
+                meta["rag_status"] = "failed"
+                meta["rag_chunks"] = 0
+                meta["rag_sources"] = []
+                return ""
+
+        _sent("rag", await asm.add_async("rag", _build_rag))
     else:
         # Capture the reason RAG was skipped so prompt_meta is always consistent
         if not rag_config:
@@ -653,25 +815,17 @@ async def _build_chat_system_prompt(
             meta["rag_status"] = "skipped_plan_mode"
         elif not _rag_has_backend:
             meta["rag_status"] = "no_vec_support"
+        elif _rag_wanted:
+            meta["rag_status"] = "no_budget"
         else:
             meta["rag_status"] = "skipped"
         meta["rag_chunks"] = 0
         meta["rag_sources"] = []
 
-    # Codebase index
-    try:
-        from ..services.codebase_index import create_index_service
-
-        _index_service = create_index_service(config)
-        _index_root = getattr(tool_registry, "_working_dir", None) or os.getcwd()
-        if _index_service:
-            _index_map = _index_service.get_map(_index_root, token_budget=config.codebase_index.map_tokens)
-            if _index_map:
-                extra += "\n" + _index_map
-    except Exception:
-        logger.debug("Codebase index unavailable, continuing without it", exc_info=True)
-
-    return extra, meta
+    if context_budget is not None:
+        meta["context_budget"] = context_budget.allocation()
+    meta.update(asm.meta())
+    return asm.render(), meta
 
 
 @dataclass
@@ -692,6 +846,8 @@ async def _web_confirm_tool(ctx: WebConfirmContext, verdict: Any) -> bool:
     """Handle tool approval via the web UI event bus."""
     import secrets as _secrets
 
+    from ..services.tool_scheduler import released_permits
+
     max_pending = 100
     if len(ctx.pending_approvals) >= max_pending:
         logger.warning("Pending approvals limit reached (%d); denying", len(ctx.pending_approvals))
@@ -718,22 +874,24 @@ async def _web_confirm_tool(ctx: WebConfirmContext, verdict: Any) -> bool:
         )
 
     try:
-        elapsed = 0.0
-        poll_interval = 1.0
-        while not approval_event.is_set():
-            if elapsed >= ctx.approval_timeout:
-                raise asyncio.TimeoutError()
-            try:
-                if await ctx.request.is_disconnected():
+        # Other users' calls to this tool may run while this one waits for approval
+        async with released_permits():
+            elapsed = 0.0
+            poll_interval = 1.0
+            while not approval_event.is_set():
+                if elapsed >= ctx.approval_timeout:
                     raise asyncio.TimeoutError()
-            except asyncio.TimeoutError:
-                raise
-            except Exception:
-                pass
-            try:
-                await asyncio.wait_for(approval_event.wait(), timeout=poll_interval)
-            except asyncio.TimeoutError:
-                elapsed += poll_interval
+                try:
+                    if await ctx.request.is_disconnected():
+                        raise asyncio.TimeoutError()
+                except asyncio.TimeoutError:
+                    raise
+                except Exception:
+                    pass
+                try:
+                    await asyncio.wait_for(approval_event.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    elapsed += poll_interval
     except asyncio.TimeoutError:
         logger.warning("Approval timed out (id=%s): %s", approval_id, verdict.reason)
         if ctx.event_bus:
@@ -870,8 +1028,12 @@ class ToolExecutorContext:
     sa_config: Any
     request_config: Any
     rate_limiter: Any = None
+    subagent_schedule: Any = None
     skill_registry: Any = None
     rule_enforcer: Any = None
+    tool_scheduler: Any = None
+    tool_output_queue: asyncio.Queue[dict[str, Any]] | None = None
+    shell_sessions: Any = None
     subagent_counter: list[int] = field(default_factory=lambda: [0])
     max_subagent_events: int = 500
 
@@ -886,6 +1048,19 @@ async def _web_event_sink_fn(ctx: ToolExecutorContext, agent_id: str, event: Any
             buf.append({"kind": kind, "agent_id": agent_id, **data})
 
 
+def _web_tool_output(ctx: ToolExecutorContext, stream: str, text: str) -> None:
+    """Queue live command output for SSE emission, tagged with the running tool call."""
+    from ..services.agent_loop import current_tool_call_id
+
+    call_id = current_tool_call_id.get()
+    if ctx.tool_output_queue is None or call_id is None:
+        return
+    try:
+        ctx.tool_output_queue.put_nowait({"id": call_id, "stream": stream, "text": text})
+    except asyncio.QueueFull:
+        pass  # progress is best-effort; the final result still carries the output
+
+
 def _scope_to_decision(confirm_ctx: WebConfirmContext) -> str:
     """Map the last resolved approval scope to an audit decision string."""
     task = asyncio.current_task()
@@ -925,6 +1100,8 @@ async def _execute_web_tool(ctx: ToolExecutorContext, tool_name: str, arguments:
             "_limiter": ctx.subagent_limiter,
             "_confirm_callback": _confirm,
             "_config": ctx.sa_config,
+            "_tool_scheduler": ctx.tool_scheduler,
+            "_schedule": ctx.subagent_schedule,
         }
     elif tool_name == "invoke_skill":
         skill_name = arguments.get("skill_name", "")
@@ -946,6 +1123,11 @@ async def _execute_web_tool(ctx: ToolExecutorContext, tool_name: str, arguments:
         return {"status": "skill_invoked", "skill": skill_name}
     elif tool_name == "ask_user":
         arguments = {**arguments, "_ask_callback": _ask_user}
+    elif tool_name == "bash":
+        arguments = {**arguments, "_output_callback": lambda stream, text: _web_tool_output(ctx, stream, text)}
+        if ctx.shell_sessions is not None:
+            bash_dir = getattr(ctx.tool_registry, "_working_dir", None) or os.getcwd()
+            arguments["_shell_session"] = ctx.shell_sessions.get(ctx.conversation_id, bash_dir)
     elif tool_name == "introspect":
         _rt_info: dict[str, Any] = {"interface": "web"}
         try:
@@ -1080,7 +1262,15 @@ class StreamContext:
     token_throttle_interval: float = 0.1
     last_token_broadcast: float = 0.0
     prompt_meta: dict[str, Any] = field(default_factory=dict)
+    context_budget: Any = None
+    history_selector: Any = None
+    tool_selector: Any = None
     user_msg: dict[str, Any] | None = None
+    compactor: Any = None
+    can_speculate: Any = None
+    tool_scheduler: Any = None
+    result_cache: Any = None
+    tool_output_queue: asyncio.Queue[dict[str, Any]] | None = None
 
 
 _DISCONNECT_POLL_INTERVAL = 3  # seconds
@@ -1140,22 +1330,36 @@ def _fallback_stream_cleanup(gen: Any) -> None:
 _KEEPALIVE_INTERVAL = 15  # seconds between SSE keepalive pings
 
 
-async def _with_keepalive(gen: Any, interval: float = _KEEPALIVE_INTERVAL) -> Any:
+async def _with_keepalive(
+    gen: Any,
+    interval: float = _KEEPALIVE_INTERVAL,
+    side_events: asyncio.Queue[dict[str, Any]] | None = None,
+) -> Any:
     """Wrap an async generator to yield keepalive comments during long pauses.
 
     Prevents browsers and proxies from closing the SSE connection when the
     agent loop blocks (e.g. during ask_user or tool approval waits).
+    Items put on *side_events* (live tool output) are yielded as
+    ``tool_output`` SSE events while the generator is blocked.
 
     Uses asyncio.wait() instead of wait_for() to avoid cancelling the
     underlying generator coroutine on timeout.
     """
     aiter = gen.__aiter__()
     pending_next: asyncio.Task | None = None
+    pending_side: asyncio.Task | None = None
     try:
         while True:
             if pending_next is None:
                 pending_next = asyncio.ensure_future(aiter.__anext__())
-            done, _ = await asyncio.wait({pending_next}, timeout=interval)
+            if side_events is not None and pending_side is None:
+                pending_side = asyncio.ensure_future(side_events.get())
+            waiting = {pending_next} if pending_side is None else {pending_next, pending_side}
+            done, _ = await asyncio.wait(waiting, timeout=interval, return_when=asyncio.FIRST_COMPLETED)
+            if pending_side is not None and pending_side in done:
+                yield {"event": "tool_output", "data": json.dumps(pending_side.result())}
+                pending_side = None
+                continue
             if done:
                 try:
                     yield pending_next.result()
@@ -1165,6 +1369,8 @@ async def _with_keepalive(gen: Any, interval: float = _KEEPALIVE_INTERVAL) -> An
             else:
                 yield {"comment": "keepalive"}
     finally:
+        if pending_side is not None and not pending_side.done():
+            pending_side.cancel()
         if pending_next is not None and not pending_next.done():
             pending_next.cancel()
             try:
@@ -1186,12 +1392,12 @@ async def _with_keepalive(gen: Any, interval: float = _KEEPALIVE_INTERVAL) -> An
 async def _stream_chat_events(ctx: StreamContext) -> Any:
     """Async generator that yields SSE events for the chat stream."""
     from ..services.agent_loop import run_agent_loop
+    from ..services.request_deadline import with_deadline
 
     current_assistant_msg = None
     _pending_tool_inputs: dict[str, Any] = {}
     _streamed_content = ""
-    _canvas_args_accum: dict[int, str] = {}
-    _canvas_content_sent: dict[int, int] = {}
+    _canvas_parsers: dict[int, _StreamingStringField] = {}
     _canvas_stream_started: set[int] = set()
 
     # Spawn background disconnect poller so stale streams are cancelled promptly
@@ -1243,37 +1449,47 @@ async def _stream_chat_events(ctx: StreamContext) -> Any:
 
             _output_filter = OutputContentFilter(_of_cfg, system_prompt=ctx.extra_system_prompt)
 
-        agent_gen = run_agent_loop(
-            ai_service=ctx.ai_service,
-            messages=ctx.ai_messages,
-            tool_executor=ctx.tool_executor,
-            tools_openai=ctx.tools,
-            cancel_event=ctx.cancel_event,
-            extra_system_prompt=ctx.extra_system_prompt,
-            message_queue=_message_queues.get(ctx.conversation_id),
-            narration_cadence=ctx.ai_service.config.narration_cadence,
-            auto_plan_threshold=(
-                _planning_cfg.auto_threshold_tools if not ctx.plan_mode and _planning_cfg.auto_mode != "off" else 0
-            ),
-            budget_config=ctx.budget_config,
-            get_token_totals=_get_token_totals,
-            dlp_scanner=_dlp_scanner,
-            injection_detector=_injection_detector,
-            output_filter=_output_filter,
-            max_consecutive_text_only=getattr(
-                getattr(_app_config, "cli", None),
-                "max_consecutive_text_only",
-                CliConfig.max_consecutive_text_only,
-            ),
-            max_line_repeats=getattr(
-                getattr(_app_config, "cli", None),
-                "max_line_repeats",
-                CliConfig.max_line_repeats,
+        agent_gen = with_deadline(
+            run_agent_loop(
+                ai_service=ctx.ai_service,
+                messages=ctx.ai_messages,
+                tool_executor=ctx.tool_executor,
+                tools_openai=ctx.tools,
+                cancel_event=ctx.cancel_event,
+                extra_system_prompt=ctx.extra_system_prompt,
+                message_queue=_message_queues.get(ctx.conversation_id),
+                narration_cadence=ctx.ai_service.config.narration_cadence,
+                auto_plan_threshold=(
+                    _planning_cfg.auto_threshold_tools if not ctx.plan_mode and _planning_cfg.auto_mode != "off" else 0
+                ),
+                budget_config=ctx.budget_config,
+                get_token_totals=_get_token_totals,
+                dlp_scanner=_dlp_scanner,
+                injection_detector=_injection_detector,
+                output_filter=_output_filter,
+                max_consecutive_text_only=getattr(
+                    getattr(_app_config, "cli", None),
+                    "max_consecutive_text_only",
+                    CliConfig.max_consecutive_text_only,
+                ),
+                max_line_repeats=getattr(
+                    getattr(_app_config, "cli", None),
+                    "max_line_repeats",
+                    CliConfig.max_line_repeats,
+                ),
+                compactor=ctx.compactor,
+                can_speculate=ctx.can_speculate,
+                tool_scheduler=ctx.tool_scheduler,
+                result_cache=ctx.result_cache,
+                history_selector=ctx.history_selector,
+                tool_selector=ctx.tool_selector,
             ),
+            ctx.ai_service.config.request_deadline,
         )
         _pending_usage: dict[str, Any] | None = None
-        async for agent_event in _with_keepalive(agent_gen):
-            if isinstance(agent_event, dict) and "comment" in agent_event:
+        _side_events = ctx.tool_output_queue if isinstance(ctx.tool_output_queue, asyncio.Queue) else None
+        async for agent_event in _with_keepalive(agent_gen, side_events=_side_events):
+            if isinstance(agent_event, dict):
                 yield agent_event
                 continue
 
@@ -1317,32 +1533,26 @@ async def _stream_chat_events(ctx: StreamContext) -> Any:
                 tool_name = data.get("tool_name", "")
                 idx = data.get("index", 0)
                 if tool_name in _CANVAS_STREAMING_TOOLS and not ctx.canvas_needs_approval:
-                    _canvas_args_accum.setdefault(idx, "")
-                    if len(_canvas_args_accum[idx]) > MAX_CANVAS_ARGS_ACCUM:
+                    parser = _canvas_parsers.setdefault(idx, _StreamingStringField("content"))
+                    if parser.consumed > MAX_CANVAS_ARGS_ACCUM:
                         continue
-                    _canvas_args_accum[idx] += data.get("delta", "")
-                    content = _extract_streaming_content(_canvas_args_accum[idx])
-                    if content is not None:
-                        prev_len = _canvas_content_sent.get(idx, 0)
-                        if len(content) > prev_len:
-                            delta_text = content[prev_len:]
-                            _canvas_content_sent[idx] = len(content)
-                            if idx not in _canvas_stream_started:
-                                _canvas_stream_started.add(idx)
-                                language = _extract_streaming_language(_canvas_args_accum[idx])
-                                yield {
-                                    "event": "canvas_stream_start",
-                                    "data": json.dumps({"tool_name": tool_name, "language": language}),
-                                }
+                    delta_text = parser.feed(data.get("delta", ""))
+                    if delta_text:
+                        if idx not in _canvas_stream_started:
+                            _canvas_stream_started.add(idx)
+                            language = _extract_streaming_language(parser.head)
                             yield {
-                                "event": "canvas_streaming",
-                                "data": json.dumps({"content_delta": delta_text}),
+                                "event": "canvas_stream_start",
+                                "data": json.dumps({"tool_name": tool_name, "language": language}),
                             }
+                        yield {
+                            "event": "canvas_streaming",
+                            "data": json.dumps({"content_delta": delta_text}),
+                        }
 
             elif kind == "tool_call_start":
                 idx = data.get("index", 0)
-                _canvas_args_accum.pop(idx, None)
-                _canvas_content_sent.pop(idx, None)
+                _canvas_parsers.pop(idx, None)
                 _canvas_stream_started.discard(idx)
                 _pending_tool_inputs[data["id"]] = data["arguments"]
                 yield {
@@ -1358,6 +1568,8 @@ async def _stream_chat_events(ctx: StreamContext) -> Any:
                 }
 
             elif kind == "assistant_message":
+                if ctx.context_budget is not None:
+                    ctx.context_budget.observe_reply(data["content"])
                 _msg_meta = None
                 _rag_sources = ctx.prompt_meta.get("rag_sources")
                 if _rag_sources:
@@ -1380,16 +1592,17 @@ async def _stream_chat_events(ctx: StreamContext) -> Any:
                         _pending_usage.get("completion_tokens", 0),
                         _pending_usage.get("total_tokens", 0),
                         _pending_usage.get("model", ""),
+                        cache_read_tokens=_pending_usage.get("cache_read_tokens"),
+                        cache_write_tokens=_pending_usage.get("cache_write_tokens"),
+                        hedge_tokens=_pending_usage.get("hedge_tokens"),
                     )
                     _pending_usage = None
 
                 if ctx.embedding_worker and current_assistant_msg:
-                    asyncio.create_task(
-                        ctx.embedding_worker.embed_message(
-                            current_assistant_msg["id"],
-                            data["content"],
-                            ctx.conversation_id,
-                        )
+                    ctx.embedding_worker.enqueue_message(
+                        current_assistant_msg["id"],
+                        data["content"],
+                        ctx.conversation_id,
                     )
 
                 if ctx.event_bus and current_assistant_msg:
@@ -1664,6 +1877,9 @@ async def _stream_chat_events(ctx: StreamContext) -> Any:
                 if current_assistant_msg:
                     _done_payload["assistant_message_id"] = current_assistant_msg["id"]
                     _done_payload["assistant_message_position"] = current_assistant_msg["position"]
+                if isinstance(getattr(ctx.result_cache, "lookups", None), int) and ctx.result_cache.lookups:
+                    _done_payload["tool_result_cache"] = ctx.result_cache.stats()
+                    logger.info("Tool result cache for %s: %s", ctx.conversation_id, _done_payload["tool_result_cache"])
                 yield {"event": "done", "data": json.dumps(_done_payload)}
 
     except Exception:
@@ -1784,7 +2000,7 @@ async def chat(conversation_id: str, request: Request) -> Any:
 
         _embedding_worker = getattr(request.app.state, "embedding_worker", None)
         if _embedding_worker:
-            asyncio.create_task(_embedding_worker.embed_message(msg["id"], message_text, conversation_id))
+            _embedding_worker.enqueue_message(msg["id"], message_text, conversation_id)
 
         event_bus = _get_event_bus(request)
         if event_bus:
@@ -1881,7 +2097,7 @@ async def chat(conversation_id: str, request: Request) -> Any:
         # Trigger async embedding for user message
         _embedding_worker = getattr(request.app.state, "embedding_worker", None)
         if _embedding_worker and user_msg:
-            asyncio.create_task(_embedding_worker.embed_message(user_msg["id"], message_text, conversation_id))
+            _embedding_worker.enqueue_message(user_msg["id"], message_text, conversation_id)
 
         if event_bus and user_msg:
             asyncio.create_task(
@@ -2025,10 +2241,36 @@ async def chat(conversation_id: str, request: Request) -> Any:
 
     ai_service = _get_ai_service(request, model_override=model_override)
 
-    # Build message history
+    # Build message history, starting from the persisted rolling summary (if
+    # any) instead of the messages it already covers.
     history = storage.list_messages(db, conversation_id)
+    token_counter = get_token_counter(ai_service.config.model, ai_service.config.provider)
+    try:
+        storage.ensure_message_token_counts(db, history, token_counter)
+    except Exception:
+        logger.debug("Failed to load persisted token counts", exc_info=True)
+    _compaction_cfg = getattr(request.app.state.config.cli, "compaction", None)
+    history_selector: HistorySelector | None = None
+    if getattr(_compaction_cfg, "strategy", "summarize") == "select":
+        # The full history is loaded; each model call is sent a relevant subset
+        history_selector = HistorySelector(
+            token_counter,
+            recent_turns=getattr(_compaction_cfg, "recent_turns", 4),
+            embedding_service=getattr(request.app.state, "embedding_service", None),
+        )
+    summary_row = None if history_selector else storage.get_conversation_summary(db, conversation_id)
+    covered_upto = summary_row["upto_position"] if summary_row else -1
     ai_messages: list[dict[str, Any]] = []
+    summary_msg: dict[str, Any] | None = None
+    rolling: RollingSummary | None = None
+    if summary_row:
+        rolling = RollingSummary(text=summary_row["content"], covered_messages=summary_row["covered_messages"])
+        summary_msg = format_summary_message(rolling)
+        ai_messages.append(summary_msg)
+    message_positions: dict[int, int] = {}
     for msg in history:
+        if msg["position"] <= covered_upto:
+            continue
         content: Any = msg["content"]
         if user_msg and msg["id"] == user_msg["id"] and attachment_contents:
             parts: list[dict[str, Any]] = [{"type": "text", "text": msg["content"]}]
@@ -2038,7 +2280,30 @@ async def chat(conversation_id: str, request: Request) -> Any:
                 elif att["type"] == "text":
                     parts.append({"type": "text", "text": f"[Attached file: {att['filename']}]\n{att['content']}"})
             content = parts
-        ai_messages.append({"role": msg["role"], "content": content})
+        ai_msg = {"role": msg["role"], "content": content}
+        # Seed the shared token counter from the persisted per-message count
+        # so the context size is known without re-tokenizing the history.
+        if isinstance(content, str) and msg.get("content_tokens") is not None:
+            token_counter.seed(ai_msg, MESSAGE_OVERHEAD + msg["content_tokens"])
+        message_positions[id(ai_msg)] = msg["position"]
+        ai_messages.append(ai_msg)
+
+    _app_config = request.app.state.config
+
+    def _persist_summary(summary: RollingSummary, span: list[dict[str, Any]]) -> None:
+        covered = [message_positions[id(m)] for m in span if id(m) in message_positions]
+        if covered:
+            storage.save_conversation_summary(db, conversation_id, summary.text, max(covered), summary.covered_messages)
+
+    compactor = ContextCompactor(
+        ai_service,
+        CompactionPolicy.from_config(_app_config),
+        counter=token_counter,
+        background=getattr(getattr(_app_config.cli, "compaction", None), "enabled", True) is not False,
+        on_summary=_persist_summary,
+    )
+    if summary_msg is not None and rolling is not None:
+        compactor.adopt(summary_msg, rolling)
 
     # Build unified tool list: builtins + MCP
     tool_registry = request.app.state.tool_registry
@@ -2060,12 +2325,21 @@ async def chat(conversation_id: str, request: Request) -> Any:
     )
 
     tools = tools_openai if tools_openai else None
+    # The agent loop sends a relevant subset; selecting here lets the budget count only that
+    tool_selector = selector_for(_app_config, getattr(request.app.state, "embedding_service", None))
+    sent_tools = await tool_selector.select(tools, ai_messages) if tool_selector and tools else tools
 
     is_first_message = not regenerate and len(history) <= 1
     first_user_text = message_text
 
     _att_filenames = [a["filename"] for a in attachment_contents if a.get("filename")] if attachment_contents else []
 
+    # Tools and history are sent as is; per-turn context gets what they leave of the window
+    context_budget = budget_for(_app_config, token_counter)
+    if context_budget is not None:
+        context_budget.reserve("tools", token_counter.count_text(json.dumps(sent_tools)) if sent_tools else 0)
+        context_budget.reserve_history(token_counter.count_messages(ai_messages), compactor.policy.soft_limit)
+
     extra_system_prompt, prompt_meta = await _build_chat_system_prompt(
         ai_service=ai_service,
         tool_registry=tool_registry,
@@ -2089,7 +2363,13 @@ async def chat(conversation_id: str, request: Request) -> Any:
         space_id=space_id,
         attachment_filenames=_att_filenames,
         vec_manager=getattr(request.app.state, "vec_manager", None),
+        prompt_cache=getattr(request.app.state, "prompt_section_cache", None),
+        index_service=getattr(request.app.state, "codebase_index", None),
+        context_budget=context_budget,
     )
+    prompt_meta["context_tokens"] = token_counter.count_messages(ai_messages)
+    if tool_selector is not None and tool_selector.last_hidden:
+        prompt_meta["tool_selection"] = {"sent": tool_selector.last_sent, "hidden": tool_selector.last_hidden}
 
     # Build per-request safety approval context
     pending_approvals = getattr(request.app.state, "pending_approvals", {})
@@ -2115,20 +2395,43 @@ async def chat(conversation_id: str, request: Request) -> Any:
     from ..tools.subagent import SubagentLimiter
 
     _sa_config = getattr(request.app.state.config.safety, "subagent", None)
-    # SECURITY-REVIEW: Limiter is per-request, not global. A single user with
-    # multiple browser tabs can spawn up to max_total * concurrent_requests
-    # sub-agents. Acceptable for a single-user local app; revisit if
-    # multi-user support is added.
+    # SECURITY-REVIEW: Limiter is per-request; the process-wide caps (global,
+    # per-user, token budget per conversation) live in the shared
+    # SubagentScheduler, so extra browser tabs queue instead of multiplying
+    # the number of running sub-agents.
     _subagent_limiter = SubagentLimiter(
         max_concurrent=_sa_config.max_concurrent if _sa_config else 5,
         max_total=_sa_config.max_total if _sa_config else 10,
     )
+    from ..services.subagent_scheduler import PRIORITY_INTERACTIVE, SubagentScheduler
+
+    _subagent_scheduler = getattr(request.app.state, "subagent_scheduler", None)
+    _subagent_schedule = (
+        _subagent_scheduler.scope(user=uid or "", conversation_id=conversation_id, priority=PRIORITY_INTERACTIVE)
+        if isinstance(_subagent_scheduler, SubagentScheduler)
+        else None
+    )
     from ..services.tool_rate_limit import ToolRateLimiter
 
     _rate_limiter = ToolRateLimiter(safety_config.tool_rate_limit if safety_config else None)
     tool_registry.set_rate_limiter(_rate_limiter)
     _subagent_events: dict[str, list[dict[str, Any]]] = {}
 
+    from ..services.tool_scheduler import ToolScheduler
+
+    tool_scheduler = getattr(request.app.state, "tool_scheduler", None)
+    if not isinstance(tool_scheduler, ToolScheduler):
+        tool_scheduler = None
+
+    # Live bash output, streamed to the client while the command runs
+    tool_output_queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=256)
+
+    from ..tools.shell_session import ShellSessionPool
+
+    shell_sessions = getattr(request.app.state, "shell_sessions", None)
+    if not isinstance(shell_sessions, ShellSessionPool):
+        shell_sessions = None
+
     tool_exec_ctx = ToolExecutorContext(
         tool_registry=tool_registry,
         mcp_manager=mcp_manager,
@@ -2145,13 +2448,40 @@ async def chat(conversation_id: str, request: Request) -> Any:
         sa_config=_sa_config,
         request_config=request.app.state.config,
         rate_limiter=_rate_limiter,
+        subagent_schedule=_subagent_schedule,
         skill_registry=req_skill_reg,
         rule_enforcer=req_rule_enf,
+        tool_scheduler=tool_scheduler,
+        tool_output_queue=tool_output_queue,
+        shell_sessions=shell_sessions,
     )
 
     async def _tool_executor(tool_name: str, arguments: dict[str, Any]) -> dict[str, Any]:
         return await _execute_web_tool(tool_exec_ctx, tool_name, arguments)
 
+    from ..tools import ToolRegistry
+
+    speculation_registry: ToolRegistry = tool_registry
+
+    def _can_speculate(tool_name: str, arguments: dict[str, Any]) -> bool:
+        return speculation_registry.can_speculate(tool_name, arguments, rule_enforcer_override=req_rule_enf)
+
+    # History reloaded from the database carries no tool results, so the
+    # cache only needs to live as long as this request's agent loop
+    result_cache = None
+    if getattr(getattr(request.app.state.config, "cli", None), "tool_result_cache", False) is True:
+        from ..config import DEFAULT_EXCLUDE_DIRS
+        from ..services.tool_result_cache import ToolResultCache
+
+        _cache_dir = getattr(tool_registry, "_working_dir", None)
+        _tiers = getattr(safety_config, "tool_tiers", None)
+        _exclude = getattr(getattr(request.app.state.config, "codebase_index", None), "exclude_dirs", None)
+        result_cache = ToolResultCache(
+            working_dir=_cache_dir if isinstance(_cache_dir, str) else None,
+            tier_overrides=_tiers if isinstance(_tiers, dict) else None,
+            exclude_dirs=_exclude if isinstance(_exclude, list) else DEFAULT_EXCLUDE_DIRS,
+        )
+
     stream_ctx = StreamContext(
         ai_service=ai_service,
         ai_messages=ai_messages,
@@ -2180,7 +2510,15 @@ async def chat(conversation_id: str, request: Request) -> Any:
         canvas_needs_approval=_canvas_needs_approval(safety_config, tool_registry),
         request=request,
         prompt_meta=prompt_meta,
+        context_budget=context_budget,
+        history_selector=history_selector,
+        tool_selector=tool_selector,
         user_msg=user_msg,
+        compactor=compactor,
+        can_speculate=_can_speculate,
+        tool_scheduler=tool_scheduler,
+        result_cache=result_cache,
+        tool_output_queue=tool_output_queue,
     )
 
     return EventSourceResponse(_stream_chat_events(stream_ctx))
@@ -2200,6 +2538,25 @@ async def stop_generation(conversation_id: str, request: Request) -> Any:
     return {"status": "stopped"}
 
 
+@router.get("/subagents/queue")
+async def subagent_queue(request: Request, conversation_id: str | None = None) -> Any:
+    """Global sub-agent queue depth and wait times, plus a conversation's token spend."""
+    from ..services.subagent_scheduler import SubagentScheduler
+
+    scheduler = getattr(request.app.state, "subagent_scheduler", None)
+    if not isinstance(scheduler, SubagentScheduler):
+        return {"enabled": False}
+    stats = {"enabled": True, **scheduler.stats()}
+    if conversation_id:
+        _validate_uuid(conversation_id)
+        # Same access check as the conversation routes: the conversation must be in the caller's database
+        if not storage.get_conversation(_get_db(request), conversation_id):
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        stats["conversation_tokens"] = scheduler.conversation_tokens(conversation_id)
+        stats["max_tokens_per_conversation"] = scheduler.max_tokens_per_conversation
+    return stats
+
+
 @router.get("/conversations/{conversation_id}/stream-status")
 async def stream_status(conversation_id: str, request: Request) -> Any:
     _validate_uuid(conversation_id)
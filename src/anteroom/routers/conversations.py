@@ -29,6 +29,7 @@ from ..models import (
 )
 from ..services import storage
 from ..services.export import export_conversation_markdown
+from ..services.response_cache import invalidate_response_cache
 from ..services.rewind import rewind_conversation as rewind_service
 
 router = APIRouter(tags=["conversations"])
@@ -238,6 +239,13 @@ async def delete_conversation(conversation_id: str, request: Request) -> None:
     deleted = storage.delete_conversation(db, conversation_id, data_dir)
     if not deleted:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    invalidate_response_cache(data_dir)
+
+    from ..tools.shell_session import ShellSessionPool
+
+    shell_sessions = getattr(request.app.state, "shell_sessions", None)
+    if isinstance(shell_sessions, ShellSessionPool):
+        await shell_sessions.close(conversation_id)
 
     event_bus = _get_event_bus(request)
     if event_bus:
@@ -272,7 +280,7 @@ async def create_entry(conversation_id: str, body: EntryCreate, request: Request
 
     _embedding_worker = getattr(request.app.state, "embedding_worker", None)
     if _embedding_worker:
-        asyncio.create_task(_embedding_worker.embed_message(msg["id"], body.content, conversation_id))
+        _embedding_worker.enqueue_message(msg["id"], body.content, conversation_id)
 
     event_bus = _get_event_bus(request)
     if event_bus:
@@ -0,0 +1,83 @@
+"""Background job queue API: backlog, failures and throughput, plus retry/cancel."""
+
+from __future__ import annotations
+
+import uuid
+from typing import TYPE_CHECKING, Any
+
+from fastapi import APIRouter, HTTPException, Query, Request
+
+from ..services import job_storage
+
+if TYPE_CHECKING:
+    from ..services.job_queue import JobQueue
+
+router = APIRouter(tags=["jobs"])
+
+
+def _validate_uuid(value: str) -> str:
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+    return value
+
+
+def _get_queue(request: Request) -> JobQueue:
+    queue: JobQueue | None = getattr(request.app.state, "job_queue", None)
+    if queue is None:
+        raise HTTPException(status_code=503, detail="Job queue is not running")
+    return queue
+
+
+@router.get("/jobs")
+async def get_jobs(
+    request: Request,
+    status: str | None = Query(default=None, pattern="^(queued|running|succeeded|dead|cancelled)$"),
+    job_type: str | None = Query(default=None, max_length=64),
+    window: int = Query(default=3600, ge=60, le=86400 * 7),
+    limit: int = Query(default=50, ge=1, le=200),
+    offset: int = Query(default=0, ge=0),
+) -> dict[str, Any]:
+    """Queue statistics for the last *window* seconds and the most recently updated jobs.
+
+    Without a *status* filter the job list shows dead-lettered jobs, the ones
+    that need attention.
+    """
+    queue = _get_queue(request)
+    stats = queue.stats(window_seconds=window)
+    stats["jobs"] = job_storage.list_jobs(
+        request.app.state.db, status=status or "dead", job_type=job_type, limit=limit, offset=offset
+    )
+    return stats
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(request: Request, job_id: str) -> dict[str, Any]:
+    _validate_uuid(job_id)
+    _get_queue(request)
+    job = job_storage.get_job(request.app.state.db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_job(request: Request, job_id: str) -> dict[str, Any]:
+    """Requeue a dead-lettered or cancelled job with a fresh attempt budget."""
+    _validate_uuid(job_id)
+    _get_queue(request)
+    job = job_storage.retry_job(request.app.state.db, job_id)
+    if not job:
+        raise HTTPException(status_code=409, detail="Only dead or cancelled jobs can be retried")
+    return job
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(request: Request, job_id: str) -> dict[str, str]:
+    """Cancel a job that has not started yet."""
+    _validate_uuid(job_id)
+    _get_queue(request)
+    if not job_storage.cancel_job(request.app.state.db, job_id):
+        raise HTTPException(status_code=409, detail="Only queued jobs can be cancelled")
+    return {"status": "cancelled"}
@@ -124,6 +124,9 @@ def _reload_registries_only(request: Request, db: Any) -> None:
     skill_registry = getattr(request.app.state, "skill_registry", None)
     if skill_registry is not None and registry is not None:
         skill_registry.load_from_artifacts(registry)
+    space_cache = getattr(request.app.state, "space_registry_cache", None)
+    if space_cache is not None:
+        space_cache.invalidate()
 
 
 def _reload_registries(request: Request, db: Any) -> None:
@@ -5,12 +5,20 @@ OpenAI SDK can route requests through Anteroom to the configured upstream API.
 
 This is a passthrough proxy — requests are forwarded as-is with minimal
 transformation.  Auth uses the same Bearer token as the rest of Anteroom.
+
+/v1/embeddings is served by Anteroom's own embedding service (the local
+fastembed model, or the configured upstream embeddings API) through a shared
+batcher, so other tools on the same machine reuse one warm model.
 """
 
 from __future__ import annotations
 
+import base64
+import hashlib
 import json
 import logging
+import math
+import struct
 import time
 import uuid
 from typing import Any
@@ -18,6 +26,8 @@ from typing import Any
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse, StreamingResponse
 
+from ..services.embeddings import EmbeddingPermanentError, EmbeddingTransientError
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["proxy"])
@@ -30,19 +40,23 @@ def _get_ai_service(request: Request) -> Any:
 
 @router.get("/models")
 async def list_models(request: Request) -> JSONResponse:
-    """Return the configured model as an OpenAI-compatible models list."""
+    """Return the configured models as an OpenAI-compatible models list."""
     config = request.app.state.config
-    model = config.ai.model
+    model_ids = [config.ai.model]
+    batcher = getattr(request.app.state, "proxy_embedding_batcher", None)
+    if batcher is not None and batcher.model not in model_ids:
+        model_ids.append(batcher.model)
     return JSONResponse(
         content={
             "object": "list",
             "data": [
                 {
-                    "id": model,
+                    "id": model_id,
                     "object": "model",
                     "created": 0,
                     "owned_by": "anteroom-proxy",
                 }
+                for model_id in model_ids
             ],
         }
     )
@@ -143,3 +157,120 @@ async def _handle_streaming(ai_service: Any, kwargs: dict) -> StreamingResponse:
             "X-Accel-Buffering": "no",
         },
     )
+
+
+_MAX_EMBEDDING_INPUTS = 2048
+
+
+def _rate_limit_key(request: Request) -> str:
+    """Identify the caller for per-key rate limiting.
+
+    Uses the presented credential (Bearer token or session cookie) so each
+    API key gets its own window; falls back to the client IP.
+    """
+    auth = request.headers.get("authorization", "")
+    if auth:
+        return "key:" + hashlib.sha256(auth.encode()).hexdigest()[:16]
+    cookie = request.cookies.get("anteroom_session", "")
+    if cookie:
+        return "cookie:" + hashlib.sha256(cookie.encode()).hexdigest()[:16]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+def _encode_base64(vec: list[float]) -> str:
+    return base64.b64encode(struct.pack(f"<{len(vec)}f", *vec)).decode("ascii")
+
+
+@router.post("/embeddings")
+async def embeddings(request: Request) -> JSONResponse:
+    """Create embeddings with Anteroom's embedding model (OpenAI-compatible)."""
+    content_type = request.headers.get("content-type", "")
+    if "application/json" not in content_type:
+        return JSONResponse(status_code=415, content={"error": {"message": "Content-Type must be application/json"}})
+
+    batcher = getattr(request.app.state, "proxy_embedding_batcher", None)
+    if batcher is None:
+        return JSONResponse(
+            status_code=503,
+            content={"error": {"message": "Embeddings are not enabled on this server"}},
+        )
+
+    limiter = getattr(request.app.state, "proxy_embedding_rate_limiter", None)
+    if limiter is not None:
+        retry_after = limiter.check(_rate_limit_key(request))
+        if retry_after > 0:
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Embedding rate limit exceeded", "type": "rate_limit_exceeded"}},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse(status_code=400, content={"error": {"message": "Invalid JSON body"}})
+
+    if not isinstance(body, dict):
+        return JSONResponse(status_code=400, content={"error": {"message": "Request body must be a JSON object"}})
+
+    raw_input = body.get("input")
+    if isinstance(raw_input, str):
+        texts = [raw_input]
+    elif isinstance(raw_input, list) and raw_input and all(isinstance(t, str) for t in raw_input):
+        texts = list(raw_input)
+    else:
+        return JSONResponse(
+            status_code=400,
+            content={"error": {"message": "'input' must be a string or a non-empty array of strings"}},
+        )
+    if len(texts) > _MAX_EMBEDDING_INPUTS:
+        return JSONResponse(
+            status_code=400,
+            content={"error": {"message": f"'input' may contain at most {_MAX_EMBEDDING_INPUTS} items"}},
+        )
+    if any(not t.strip() for t in texts):
+        return JSONResponse(status_code=400, content={"error": {"message": "'input' items must not be empty"}})
+
+    encoding_format = body.get("encoding_format", "float")
+    if encoding_format not in ("float", "base64"):
+        return JSONResponse(
+            status_code=400,
+            content={"error": {"message": "'encoding_format' must be 'float' or 'base64'"}},
+        )
+
+    dimensions = body.get("dimensions")
+    if dimensions is not None and dimensions != batcher.dimensions:
+        return JSONResponse(
+            status_code=400,
+            content={"error": {"message": f"This server only serves {batcher.dimensions}-dimensional embeddings"}},
+        )
+
+    try:
+        vectors = await batcher.embed(texts)
+    except EmbeddingTransientError:
+        logger.warning("Proxy embedding request failed (transient)", exc_info=True)
+        return JSONResponse(
+            status_code=503,
+            content={"error": {"message": "Embedding model temporarily unavailable"}},
+            headers={"Retry-After": "1"},
+        )
+    except EmbeddingPermanentError:
+        logger.exception("Proxy embedding request failed")
+        return JSONResponse(status_code=502, content={"error": {"message": "Embedding backend error"}})
+
+    data: list[dict[str, Any]] = []
+    for i, vec in enumerate(vectors):
+        if vec is None:
+            return JSONResponse(status_code=502, content={"error": {"message": "Embedding backend error"}})
+        embedding: list[float] | str = _encode_base64(vec) if encoding_format == "base64" else vec
+        data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+    prompt_tokens = sum(max(1, len(t) // 4) for t in texts)
+    return JSONResponse(
+        content={
+            "object": "list",
+            "data": data,
+            "model": batcher.model,
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+        }
+    )
@@ -103,6 +103,13 @@ def _validate_uuid(value: str, label: str = "ID") -> None:
         raise HTTPException(status_code=400, detail=f"Invalid {label} format")
 
 
+def _invalidate_space_registries(request: Request, space_id: str | None) -> None:
+    """Drop cached per-space chat registries after the space's packs or paths change."""
+    cache = getattr(request.app.state, "space_registry_cache", None)
+    if cache is not None and space_id:
+        cache.invalidate(space_id)
+
+
 def _enrich_origin(space: dict[str, Any]) -> dict[str, Any]:
     sf = space.get("source_file", "")
     space["origin"] = "local" if (sf and is_local_space(sf)) else "global"
@@ -168,6 +175,7 @@ async def api_update_space(request: Request, space_id: str, body: SpaceUpdateReq
 async def api_delete_space(request: Request, space_id: str) -> None:
     if not db_delete_space(_get_db(request), space_id):
         raise HTTPException(status_code=404, detail="Space not found")
+    _invalidate_space_registries(request, space_id)
 
 
 @router.get("/spaces/{space_id}/paths")
@@ -211,6 +219,7 @@ async def api_refresh_space(request: Request, space_id: str) -> dict[str, Any]:
     updated = update_space(db, space_id, **updates)
     if not updated:
         raise HTTPException(status_code=404, detail="Space not found")
+    _invalidate_space_registries(request, space_id)
     result = _enrich_origin(updated)
     result["refreshed"] = True
     return result
@@ -253,6 +262,7 @@ async def api_sync_space(request: Request) -> dict[str, Any]:
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid space configuration")
 
+    _invalidate_space_registries(request, space.get("id"))
     return _enrich_origin(space)
 
 
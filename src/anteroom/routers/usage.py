@@ -8,6 +8,10 @@ from typing import Any
 from fastapi import APIRouter, Query, Request
 
 from ..services import storage
+from ..services.endpoint_pool import endpoint_stats
+from ..services.request_hedging import hedge_stats
+from ..services.response_cache import response_cache_stats
+from ..services.task_routing import task_stats
 
 router = APIRouter(tags=["usage"])
 
@@ -47,12 +51,17 @@ async def get_usage(
         total_completion = sum(s.get("completion_tokens", 0) or 0 for s in stats)
         total_tokens = sum(s.get("total_tokens", 0) or 0 for s in stats)
         total_messages = sum(s.get("message_count", 0) or 0 for s in stats)
+        total_cache_read = sum(s.get("cache_read_tokens", 0) or 0 for s in stats)
+        total_cache_write = sum(s.get("cache_write_tokens", 0) or 0 for s in stats)
+        total_hedge = sum(s.get("hedge_tokens", 0) or 0 for s in stats)
 
         total_cost = 0.0
         for s in stats:
             model = s.get("model", "") or ""
             prompt_t = s.get("prompt_tokens", 0) or 0
             completion_t = s.get("completion_tokens", 0) or 0
+            # Prompts of cancelled hedge requests are billed at the input rate
+            prompt_t += s.get("hedge_tokens", 0) or 0
             costs = usage_cfg.model_costs.get(model, {})
             input_rate = costs.get("input", 0.0)
             output_rate = costs.get("output", 0.0)
@@ -62,14 +71,22 @@ async def get_usage(
             "prompt_tokens": total_prompt,
             "completion_tokens": total_completion,
             "total_tokens": total_tokens,
+            "cache_read_tokens": total_cache_read,
+            "cache_write_tokens": total_cache_write,
+            "hedge_tokens": total_hedge,
             "message_count": total_messages,
             "estimated_cost": round(total_cost, 4),
+            # Cached responses are not tied to a conversation
+            "response_cache": None if conversation_id else response_cache_stats(config.app.data_dir, since),
             "by_model": [
                 {
                     "model": s.get("model", "unknown"),
                     "prompt_tokens": s.get("prompt_tokens", 0) or 0,
                     "completion_tokens": s.get("completion_tokens", 0) or 0,
                     "total_tokens": s.get("total_tokens", 0) or 0,
+                    "cache_read_tokens": s.get("cache_read_tokens", 0) or 0,
+                    "cache_write_tokens": s.get("cache_write_tokens", 0) or 0,
+                    "hedge_tokens": s.get("hedge_tokens", 0) or 0,
                     "message_count": s.get("message_count", 0) or 0,
                 }
                 for s in stats
@@ -77,3 +94,24 @@ async def get_usage(
         }
 
     return results
+
+
+@router.get("/usage/tasks")
+async def get_task_usage(request: Request) -> dict[str, Any]:
+    """Per-task-class model routing statistics since this process started."""
+    return {
+        "routes": {task: route.model for task, route in request.app.state.config.ai.task_models.items()},
+        "tasks": task_stats.snapshot(),
+    }
+
+
+@router.get("/usage/hedging")
+async def get_hedging_usage(request: Request) -> dict[str, Any]:
+    """Request hedging statistics per endpoint and model since this process started."""
+    return {"enabled": request.app.state.config.ai.hedge_requests, "endpoints": hedge_stats()}
+
+
+@router.get("/usage/endpoints")
+async def get_endpoint_usage() -> dict[str, Any]:
+    """Load-balancing state of each ``ai.endpoints`` entry: circuit, load, EWMA latency and error rate."""
+    return {"endpoints": endpoint_stats()}
@@ -6,12 +6,25 @@ import asyncio
 import json
 import logging
 import time
+from collections.abc import Callable
+from contextvars import ContextVar
 from dataclasses import dataclass
-from typing import Any, AsyncGenerator
+from typing import TYPE_CHECKING, Any, AsyncGenerator
 
+from . import request_deadline
 from .ai_service import AIService
 from .context_trust import wrap_untrusted
+from .speculative_tools import SpeculativeToolRunner
+from .task_routing import TASK_SUMMARIZE
 from .token_budget import BudgetCheckResult, check_all_budgets
+from .tool_selection import LOAD_ALL_TOOLS
+
+if TYPE_CHECKING:
+    from .context_compactor import ContextCompactor
+    from .history_selection import HistorySelector
+    from .tool_result_cache import ToolResultCache
+    from .tool_scheduler import ToolScheduler
+    from .tool_selection import ToolSelector
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +37,6 @@ class AgentEvent:
 
 _DEFAULT_TOOL_OUTPUT_MAX_CHARS = 2000
 _DEFAULT_TOOL_TIMEOUT = 300  # 5 minutes hard cap per tool execution
-_PROACTIVE_COMPACTION_THRESHOLD = 80  # compact when messages exceed this count
 
 
 def _truncate_large_tool_outputs(
@@ -150,6 +162,8 @@ async def _compact_messages(
         result = await ai_service.complete(
             messages=[{"role": "user", "content": summary_prompt}],
             max_completion_tokens=1000,
+            cacheable=True,
+            task=TASK_SUMMARIZE,
         )
         summary = result or "Conversation summary unavailable."
     except Exception:
@@ -168,6 +182,11 @@ async def _compact_messages(
     return True
 
 
+# Id of the tool call being executed, so tool executors can attribute live
+# output (e.g. streaming bash progress) to the right call
+current_tool_call_id: ContextVar[str | None] = ContextVar("current_tool_call_id", default=None)
+
+
 async def _execute_tool(
     tc: dict[str, Any],
     tool_executor: Any,
@@ -177,16 +196,28 @@ async def _execute_tool(
     """Execute a single tool call, returning (tool_call, result, status).
 
     A hard timeout prevents any single tool (including MCP tools) from
-    hanging the entire agent loop indefinitely.
+    hanging the entire agent loop indefinitely.  It is shortened to the time
+    left before the request deadline, if any.
     """
+    timeout = request_deadline.bound(timeout)
+    if timeout <= 0:
+        return tc, {"error": "Request deadline exceeded; tool not run"}, "timeout"
+    # Tasks created below copy the context, so the executor sees this call's id
+    token = current_tool_call_id.set(tc.get("id"))
     try:
         if cancel_event:
             cancel_task = asyncio.create_task(cancel_event.wait())
             exec_task = asyncio.create_task(tool_executor(tc["function_name"], tc["arguments"]))
             timeout_task = asyncio.create_task(asyncio.sleep(timeout))
-            done, pending = await asyncio.wait(
-                {cancel_task, exec_task, timeout_task}, return_when=asyncio.FIRST_COMPLETED
-            )
+            try:
+                done, pending = await asyncio.wait(
+                    {cancel_task, exec_task, timeout_task}, return_when=asyncio.FIRST_COMPLETED
+                )
+            except asyncio.CancelledError:
+                # Cancelled from outside (e.g. a discarded speculative call): stop the tool too
+                for t in (cancel_task, exec_task, timeout_task):
+                    t.cancel()
+                raise
             for p in pending:
                 p.cancel()
                 try:
@@ -209,6 +240,8 @@ async def _execute_tool(
         return tc, {"error": f"Tool execution timed out after {int(timeout)}s"}, "timeout"
     except Exception as e:
         return tc, {"error": str(e)}, "error"
+    finally:
+        current_tool_call_id.reset(token)
 
 
 _NARRATION_PROMPT = (
@@ -238,13 +271,72 @@ async def run_agent_loop(
     max_line_repeats: int = 5,
     serialize_tools: bool = False,
     pause_signal: asyncio.Event | None = None,
+    compactor: ContextCompactor | None = None,
+    can_speculate: Callable[[str, dict[str, Any]], bool] | None = None,
+    tool_scheduler: ToolScheduler | None = None,
+    result_cache: ToolResultCache | None = None,
+    history_selector: HistorySelector | None = None,
+    tool_selector: ToolSelector | None = None,
 ) -> AsyncGenerator[AgentEvent, None]:
     """Run the agentic tool-call loop, yielding events.
 
     tool_executor must be an async callable: (tool_name, arguments) -> dict
     budget_config: BudgetConfig dataclass (or None to disable).
     get_token_totals: async callable() -> (conversation_total, daily_total)
+    compactor: keeps *messages* within the context window.  Callers that own
+    a long-lived compactor get background summaries; without one, a
+    default-policy compactor compacts (blocking) only at its hard limit.
+    can_speculate: predicate (tool_name, arguments) -> bool.  When given,
+    eligible tool calls start as soon as the provider reports their
+    arguments complete, while the model is still streaming the rest of the
+    turn (parallel execution only; ignored with serialize_tools).
+    tool_scheduler: orders conflicting tool calls within a turn and applies
+    concurrency caps.  Share one across loops so the per-tool and per-server
+    caps hold process-wide (``max_parallel`` is per run); without one,
+    conflicting calls are still ordered but nothing is capped.
+    result_cache: per-conversation cache of read-only tool results.  Repeated
+    reads/searches whose files are unchanged get a short "unchanged since
+    call X" result instead of the full output again.
+    history_selector: instead of compacting, send each call the recent turns
+    plus the older messages most relevant to the current request that fit
+    the compactor's soft limit; *messages* keeps the full history.  The
+    compactor still runs when the recent turns alone do not fit.
+    tool_selector: send the pinned tools plus the ones most relevant to the
+    latest user messages instead of all of *tools_openai*, with a
+    ``load_all_tools`` meta-tool that switches to the full list for the
+    rest of the run.
     """
+    if compactor is None:
+        from .context_compactor import ContextCompactor
+
+        compactor = ContextCompactor(ai_service, background=False)
+    if tool_selector is not None and tools_openai:
+        tools_openai = await tool_selector.select(tools_openai, messages)
+    compactor.reserve(extra_system_prompt, tools_openai)
+    if tool_scheduler is None:
+        from .tool_scheduler import ToolScheduler
+
+        tool_scheduler = ToolScheduler()
+    # Concurrency caps are taken inside the tool timeout; max_parallel counts this run's calls
+    limited_executor = tool_scheduler.limit(tool_executor)
+    # Tool call ids whose results are in *messages* as sent to the model this turn
+    visible_results: set[str] = set()
+
+    async def _run_tool(tc: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any], str]:
+        if tool_selector is not None and tc["function_name"] == LOAD_ALL_TOOLS:
+            return tc, tool_selector.expand(), "success"
+        if result_cache is not None:
+            cached = result_cache.lookup(tc["function_name"], tc["arguments"], visible_results)
+            if cached is not None:
+                return tc, cached, "success"
+        tc, result, tool_status = await _execute_tool(tc, limited_executor, cancel_event)
+        if result_cache is not None:
+            result_cache.record(tc["function_name"], tc["arguments"], tc["id"], result, tool_status)
+        return tc, result, tool_status
+
+    speculation: SpeculativeToolRunner | None = None
+    if can_speculate is not None and not serialize_tools:
+        speculation = SpeculativeToolRunner(_run_tool, can_speculate)
     iteration = 0
     context_recovery_attempts = 0
     max_context_recoveries = 2  # truncate once, compact once
@@ -258,6 +350,19 @@ async def run_agent_loop(
     while iteration < max_iterations:
         iteration += 1
         _iter_start = time.monotonic()
+        if tool_selector is not None and tool_selector.expanded and tools_openai is not tool_selector.catalog:
+            tools_openai = tool_selector.catalog
+            compactor.reserve(extra_system_prompt, tools_openai)
+        if request_deadline.expired():
+            yield AgentEvent(
+                kind="error",
+                data={
+                    "message": "Request deadline exceeded",
+                    "code": "deadline_exceeded",
+                    "retryable": False,
+                },
+            )
+            return
         tool_calls_pending: list[dict[str, Any]] = []
         assistant_content = ""
         got_context_error = False
@@ -333,20 +438,35 @@ async def run_agent_loop(
                         },
                     )
 
-        # Proactive compaction: compact before hitting the API context limit
-        if len(messages) >= _PROACTIVE_COMPACTION_THRESHOLD:
-            logger.info(
-                "Proactive compaction triggered: %d messages (threshold %d)",
-                len(messages),
-                _PROACTIVE_COMPACTION_THRESHOLD,
-            )
-            yield AgentEvent(
-                kind="token",
-                data={"content": "\n\n*Compacting conversation history to stay within context limits...*\n\n"},
+        # Relevance-based selection sends a subset and leaves *messages* whole
+        request_messages = messages
+        if history_selector is not None:
+            request_messages = await history_selector.select(
+                messages, compactor.policy.soft_limit - compactor.usage([])
             )
-            if await _compact_messages(ai_service, messages):
+
+        # Token-budget compaction: swap in finished background summaries, and
+        # only wait for one when the hard limit would otherwise be exceeded
+        if request_messages is messages:
+            _swapped = compactor.apply_ready(messages)
+            _waits_before = compactor.blocking_waits
+            if compactor.usage(messages) >= compactor.policy.hard_limit:
+                yield AgentEvent(
+                    kind="token",
+                    data={"content": "\n\n*Compacting conversation history to stay within context limits...*\n\n"},
+                )
+            if await compactor.ensure_fits(messages) or _swapped:
+                logger.info(
+                    "Context compacted to %d messages (blocking waits: %d)",
+                    len(messages),
+                    compactor.blocking_waits - _waits_before,
+                )
                 yield AgentEvent(kind="compaction", data={"new_message_count": len(messages)})
 
+        if result_cache is not None:
+            visible_results.clear()
+            visible_results.update(m["tool_call_id"] for m in request_messages if "tool_call_id" in m)
+
         yield AgentEvent(kind="thinking", data={})
 
         _dlp_blocked = False
@@ -358,7 +478,7 @@ async def run_agent_loop(
         _first_token_logged = False
         logger.debug("agent_loop ai_call_start iteration=%d", iteration)
         async for event in ai_service.stream_chat(
-            messages,
+            request_messages,
             tools=tools_openai,
             cancel_event=cancel_event,
             extra_system_prompt=extra_system_prompt,
@@ -428,12 +548,16 @@ async def run_agent_loop(
                 )
             elif etype == "tool_call_args_delta":
                 yield AgentEvent(kind="tool_call_args_delta", data=event["data"])
+            elif etype == "tool_call_ready":
+                if speculation is not None:
+                    speculation.offer(event["data"])
             elif etype == "phase":
                 yield AgentEvent(kind="phase", data=event["data"])
             elif etype == "retrying":
                 yield AgentEvent(kind="retrying", data=event["data"])
             elif etype == "usage":
-                request_tokens += event["data"].get("total_tokens", 0)
+                # Hedged duplicates were billed too
+                request_tokens += event["data"].get("total_tokens", 0) + event["data"].get("hedge_tokens", 0)
                 yield AgentEvent(kind="usage", data=event["data"])
             elif etype == "error":
                 if (
@@ -447,6 +571,12 @@ async def run_agent_loop(
             elif etype == "done":
                 break
 
+        # Speculative results only count for a turn whose tool calls will run
+        if speculation is not None and (
+            _dlp_blocked or got_context_error or not tool_calls_pending or (cancel_event and cancel_event.is_set())
+        ):
+            speculation.discard_all()
+
         if _dlp_blocked:
             return
 
@@ -472,6 +602,9 @@ async def run_agent_loop(
 
             # Strategy 1: truncate oversized tool outputs and let the AI retry with smaller params
             if _truncate_large_tool_outputs(messages, max_chars=tool_output_max_chars):
+                if result_cache is not None:
+                    # Earlier results are no longer complete; repeats must re-run
+                    result_cache.clear()
                 yield AgentEvent(
                     kind="token",
                     data={
@@ -595,6 +728,8 @@ async def run_agent_loop(
         if output_filter is not None and output_filter.enabled and assistant_content:
             assistant_content, of_result = output_filter.apply(assistant_content)
             if of_result.matched and of_result.action == "block":
+                if speculation is not None:
+                    speculation.discard_all()
                 yield AgentEvent(
                     kind="output_filter_blocked",
                     data={"matches": [m.rule_name for m in of_result.matches]},
@@ -642,6 +777,8 @@ async def run_agent_loop(
             [tc["function_name"] for tc in tool_calls_pending],
         )
         if cancel_event and cancel_event.is_set():
+            if speculation is not None:
+                speculation.discard_all()
             for tc in tool_calls_pending:
                 cancelled_result = {"error": "Cancelled by user"}
                 yield AgentEvent(
@@ -665,7 +802,7 @@ async def run_agent_loop(
             # block). Full step isolation is handled by the workflow engine
             # (Phase 3) via session isolation per step.
             for tc in tool_calls_pending:
-                tc, result, tool_status = await _execute_tool(tc, tool_executor, cancel_event)
+                tc, result, tool_status = await _run_tool(tc)
 
                 # Check pause signal BEFORE processing this tool's result.
                 if pause_signal and pause_signal.is_set():
@@ -741,14 +878,28 @@ async def run_agent_loop(
                 time.monotonic() - _tools_start,
             )
         else:
-            # Parallel tool execution (default — existing behavior, untouched)
-            tasks = [asyncio.create_task(_execute_tool(tc, tool_executor, cancel_event)) for tc in tool_calls_pending]
+            # Parallel tool execution: conflicting calls run in order, independent
+            # ones concurrently; calls already started speculatively are reused
+            started: dict[int, asyncio.Task[Any]] = {}
+            speculative_ids: set[str] = set()
+            if speculation is not None:
+                for i, tc in enumerate(tool_calls_pending):
+                    claimed = speculation.claim(tc)
+                    if claimed is not None:
+                        speculative_ids.add(tc["id"])
+                        started[i] = claimed
+                speculation.discard_all()
+            tasks = tool_scheduler.schedule(
+                tool_calls_pending,
+                _run_tool,
+                started=started,
+            )
             for coro in asyncio.as_completed(tasks):
                 tc, result, tool_status = await coro
-                yield AgentEvent(
-                    kind="tool_call_end",
-                    data={"id": tc["id"], "tool_name": tc["function_name"], "output": result, "status": tool_status},
-                )
+                end_data = {"id": tc["id"], "tool_name": tc["function_name"], "output": result, "status": tool_status}
+                if tc["id"] in speculative_ids:
+                    end_data["speculative"] = True
+                yield AgentEvent(kind="tool_call_end", data=end_data)
                 # Strip internal metadata before sending to the LLM
                 # _approval_decision: safety gate audit field
                 # _old_content/_new_content: large strings for diff rendering only
@@ -808,9 +959,10 @@ async def run_agent_loop(
             total_tool_calls += len(tool_calls_pending)
             consecutive_text_only = 0
             logger.debug(
-                "agent_loop tool_exec_done iteration=%d count=%d elapsed=%.2fs",
+                "agent_loop tool_exec_done iteration=%d count=%d speculative=%d elapsed=%.2fs",
                 iteration,
                 len(tool_calls_pending),
+                len(speculative_ids),
                 time.monotonic() - _tools_start,
             )
 
@@ -828,9 +980,9 @@ async def run_agent_loop(
             auto_plan_suggested = True
             yield AgentEvent(kind="auto_plan_suggest", data={"tool_calls": total_tool_calls})
 
-        # Enforce narration cadence: inject an ephemeral prompt to force a progress update.
-        # The injected message is removed from history immediately after the narration response
-        # so it does not pollute the conversation context for subsequent tool calls.
+        # Enforce narration cadence: send an ephemeral prompt to force a progress update.
+        # The prompt is only added to the request, never to *messages*, so it does not
+        # pollute the conversation context for subsequent tool calls.
         if (
             narration_cadence > 0
             and total_tool_calls > 0
@@ -838,11 +990,15 @@ async def run_agent_loop(
             and not (cancel_event and cancel_event.is_set())
         ):
             yield AgentEvent(kind="thinking", data={})
-            narration_idx = len(messages)
-            messages.append({"role": "user", "content": _NARRATION_PROMPT})
             try:
+                narration_messages = messages
+                if history_selector is not None:
+                    # The same selection a regular call gets, including this iteration's tool results
+                    narration_messages = await history_selector.select(
+                        messages, compactor.policy.soft_limit - compactor.usage([])
+                    )
                 async for event in ai_service.stream_chat(
-                    messages,
+                    [*narration_messages, {"role": "user", "content": _NARRATION_PROMPT}],
                     cancel_event=cancel_event,
                     extra_system_prompt=extra_system_prompt,
                 ):
@@ -852,10 +1008,6 @@ async def run_agent_loop(
                         break
             except Exception:
                 logger.exception("Narration request failed; continuing without update")
-            finally:
-                # Remove by index — safer than content equality if stream_chat mutated messages
-                if len(messages) > narration_idx:
-                    messages.pop(narration_idx)
 
         assistant_content = ""
 
@@ -3,12 +3,12 @@
 from __future__ import annotations
 
 import asyncio
+import dataclasses
 import json
 import logging
 import time
 from typing import Any, AsyncGenerator
 
-import httpx
 from openai import (
     APIConnectionError,
     APIStatusError,
@@ -20,8 +20,12 @@ from openai import (
 )
 
 from ..config import AIConfig
+from . import endpoint_pool, request_deadline, request_hedging, response_cache, task_routing
 from .egress_allowlist import check_egress_allowed
 from .error_sanitizer import sanitize_provider_error
+from .http_pool import http_clients
+from .prompt_sections import compose_system_prompt
+from .speculative_tools import tool_call_ready_event
 from .token_provider import TokenProvider, TokenProviderError
 
 logger = logging.getLogger(__name__)
@@ -35,6 +39,18 @@ class _StreamTimeoutError(Exception):
     """Raised when the stream stalls mid-response after first token was received."""
 
 
+# First-chunk placeholder for a stream that ended before producing anything
+_EMPTY_STREAM = object()
+
+
+async def _close_stream(stream: Any) -> None:
+    if hasattr(stream, "close"):
+        try:
+            await asyncio.wait_for(stream.close(), timeout=2.0)
+        except (asyncio.TimeoutError, Exception):
+            pass
+
+
 def _is_html_error(exc: Exception) -> bool:
     """Check if an API error contains an HTML response instead of JSON."""
     msg = str(exc).lower()
@@ -62,64 +78,88 @@ def create_ai_service(config: AIConfig) -> "AIService":
 
 
 class AIService:
+    # Set when ai.endpoints lists more than one endpoint
+    _endpoint_pool: endpoint_pool.EndpointPool | None = None
+
     def __init__(self, config: AIConfig, token_provider: TokenProvider | None = None) -> None:
         self.config = config
         self._token_provider = token_provider
         self._validate_egress()
+        self._endpoint_pool = endpoint_pool.pool_for(config)
         self._build_client()
 
     def _validate_egress(self) -> None:
-        """Validate base_url against egress domain allowlist. Raises ValueError if blocked."""
-        if not check_egress_allowed(
-            self.config.base_url,
-            self.config.allowed_domains,
-            block_localhost=self.config.block_localhost_api,
-        ):
-            logger.debug(
-                "Egress blocked for %s (allowed: %s, block_localhost: %s)",
-                self.config.base_url,
+        """Validate base_url (and ai.endpoints) against egress domain allowlist. Raises ValueError if blocked."""
+        for url in endpoint_pool.endpoint_urls(self.config) or [self.config.base_url]:
+            if not check_egress_allowed(
+                url,
                 self.config.allowed_domains,
-                self.config.block_localhost_api,
-            )
-            raise ValueError("Egress blocked: the configured base_url is not permitted by the egress allowlist.")
+                block_localhost=self.config.block_localhost_api,
+            ):
+                logger.debug(
+                    "Egress blocked for %s (allowed: %s, block_localhost: %s)",
+                    url,
+                    self.config.allowed_domains,
+                    self.config.block_localhost_api,
+                )
+                raise ValueError("Egress blocked: the configured base_url is not permitted by the egress allowlist.")
 
-    def _build_client(self) -> None:
+    def _build_client(self, *, reset_pool: bool = True) -> None:
         """Build (or rebuild) the AsyncOpenAI client with the current API key.
 
-        Closes the old client's HTTP connection pool to prevent resource leaks.
+        The HTTP connection pool comes from the process-wide ``http_clients``
+        registry and is shared with every other service for the same endpoint.
+        By default (after connection-level errors) the current pool is retired
+        so the retry starts on fresh connections; credential rotation passes
+        ``reset_pool=False`` and keeps the warm pool unless another service
+        has retired it meanwhile.
         """
-        old_client = getattr(self, "client", None)
-        if old_client is not None:
-            try:
-                old_http = getattr(old_client, "_client", None)
-                if old_http and hasattr(old_http, "close"):
-                    # Schedule async close without blocking; best-effort cleanup
-                    try:
-                        loop = asyncio.get_running_loop()
-                        task = loop.create_task(old_http.close())
-                        task.add_done_callback(lambda t: t.exception() if not t.cancelled() else None)
-                    except RuntimeError:
-                        pass  # No running loop (e.g. during __init__)
-            except Exception:
-                logger.debug("Failed to close old HTTP client", exc_info=True)
-
-        api_key = self._resolve_api_key()
-        timeout = httpx.Timeout(
-            connect=float(self.config.connect_timeout),
-            read=float(self.config.request_timeout),
-            write=float(self.config.write_timeout),
-            pool=float(self.config.pool_timeout),
-        )
-        # SECURITY-REVIEW: verify=False only when user explicitly sets verify_ssl: false in config
-        new_http_client = httpx.AsyncClient(
-            verify=self.config.verify_ssl,
-            timeout=timeout,
-        )
+        old_http = getattr(self, "_http_client", None)
+        if old_http is not None and not reset_pool and not http_clients.is_retired(old_http):
+            http_client = old_http
+        else:
+            if old_http is not None:
+                http_clients.retire(old_http)
+            http_client = http_clients.get(self.config)
+        self._http_client = http_client
         self.client = AsyncOpenAI(
             base_url=self.config.base_url,
-            api_key=api_key,
-            http_client=new_http_client,
+            api_key=self._resolve_api_key(),
+            http_client=http_client,
         )
+        # Clients for the other ai.endpoints are rebuilt lazily (with the current key)
+        self._endpoint_clients: dict[str, tuple[AsyncOpenAI, Any]] = {}
+
+    def _client_for(self, endpoint: str | None) -> AsyncOpenAI:
+        """The SDK client for *endpoint* (None or ``base_url``: the main client)."""
+        if endpoint is None or endpoint == self.config.base_url:
+            http_client = getattr(self, "_http_client", None)
+            if http_client is not None and http_clients.is_retired(http_client):
+                # Another service sharing the pool retired it after a connection error
+                self._build_client(reset_pool=False)
+            return self.client
+        entry = self._endpoint_clients.get(endpoint)
+        if entry is None or http_clients.is_retired(entry[1]):
+            http_client = http_clients.get(dataclasses.replace(self.config, base_url=endpoint))
+            client = AsyncOpenAI(base_url=endpoint, api_key=self._resolve_api_key(), http_client=http_client)
+            entry = self._endpoint_clients[endpoint] = (client, http_client)
+        return entry[0]
+
+    def _reset_endpoint(self, endpoint: str | None) -> None:
+        """After a connection-level error on *endpoint*: the next request to it starts on fresh connections."""
+        if endpoint is None or endpoint == self.config.base_url:
+            self._build_client()
+            return
+        entry = self._endpoint_clients.pop(endpoint, None)
+        if entry is not None:
+            http_clients.retire(entry[1])
+
+    def _endpoint_failed(self, endpoint: str | None, failed: set[str] | None = None) -> None:
+        """Count a transient failure against *endpoint*'s circuit breaker."""
+        if endpoint is not None and self._endpoint_pool is not None:
+            self._endpoint_pool.record_failure(endpoint)
+            if failed is not None:
+                failed.add(endpoint)
 
     def _resolve_api_key(self) -> str:
         """Get API key from token provider (if set) or static config."""
@@ -133,7 +173,7 @@ class AIService:
             return False
         try:
             self._token_provider.refresh()
-            self._build_client()
+            self._build_client(reset_pool=False)
             logger.info("Token refreshed and client rebuilt successfully")
             return True
         except TokenProviderError:
@@ -236,10 +276,8 @@ class AIService:
         extra_system_prompt: str | None = None,
         _token_refreshed: bool = False,
     ) -> AsyncGenerator[dict[str, Any], None]:
-        system_content = self.config.system_prompt
-        if extra_system_prompt:
-            system_content = extra_system_prompt + "\n\n" + system_content
-        system_msg = {"role": "system", "content": system_content}
+        system_prompt = compose_system_prompt(self.config.system_prompt, extra_system_prompt)
+        system_msg = {"role": "system", "content": system_prompt}
         full_messages = [system_msg] + messages
 
         kwargs: dict[str, Any] = {
@@ -250,166 +288,207 @@ class AIService:
         }
         if tools:
             kwargs["tools"] = tools
-        if self.config.temperature is not None:
-            kwargs["temperature"] = self.config.temperature
-        if self.config.top_p is not None:
-            kwargs["top_p"] = self.config.top_p
-        if self.config.seed is not None:
-            kwargs["seed"] = self.config.seed
+        kwargs.update(self._sampling_params())
 
         max_attempts = max(1, self.config.retry_max_attempts + 1)  # +1: first attempt is not a "retry"
         last_transient_error: Exception | None = None
+        pool = self._endpoint_pool
+        sticky_key = endpoint_pool.conversation_key(messages) if pool and self.config.endpoint_sticky else None
+        failed_endpoints: set[str] = set()
 
         for attempt in range(max_attempts):
             # Check cancel before (re-)entering create() — avoids blocking on a stale cancel
             if cancel_event and cancel_event.is_set():
                 return
+            if request_deadline.expired():
+                yield {
+                    "event": "error",
+                    "data": {
+                        "message": "Request deadline exceeded before the model responded",
+                        "code": "deadline_exceeded",
+                        "retryable": False,
+                    },
+                }
+                return
 
+            endpoint = pool.choose(sticky_key, exclude=failed_endpoints) if pool else None
+            endpoint_url = endpoint or self.config.base_url
+            client = self._client_for(endpoint)
             try:
                 _attempt_start = time.monotonic()
                 logger.debug(
-                    "ai_service connect attempt=%d/%d model=%s messages=%d",
+                    "ai_service connect attempt=%d/%d model=%s messages=%d endpoint=%s",
                     attempt + 1,
                     max_attempts,
                     self.config.model,
                     len(full_messages),
+                    endpoint_url,
                 )
                 yield {"event": "phase", "data": {"phase": "connecting"}}
 
-                # --- Cancel-aware create() with hard timeout ---
-                # The bare `await create()` is not interruptible by cancel_event and
-                # httpx per-read timeouts can reset, so we race the create task against
-                # cancel_event and a hard request_timeout deadline.
-                create_coro = self.client.chat.completions.create(**kwargs)
-                create_task = asyncio.ensure_future(create_coro)
-                wait_tasks: list[asyncio.Future[Any]] = [create_task]
-
-                if cancel_event:
-                    cancel_wait = asyncio.ensure_future(cancel_event.wait())
-                    wait_tasks.append(cancel_wait)
+                hedged = False
+                first_chunk: Any = None
+                if self.config.hedge_requests:
+                    connected = asyncio.Event()
+                    open_task = asyncio.ensure_future(
+                        self._open_stream_hedged(kwargs, cancel_event, client, endpoint, connected)
+                    )
+                    connected_wait = asyncio.ensure_future(connected.wait())
+                    try:
+                        await asyncio.wait({open_task, connected_wait}, return_when=asyncio.FIRST_COMPLETED)
+                        if connected.is_set():
+                            yield {"event": "phase", "data": {"phase": "waiting"}}
+                        opened = await open_task
+                    finally:
+                        connected_wait.cancel()
+                        if not open_task.done():
+                            open_task.cancel()
+                    if opened is None:
+                        logger.info("Cancelled during connecting phase")
+                        return
+                    stream, stream_iter, first_chunk, hedged = opened
+                    if first_chunk is _EMPTY_STREAM:
+                        logger.debug("ai_service empty_stream attempt=%d", attempt + 1)
+                        await _close_stream(stream)
+                        yield {"event": "done", "data": {}}
+                        return
                 else:
-                    cancel_wait = None
+                    # --- Cancel-aware create() with hard timeout ---
+                    # The bare `await create()` is not interruptible by cancel_event and
+                    # httpx per-read timeouts can reset, so we race the create task against
+                    # cancel_event and a hard request_timeout deadline.
+                    create_coro = client.chat.completions.create(**kwargs)
+                    create_task = asyncio.ensure_future(create_coro)
+                    wait_tasks: list[asyncio.Future[Any]] = [create_task]
 
-                try:
-                    done, _pending = await asyncio.wait(
-                        wait_tasks,
-                        timeout=float(self.config.request_timeout),
-                        return_when=asyncio.FIRST_COMPLETED,
-                    )
-                except Exception:
-                    create_task.cancel()
-                    if cancel_wait:
-                        cancel_wait.cancel()
-                    raise
+                    if cancel_event:
+                        cancel_wait = asyncio.ensure_future(cancel_event.wait())
+                        wait_tasks.append(cancel_wait)
+                    else:
+                        cancel_wait = None
+
+                    try:
+                        done, _pending = await asyncio.wait(
+                            wait_tasks,
+                            timeout=request_deadline.bound(float(self.config.request_timeout)),
+                            return_when=asyncio.FIRST_COMPLETED,
+                        )
+                    except Exception:
+                        create_task.cancel()
+                        if cancel_wait:
+                            cancel_wait.cancel()
+                        raise
+
+                    if not done:
+                        # Hard timeout exceeded — create() never returned
+                        create_task.cancel()
+                        if cancel_wait:
+                            cancel_wait.cancel()
+                        logger.warning(
+                            "API create() timed out after %ds (attempt %d/%d)",
+                            self.config.request_timeout,
+                            attempt + 1,
+                            max_attempts,
+                        )
+                        raise _FirstTokenTimeoutError()
 
-                if not done:
-                    # Hard timeout exceeded — create() never returned
-                    create_task.cancel()
+                    if cancel_wait and cancel_wait in done:
+                        # User pressed Escape during connecting — clean exit
+                        create_task.cancel()
+                        logger.info("Cancelled during connecting phase")
+                        return
+
+                    # create() completed — clean up cancel_wait
                     if cancel_wait:
                         cancel_wait.cancel()
-                    logger.warning(
-                        "API create() timed out after %ds (attempt %d/%d)",
-                        self.config.request_timeout,
+
+                    stream = create_task.result()
+                    logger.debug(
+                        "ai_service connected attempt=%d elapsed=%.2fs",
                         attempt + 1,
-                        max_attempts,
+                        time.monotonic() - _attempt_start,
                     )
-                    raise _FirstTokenTimeoutError()
-
-                if cancel_wait and cancel_wait in done:
-                    # User pressed Escape during connecting — clean exit
-                    create_task.cancel()
-                    logger.info("Cancelled during connecting phase")
-                    return
-
-                # create() completed — clean up cancel_wait
-                if cancel_wait:
-                    cancel_wait.cancel()
-
-                stream = create_task.result()
-                logger.debug(
-                    "ai_service connected attempt=%d elapsed=%.2fs",
-                    attempt + 1,
-                    time.monotonic() - _attempt_start,
-                )
-                yield {"event": "phase", "data": {"phase": "waiting"}}
-
-                # --- First-token timeout (cancel-aware) ---
-                stream_iter = stream.__aiter__()
-                first_chunk: Any = None
+                    yield {"event": "phase", "data": {"phase": "waiting"}}
 
-                first_token_task = asyncio.ensure_future(stream_iter.__anext__())
-                ft_wait_tasks: list[asyncio.Future[Any]] = [first_token_task]
+                    # --- First-token timeout (cancel-aware) ---
+                    stream_iter = stream.__aiter__()
 
-                if cancel_event:
-                    ft_cancel_wait = asyncio.ensure_future(cancel_event.wait())
-                    ft_wait_tasks.append(ft_cancel_wait)
-                else:
-                    ft_cancel_wait = None
-
-                try:
-                    ft_done, _ = await asyncio.wait(
-                        ft_wait_tasks,
-                        timeout=float(self.config.first_token_timeout),
-                        return_when=asyncio.FIRST_COMPLETED,
-                    )
-                except Exception:
-                    first_token_task.cancel()
-                    if ft_cancel_wait:
-                        ft_cancel_wait.cancel()
-                    raise
+                    first_token_task = asyncio.ensure_future(stream_iter.__anext__())
+                    ft_wait_tasks: list[asyncio.Future[Any]] = [first_token_task]
 
-                if not ft_done:
-                    # First-token timeout
-                    first_token_task.cancel()
-                    if ft_cancel_wait:
-                        ft_cancel_wait.cancel()
-                    logger.warning(
-                        "No first token within %ds (attempt %d/%d)",
-                        self.config.first_token_timeout,
-                        attempt + 1,
-                        max_attempts,
-                    )
-                    try:
-                        if hasattr(stream, "close"):
-                            await stream.close()
-                    except Exception:
-                        pass
-                    raise _FirstTokenTimeoutError()
+                    if cancel_event:
+                        ft_cancel_wait = asyncio.ensure_future(cancel_event.wait())
+                        ft_wait_tasks.append(ft_cancel_wait)
+                    else:
+                        ft_cancel_wait = None
 
-                if ft_cancel_wait and ft_cancel_wait in ft_done:
-                    # User cancelled during first-token wait
-                    first_token_task.cancel()
                     try:
-                        if hasattr(stream, "close"):
-                            await stream.close()
+                        ft_done, _ = await asyncio.wait(
+                            ft_wait_tasks,
+                            timeout=request_deadline.bound(float(self.config.first_token_timeout)),
+                            return_when=asyncio.FIRST_COMPLETED,
+                        )
                     except Exception:
-                        pass
-                    return
+                        first_token_task.cancel()
+                        if ft_cancel_wait:
+                            ft_cancel_wait.cancel()
+                        raise
+
+                    if not ft_done:
+                        # First-token timeout
+                        first_token_task.cancel()
+                        if ft_cancel_wait:
+                            ft_cancel_wait.cancel()
+                        logger.warning(
+                            "No first token within %ds (attempt %d/%d)",
+                            self.config.first_token_timeout,
+                            attempt + 1,
+                            max_attempts,
+                        )
+                        try:
+                            if hasattr(stream, "close"):
+                                await stream.close()
+                        except Exception:
+                            pass
+                        raise _FirstTokenTimeoutError()
+
+                    if ft_cancel_wait and ft_cancel_wait in ft_done:
+                        # User cancelled during first-token wait
+                        first_token_task.cancel()
+                        try:
+                            if hasattr(stream, "close"):
+                                await stream.close()
+                        except Exception:
+                            pass
+                        return
 
-                if ft_cancel_wait:
-                    ft_cancel_wait.cancel()
+                    if ft_cancel_wait:
+                        ft_cancel_wait.cancel()
 
-                try:
-                    first_chunk = first_token_task.result()
-                except StopAsyncIteration:
-                    # Stream ended immediately (empty response)
-                    logger.debug("ai_service empty_stream attempt=%d", attempt + 1)
                     try:
-                        if hasattr(stream, "close"):
-                            await stream.close()
-                    except Exception:
-                        pass
-                    yield {"event": "done", "data": {}}
-                    return
+                        first_chunk = first_token_task.result()
+                    except StopAsyncIteration:
+                        # Stream ended immediately (empty response)
+                        logger.debug("ai_service empty_stream attempt=%d", attempt + 1)
+                        try:
+                            if hasattr(stream, "close"):
+                                await stream.close()
+                        except Exception:
+                            pass
+                        yield {"event": "done", "data": {}}
+                        return
 
                 logger.debug(
                     "ai_service first_token attempt=%d elapsed=%.2fs",
                     attempt + 1,
                     time.monotonic() - _attempt_start,
                 )
+                if pool is not None and endpoint is not None:
+                    pool.record_success(endpoint, time.monotonic() - _attempt_start)
                 # --- Stream with full request_timeout (first chunk already received) ---
                 current_tool_calls: dict[int, dict[str, Any]] = {}
-                total_timeout = float(self.config.request_timeout)
+                announced_tool_calls: set[int] = set()
+                total_timeout = request_deadline.bound(float(self.config.request_timeout))
 
                 async def _prepended_stream() -> AsyncGenerator[Any, None]:
                     """Yield the first chunk, then remaining chunks via _iter_stream."""
@@ -431,6 +510,16 @@ class AIService:
                                 or (chunk.usage.prompt_tokens + chunk.usage.completion_tokens),
                                 "model": self.config.model,
                             }
+                            # Automatic prefix caching (OpenAI and compatible servers)
+                            _details = getattr(chunk.usage, "prompt_tokens_details", None)
+                            _cached = getattr(_details, "cached_tokens", None)
+                            if isinstance(_cached, int) and _cached > 0:
+                                usage_data["cache_read_tokens"] = _cached
+                            if hedged:
+                                # The cancelled duplicate's prompt was billed too
+                                usage_data["hedge_tokens"] = chunk.usage.prompt_tokens
+                                _tracker = request_hedging.tracker_for(endpoint_url, self.config.model)
+                                _tracker.add_duplicate_tokens(chunk.usage.prompt_tokens)
 
                         choice = chunk.choices[0] if chunk.choices else None
                         if not choice:
@@ -445,6 +534,12 @@ class AIService:
                             for tc in delta.tool_calls:
                                 idx = tc.index
                                 if idx not in current_tool_calls:
+                                    # A new call starting means the earlier ones are complete
+                                    for prev_idx in sorted(set(current_tool_calls) - announced_tool_calls):
+                                        announced_tool_calls.add(prev_idx)
+                                        ready = tool_call_ready_event(prev_idx, current_tool_calls[prev_idx])
+                                        if ready:
+                                            yield ready
                                     current_tool_calls[idx] = {
                                         "id": tc.id or "",
                                         "function_name": "",
@@ -563,6 +658,19 @@ class AIService:
                 logger.warning("Rate limited by AI provider: %s", e)
                 if cancel_event and cancel_event.is_set():
                     return  # user cancelled — don't emit retryable error
+                self._endpoint_failed(endpoint, failed_endpoints)
+                if pool is not None and attempt < max_attempts - 1 and len(failed_endpoints) < len(pool.urls):
+                    # Another endpoint has its own rate limit: fail over without waiting
+                    yield {
+                        "event": "retrying",
+                        "data": {
+                            "attempt": attempt + 2,
+                            "max_attempts": max_attempts,
+                            "delay": 0,
+                            "reason": "rate_limit",
+                        },
+                    }
+                    continue
                 yield {
                     "event": "error",
                     "data": {
@@ -583,7 +691,8 @@ class AIService:
                     # Server errors (500, 502, 503, etc.) are transient — retry
                     last_transient_error = e
                     logger.warning("API server error %d (attempt %d/%d)", e.status_code, attempt + 1, max_attempts)
-                    self._build_client()
+                    # The connections are fine; the upstream failed, so the pool is kept
+                    self._endpoint_failed(endpoint, failed_endpoints)
                     if attempt < max_attempts - 1:
                         delay = self.config.retry_backoff_base * (2**attempt)
                         yield {
@@ -630,7 +739,8 @@ class AIService:
             except _StreamTimeoutError:
                 stream_elapsed = time.monotonic() - _attempt_start
                 logger.debug("Stream timed out mid-response after first token (%.0fs)", stream_elapsed)
-                self._build_client()
+                self._endpoint_failed(endpoint)
+                self._reset_endpoint(endpoint)
                 if cancel_event and cancel_event.is_set():
                     return  # user cancelled — don't emit retryable error
                 yield {
@@ -644,7 +754,8 @@ class AIService:
                 return
             except (APITimeoutError, APIConnectionError, _FirstTokenTimeoutError) as e:
                 last_transient_error = e
-                self._build_client()
+                self._endpoint_failed(endpoint, failed_endpoints)
+                self._reset_endpoint(endpoint)
 
                 if attempt < max_attempts - 1:
                     delay = self.config.retry_backoff_base * (2**attempt)
@@ -694,6 +805,9 @@ class AIService:
                     logger.exception("AI stream error")
                     yield {"event": "error", "data": {"message": "An internal error occurred", "retryable": False}}
                 return
+            finally:
+                if pool is not None and endpoint is not None:
+                    pool.release(endpoint)
 
         # All retries exhausted — yield appropriate error for the last transient error
         if isinstance(last_transient_error, APITimeoutError):
@@ -740,58 +854,229 @@ class AIService:
                 },
             }
 
-    async def generate_title(self, user_message: str, _token_refreshed: bool = False) -> str:
+    async def _open_stream(
+        self, kwargs: dict[str, Any], client: AsyncOpenAI, connected: asyncio.Event | None = None
+    ) -> tuple[Any, Any, Any]:
+        """Create a stream and read its first chunk: one candidate in a hedged race.
+
+        Connecting is bounded by ``request_timeout`` and the first chunk by
+        ``first_token_timeout``, as in the non-hedged path; either raises
+        ``_FirstTokenTimeoutError``.  *connected* is set once create() returns.
+        """
+        try:
+            stream = await asyncio.wait_for(
+                client.chat.completions.create(**kwargs),
+                timeout=request_deadline.bound(float(self.config.request_timeout)),
+            )
+        except asyncio.TimeoutError:
+            logger.warning("API create() timed out after %ds (hedged open)", self.config.request_timeout)
+            raise _FirstTokenTimeoutError() from None
+        if connected is not None:
+            connected.set()
+        stream_iter = stream.__aiter__()
+        try:
+            first_chunk = await asyncio.wait_for(
+                stream_iter.__anext__(),
+                timeout=request_deadline.bound(float(self.config.first_token_timeout)),
+            )
+        except StopAsyncIteration:
+            first_chunk = _EMPTY_STREAM
+        except asyncio.TimeoutError:
+            await _close_stream(stream)
+            logger.warning("No first token within %ds (hedged open)", self.config.first_token_timeout)
+            raise _FirstTokenTimeoutError() from None
+        except BaseException:
+            await _close_stream(stream)
+            raise
+        return stream, stream_iter, first_chunk
+
+    async def _open_stream_hedged(
+        self,
+        kwargs: dict[str, Any],
+        cancel_event: asyncio.Event | None,
+        client: AsyncOpenAI,
+        endpoint: str | None = None,
+        connected: asyncio.Event | None = None,
+    ) -> tuple[Any, Any, Any, bool] | None:
+        """Open a stream, hedging with a duplicate request if the first byte is slow.
+
+        Returns ``(stream, stream_iter, first_chunk, hedged)``, or None if
+        cancelled.  Raises ``_FirstTokenTimeoutError`` if no request produced
+        a chunk in time: each request gets ``request_timeout`` to connect and
+        ``first_token_timeout`` for its first chunk (bounded by the request
+        deadline).  *connected* is set when the first request connects.
+        """
+        tracker = request_hedging.tracker_for(endpoint or self.config.base_url, self.config.model)
+        timeout = request_deadline.bound(float(self.config.request_timeout + self.config.first_token_timeout))
+        hedge_after = tracker.hedge_delay(self.config.hedge_min_delay)
+        reserved: list[bool] = []
+
+        def _allow_hedge() -> bool:
+            if tracker.try_hedge(self.config.hedge_max_rate):
+                reserved.append(True)
+                logger.info("No first byte after %.1fs from %s; hedging", hedge_after, self.config.model)
+                return True
+            return False
+
+        try:
+            result = await request_hedging.race(
+                lambda: self._open_stream(kwargs, client, connected),
+                hedge_after=hedge_after,
+                allow_hedge=_allow_hedge,
+                timeout=timeout,
+                cancel_event=cancel_event,
+                discard=lambda opened: _close_stream(opened[0]),
+            )
+        except asyncio.TimeoutError:
+            if reserved:
+                tracker.release()
+            logger.warning("No first token within %.0fs (hedged: %s)", timeout, bool(reserved))
+            raise _FirstTokenTimeoutError() from None
+        except BaseException:
+            if reserved:
+                tracker.release()
+            raise
+        if result.value is None:
+            if reserved:
+                tracker.release()
+            return None
+        tracker.record(result.latency, hedged=result.hedged, hedge_won=result.hedge_won)
+        stream, stream_iter, first_chunk = result.value
+        return stream, stream_iter, first_chunk, result.hedged
+
+    async def _create_completion(self, **params: Any) -> Any:
+        """Non-streaming ``chat.completions.create`` on an endpoint picked from ``ai.endpoints``.
+
+        Transport errors and 5xx responses count against the endpoint's
+        circuit breaker, and transport errors also retire its connections;
+        the error is re-raised.
+        """
+        pool = self._endpoint_pool
+        endpoint = pool.choose() if pool else None
+        try:
+            response = await self._client_for(endpoint).chat.completions.create(**params)
+        except (APITimeoutError, APIConnectionError, RateLimitError) as e:
+            self._endpoint_failed(endpoint)
+            if not isinstance(e, RateLimitError):
+                self._reset_endpoint(endpoint)
+            raise
+        except APIStatusError as e:
+            if e.status_code >= 500:
+                self._endpoint_failed(endpoint)
+            raise
+        finally:
+            if pool is not None and endpoint is not None:
+                pool.release(endpoint)
+        if pool is not None and endpoint is not None:
+            pool.record_success(endpoint)
+        return response
+
+    async def generate_title(self, user_message: str) -> str:
+        """Short conversation title, generated on the ``title`` task model when one is configured."""
+        return await task_routing.run(
+            self,
+            task_routing.TASK_TITLE,
+            lambda svc: svc._generate_title(user_message),
+            failed=lambda title: title == "New Conversation",
+        )
+
+    async def _generate_title(self, user_message: str, _token_refreshed: bool = False) -> str:
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "Generate a short title (3-6 words) for a conversation that starts"
+                    " with the following message. Return only the title, no quotes or punctuation."
+                ),
+            },
+            {"role": "user", "content": user_message},
+        ]
+        cached = response_cache.lookup(self.config, messages, params={"max_completion_tokens": 20}, cacheable=True)
+        if cached and cached.hit is not None:
+            return cached.hit
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=self.config.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "Generate a short title (3-6 words) for a conversation that starts"
-                            " with the following message. Return only the title, no quotes or punctuation."
-                        ),
-                    },
-                    {"role": "user", "content": user_message},
-                ],
+                messages=messages,
                 max_completion_tokens=20,
             )
+            task_routing.note_tokens(response_cache.response_tokens(response))
             title = response.choices[0].message.content or "New Conversation"
-            return title.strip().strip('"').strip("'")
+            title = title.strip().strip('"').strip("'")
+            if cached and response.choices[0].message.content:
+                cached.store(title, response_cache.response_tokens(response))
+            return title
         except AuthenticationError:
             if not _token_refreshed and self._try_refresh_token():
-                return await self.generate_title(user_message, _token_refreshed=True)
+                return await self._generate_title(user_message, _token_refreshed=True)
             logger.error("Authentication failed during title generation")
             return "New Conversation"
         except APITimeoutError:
             logger.warning("Title generation timed out")
-            self._build_client()
             return "New Conversation"
         except APIConnectionError:
             logger.warning("Cannot connect to API at %s during title generation", self.config.base_url)
-            self._build_client()
             return "New Conversation"
         except Exception:
             logger.exception("Failed to generate title")
             return "New Conversation"
 
     async def complete(
+        self,
+        messages: list[dict[str, Any]],
+        max_completion_tokens: int = 1000,
+        *,
+        cacheable: bool | None = None,
+        task: str = task_routing.TASK_MAIN,
+    ) -> str | None:
+        """Non-streaming completion for internal use (e.g. context compaction).
+
+        With ``ai.response_cache`` on, *cacheable* True replays identical
+        earlier calls from the response cache; None caches temperature-0 only.
+        *task* (``summarize``, ``classify``, ...) selects the model from
+        ``ai.task_models``; see ``task_routing``.
+        """
+        return await task_routing.run(
+            self,
+            task,
+            lambda svc: svc._complete(messages, max_completion_tokens, cacheable=cacheable),
+            failed=lambda text: text is None,
+        )
+
+    def _sampling_params(self) -> dict[str, Any]:
+        """Configured temperature, top_p and seed, as sent to the provider."""
+        params: dict[str, Any] = {}
+        if self.config.temperature is not None:
+            params["temperature"] = self.config.temperature
+        if self.config.top_p is not None:
+            params["top_p"] = self.config.top_p
+        if self.config.seed is not None:
+            params["seed"] = self.config.seed
+        return params
+
+    async def _complete(
         self,
         messages: list[dict[str, Any]],
         max_completion_tokens: int = 1000,
         _token_refreshed: bool = False,
+        *,
+        cacheable: bool | None = None,
     ) -> str | None:
-        """Non-streaming completion for internal use (e.g. context compaction)."""
+        # The cache key and the temperature-0 check use exactly what is sent
+        params = {"max_completion_tokens": max_completion_tokens, **self._sampling_params()}
+        cached = response_cache.lookup(self.config, messages, params=params, cacheable=cacheable)
+        if cached and cached.hit is not None:
+            return cached.hit
         try:
-            response = await self.client.chat.completions.create(
-                model=self.config.model,
-                messages=messages,  # type: ignore[arg-type]
-                max_completion_tokens=max_completion_tokens,
-            )
-            return response.choices[0].message.content if response.choices else None
+            response = await self._create_completion(model=self.config.model, messages=messages, **params)
+            task_routing.note_tokens(response_cache.response_tokens(response))
+            text = response.choices[0].message.content if response.choices else None
+            if cached:
+                cached.store(text, response_cache.response_tokens(response))
+            return text
         except AuthenticationError:
             if not _token_refreshed and self._try_refresh_token():
-                return await self.complete(messages, max_completion_tokens, _token_refreshed=True)
+                return await self._complete(messages, max_completion_tokens, _token_refreshed=True, cacheable=cacheable)
             return None
         except Exception:
             logger.exception("Failed to generate completion")
@@ -799,7 +1084,7 @@ class AIService:
 
     async def validate_connection(self, _token_refreshed: bool = False) -> tuple[bool, str, list[str]]:
         try:
-            models = await self.client.models.list()
+            models = await self._client_for(None).models.list()
             model_ids = [m.id for m in models.data]
             return True, "Connected successfully", model_ids
         except AuthenticationError:
@@ -9,8 +9,12 @@ import time
 from typing import Any, AsyncGenerator
 
 from ..config import AIConfig
+from . import response_cache, task_routing
 from .egress_allowlist import check_egress_allowed
 from .error_sanitizer import sanitize_provider_error
+from .http_pool import http_clients
+from .prompt_sections import compose_system_prompt, split_system_prompt
+from .speculative_tools import tool_call_ready_event
 from .token_provider import TokenProvider, TokenProviderError
 
 logger = logging.getLogger(__name__)
@@ -121,6 +125,81 @@ def _convert_messages(messages: list[dict[str, Any]]) -> tuple[str, list[dict[st
     return "\n\n".join(system_parts), anthropic_msgs
 
 
+_CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _cached_system(system_prompt: str) -> list[dict[str, Any]]:
+    """System prompt as text blocks with a cache breakpoint after the stable prefix."""
+    stable, per_request = split_system_prompt(system_prompt)
+    blocks: list[dict[str, Any]] = [{"type": "text", "text": stable, "cache_control": dict(_CACHE_CONTROL)}]
+    if per_request:
+        blocks.append({"type": "text", "text": per_request})
+    return blocks
+
+
+def _with_cache_breakpoints(kwargs: dict[str, Any]) -> None:
+    """Mark the tool definitions, stable system prefix and conversation so far as cacheable.
+
+    Anthropic caches the request prefix up to each ``cache_control`` block
+    (tools, then system, then messages), so the next request of an agent loop
+    re-reads the whole history from cache instead of reprocessing it.
+    """
+    tools = kwargs.get("tools")
+    if tools:
+        kwargs["tools"] = [*tools[:-1], {**tools[-1], "cache_control": dict(_CACHE_CONTROL)}]
+    if kwargs.get("system"):
+        kwargs["system"] = _cached_system(kwargs["system"])
+    messages = kwargs.get("messages")
+    if not messages:
+        return
+    last = messages[-1]
+    content = last.get("content")
+    if isinstance(content, str):
+        if not content:
+            return
+        blocks: list[dict[str, Any]] = [{"type": "text", "text": content}]
+    elif isinstance(content, list) and content and isinstance(content[-1], dict):
+        blocks = list(content)
+    else:
+        return
+    # Copy rather than mutate: content lists may be shared with the caller's history
+    blocks[-1] = {**blocks[-1], "cache_control": dict(_CACHE_CONTROL)}
+    kwargs["messages"] = [*messages[:-1], {**last, "content": blocks}]
+
+
+def _build_request(
+    config: AIConfig,
+    messages: list[dict[str, Any]],
+    tools: list[dict[str, Any]] | None,
+    extra_system_prompt: str | None,
+) -> dict[str, Any]:
+    """Keyword arguments for ``messages.stream()`` from OpenAI-format messages and tools."""
+    system_content = compose_system_prompt(config.system_prompt, extra_system_prompt)
+    full_messages = [{"role": "system", "content": system_content}] + messages
+    system_prompt, anthropic_messages = _convert_messages(full_messages)
+
+    kwargs: dict[str, Any] = {
+        "model": config.model,
+        "messages": anthropic_messages,
+        "max_tokens": config.max_output_tokens,
+        "system": system_prompt,
+    }
+    if tools:
+        kwargs["tools"] = _convert_tools(tools)
+    if config.temperature is not None:
+        kwargs["temperature"] = config.temperature
+    if config.top_p is not None:
+        kwargs["top_p"] = config.top_p
+    if config.prompt_caching:
+        _with_cache_breakpoints(kwargs)
+    return kwargs
+
+
+def _usage_int(usage: Any, name: str) -> int:
+    value = getattr(usage, name, None)
+    return value if isinstance(value, int) else 0
+
+
 class AnthropicService:
     """Anthropic SDK wrapper matching the AIService interface."""
 
@@ -142,7 +221,17 @@ class AnthropicService:
         ):
             raise ValueError("Egress blocked: the configured base_url is not permitted by the egress allowlist.")
 
-    def _build_client(self) -> None:
+    def _build_client(self, *, reset_pool: bool = True) -> None:
+        """Build the SDK client over the shared connection pool (see ``AIService._build_client``)."""
+        old_http = getattr(self, "_http_client", None)
+        if old_http is not None and not reset_pool and not http_clients.is_retired(old_http):
+            http_client = old_http
+        else:
+            if old_http is not None:
+                http_clients.retire(old_http)
+            http_client = http_clients.get(self.config)
+        self._http_client = http_client
+
         api_key = self._resolve_api_key()
         base_url = self.config.base_url
         if base_url.rstrip("/").endswith("/v1"):
@@ -152,8 +241,16 @@ class AnthropicService:
             api_key=api_key,
             base_url=base_url if base_url != "https://api.anthropic.com" else None,
             timeout=float(self.config.request_timeout),
+            http_client=http_client,
         )
 
+    def _sdk_client(self) -> anthropic.AsyncAnthropic:
+        """The SDK client, moved to a fresh pool when another service retired the shared one."""
+        http_client = getattr(self, "_http_client", None)
+        if http_client is not None and http_clients.is_retired(http_client):
+            self._build_client(reset_pool=False)
+        return self.client
+
     def _resolve_api_key(self) -> str:
         if self._token_provider:
             return self._token_provider.get_token()
@@ -164,7 +261,7 @@ class AnthropicService:
             return False
         try:
             self._token_provider.refresh()
-            self._build_client()
+            self._build_client(reset_pool=False)
             return True
         except TokenProviderError:
             logger.exception("Token refresh failed")
@@ -178,25 +275,7 @@ class AnthropicService:
         extra_system_prompt: str | None = None,
         _token_refreshed: bool = False,
     ) -> AsyncGenerator[dict[str, Any], None]:
-        system_content = self.config.system_prompt
-        if extra_system_prompt:
-            system_content = extra_system_prompt + "\n\n" + system_content
-
-        full_messages = [{"role": "system", "content": system_content}] + messages
-        system_prompt, anthropic_messages = _convert_messages(full_messages)
-
-        kwargs: dict[str, Any] = {
-            "model": self.config.model,
-            "messages": anthropic_messages,
-            "max_tokens": self.config.max_output_tokens,
-            "system": system_prompt,
-        }
-        if tools:
-            kwargs["tools"] = _convert_tools(tools)
-        if self.config.temperature is not None:
-            kwargs["temperature"] = self.config.temperature
-        if self.config.top_p is not None:
-            kwargs["top_p"] = self.config.top_p
+        kwargs = _build_request(self.config, messages, tools, extra_system_prompt)
 
         max_attempts = max(1, self.config.retry_max_attempts + 1)
         # Timeouts — reuse the same config fields as the OpenAI provider
@@ -212,7 +291,7 @@ class AnthropicService:
                 yield {"event": "phase", "data": {"phase": "connecting"}}
 
                 # --- Cancel-aware stream creation with hard timeout ---
-                stream_mgr = self.client.messages.stream(**kwargs)
+                stream_mgr = self._sdk_client().messages.stream(**kwargs)
                 enter_coro = stream_mgr.__aenter__()
                 enter_task = asyncio.ensure_future(enter_coro)
                 wait_tasks: list[asyncio.Future[Any]] = [enter_task]
@@ -266,6 +345,7 @@ class AnthropicService:
                     yield {"event": "phase", "data": {"phase": "waiting"}}
 
                     current_tool_calls: dict[int, dict[str, Any]] = {}
+                    announced_tool_calls: set[int] = set()
                     tool_index = 0
                     usage_data: dict[str, Any] | None = None
                     _last_chunk_time = time.monotonic()
@@ -328,12 +408,19 @@ class AnthropicService:
                         if event_type == "message_start":
                             msg = getattr(event, "message", None)
                             if msg and hasattr(msg, "usage"):
+                                # input_tokens excludes the cached part of the prompt
+                                cache_read = _usage_int(msg.usage, "cache_read_input_tokens")
+                                cache_write = _usage_int(msg.usage, "cache_creation_input_tokens")
+                                prompt_tokens = msg.usage.input_tokens + cache_read + cache_write
                                 usage_data = {
-                                    "prompt_tokens": msg.usage.input_tokens,
+                                    "prompt_tokens": prompt_tokens,
                                     "completion_tokens": 0,
-                                    "total_tokens": msg.usage.input_tokens,
+                                    "total_tokens": prompt_tokens,
                                     "model": self.config.model,
                                 }
+                                if cache_read or cache_write:
+                                    usage_data["cache_read_tokens"] = cache_read
+                                    usage_data["cache_write_tokens"] = cache_write
 
                         elif event_type == "content_block_start":
                             block = event.content_block
@@ -362,6 +449,14 @@ class AnthropicService:
                                         },
                                     }
 
+                        elif event_type == "content_block_stop":
+                            idx = tool_index - 1
+                            if idx in current_tool_calls and idx not in announced_tool_calls:
+                                announced_tool_calls.add(idx)
+                                ready = tool_call_ready_event(idx, current_tool_calls[idx])
+                                if ready:
+                                    yield ready
+
                         elif event_type == "message_delta":
                             delta = event.delta
                             if hasattr(event, "usage") and event.usage:
@@ -461,7 +556,7 @@ class AnthropicService:
                 return
             except AnthropicStatusError as e:
                 if e.status_code >= 500:
-                    self._build_client()
+                    # The upstream failed, not the connections; the pool is kept
                     if attempt < max_attempts - 1:
                         delay = self.config.retry_backoff_base * (2**attempt)
                         yield {
@@ -539,25 +634,45 @@ class AnthropicService:
         }
 
     async def generate_title(self, user_message: str) -> str:
+        """Short conversation title, generated on the ``title`` task model when one is configured."""
+        return await task_routing.run(
+            self,
+            task_routing.TASK_TITLE,
+            lambda svc: svc._generate_title(user_message),
+            failed=lambda title: title == "New Conversation",
+        )
+
+    async def _generate_title(self, user_message: str) -> str:
+        system = (
+            "Generate a short title (3-6 words) for a conversation that starts"
+            " with the following message. Return only the title, no quotes or punctuation."
+        )
+        messages = [{"role": "user", "content": user_message}]
+        cached = response_cache.lookup(
+            self.config, messages, params={"max_tokens": 20, "system": system}, cacheable=True
+        )
+        if cached and cached.hit is not None:
+            return cached.hit
         try:
-            response = await self.client.messages.create(
+            response = await self._sdk_client().messages.create(
                 model=self.config.model,
                 max_tokens=20,
-                system=(
-                    "Generate a short title (3-6 words) for a conversation that starts"
-                    " with the following message. Return only the title, no quotes or punctuation."
-                ),
-                messages=[{"role": "user", "content": user_message}],
+                system=system,
+                messages=messages,
             )
+            task_routing.note_tokens(response_cache.response_tokens(response))
             text = response.content[0].text if response.content else "New Conversation"
-            return text.strip().strip('"').strip("'")
+            text = text.strip().strip('"').strip("'")
+            if cached and response.content:
+                cached.store(text, response_cache.response_tokens(response))
+            return text
         except Exception:
             logger.exception("Failed to generate title")
             return "New Conversation"
 
     async def validate_connection(self, _token_refreshed: bool = False) -> tuple[bool, str, list[str]]:
         try:
-            await self.client.messages.create(
+            await self._sdk_client().messages.create(
                 model=self.config.model,
                 max_tokens=5,
                 messages=[{"role": "user", "content": "Hi"}],
@@ -578,22 +693,52 @@ class AnthropicService:
             return False, "Connection validation failed.", []
 
     async def complete(
+        self,
+        messages: list[dict[str, Any]],
+        max_completion_tokens: int = 1000,
+        *,
+        cacheable: bool | None = None,
+        task: str = task_routing.TASK_MAIN,
+    ) -> str | None:
+        return await task_routing.run(
+            self,
+            task,
+            lambda svc: svc._complete(messages, max_completion_tokens, cacheable=cacheable),
+            failed=lambda text: text is None,
+        )
+
+    async def _complete(
         self,
         messages: list[dict[str, Any]],
         max_completion_tokens: int = 1000,
         _token_refreshed: bool = False,
+        *,
+        cacheable: bool | None = None,
     ) -> str | None:
+        # The cache key and the temperature-0 check use exactly what is sent
+        params: dict[str, Any] = {"max_tokens": max_completion_tokens}
+        if self.config.temperature is not None:
+            params["temperature"] = self.config.temperature
+        if self.config.top_p is not None:
+            params["top_p"] = self.config.top_p
+        cached = response_cache.lookup(self.config, messages, params=params, cacheable=cacheable)
+        if cached and cached.hit is not None:
+            return cached.hit
         try:
             _, anthropic_messages = _convert_messages(messages)
-            response = await self.client.messages.create(
+            response = await self._sdk_client().messages.create(
                 model=self.config.model,
-                max_tokens=max_completion_tokens,
                 messages=anthropic_messages,
+                **params,
             )
-            return response.content[0].text if response.content else None
+            task_routing.note_tokens(response_cache.response_tokens(response))
+            text = response.content[0].text if response.content else None
+            if cached:
+                cached.store(text, response_cache.response_tokens(response))
+            return text
         except AnthropicAuthError:
             if not _token_refreshed and self._try_refresh_token():
-                return await self.complete(messages, max_completion_tokens, _token_refreshed=True)
+                return await self._complete(messages, max_completion_tokens, _token_refreshed=True, cacheable=cacheable)
             return None
         except Exception:
             logger.exception("Failed to generate completion")
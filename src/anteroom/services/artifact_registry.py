@@ -40,6 +40,7 @@ class ArtifactRegistry:
 
     def __init__(self) -> None:
         self._artifacts: dict[str, Artifact] = {}
+        self._version = 0
 
     # ------------------------------------------------------------------
     # Loading
@@ -83,6 +84,7 @@ class ArtifactRegistry:
 
         # Atomic swap
         self._artifacts = new_artifacts
+        self._version += 1
 
     reload = load_from_db
 
@@ -93,9 +95,11 @@ class ArtifactRegistry:
             if prev.source == ArtifactSource.BUILT_IN and artifact.source != ArtifactSource.BUILT_IN:
                 logger.warning("Artifact %s overrides built-in (source=%s)", artifact.fqn, artifact.source.value)
         self._artifacts[artifact.fqn] = artifact
+        self._version += 1
 
     def unregister(self, fqn: str) -> bool:
         """Remove an artifact by FQN. Returns True if it existed."""
+        self._version += 1
         return self._artifacts.pop(fqn, None) is not None
 
     # ------------------------------------------------------------------
@@ -131,8 +135,14 @@ class ArtifactRegistry:
     def count(self) -> int:
         return len(self._artifacts)
 
+    @property
+    def version(self) -> int:
+        """Monotonic counter bumped on every mutation (for cache keys)."""
+        return self._version
+
     def clear(self) -> None:
         self._artifacts = {}
+        self._version += 1
 
 
 def _artifact_from_row(row: dict[str, Any]) -> Artifact:
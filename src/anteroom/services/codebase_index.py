@@ -4,15 +4,27 @@ Parses source files to extract symbols (functions, classes, types, imports),
 ranks them by dependency centrality, and produces a token-budgeted map
 for injection into the system prompt.
 
+One service instance is meant to live for the whole process (web app state or
+CLI session).  It keeps a per-root symbol table, persists parsed symbols to
+disk keyed by path + mtime + size + grammar version, and only re-walks the
+tree every ``refresh_interval`` seconds; in between, files reported through
+``notify_changed()`` are re-parsed individually.
+
 Requires optional dependency: ``pip install anteroom[index]``
 Degrades gracefully to filename-only listing when tree-sitter is unavailable.
 """
 
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
+import multiprocessing
 import os
+import threading
 import time
+from collections.abc import Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
@@ -85,6 +97,7 @@ class FileSymbols:
     symbols: list[SymbolInfo] = field(default_factory=list)
     imports: list[str] = field(default_factory=list)  # imported module names
     mtime: float = 0.0
+    size: int = 0
 
 
 @dataclass
@@ -94,6 +107,8 @@ class CodebaseMap:
     root: str
     files: list[FileSymbols] = field(default_factory=list)
     scan_time: float = 0.0
+    reparsed: int = 0  # files parsed (not served from cache) during this scan
+    partial: bool = False  # scan budget ran out; some files are listed without symbols
 
 
 def _classify_node(node_type: str, language: str) -> str:
@@ -173,14 +188,15 @@ def _parse_file(
 ) -> FileSymbols | None:
     """Parse a single file and extract symbols."""
     try:
-        if file_path.stat().st_size > _MAX_FILE_SIZE:
+        st = file_path.stat()
+        if st.st_size > _MAX_FILE_SIZE:
             return None
         source = file_path.read_bytes()
     except (OSError, PermissionError):
         return None
 
     rel_path = str(file_path.relative_to(root))
-    mtime = file_path.stat().st_mtime
+    mtime = st.st_mtime
 
     parser.language = ts_language
     tree = parser.parse(source)
@@ -188,7 +204,7 @@ def _parse_file(
 
     query_types = set(_SYMBOL_QUERIES.get(language, []))
     if not query_types:
-        return FileSymbols(path=rel_path, language=language, mtime=mtime)
+        return FileSymbols(path=rel_path, language=language, mtime=mtime, size=st.st_size)
 
     symbols: list[SymbolInfo] = []
     imports: list[str] = []
@@ -211,7 +227,7 @@ def _parse_file(
 
     _walk(root_node)
 
-    return FileSymbols(path=rel_path, language=language, symbols=symbols, imports=imports, mtime=mtime)
+    return FileSymbols(path=rel_path, language=language, symbols=symbols, imports=imports, mtime=mtime, size=st.st_size)
 
 
 def _rank_files(files: list[FileSymbols]) -> list[FileSymbols]:
@@ -261,15 +277,131 @@ def _estimate_tokens(text: str) -> int:
         return len(text) // 4
 
 
-class CodebaseIndexService:
-    """Builds and caches a token-efficient codebase symbol map."""
+# Cold scans with at least this many files to parse use the process pool.
+_PARALLEL_MIN_FILES = 200
+_SHARD_SIZE = 64
+
+# Per-process parser state for pool workers; grammars load once per worker.
+_worker_parser: Any = None
+_worker_languages: dict[str, Any] = {}
+
+
+def _worker_init(languages: list[str]) -> None:
+    """ProcessPoolExecutor initializer: create the parser and load grammars."""
+    global _worker_parser
+    try:
+        import tree_sitter
+        import tree_sitter_language_pack
+    except ImportError:
+        _worker_parser = None
+        return
+    _worker_parser = tree_sitter.Parser()
+    for lang in languages:
+        try:
+            _worker_languages[lang] = tree_sitter_language_pack.get_language(lang)
+        except Exception:
+            _worker_languages[lang] = None
+
+
+def _worker_parse_shard(root: str, shard: list[tuple[str, str]]) -> list[FileSymbols]:
+    """Parse ``(rel_path, language)`` pairs under *root* inside a pool worker."""
+    root_path = Path(root)
+    results: list[FileSymbols] = []
+    for rel, lang in shard:
+        fpath = root_path / rel
+        ts_lang = _worker_languages.get(lang) if _worker_parser is not None else None
+        if ts_lang is None:
+            try:
+                st = fpath.stat()
+            except OSError:
+                continue
+            results.append(FileSymbols(path=rel, language=lang, mtime=st.st_mtime, size=st.st_size))
+            continue
+        result = _parse_file(fpath, root_path, lang, _worker_parser, ts_lang)
+        if result:
+            results.append(result)
+    return results
+
+
+# Bump when the on-disk cache layout or the extraction logic changes.
+_CACHE_FORMAT_VERSION = 1
+
+_DEFAULT_REFRESH_INTERVAL = 30.0
+
 
-    def __init__(self, exclude_dirs: list[str] | None = None, languages: list[str] | None = None) -> None:
+def _grammar_version() -> str:
+    """Identify the parser build so cached symbols are dropped when grammars change."""
+    try:
+        from importlib.metadata import version
+
+        return f"{_CACHE_FORMAT_VERSION}:{version('tree-sitter')}:{version('tree-sitter-language-pack')}"
+    except Exception:
+        return f"{_CACHE_FORMAT_VERSION}:none"
+
+
+def _symbols_to_json(fsym: FileSymbols) -> dict[str, Any]:
+    return {
+        "path": fsym.path,
+        "language": fsym.language,
+        "mtime": fsym.mtime,
+        "size": fsym.size,
+        "symbols": [[s.name, s.kind, s.signature] for s in fsym.symbols],
+        "imports": fsym.imports,
+    }
+
+
+def _symbols_from_json(data: dict[str, Any]) -> FileSymbols:
+    return FileSymbols(
+        path=str(data["path"]),
+        language=str(data["language"]),
+        symbols=[SymbolInfo(name=n, kind=k, signature=sig) for n, k, sig in data.get("symbols", [])],
+        imports=[str(i) for i in data.get("imports", [])],
+        mtime=float(data.get("mtime", 0.0)),
+        size=int(data.get("size", 0)),
+    )
+
+
+@dataclass
+class _RootState:
+    """Everything the service knows about one indexed root directory."""
+
+    files: dict[str, FileSymbols] = field(default_factory=dict)  # rel path -> parsed symbols
+    cmap: CodebaseMap | None = None  # last ranked map
+    scanned_at: float = 0.0  # monotonic time of the last full walk
+    dirty: set[str] = field(default_factory=set)  # rel paths reported changed since
+    stale: bool = False  # unknown changes: force a full walk on next use
+    formatted: dict[int, str] = field(default_factory=dict)  # token budget -> rendered map
+
+
+class CodebaseIndexService:
+    """Builds and caches a token-efficient codebase symbol map.
+
+    Pass ``cache_dir`` to persist parsed symbols across processes; without it
+    the cache lives only as long as the service.  ``workers`` > 1 enables
+    process-parallel parsing for cold scans; ``scan_budget`` (seconds, 0 =
+    unlimited) bounds how long a full scan may spend parsing.
+    """
+
+    def __init__(
+        self,
+        exclude_dirs: list[str] | None = None,
+        languages: list[str] | None = None,
+        *,
+        cache_dir: Path | None = None,
+        refresh_interval: float = _DEFAULT_REFRESH_INTERVAL,
+        workers: int = 1,
+        scan_budget: float = 0.0,
+    ) -> None:
         self._exclude_dirs = set(exclude_dirs or [])
         self._languages = set(languages) if languages else None
+        self._cache_dir = cache_dir
+        self._refresh_interval = max(0.0, refresh_interval)
+        self._workers = max(1, workers)
+        self._scan_budget = max(0.0, scan_budget)
         self._parser: Any = None
         self._lang_cache: dict[str, Any] = {}
-        self._file_cache: dict[str, FileSymbols] = {}
+        self._roots: dict[str, _RootState] = {}
+        self._lock = threading.RLock()
         self._available: bool | None = None
 
     def _ensure_parser(self) -> Any:
@@ -312,71 +444,283 @@ class CodebaseIndexService:
             self._available = False
         return self._available
 
-    def scan(self, root_dir: str) -> CodebaseMap:
-        """Scan a directory and build the codebase symbol map."""
-        root = Path(root_dir).resolve()
-        start = time.monotonic()
+    # -- on-disk symbol cache ------------------------------------------------
 
-        if not any((root / marker).exists() for marker in _PROJECT_MARKERS):
-            logger.debug("Skipping codebase index: no project markers in %s", root)
-            return CodebaseMap(root=str(root), files=[], scan_time=time.monotonic() - start)
+    def _cache_path(self, root: Path) -> Path | None:
+        if self._cache_dir is None:
+            return None
+        digest = hashlib.sha256(str(root).encode("utf-8")).hexdigest()[:16]
+        return self._cache_dir / f"{digest}.json"
+
+    def _load_cache(self, root: Path) -> dict[str, FileSymbols]:
+        path = self._cache_path(root)
+        if path is None or not self.is_available():
+            return {}
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("grammar") != _grammar_version() or data.get("root") != str(root):
+                return {}
+            files = [_symbols_from_json(f) for f in data.get("files", [])]
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError, KeyError):
+            logger.debug("Ignoring unreadable codebase index cache %s", path, exc_info=True)
+            return {}
+        return {f.path: f for f in files}
+
+    def _save_cache(self, root: Path, files: dict[str, FileSymbols]) -> None:
+        path = self._cache_path(root)
+        if path is None or not self.is_available():
+            return
+        payload = {
+            "grammar": _grammar_version(),
+            "root": str(root),
+            "files": [_symbols_to_json(files[k]) for k in sorted(files)],
+        }
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(payload, separators=(",", ":")), encoding="utf-8")
+            os.replace(str(tmp), str(path))
+        except OSError:
+            logger.debug("Failed to write codebase index cache %s", path, exc_info=True)
+
+    # -- scanning -------------------------------------------------------------
+
+    def _language_for(self, name: str) -> str | None:
+        lang = _EXTENSION_MAP.get(Path(name).suffix)
+        if lang and (not self._languages or lang in self._languages):
+            return lang
+        return None
+
+    def _is_excluded(self, dirname: str) -> bool:
+        return dirname in self._exclude_dirs or any(dirname.endswith(exc) for exc in self._exclude_dirs)
 
+    def _walk(self, root: Path) -> list[tuple[Path, str]]:
         source_files: list[tuple[Path, str]] = []
         for dirpath, dirnames, filenames in os.walk(root):
             # Filter excluded directories in-place
-            dirnames[:] = [
-                d
-                for d in dirnames
-                if d not in self._exclude_dirs and not any(d.endswith(exc) for exc in self._exclude_dirs)
-            ]
+            dirnames[:] = [d for d in dirnames if not self._is_excluded(d)]
             for fname in filenames:
-                ext = Path(fname).suffix
-                lang = _EXTENSION_MAP.get(ext)
-                if lang and (not self._languages or lang in self._languages):
+                lang = self._language_for(fname)
+                if lang:
                     source_files.append((Path(dirpath) / fname, lang))
+        return source_files
 
-        if not self.is_available():
-            # Fallback: filename-only listing
-            files: list[FileSymbols] = []
-            for fpath, lang in source_files:
-                rel = str(fpath.relative_to(root))
-                files.append(FileSymbols(path=rel, language=lang, mtime=fpath.stat().st_mtime))
-            return CodebaseMap(
-                root=str(root), files=sorted(files, key=lambda f: f.path), scan_time=time.monotonic() - start
-            )
-
-        parser = self._ensure_parser()
-        files = []  # list[FileSymbols]
-
-        for fpath, lang in source_files:
+    def _parse_one(self, fpath: Path, root: Path, lang: str) -> FileSymbols | None:
+        """Parse one file in-process (filename-only when tree-sitter or the grammar is missing)."""
+        ts_lang = self._get_language(lang) if self.is_available() else None
+        if ts_lang is None:
+            try:
+                st = fpath.stat()
+            except OSError:
+                return None
+            return FileSymbols(path=str(fpath.relative_to(root)), language=lang, mtime=st.st_mtime, size=st.st_size)
+        return _parse_file(fpath, root, lang, self._ensure_parser(), ts_lang)
+
+    def _parse_serial(
+        self, root: Path, pending: list[tuple[str, str]], deadline: float | None
+    ) -> tuple[dict[str, FileSymbols], list[tuple[str, str]]]:
+        parsed: dict[str, FileSymbols] = {}
+        for i, (rel, lang) in enumerate(pending):
+            if deadline is not None and time.monotonic() >= deadline:
+                return parsed, pending[i:]
+            result = self._parse_one(root / rel, root, lang)
+            if result:
+                parsed[rel] = result
+        return parsed, []
+
+    def _parse_parallel(
+        self, root: Path, pending: list[tuple[str, str]], deadline: float | None
+    ) -> tuple[dict[str, FileSymbols], list[tuple[str, str]]]:
+        """Parse *pending* in worker processes, collecting shards as they finish.
+
+        Shards still outstanding at *deadline* are cancelled and returned as
+        remaining; shards whose worker failed are parsed in-process instead.
+        """
+        shards = [pending[i : i + _SHARD_SIZE] for i in range(0, len(pending), _SHARD_SIZE)]
+        languages = sorted({lang for _, lang in pending})
+        parsed: dict[str, FileSymbols] = {}
+        failed: list[tuple[str, str]] = []
+        executor = ProcessPoolExecutor(
+            max_workers=min(self._workers, len(shards)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_worker_init,
+            initargs=(languages,),
+        )
+        futures: dict[Future[list[FileSymbols]], list[tuple[str, str]]] = {}
+        timed_out = False
+        try:
+            for shard in shards:
+                futures[executor.submit(_worker_parse_shard, str(root), shard)] = shard
+            outstanding = set(futures)
+            while outstanding:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                done, outstanding = wait(outstanding, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    timed_out = True
+                    break
+                for fut in done:
+                    try:
+                        for fsym in fut.result():
+                            parsed[fsym.path] = fsym
+                    except Exception:
+                        logger.debug("Codebase index worker failed; parsing shard in-process", exc_info=True)
+                        failed.extend(futures[fut])
+        finally:
+            executor.shutdown(wait=not timed_out, cancel_futures=True)
+
+        remaining = [item for fut in outstanding for item in futures[fut]] if timed_out else []
+        if failed:
+            recovered, left = self._parse_serial(root, failed, deadline)
+            parsed.update(recovered)
+            remaining.extend(left)
+        return parsed, sorted(remaining)
+
+    def _full_scan(self, root: Path, state: _RootState) -> tuple[int, list[FileSymbols]]:
+        """Walk *root*, re-parsing only files whose mtime/size changed.
+
+        Returns ``(reparsed, placeholders)``; placeholders are filename-only
+        entries for files the scan budget ran out on.  They are not cached,
+        so the next scan picks them up again.
+        """
+        files: dict[str, FileSymbols] = {}
+        pending: list[tuple[str, str]] = []
+        for fpath, lang in self._walk(root):
             rel = str(fpath.relative_to(root))
-
-            # Mtime cache: skip re-parsing if file hasn't changed
             try:
-                current_mtime = fpath.stat().st_mtime
+                st = fpath.stat()
             except OSError:
                 continue
-            cached = self._file_cache.get(rel)
-            if cached and cached.mtime == current_mtime:
-                files.append(cached)
-                continue
+            cached = state.files.get(rel)
+            if cached and cached.mtime == st.st_mtime and cached.size == st.st_size:
+                files[rel] = cached
+            else:
+                pending.append((rel, lang))
+
+        deadline = time.monotonic() + self._scan_budget if self._scan_budget > 0 else None
+        use_pool = self._workers > 1 and len(pending) >= _PARALLEL_MIN_FILES and self.is_available()
+        if use_pool:
+            parsed, remaining = self._parse_parallel(root, pending, deadline)
+        else:
+            parsed, remaining = self._parse_serial(root, pending, deadline)
+        if remaining:
+            logger.info(
+                "Codebase index for %s is partial: scan budget of %.1fs left %d files unparsed",
+                root,
+                self._scan_budget,
+                len(remaining),
+            )
 
-            ts_lang = self._get_language(lang)
-            if ts_lang is None:
-                files.append(FileSymbols(path=rel, language=lang, mtime=current_mtime))
+        files.update(parsed)
+        changed = bool(parsed) or files.keys() != state.files.keys()
+        state.files = files
+        state.scanned_at = time.monotonic()
+        state.stale = bool(remaining)
+        state.dirty.clear()
+        if changed:
+            self._save_cache(root, files)
+        return len(parsed), [FileSymbols(path=rel, language=lang) for rel, lang in remaining]
+
+    def _apply_dirty(self, root: Path, state: _RootState) -> int:
+        """Re-index only the files reported through ``notify_changed()``."""
+        reparsed = 0
+        for rel in sorted(state.dirty):
+            fpath = root / rel
+            lang = self._language_for(rel)
+            excluded = any(self._is_excluded(part) for part in Path(rel).parts[:-1])
+            if lang is None or excluded or not fpath.is_file():
+                state.files.pop(rel, None)
                 continue
-
-            result = _parse_file(fpath, root, lang, parser, ts_lang)
+            result = self._parse_one(fpath, root, lang)
             if result:
-                self._file_cache[rel] = result
-                files.append(result)
+                reparsed += 1
+                state.files[rel] = result
+            else:
+                state.files.pop(rel, None)
+        state.dirty.clear()
+        self._save_cache(root, state.files)
+        return reparsed
 
-        ranked = _rank_files(files)
-        return CodebaseMap(root=str(root), files=ranked, scan_time=time.monotonic() - start)
+    def scan(self, root_dir: str) -> CodebaseMap:
+        """Scan a directory and build the codebase symbol map.
+
+        Served from memory while the root is fresh; dirty files are re-parsed
+        individually and a full (stat-only) walk happens every
+        ``refresh_interval`` seconds.  Large cold scans are parsed in worker
+        processes; if ``scan_budget`` runs out the map is marked partial and
+        the next call resumes where this one stopped.
+        """
+        root = Path(root_dir).resolve()
+        start = time.monotonic()
+
+        if not any((root / marker).exists() for marker in _PROJECT_MARKERS):
+            logger.debug("Skipping codebase index: no project markers in %s", root)
+            return CodebaseMap(root=str(root), files=[], scan_time=time.monotonic() - start)
+
+        with self._lock:
+            state = self._roots.get(str(root))
+            if state is None:
+                state = _RootState(files=self._load_cache(root))
+                self._roots[str(root)] = state
+
+            fresh = (
+                state.cmap is not None
+                and not state.stale
+                and time.monotonic() - state.scanned_at < self._refresh_interval
+            )
+            if fresh and not state.dirty:
+                assert state.cmap is not None
+                return state.cmap
+
+            placeholders: list[FileSymbols] = []
+            if fresh:
+                reparsed = self._apply_dirty(root, state)
+            else:
+                reparsed, placeholders = self._full_scan(root, state)
+
+            files = list(state.files.values()) + placeholders
+            ranked = _rank_files(files) if self.is_available() else sorted(files, key=lambda f: f.path)
+            state.cmap = CodebaseMap(
+                root=str(root),
+                files=ranked,
+                scan_time=time.monotonic() - start,
+                reparsed=reparsed,
+                partial=bool(placeholders),
+            )
+            state.formatted.clear()
+            return state.cmap
+
+    def notify_changed(self, paths: Iterable[str] | None = None) -> None:
+        """Record file changes reported by tools or watchers.
+
+        Paths inside an indexed root are re-parsed on the next ``scan()``;
+        passing ``None`` (changes unknown, e.g. after a shell command) forces
+        a full revalidation of every root.
+        """
+        with self._lock:
+            if paths is None:
+                for state in self._roots.values():
+                    state.stale = True
+                return
+            for raw in paths:
+                try:
+                    path = Path(raw).resolve()
+                except (OSError, ValueError):
+                    continue
+                for root_str, state in self._roots.items():
+                    try:
+                        rel = path.relative_to(root_str)
+                    except ValueError:
+                        continue
+                    state.dirty.add(str(rel))
 
     def format_map(self, cmap: CodebaseMap, token_budget: int = 1000) -> str:
         """Format the codebase map as a token-budgeted string."""
-        lines: list[str] = ["# Codebase Map (auto-generated)", ""]
+        header = "# Codebase Map (auto-generated)"
+        if cmap.partial:
+            header = "# Codebase Map (auto-generated, partial: indexing still in progress)"
+        lines: list[str] = [header, ""]
         current_tokens = _estimate_tokens("\n".join(lines))
 
         for fsym in cmap.files:
@@ -415,17 +759,49 @@ class CodebaseIndexService:
         cmap = self.scan(root_dir)
         if not cmap.files:
             return ""
+        with self._lock:
+            state = self._roots.get(cmap.root)
+            if state is not None and state.cmap is cmap and token_budget in state.formatted:
+                return state.formatted[token_budget]
         formatted = self.format_map(cmap, token_budget)
-        return f"\n<codebase_index>\n{formatted}\n</codebase_index>"
+        wrapped = f"\n<codebase_index>\n{formatted}\n</codebase_index>"
+        with self._lock:
+            if state is not None and state.cmap is cmap:
+                state.formatted[token_budget] = wrapped
+        return wrapped
 
 
 def create_index_service(
     config: Any,
+    *,
+    cache_dir: Path | None = None,
 ) -> CodebaseIndexService | None:
-    """Factory: create a CodebaseIndexService if enabled, else None."""
+    """Factory: create a CodebaseIndexService if enabled, else None.
+
+    Long-lived callers (web app, CLI session) should create one service and
+    reuse it, passing *cache_dir* to persist symbols between runs.
+    """
     if not config.codebase_index.enabled:
         return None
     return CodebaseIndexService(
         exclude_dirs=config.codebase_index.exclude_dirs,
         languages=config.codebase_index.languages or None,
+        cache_dir=cache_dir,
+        refresh_interval=float(config.codebase_index.refresh_interval),
+        workers=resolve_index_workers(int(config.codebase_index.parallel_workers)),
+        scan_budget=float(config.codebase_index.scan_budget),
     )
+
+
+def resolve_index_workers(configured: int) -> int:
+    """Map the ``parallel_workers`` setting to a worker count (0 = one per CPU, capped at 8)."""
+    if configured > 0:
+        return configured
+    return max(1, min(8, os.cpu_count() or 1))
+
+
+def index_cache_dir(config: Any) -> Path | None:
+    """Where persisted symbol caches live, or None when persistence is disabled."""
+    if not config.codebase_index.persist_cache:
+        return None
+    return Path(config.app.data_dir) / "cache" / "codebase_index"
@@ -140,13 +140,24 @@ def list_settable_fields(*, include_sensitive: bool = False) -> list[ConfigField
     bool_field_paths = [
         ("ai", "verify_ssl"),
         ("ai", "block_localhost_api"),
+        ("ai", "prompt_caching"),
+        ("ai", "http2"),
+        ("ai", "warmup_connections"),
+        ("ai", "response_cache"),
+        ("ai", "hedge_requests"),
+        ("ai", "endpoint_sticky"),
+        ("ai", "tool_selection"),
         ("app", "tls"),
         ("cli", "builtin_tools"),
         ("cli", "tool_dedup"),
+        ("cli", "tool_result_cache"),
+        ("cli", "context_budget"),
         ("cli.planning", "enabled"),
+        ("cli.compaction", "enabled"),
         ("embeddings", "enabled"),
         ("safety", "enabled"),
         ("safety", "read_only"),
+        ("safety.bash", "persistent_shell"),
         ("proxy", "enabled"),
         ("storage", "purge_attachments"),
         ("storage", "purge_embeddings"),
@@ -168,6 +179,7 @@ def list_settable_fields(*, include_sensitive: bool = False) -> list[ConfigField
         ("rag", "exclude_current"),
         ("reranker", "enabled"),
         ("codebase_index", "enabled"),
+        ("codebase_index", "persist_cache"),
         ("session", "log_session_events"),
         ("audit", "enabled"),
         ("audit", "redact_content"),
@@ -185,6 +197,7 @@ def list_settable_fields(*, include_sensitive: bool = False) -> list[ConfigField
         ("safety", "denied_tools"),
         ("proxy", "allowed_origins"),
         ("ai", "allowed_domains"),
+        ("ai", "tool_selection_pinned"),
         ("session", "allowed_ips"),
     ]
     for section_path, key in list_field_paths:
@@ -118,6 +118,28 @@ _KNOWN_KEYS: dict[str, set[str]] = {
         "block_localhost_api",
         "provider",
         "max_output_tokens",
+        "prompt_caching",
+        "http2",
+        "http_max_connections",
+        "http_max_keepalive",
+        "http_keepalive_expiry",
+        "warmup_connections",
+        "response_cache",
+        "response_cache_ttl",
+        "response_cache_max_entries",
+        "task_models",
+        "hedge_requests",
+        "hedge_min_delay",
+        "hedge_max_rate",
+        "request_deadline",
+        "endpoints",
+        "endpoint_failure_threshold",
+        "endpoint_cooldown",
+        "endpoint_health_interval",
+        "endpoint_sticky",
+        "tool_selection",
+        "tool_selection_top_n",
+        "tool_selection_pinned",
     },
     "app": {"host", "port", "data_dir", "tls"},
     "cli": {
@@ -126,6 +148,8 @@ _KNOWN_KEYS: dict[str, set[str]] = {
         "context_warn_tokens",
         "context_auto_compact_tokens",
         "tool_dedup",
+        "tool_result_cache",
+        "context_budget",
         "retry_delay",
         "max_retries",
         "esc_hint_delay",
@@ -137,8 +161,20 @@ _KNOWN_KEYS: dict[str, set[str]] = {
         "model_context_window",
         "planning",
         "usage",
+        "compaction",
+        "tool_concurrency",
     },
     "cli.planning": {"enabled", "auto_threshold_tools", "auto_mode"},
+    "cli.compaction": {
+        "enabled",
+        "soft_threshold",
+        "hard_threshold",
+        "keep_recent_messages",
+        "summary_max_tokens",
+        "strategy",
+        "recent_turns",
+    },
+    "cli.tool_concurrency": {"max_parallel", "bash", "mcp_per_server", "tool_limits"},
     "cli.usage": {"week_days", "month_days", "model_costs", "budgets"},
     "cli.usage.budgets": {
         "enabled",
@@ -177,6 +213,21 @@ _KNOWN_KEYS: dict[str, set[str]] = {
         "prompt_injection",
         "output_filter",
     },
+    "safety.bash": {
+        "enabled",
+        "timeout",
+        "max_output_chars",
+        "blocked_paths",
+        "allowed_paths",
+        "blocked_commands",
+        "allow_network",
+        "allow_package_install",
+        "log_all_commands",
+        "persistent_shell",
+        "shell_idle_timeout",
+        "shell_max_sessions",
+        "sandbox",
+    },
     "safety.dlp": {
         "enabled",
         "scan_output",
@@ -219,8 +270,19 @@ _KNOWN_KEYS: dict[str, set[str]] = {
         "timeout",
         "max_output_chars",
         "max_prompt_chars",
+        "global_max_concurrent",
+        "max_concurrent_per_user",
+        "queue_timeout",
+        "max_tokens_per_conversation",
+    },
+    "proxy": {
+        "enabled",
+        "allowed_origins",
+        "embeddings_max_batch",
+        "embeddings_batch_wait_ms",
+        "embeddings_cache_size",
+        "embeddings_rate_limit",
     },
-    "proxy": {"enabled", "allowed_origins"},
     "storage": {
         "retention_days",
         "retention_check_interval",
@@ -228,6 +290,10 @@ _KNOWN_KEYS: dict[str, set[str]] = {
         "purge_embeddings",
         "encrypt_at_rest",
         "encryption_kdf",
+        "job_poll_interval",
+        "job_lease_seconds",
+        "job_max_attempts",
+        "job_retention_hours",
     },
     "identity": {"user_id", "display_name", "public_key", "private_key"},
     "references": {"instructions", "rules", "skills"},
@@ -240,6 +306,8 @@ _KNOWN_KEYS: dict[str, set[str]] = {
         "include_conversations",
         "exclude_current",
         "retrieval_mode",
+        "mmr_lambda",
+        "near_duplicate_threshold",
     },
     "reranker": {
         "enabled",
@@ -250,7 +318,16 @@ _KNOWN_KEYS: dict[str, set[str]] = {
         "candidate_multiplier",
         "cache_dir",
     },
-    "codebase_index": {"enabled", "map_tokens", "languages", "exclude_dirs"},
+    "codebase_index": {
+        "enabled",
+        "map_tokens",
+        "persist_cache",
+        "refresh_interval",
+        "parallel_workers",
+        "scan_budget",
+        "languages",
+        "exclude_dirs",
+    },
     "session": {
         "store",
         "max_concurrent_sessions",
@@ -283,6 +360,15 @@ _INT_FIELDS: list[tuple[str, str, int, int, int]] = [
     ("ai", "retry_max_attempts", 0, 10, 3),
     ("ai", "narration_cadence", 0, 100, 5),
     ("ai", "max_tools", 0, 1000, 128),
+    ("ai", "http_max_connections", 1, 1000, 100),
+    ("ai", "http_max_keepalive", 0, 1000, 20),
+    ("ai", "http_keepalive_expiry", 1, 600, 60),
+    ("ai", "response_cache_ttl", 60, 31_536_000, 604_800),
+    ("ai", "response_cache_max_entries", 100, 1_000_000, 10_000),
+    ("ai", "request_deadline", 0, 86_400, 0),
+    ("ai", "endpoint_failure_threshold", 1, 100, 3),
+    ("ai", "endpoint_health_interval", 0, 3600, 30),
+    ("ai", "tool_selection_top_n", 1, 500, 24),
     ("app", "port", 1, 65535, 8080),
     ("cli", "max_tool_iterations", 1, 200, 50),
     ("cli", "context_warn_tokens", 1000, 1_000_000, 80_000),
@@ -292,13 +378,23 @@ _INT_FIELDS: list[tuple[str, str, int, int, int]] = [
     ("cli", "file_reference_max_chars", 1000, 10_000_000, 100_000),
     ("cli", "model_context_window", 1000, 2_000_000, 128_000),
     ("cli.planning", "auto_threshold_tools", 0, 200, 15),
+    ("cli.compaction", "keep_recent_messages", 2, 100, 6),
+    ("cli.compaction", "summary_max_tokens", 100, 8000, 1000),
+    ("cli.compaction", "recent_turns", 1, 50, 4),
+    ("cli.tool_concurrency", "max_parallel", 0, 256, 8),
+    ("cli.tool_concurrency", "bash", 1, 64, 4),
+    ("cli.tool_concurrency", "mcp_per_server", 0, 256, 4),
     ("cli.usage", "week_days", 1, 365, 7),
     ("cli.usage", "month_days", 1, 365, 30),
     ("cli.usage.budgets", "max_tokens_per_request", 0, 100_000_000, 0),
     ("cli.usage.budgets", "max_tokens_per_conversation", 0, 100_000_000, 0),
     ("cli.usage.budgets", "max_tokens_per_day", 0, 100_000_000, 0),
     ("cli.usage.budgets", "warn_threshold_percent", 0, 100, 80),
+    ("codebase_index", "refresh_interval", 0, 3600, 30),
+    ("codebase_index", "parallel_workers", 0, 64, 0),
     ("safety", "approval_timeout", 10, 600, 120),
+    ("safety.bash", "shell_idle_timeout", 10, 86_400, 600),
+    ("safety.bash", "shell_max_sessions", 1, 1024, 32),
     ("safety.tool_rate_limit", "max_calls_per_minute", 0, 100_000, 0),
     ("safety.tool_rate_limit", "max_calls_per_conversation", 0, 100_000, 0),
     ("safety.tool_rate_limit", "max_consecutive_failures", 0, 1000, 5),
@@ -309,8 +405,21 @@ _INT_FIELDS: list[tuple[str, str, int, int, int]] = [
     ("safety.subagent", "timeout", 10, 600, 120),
     ("safety.subagent", "max_output_chars", 100, 100_000, 4000),
     ("safety.subagent", "max_prompt_chars", 100, 100_000, 32_000),
+    ("safety.subagent", "global_max_concurrent", 1, 200, 8),
+    ("safety.subagent", "max_concurrent_per_user", 1, 200, 4),
+    ("safety.subagent", "queue_timeout", 1, 3600, 120),
+    ("safety.subagent", "max_tokens_per_conversation", 0, 100_000_000, 0),
+    ("proxy", "embeddings_max_batch", 1, 2048, 64),
+    ("proxy", "embeddings_batch_wait_ms", 0, 1000, 10),
+    ("proxy", "embeddings_cache_size", 0, 1_000_000, 2048),
+    ("proxy", "embeddings_rate_limit", 0, 1_000_000, 600),
+    ("rag", "near_duplicate_threshold", -1, 32, 3),
     ("storage", "retention_days", 0, 36500, 0),
     ("storage", "retention_check_interval", 60, 86400, 3600),
+    ("storage", "job_poll_interval", 1, 60, 2),
+    ("storage", "job_lease_seconds", 10, 3600, 120),
+    ("storage", "job_max_attempts", 1, 50, 5),
+    ("storage", "job_retention_hours", 1, 8760, 24),
     ("safety.prompt_injection", "canary_length", 8, 64, 16),
 ]
 
@@ -319,11 +428,18 @@ _FLOAT_FIELDS: list[tuple[str, str, float, float, float]] = [
     ("ai", "retry_backoff_base", 0.1, 30.0, 1.0),
     ("ai", "temperature", 0.0, 2.0, 1.0),
     ("ai", "top_p", 0.0, 1.0, 1.0),
+    ("ai", "hedge_min_delay", 0.1, 60.0, 2.0),
+    ("ai", "hedge_max_rate", 0.0, 1.0, 0.1),
+    ("ai", "endpoint_cooldown", 1.0, 3600.0, 30.0),
+    ("rag", "mmr_lambda", 0.0, 1.0, 0.7),
     ("cli", "retry_delay", 1.0, 60.0, 5.0),
     ("cli", "esc_hint_delay", 0.0, 60.0, 3.0),
     ("cli", "stall_display_threshold", 1.0, 120.0, 5.0),
     ("cli", "stall_warning_threshold", 1.0, 300.0, 15.0),
     ("cli", "stall_throughput_threshold", 0.0, 1000.0, 30.0),
+    ("cli.compaction", "soft_threshold", 0.1, 0.95, 0.6),
+    ("cli.compaction", "hard_threshold", 0.1, 0.99, 0.85),
+    ("codebase_index", "scan_budget", 0.0, 600.0, 15.0),
     ("safety.prompt_injection", "heuristic_threshold", 0.0, 1.0, 0.7),
 ]
 
@@ -331,6 +447,7 @@ _FLOAT_FIELDS: list[tuple[str, str, float, float, float]] = [
 _ENUM_FIELDS: list[tuple[str, str, set[str]]] = [
     ("safety", "approval_mode", {"auto", "ask_for_dangerous", "ask_for_writes", "ask"}),
     ("cli.planning", "auto_mode", {"off", "suggest", "auto"}),
+    ("cli.compaction", "strategy", {"summarize", "select"}),
     ("cli.usage.budgets", "action_on_exceed", {"block", "warn"}),
     ("safety.tool_rate_limit", "action", {"block", "warn"}),
     ("safety.dlp", "action", {"redact", "block", "warn"}),
@@ -341,6 +458,9 @@ _ENUM_FIELDS: list[tuple[str, str, set[str]]] = [
 ]
 
 # MCP server known keys
+_TASK_MODEL_CLASSES = ("title", "summarize", "classify")
+_TASK_MODEL_KEYS = {"model", "base_url", "provider", "api_key", "fallback"}
+
 _MCP_SERVER_KEYS = {
     "name",
     "transport",
@@ -511,10 +631,20 @@ def validate_config(raw: dict[str, Any]) -> ValidationResult:
     for section_path, key in [
         ("ai", "verify_ssl"),
         ("ai", "block_localhost_api"),
+        ("ai", "prompt_caching"),
+        ("ai", "http2"),
+        ("ai", "warmup_connections"),
+        ("ai", "response_cache"),
+        ("ai", "hedge_requests"),
+        ("ai", "endpoint_sticky"),
+        ("ai", "tool_selection"),
         ("app", "tls"),
         ("cli", "builtin_tools"),
         ("cli", "tool_dedup"),
+        ("cli", "tool_result_cache"),
+        ("cli", "context_budget"),
         ("cli.planning", "enabled"),
+        ("cli.compaction", "enabled"),
         ("embeddings", "enabled"),
         ("safety", "enabled"),
         ("safety", "read_only"),
@@ -553,6 +683,8 @@ def validate_config(raw: dict[str, Any]) -> ValidationResult:
         ("safety", "denied_tools"),
         ("proxy", "allowed_origins"),
         ("ai", "allowed_domains"),
+        ("ai", "endpoints"),
+        ("ai", "tool_selection_pinned"),
     ]:
         section = _get_section(raw, section_path)
         if section is None or key not in section:
@@ -645,6 +777,57 @@ def validate_config(raw: dict[str, Any]) -> ValidationResult:
                     )
                 )
 
+    # Validate ai.task_models routes
+    ai_section = raw.get("ai", {})
+    task_models = ai_section.get("task_models") if isinstance(ai_section, dict) else None
+    if task_models is not None and not isinstance(task_models, dict):
+        result.errors.append(
+            ConfigError(
+                path="ai.task_models",
+                message="expected a mapping of task class to model (will be ignored)",
+                severity="warning",
+            )
+        )
+    elif isinstance(task_models, dict):
+        for task, route in task_models.items():
+            prefix = f"ai.task_models.{task}"
+            if task not in _TASK_MODEL_CLASSES:
+                result.errors.append(
+                    ConfigError(
+                        path=prefix,
+                        message=f"unknown task class '{task}'; expected one of: {', '.join(_TASK_MODEL_CLASSES)}",
+                        severity="warning",
+                    )
+                )
+                continue
+            if isinstance(route, dict):
+                if not route.get("model"):
+                    result.errors.append(
+                        ConfigError(path=f"{prefix}.model", message="a model name is required", severity="warning")
+                    )
+                provider = route.get("provider")
+                if provider and provider not in ("openai", "anthropic", "litellm"):
+                    result.errors.append(
+                        ConfigError(
+                            path=f"{prefix}.provider",
+                            message=f"invalid provider '{provider}'; must be 'openai', 'anthropic' or 'litellm'",
+                            severity="warning",
+                        )
+                    )
+                for key in route:
+                    if key not in _TASK_MODEL_KEYS:
+                        result.errors.append(
+                            ConfigError(path=f"{prefix}.{key}", message=f"unknown key '{key}'", severity="warning")
+                        )
+            elif not isinstance(route, str) or not route.strip():
+                result.errors.append(
+                    ConfigError(
+                        path=prefix,
+                        message="expected a model name or a mapping with 'model' (will be ignored)",
+                        severity="warning",
+                    )
+                )
+
     # Validate proxy origins format
     proxy = raw.get("proxy", {})
     if isinstance(proxy, dict):
@@ -669,6 +852,22 @@ def validate_config(raw: dict[str, Any]) -> ValidationResult:
                         )
                     )
 
+    # Tools the tool scheduler never caps
+    concurrency = _get_section(raw, "cli.tool_concurrency")
+    tool_limits = concurrency.get("tool_limits") if concurrency is not None else None
+    if isinstance(tool_limits, dict):
+        from .tool_scheduler import UNCAPPED_TOOLS
+
+        for name in tool_limits:
+            if name in UNCAPPED_TOOLS:
+                result.errors.append(
+                    ConfigError(
+                        path=f"cli.tool_concurrency.tool_limits.{name}",
+                        message=f"'{name}' waits on sub-agents or the user and is never capped (will be ignored)",
+                        severity="warning",
+                    )
+                )
+
     return result
 
 
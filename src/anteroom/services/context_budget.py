@@ -0,0 +1,204 @@
+"""One token budget for everything a chat request sends to the model.
+
+The parts of a request used to be sized independently -- ``rag.max_tokens``,
+``codebase_index.map_tokens``, the canvas and source caps -- so together they
+could overflow ``cli.model_context_window`` or leave most of it unused.  With
+``cli.context_budget`` on, every web chat turn gets a ``ContextBudget``:
+
+- **reserved parts** are counted first and never trimmed here: room for the
+  reply (``ai.max_output_tokens``), tool schemas, the trusted system prompt
+  (instructions, artifacts, skills) and the conversation history, which the
+  compactor summarizes on its own schedule.
+- **flexible sections** (codebase map, sources, canvas, RAG) share what is
+  left.  Each asks for up to its own cap; the pool is split in proportion to
+  priority weight times observed usefulness, and a section that needs less
+  than its share passes the rest on.  Sources the user attached explicitly
+  keep a minimum (``SECTION_MINIMUMS``) even when the reserved parts fill
+  the window.
+- **usefulness** is the share of a reply's vocabulary that also appeared in
+  a section, as a per-process EWMA.  Sections the model keeps drawing on get
+  up to 1.5x their weight, ignored ones down to 0.5x.
+
+Producers fit their own budget: RAG keeps fewer chunks, the codebase map lists
+fewer files, sources and canvas are truncated.  Counts use the model's
+tokenizer (``TokenCounter``).  The final split is reported as
+``prompt_meta["context_budget"]``.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from typing import Any
+
+from .token_counter import TokenCounter
+
+# Relative share of the flexible pool, before usefulness weighting
+SECTION_WEIGHTS: dict[str, float] = {
+    "sources": 4.0,  # attached explicitly by the user
+    "canvas": 3.0,
+    "rag": 2.0,
+    "codebase_map": 1.0,
+}
+
+# Tokens a section keeps even when the reserved parts leave no pool
+SECTION_MINIMUMS: dict[str, int] = {
+    "sources": 1000,  # an attachment the user chose should not silently vanish
+}
+
+# Weight of the newest reply in the usefulness EWMA
+_EWMA_ALPHA = 0.2
+# Usefulness assumed for a section that has not been observed yet
+_DEFAULT_USEFULNESS = 0.5
+# Replies with fewer distinct terms say too little to judge a section
+_MIN_REPLY_TERMS = 5
+
+_TERM_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{4,}")
+
+
+def _terms(text: str) -> set[str]:
+    return {t.lower() for t in _TERM_RE.findall(text)}
+
+
+class UsefulnessTracker:
+    """Per-section EWMA of how much of the model's replies drew on that section."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._scores: dict[str, float] = {}
+
+    def weight(self, section: str) -> float:
+        """Multiplier between 0.5 and 1.5 for *section*'s share of the pool."""
+        with self._lock:
+            return 0.5 + self._scores.get(section, _DEFAULT_USEFULNESS)
+
+    def observe(self, sections: dict[str, str], reply: str) -> None:
+        """Score each section that was sent by its overlap with *reply*."""
+        reply_terms = _terms(reply)
+        if len(reply_terms) < _MIN_REPLY_TERMS:
+            return
+        for name, text in sections.items():
+            if not text:
+                continue
+            overlap = len(reply_terms & _terms(text)) / len(reply_terms)
+            with self._lock:
+                score = self._scores.get(name, _DEFAULT_USEFULNESS)
+                self._scores[name] = score + _EWMA_ALPHA * (overlap - score)
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return {name: round(score, 3) for name, score in sorted(self._scores.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._scores.clear()
+
+
+usefulness_tracker = UsefulnessTracker()
+
+
+def split_pool(pool: int, demands: dict[str, int], weights: dict[str, float]) -> dict[str, int]:
+    """Divide *pool* tokens among *demands* in proportion to *weights* (water-filling).
+
+    No section gets more than it asked for; what a small section leaves is
+    shared among the rest.
+    """
+    budgets = {name: 0 for name in demands}
+    pending = {name for name, demand in demands.items() if demand > 0}
+    while pending and pool > 0:
+        total = sum(weights.get(name, 1.0) for name in pending)
+        shares = {name: pool * weights.get(name, 1.0) / total for name in pending}
+        satisfied = {name for name in pending if demands[name] <= shares[name]}
+        if not satisfied:
+            for name in pending:
+                budgets[name] = int(shares[name])
+            break
+        for name in satisfied:
+            budgets[name] = demands[name]
+            pool -= demands[name]
+        pending -= satisfied
+    return budgets
+
+
+class ContextBudget:
+    """Token allocation for one request against the model's context window."""
+
+    def __init__(
+        self,
+        window: int,
+        counter: TokenCounter,
+        *,
+        usefulness: UsefulnessTracker | None = None,
+    ) -> None:
+        self.window = window
+        self.counter = counter
+        self._usefulness = usefulness if usefulness is not None else usefulness_tracker
+        self.reserved: dict[str, int] = {}
+        self.budgets: dict[str, int] = {}
+        self.used: dict[str, int] = {}
+        self._weights: dict[str, float] = {}
+        self._texts: dict[str, str] = {}
+
+    def reserve(self, name: str, tokens: int) -> None:
+        """Count *tokens* for a part that is sent as is (reply, tools, history, system prompt)."""
+        self.reserved[name] = self.reserved.get(name, 0) + max(0, tokens)
+
+    @property
+    def available(self) -> int:
+        """Tokens left for flexible sections after the reserved parts."""
+        return max(0, self.window - sum(self.reserved.values()))
+
+    def allocate(self, demands: dict[str, int]) -> dict[str, int]:
+        """Budget per flexible section; *demands* are the most each one would use.
+
+        Sections in ``SECTION_MINIMUMS`` get their minimum (or their whole
+        demand, if smaller) first, even beyond the window.
+        """
+        self._weights = {name: SECTION_WEIGHTS.get(name, 1.0) * self._usefulness.weight(name) for name in demands}
+        floors = {name: min(SECTION_MINIMUMS.get(name, 0), max(0, demand)) for name, demand in demands.items()}
+        pool = max(0, self.available - sum(floors.values()))
+        rest = split_pool(pool, {name: demand - floors[name] for name, demand in demands.items()}, self._weights)
+        self.budgets = {name: floors[name] + rest[name] for name in demands}
+        return dict(self.budgets)
+
+    def reserve_history(self, tokens: int, soft_limit: int) -> None:
+        """Reserve the history as sent: compaction or selection keep it under *soft_limit*."""
+        self.reserve("history", min(tokens, soft_limit) if soft_limit > 0 else tokens)
+
+    def record(self, name: str, text: str) -> None:
+        """What a flexible section actually sent, after fitting its budget."""
+        self.used[name] = self.counter.count_text(text) if text else 0
+        self._texts[name] = text
+
+    def observe_reply(self, reply: str) -> None:
+        """Feed the model's reply back into the usefulness scores."""
+        self._usefulness.observe(self._texts, reply)
+
+    def allocation(self) -> dict[str, Any]:
+        """The final split, for ``prompt_meta``."""
+        total = sum(self.reserved.values()) + sum(self.used.values())
+        return {
+            "window": self.window,
+            "reserved": dict(self.reserved),
+            "budgets": dict(self.budgets),
+            "used": dict(self.used),
+            "weights": {name: round(w, 3) for name, w in self._weights.items()},
+            "free": self.window - total,
+        }
+
+
+def budget_for(config: Any, counter: TokenCounter) -> ContextBudget | None:
+    """A budget for one request under *config* (an ``AppConfig``), or None when disabled.
+
+    The reply's ``ai.max_output_tokens`` is reserved up front.
+    """
+    cli = getattr(config, "cli", None)
+    if getattr(cli, "context_budget", True) is False:
+        return None
+    window = getattr(cli, "model_context_window", None)
+    if not isinstance(window, int) or isinstance(window, bool):
+        return None
+    budget = ContextBudget(window, counter)
+    output = getattr(getattr(config, "ai", None), "max_output_tokens", 0)
+    budget.reserve("output", output if isinstance(output, int) else 0)
+    return budget
@@ -0,0 +1,292 @@
+"""Token-budget driven, incremental context compaction for the agent loop.
+
+Instead of summarising the whole history in one blocking call once a fixed
+message count is reached, ``ContextCompactor`` watches the token usage of
+the conversation against the model's context window:
+
+- Past the *soft* limit it summarises the oldest un-summarised span in a
+  background task while the agent keeps working.
+- When that summary is ready it is swapped in as a single rolling summary
+  message (earlier summaries are folded into the new one).
+- Only past the *hard* limit does the loop wait for (or start) a summary
+  before the next model call.
+
+An ``on_summary`` callback lets callers persist each rolling summary as soon
+as it is generated (even if the request that started it has finished), so a
+reloaded conversation starts from the summary instead of re-summarising.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from .task_routing import TASK_SUMMARIZE
+from .token_counter import TokenCounter, get_token_counter
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Previous conversation summary"
+
+_SUMMARY_INSTRUCTIONS = (
+    "- Key decisions and conclusions\n"
+    "- File paths that were read, written, or edited\n"
+    "- Important code changes and their purpose\n"
+    "- Which steps of any multi-step plan have been COMPLETED (tool_result SUCCESS) vs remaining\n"
+    "- Current state of the task — what has been done and what is next\n"
+    "- Any errors encountered and how they were resolved\n\n"
+)
+
+# Blocking compaction rounds allowed before giving up on reaching the hard limit
+_MAX_BLOCKING_ROUNDS = 3
+
+# Strong references so summaries still finish (and persist) after their request ends
+_background_tasks: set[asyncio.Task[Any]] = set()
+
+
+@dataclass
+class CompactionPolicy:
+    """Token thresholds for compaction, as fractions of the context window."""
+
+    context_window: int = 128_000
+    soft_threshold: float = 0.6
+    hard_threshold: float = 0.85
+    keep_recent_messages: int = 6
+    summary_max_tokens: int = 1000
+
+    @property
+    def soft_limit(self) -> int:
+        return int(self.context_window * self.soft_threshold)
+
+    @property
+    def hard_limit(self) -> int:
+        return int(self.context_window * max(self.hard_threshold, self.soft_threshold))
+
+    @classmethod
+    def from_config(cls, config: Any) -> CompactionPolicy:
+        """Build a policy from an ``AppConfig`` (``cli.model_context_window`` + ``cli.compaction``)."""
+        cli = getattr(config, "cli", None)
+        policy = cls()
+        window = getattr(cli, "model_context_window", None)
+        if isinstance(window, int):
+            policy.context_window = window
+        comp = getattr(cli, "compaction", None)
+        for name in ("soft_threshold", "hard_threshold", "keep_recent_messages", "summary_max_tokens"):
+            value = getattr(comp, name, None)
+            if isinstance(value, (int, float)):
+                setattr(policy, name, value)
+        return policy
+
+
+@dataclass
+class RollingSummary:
+    text: str
+    covered_messages: int  # original messages folded into the summary so far
+
+
+def format_summary_message(summary: RollingSummary) -> dict[str, Any]:
+    return {
+        "role": "system",
+        "content": (f"{SUMMARY_PREFIX} (auto-compacted from {summary.covered_messages} messages):\n\n{summary.text}"),
+    }
+
+
+def _build_summary_prompt(previous: str | None, span: list[dict[str, Any]]) -> str:
+    from .agent_loop import _build_compaction_history
+
+    history_text = _build_compaction_history(span)
+    if previous:
+        return (
+            "Update the running summary of a conversation with the newer messages below. "
+            "Produce one concise summary that replaces the old one, preserving:\n"
+            + _SUMMARY_INSTRUCTIONS
+            + "Running summary so far:\n"
+            + previous
+            + "\n\nNewer messages:\n"
+            + history_text
+        )
+    return "Summarize the following conversation concisely, preserving:\n" + _SUMMARY_INSTRUCTIONS + history_text
+
+
+class ContextCompactor:
+    """Keeps a message list under the policy's token budget with rolling summaries.
+
+    One compactor follows one conversation's message list; the list is
+    mutated in place when a summary is swapped in.  With ``background=False``
+    summaries are only produced (blocking) at the hard limit and no task ever
+    outlives a call.
+    """
+
+    def __init__(
+        self,
+        ai_service: Any,
+        policy: CompactionPolicy | None = None,
+        *,
+        counter: TokenCounter | None = None,
+        background: bool = True,
+        on_summary: Callable[[RollingSummary, list[dict[str, Any]]], Any] | None = None,
+    ) -> None:
+        self._ai_service = ai_service
+        self.policy = policy or CompactionPolicy()
+        if counter is None:
+            cfg = getattr(ai_service, "config", None)
+            counter = get_token_counter(getattr(cfg, "model", None), getattr(cfg, "provider", None))
+        self._counter = counter
+        self._background = background
+        self._on_summary = on_summary
+        self._summary: RollingSummary | None = None
+        self._summary_msg: dict[str, Any] | None = None
+        self._task: asyncio.Task[RollingSummary | None] | None = None
+        self._span: list[dict[str, Any]] = []
+        self._reserved = 0
+        self.background_runs = 0
+        self.blocking_waits = 0
+        self.swaps = 0
+
+    @property
+    def ai_service(self) -> Any:
+        return self._ai_service
+
+    @property
+    def summary(self) -> RollingSummary | None:
+        return self._summary
+
+    @property
+    def pending(self) -> bool:
+        return self._task is not None
+
+    def reserve(self, extra_system_prompt: str | None, tools: list[dict[str, Any]] | None) -> None:
+        """Account for prompt parts sent with every call but not in the message list."""
+        reserved = self.policy.summary_max_tokens
+        if extra_system_prompt:
+            reserved += self._counter.count_text(extra_system_prompt)
+        if tools:
+            reserved += self._counter.count_text(json.dumps(tools))
+        self._reserved = reserved
+
+    def adopt(self, message: dict[str, Any], summary: RollingSummary) -> None:
+        """Treat *message* (already at the head of the list) as the current rolling summary."""
+        self._summary = summary
+        self._summary_msg = message
+
+    def usage(self, messages: list[dict[str, Any]]) -> int:
+        return self._reserved + self._counter.count_messages(messages)
+
+    def _select_span(self, messages: list[dict[str, Any]], target: int) -> tuple[int, int]:
+        """Oldest un-summarised span worth at least *target* tokens, never splitting tool results."""
+        start = 1 if messages and messages[0] is self._summary_msg else 0
+        limit = len(messages) - self.policy.keep_recent_messages
+        end = start
+        freed = 0
+        while end < limit and freed < target:
+            freed += self._counter.count_message(messages[end])
+            end += 1
+        # Tool results must stay with the assistant message that requested them
+        while end < len(messages) and messages[end].get("role") == "tool":
+            end += 1
+        if end >= len(messages):
+            end = start
+        return start, end
+
+    def _start(self, messages: list[dict[str, Any]]) -> bool:
+        if self._task is not None:
+            return False
+        target = self.usage(messages) - self.policy.soft_limit // 2
+        start, end = self._select_span(messages, max(target, 1))
+        if end - start < 2:
+            return False
+        self._span = messages[start:end]
+        folded = self._summary if start == 1 else None
+        covered = (folded.covered_messages if folded else 0) + len(self._span)
+        task = asyncio.create_task(self._summarize(folded.text if folded else None, list(self._span), covered))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        self._task = task
+        return True
+
+    async def _summarize(self, previous: str | None, span: list[dict[str, Any]], covered: int) -> RollingSummary | None:
+        try:
+            text = await self._ai_service.complete(
+                messages=[{"role": "user", "content": _build_summary_prompt(previous, span)}],
+                max_completion_tokens=self.policy.summary_max_tokens,
+                cacheable=True,
+                task=TASK_SUMMARIZE,
+            )
+        except Exception:
+            logger.exception("Failed to generate rolling compaction summary")
+            return None
+        if not text:
+            return None
+        summary = RollingSummary(text=text, covered_messages=covered)
+        if self._on_summary is not None:
+            try:
+                self._on_summary(summary, span)
+            except Exception:
+                logger.warning("Failed to persist rolling summary", exc_info=True)
+        return summary
+
+    def maybe_start(self, messages: list[dict[str, Any]]) -> bool:
+        """Start a background summary once usage passes the soft limit."""
+        if not self._background or self.usage(messages) < self.policy.soft_limit:
+            return False
+        started = self._start(messages)
+        if started:
+            self.background_runs += 1
+            logger.info("Background compaction started: %d messages", len(self._span))
+        return started
+
+    def apply_ready(self, messages: list[dict[str, Any]]) -> bool:
+        """Swap a finished summary into *messages*.  Never blocks."""
+        task = self._task
+        if task is None or not task.done():
+            return False
+        self._task = None
+        span, self._span = self._span, []
+        summary = None if task.cancelled() else task.result()
+        if summary is None:
+            return False
+        start = 1 if messages and messages[0] is self._summary_msg else 0
+        end = start + len(span)
+        if len(messages) < end or any(a is not b for a, b in zip(messages[start:end], span)):
+            # The list was rewritten underneath us (e.g. emergency compaction)
+            return False
+        summary_msg = format_summary_message(summary)
+        messages[:end] = [summary_msg]
+        self._summary = summary
+        self._summary_msg = summary_msg
+        self.swaps += 1
+        logger.info("Swapped in rolling summary covering %d messages", summary.covered_messages)
+        return True
+
+    async def ensure_fits(self, messages: list[dict[str, Any]]) -> bool:
+        """Make *messages* fit under the hard limit before a model call.
+
+        Returns True when the list was compacted.  Below the hard limit this
+        only swaps in finished summaries and starts new background work.
+        """
+        compacted = self.apply_ready(messages)
+        rounds = 0
+        while self.usage(messages) >= self.policy.hard_limit and rounds < _MAX_BLOCKING_ROUNDS:
+            rounds += 1
+            if self._task is None:
+                self._start(messages)
+            if self._task is None:
+                break
+            self.blocking_waits += 1
+            await asyncio.wait({self._task})
+            if not self.apply_ready(messages):
+                break
+            compacted = True
+        self.maybe_start(messages)
+        return compacted
+
+    def cancel(self) -> None:
+        """Abandon any in-flight summary."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self._span = []
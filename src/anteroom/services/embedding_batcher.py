@@ -0,0 +1,215 @@
+"""Shared embedding front-end for the OpenAI-compatible proxy.
+
+Wraps an embedding service (local fastembed or upstream API) with three things
+the ``/v1/embeddings`` endpoint needs when several local tools share one model:
+
+- Dynamic batching: concurrent requests are coalesced into a single
+  ``embed_batch`` call, flushed when the batch fills or after a short wait.
+- A bounded LRU cache keyed by a hash of (model, text), so repeated inputs
+  never reach the model again.
+- A per-key sliding-window rate limiter.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any
+
+from .embeddings import EmbeddingTransientError
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_KEYS = 10000
+
+
+@dataclass
+class EmbeddingBatcherStats:
+    """Counters exposed for observability and tests."""
+
+    requests: int = 0
+    texts: int = 0
+    cache_hits: int = 0
+    batches: int = 0
+    batched_texts: int = 0
+
+
+class EmbeddingBatcher:
+    """Coalesce concurrent embedding requests into batched model calls.
+
+    ``service`` is any object with ``model``, ``dimensions`` and an async
+    ``embed_batch(texts, batch_size=...)`` method, i.e. ``EmbeddingService``
+    or ``LocalEmbeddingService``.
+    """
+
+    def __init__(
+        self,
+        service: Any,
+        *,
+        max_batch_size: int = 64,
+        max_wait_ms: int = 10,
+        cache_size: int = 2048,
+    ) -> None:
+        self._service = service
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max(0, max_wait_ms) / 1000.0
+        self._cache_size = max(0, cache_size)
+        self._cache: OrderedDict[str, list[float]] = OrderedDict()
+        self._pending: list[tuple[str, str, asyncio.Future[list[float] | None]]] = []
+        self._inflight: dict[str, asyncio.Future[list[float] | None]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task[None]] = set()
+        self.stats = EmbeddingBatcherStats()
+
+    @property
+    def model(self) -> str:
+        return str(self._service.model)
+
+    @property
+    def dimensions(self) -> int:
+        return int(self._service.dimensions)
+
+    def _cache_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode()).hexdigest()
+
+    def _cache_get(self, key: str) -> list[float] | None:
+        vec = self._cache.get(key)
+        if vec is not None:
+            self._cache.move_to_end(key)
+        return vec
+
+    def _cache_put(self, key: str, vec: list[float]) -> None:
+        if self._cache_size <= 0:
+            return
+        self._cache[key] = vec
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    async def embed(self, texts: list[str]) -> list[list[float] | None]:
+        """Embed ``texts``, returning one vector (or None for blank input) per text.
+
+        Raises whatever the wrapped service raises (``EmbeddingPermanentError``
+        / ``EmbeddingTransientError``) for the batch the texts landed in.
+        """
+        self.stats.requests += 1
+        self.stats.texts += len(texts)
+        results: list[list[float] | None] = [None] * len(texts)
+        waiting: list[tuple[int, asyncio.Future[list[float] | None]]] = []
+        loop = asyncio.get_running_loop()
+
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            key = self._cache_key(text)
+            cached = self._cache_get(key)
+            if cached is not None:
+                self.stats.cache_hits += 1
+                results[i] = cached
+                continue
+            fut = self._inflight.get(key)
+            if fut is None:
+                fut = loop.create_future()
+                self._inflight[key] = fut
+                self._pending.append((key, text, fut))
+            waiting.append((i, fut))
+
+        if self._pending:
+            self._schedule_flush(loop)
+
+        for i, fut in waiting:
+            results[i] = await asyncio.shield(fut)
+        return results
+
+    def _schedule_flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        if len(self._pending) >= self._max_batch_size or self._max_wait == 0:
+            self._cancel_timer()
+            self._spawn_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_wait, self._on_timer)
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._spawn_flush()
+
+    def _spawn_flush(self) -> None:
+        task = asyncio.ensure_future(self._flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self) -> None:
+        while self._pending:
+            batch = self._pending[: self._max_batch_size]
+            del self._pending[: self._max_batch_size]
+            self.stats.batches += 1
+            self.stats.batched_texts += len(batch)
+            texts = [text for _, text, _ in batch]
+            try:
+                vectors = await self._service.embed_batch(texts, batch_size=len(texts))
+                if len(vectors) != len(batch):
+                    raise EmbeddingTransientError(
+                        f"Embedding service returned {len(vectors)} vectors for {len(batch)} texts"
+                    )
+            except Exception as e:
+                for key, _, fut in batch:
+                    self._inflight.pop(key, None)
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (key, _, fut), vec in zip(batch, vectors):
+                self._inflight.pop(key, None)
+                if vec is not None:
+                    self._cache_put(key, vec)
+                if not fut.done():
+                    fut.set_result(vec)
+
+    async def close(self) -> None:
+        """Cancel the pending flush timer and wait for in-flight batches."""
+        self._cancel_timer()
+        if self._pending:
+            self._spawn_flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+class KeyedRateLimiter:
+    """Sliding-window request limiter keyed by caller identity.
+
+    ``max_per_minute`` of 0 disables limiting.
+    """
+
+    def __init__(self, max_per_minute: int = 0) -> None:
+        self._max = max(0, max_per_minute)
+        self._hits: OrderedDict[str, deque[float]] = OrderedDict()
+
+    def check(self, key: str) -> float:
+        """Record a request for ``key``.
+
+        Returns 0.0 when allowed, otherwise the seconds until a slot frees up.
+        """
+        if self._max <= 0:
+            return 0.0
+        now = time.monotonic()
+        hits = self._hits.get(key)
+        if hits is None:
+            hits = deque()
+            self._hits[key] = hits
+            while len(self._hits) > MAX_TRACKED_KEYS:
+                self._hits.popitem(last=False)
+        self._hits.move_to_end(key)
+        cutoff = now - 60.0
+        while hits and hits[0] <= cutoff:
+            hits.popleft()
+        if len(hits) >= self._max:
+            return max(0.0, hits[0] + 60.0 - now)
+        hits.append(now)
+        return 0.0
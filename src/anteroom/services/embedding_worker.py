@@ -12,6 +12,7 @@ from .embeddings import EmbeddingPermanentError, EmbeddingService, EmbeddingTran
 
 if TYPE_CHECKING:
     from ..db import ThreadSafeConnection
+    from .job_queue import JobQueue
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +49,7 @@ class EmbeddingWorker:
         self._store_failures: dict[str, int] = {}
         self._cycle_count = 0
         self._repair_offset = 0
+        self._job_queue: JobQueue | None = None
 
     @property
     def disabled(self) -> bool:
@@ -368,12 +370,56 @@ class EmbeddingWorker:
 
         return count
 
-    async def embed_message(self, message_id: str, content: str, conversation_id: str) -> None:
+    def register_jobs(self, queue: JobQueue) -> None:
+        """Embed new messages through the durable job queue instead of fire-and-forget tasks."""
+        self._job_queue = queue
+        queue.register("embed_message", self._run_embed_message_job, concurrency=4, timeout=120.0)
+
+    def enqueue_message(self, message_id: str, content: str, conversation_id: str) -> None:
+        """Schedule embedding of a newly created message.
+
+        With a job queue the work survives restarts and is retried with
+        backoff; otherwise it runs as a background task and anything it misses
+        is picked up by the next ``process_pending()`` cycle.
+        """
+        if len(content) < MIN_CONTENT_LENGTH:
+            return
+        if self._job_queue is not None:
+            self._job_queue.enqueue(
+                "embed_message",
+                {"message_id": message_id, "conversation_id": conversation_id},
+                dedupe_key=message_id,
+            )
+        else:
+            asyncio.create_task(self.embed_message(message_id, content, conversation_id))
+
+    async def _run_embed_message_job(self, payload: dict[str, Any]) -> None:
+        from .job_queue import PermanentJobError
+
+        if self._disabled:
+            # process_pending() catches up once the worker is re-enabled
+            return
+        row = self._db.execute_fetchone("SELECT content FROM messages WHERE id = ?", (payload["message_id"],))
+        if row is None:
+            return
+        try:
+            await self.embed_message(
+                payload["message_id"], row["content"], payload["conversation_id"], raise_errors=True
+            )
+        except EmbeddingPermanentError as e:
+            raise PermanentJobError(f"Permanent embedding error (status={e.status_code})") from e
+
+    async def embed_message(
+        self, message_id: str, content: str, conversation_id: str, *, raise_errors: bool = False
+    ) -> None:
         """Embed a single message (called inline after message creation).
 
         Unlike ``embed_source()``, this does NOT call ``save_all()`` because it
         is only invoked from within the background worker cycle where
         ``run_forever()`` handles flushing after ``process_pending()``.
+
+        Embedding API errors are logged and left for the worker to retry,
+        unless *raise_errors* is set (job queue handlers retry them instead).
         """
         if len(content) < MIN_CONTENT_LENGTH:
             return
@@ -382,6 +428,8 @@ class EmbeddingWorker:
         try:
             embedding = await self._service.embed(content)
         except (EmbeddingPermanentError, EmbeddingTransientError):
+            if raise_errors:
+                raise
             logger.warning("Embedding failed for message %s, will be retried by worker", message_id)
             return
         if embedding is None:
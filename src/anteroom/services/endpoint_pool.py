@@ -0,0 +1,306 @@
+"""Load balancing across equivalent OpenAI-compatible endpoints.
+
+``ai.endpoints`` lists extra base URLs serving the same models as
+``ai.base_url`` (regional gateways, vLLM replicas).  ``AIService`` then picks
+an endpoint for every request attempt:
+
+- **sticky routing**: turns of one conversation go back to the endpoint that
+  served it before, so the server's prefix cache stays warm, for as long as
+  that endpoint is healthy.
+- **power of two choices**: otherwise two random healthy endpoints are
+  compared by EWMA first-byte latency times (outstanding requests + 1),
+  penalised by their recent error rate, and the better one is used.
+- **circuit breakers**: ``ai.endpoint_failure_threshold`` consecutive
+  failures open an endpoint's circuit for ``ai.endpoint_cooldown`` seconds
+  (doubling, up to 8x, while it keeps failing).  Then a single request
+  probes it (half-open); success closes the circuit.
+- **health checks**: every ``ai.endpoint_health_interval`` seconds the web
+  server sends a ``HEAD`` to each endpoint.  An unreachable endpoint counts
+  a failure; a reachable one with an open circuit is probed straight away.
+
+A retry after a failed attempt goes to a different endpoint when one is
+available.  If every circuit is open, requests still go to the endpoint
+closest to its probe rather than failing outright.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Collection
+from typing import Any
+from urllib.parse import urlparse
+
+from .http_pool import http_clients
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the latency and error-rate EWMAs
+_EWMA_ALPHA = 0.3
+# Assumed first-byte latency (seconds) while no endpoint has samples; after that an
+# unmeasured endpoint is scored like the fastest one so it gets explored
+_DEFAULT_LATENCY = 1.0
+# Conversations remembered for sticky routing
+_MAX_STICKY = 10_000
+# An open circuit's cooldown doubles per failed probe, up to base * 2**_MAX_BACKOFF
+_MAX_BACKOFF = 3
+
+
+def conversation_key(messages: list[dict[str, Any]]) -> str | None:
+    """Sticky-routing key for a conversation: a hash of its first user message."""
+    for msg in messages:
+        if msg.get("role") == "user":
+            content = json.dumps(msg.get("content"), sort_keys=True, default=str)
+            return hashlib.sha256(content.encode()).hexdigest()[:16]
+    return None
+
+
+class _Endpoint:
+    __slots__ = (
+        "url",
+        "outstanding",
+        "latency",
+        "error_rate",
+        "failures",
+        "backoff",
+        "retry_at",
+        "probing",
+        "requests",
+        "errors",
+    )
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.outstanding = 0
+        self.latency: float | None = None  # EWMA first-byte seconds
+        self.error_rate = 0.0  # EWMA of failed (1) / succeeded (0) requests
+        self.failures = 0  # consecutive
+        self.backoff = 0
+        self.retry_at: float | None = None  # None: circuit closed
+        self.probing = False
+        self.requests = 0
+        self.errors = 0
+
+
+class EndpointPool:
+    """Health, load and circuit state for a set of equivalent endpoints."""
+
+    def __init__(
+        self,
+        urls: list[str],
+        *,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._endpoints = {url: _Endpoint(url) for url in urls}
+        self._failure_threshold = max(1, failure_threshold)
+        self._cooldown = cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sticky: OrderedDict[str, str] = OrderedDict()
+
+    @property
+    def urls(self) -> list[str]:
+        return list(self._endpoints)
+
+    def _state(self, ep: _Endpoint, now: float) -> str:
+        if ep.retry_at is None:
+            return "closed"
+        return "open" if now < ep.retry_at else "half_open"
+
+    def _usable(self, ep: _Endpoint, now: float) -> bool:
+        state = self._state(ep, now)
+        return state == "closed" or (state == "half_open" and not ep.probing)
+
+    def _score(self, ep: _Endpoint) -> float:
+        latency = ep.latency
+        if latency is None:
+            known = [e.latency for e in self._endpoints.values() if e.latency is not None]
+            latency = min(known) if known else _DEFAULT_LATENCY
+        return latency * (ep.outstanding + 1) * (1.0 + 4.0 * ep.error_rate)
+
+    def choose(self, sticky_key: str | None = None, exclude: Collection[str] = ()) -> str:
+        """Pick the endpoint for one request attempt and count it as outstanding.
+
+        Every call must be paired with ``release()``.  Endpoints in *exclude*
+        (those that just failed this request) are avoided when possible.
+        """
+        with self._lock:
+            now = self._clock()
+            usable = [ep for ep in self._endpoints.values() if self._usable(ep, now)]
+            candidates = [ep for ep in usable if ep.url not in exclude] or usable
+            chosen: _Endpoint | None = None
+            if not candidates:
+                # Every circuit is open: use the endpoint closest to its probe
+                chosen = min(self._endpoints.values(), key=lambda ep: ep.retry_at or now)
+            elif sticky_key is not None and sticky_key in self._sticky:
+                previous = self._endpoints.get(self._sticky[sticky_key])
+                if previous in candidates:
+                    chosen = previous
+            if chosen is None:
+                if len(candidates) == 1:
+                    chosen = candidates[0]
+                else:
+                    a, b = random.sample(candidates, 2)
+                    chosen = a if self._score(a) <= self._score(b) else b
+            if self._state(chosen, now) == "half_open":
+                chosen.probing = True
+            if sticky_key is not None:
+                self._sticky[sticky_key] = chosen.url
+                self._sticky.move_to_end(sticky_key)
+                while len(self._sticky) > _MAX_STICKY:
+                    self._sticky.popitem(last=False)
+            chosen.outstanding += 1
+            return chosen.url
+
+    def release(self, url: str) -> None:
+        """The request attempt started by ``choose()`` on *url* has finished."""
+        with self._lock:
+            ep = self._endpoints.get(url)
+            if ep is not None:
+                ep.outstanding = max(0, ep.outstanding - 1)
+                # A probe that ended without a verdict (cancelled, 4xx) frees the slot for the next one
+                ep.probing = False
+
+    def record_success(self, url: str, latency: float | None = None) -> None:
+        """*url* answered; *latency* is its first-byte time (None for non-streaming calls)."""
+        with self._lock:
+            ep = self._endpoints.get(url)
+            if ep is None:
+                return
+            ep.requests += 1
+            ep.error_rate *= 1 - _EWMA_ALPHA
+            if latency is not None:
+                ep.latency = latency if ep.latency is None else ep.latency + _EWMA_ALPHA * (latency - ep.latency)
+            if ep.retry_at is not None:
+                logger.info("Endpoint %s recovered; closing its circuit", _host(url))
+            ep.failures = 0
+            ep.backoff = 0
+            ep.retry_at = None
+            ep.probing = False
+
+    def record_failure(self, url: str) -> None:
+        """*url* failed with a transient error (connection, timeout, 5xx, rate limit)."""
+        with self._lock:
+            ep = self._endpoints.get(url)
+            if ep is None:
+                return
+            ep.requests += 1
+            ep.errors += 1
+            ep.error_rate += _EWMA_ALPHA * (1.0 - ep.error_rate)
+            ep.failures += 1
+            self._trip_if_needed(ep)
+
+    def _trip_if_needed(self, ep: _Endpoint) -> None:
+        if ep.probing:
+            # Failed probe: reopen for longer
+            ep.backoff = min(_MAX_BACKOFF, ep.backoff + 1)
+        elif ep.retry_at is not None or ep.failures < self._failure_threshold:
+            return
+        ep.probing = False
+        ep.retry_at = self._clock() + self._cooldown * (2**ep.backoff)
+        logger.warning(
+            "Endpoint %s failed %d times in a row; circuit open for %.0fs",
+            _host(ep.url),
+            ep.failures,
+            ep.retry_at - self._clock(),
+        )
+
+    def record_health(self, url: str, healthy: bool) -> None:
+        """Result of a health check: reachable endpoints with an open circuit become probeable now."""
+        with self._lock:
+            ep = self._endpoints.get(url)
+            if ep is None:
+                return
+            if not healthy:
+                ep.failures += 1
+                self._trip_if_needed(ep)
+            elif ep.retry_at is not None and not ep.probing:
+                ep.retry_at = min(ep.retry_at, self._clock())
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        with self._lock:
+            now = self._clock()
+            return [
+                {
+                    "endpoint": _host(ep.url),
+                    "state": self._state(ep, now),
+                    "outstanding": ep.outstanding,
+                    "requests": ep.requests,
+                    "errors": ep.errors,
+                    "error_rate": round(ep.error_rate, 3),
+                    "latency_ms": round(ep.latency * 1000, 1) if ep.latency is not None else None,
+                }
+                for ep in self._endpoints.values()
+            ]
+
+    async def check_health(self, config: Any) -> None:
+        """Open (or reuse) a connection to every endpoint; any HTTP response counts as healthy."""
+
+        async def _check(url: str) -> None:
+            self.record_health(url, await http_clients.warmup(dataclasses.replace(config, base_url=url)))
+
+        await asyncio.gather(*(_check(url) for url in self.urls))
+
+
+def _host(url: str) -> str:
+    return urlparse(url).netloc or url
+
+
+def endpoint_urls(config: Any) -> list[str]:
+    """``ai.base_url`` followed by ``ai.endpoints``, without duplicates."""
+    return list(dict.fromkeys(u for u in [config.base_url, *config.endpoints] if u))
+
+
+_pools: dict[tuple[Any, ...], EndpointPool] = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(config: Any) -> EndpointPool | None:
+    """The process-wide pool for *config*'s endpoints, or None with a single endpoint."""
+    urls = endpoint_urls(config)
+    if len(urls) < 2:
+        return None
+    key = (tuple(urls), int(config.endpoint_failure_threshold), float(config.endpoint_cooldown))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = EndpointPool(
+                urls,
+                failure_threshold=int(config.endpoint_failure_threshold),
+                cooldown=float(config.endpoint_cooldown),
+            )
+        return pool
+
+
+def endpoint_stats() -> list[dict[str, Any]]:
+    """Per-endpoint state of every pool in this process (hosts only)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [entry for pool in pools for entry in pool.snapshot()]
+
+
+def reset_endpoint_pools() -> None:
+    with _pools_lock:
+        _pools.clear()
+
+
+async def run_health_checks(config: Any) -> None:
+    """Check the configured endpoints every ``endpoint_health_interval`` seconds until cancelled."""
+    pool = pool_for(config)
+    if pool is None or config.endpoint_health_interval <= 0:
+        return
+    while True:
+        try:
+            await pool.check_health(config)
+        except Exception:
+            logger.debug("Endpoint health check failed", exc_info=True)
+        await asyncio.sleep(float(config.endpoint_health_interval))
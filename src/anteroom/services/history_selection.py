@@ -0,0 +1,270 @@
+"""Relevance-based history selection for very long conversations.
+
+With ``cli.compaction.strategy: select`` old turns are no longer folded into
+summaries.  The full history is kept, and each model call is sent a
+selection of it that fits the compaction budget (``soft_threshold`` of the
+context window, minus the system prompt and tools):
+
+- leading system messages (e.g. a rolling summary from before the switch)
+  and the last ``cli.compaction.recent_turns`` turns are always sent;
+- older history is split into blocks -- a user message, or an assistant
+  message together with the results of its tool calls, so a tool call is
+  never separated from its result -- and ranked by embedding similarity to
+  the current request, plus a bonus when a block's tool calls used the same
+  paths or arguments as the current request or the recent turns;
+- the best blocks are added until the budget is spent and sent in their
+  original order, after a note saying how much was left out.
+
+Without an embedding service (or when embedding fails) blocks are ranked by
+term overlap instead.  Embeddings are cached per process by content hash,
+so each block is embedded once.  When the recent turns alone do not fit,
+nothing is selected and the agent loop compacts as usual.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+from .token_counter import MESSAGE_OVERHEAD, TokenCounter
+
+logger = logging.getLogger(__name__)
+
+# Score bonus for a block whose tool calls used the current turn's paths/arguments
+_LINK_BONUS = 0.15
+# Characters of a block sent to the embedding model
+_MAX_EMBED_CHARS = 4000
+# Block and tool embeddings kept per process
+_MAX_CACHED = 5000
+# Tool-call string arguments shorter or longer than this are not linkage anchors
+_ANCHOR_LEN = (3, 200)
+
+# Words of four or more characters, so articles and prepositions do not count as overlap
+_TERM_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{3,}")
+
+_cache: OrderedDict[tuple[str, str], array[float]] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _message_text(msg: dict[str, Any]) -> str:
+    content = msg.get("content")
+    if isinstance(content, list):
+        parts = [str(p.get("text", "")) for p in content if isinstance(p, dict) and p.get("type") == "text"]
+    else:
+        parts = [content if isinstance(content, str) else ""]
+    for tc in msg.get("tool_calls", None) or []:
+        func = tc.get("function", {}) if isinstance(tc, dict) else {}
+        parts.append(f"{func.get('name', '')}({func.get('arguments', '')})")
+    return "\n".join(p for p in parts if p)
+
+
+def _anchors(msg: dict[str, Any]) -> set[str]:
+    """String arguments of *msg*'s tool calls (paths, patterns, identifiers)."""
+    found: set[str] = set()
+    for tc in msg.get("tool_calls", None) or []:
+        func = tc.get("function", {}) if isinstance(tc, dict) else {}
+        try:
+            args = json.loads(func.get("arguments") or "{}")
+        except (TypeError, ValueError):
+            continue
+        if isinstance(args, dict):
+            lo, hi = _ANCHOR_LEN
+            found.update(v for v in args.values() if isinstance(v, str) and lo <= len(v) <= hi)
+    return found
+
+
+def _terms(text: str) -> set[str]:
+    return {t.lower() for t in _TERM_RE.findall(text)}
+
+
+def _cosine(a: Any, b: Any) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+@dataclass
+class _Block:
+    start: int
+    end: int  # exclusive
+    text: str
+    tokens: int
+    anchors: set[str] = field(default_factory=set)
+    score: float = 0.0
+
+
+class HistorySelector:
+    """Picks the recent turns plus the most relevant older history that fits a token budget."""
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        *,
+        recent_turns: int = 4,
+        embedding_service: Any = None,
+    ) -> None:
+        self._counter = counter
+        self.recent_turns = max(1, recent_turns)
+        self._embedding_service = embedding_service
+        self.selections = 0
+        self.last_selected = 0
+        self.last_omitted = 0
+
+    async def select(self, messages: list[dict[str, Any]], budget: int) -> list[dict[str, Any]]:
+        """The messages to send for the next call; *messages* itself when it already fits.
+
+        *messages* is not modified.  Also returns *messages* when the recent
+        turns alone exceed *budget*, so the caller can fall back to compaction.
+        """
+        if self._counter.count_messages(messages) <= budget:
+            return messages
+        head = 0
+        while head < len(messages) and messages[head].get("role") == "system":
+            head += 1
+        user_positions = [i for i in range(head, len(messages)) if messages[i].get("role") == "user"]
+        if len(user_positions) <= self.recent_turns:
+            return messages
+        recent_start = user_positions[-self.recent_turns]
+        remaining = (
+            budget
+            - self._counter.count_messages(messages[:head])
+            - self._counter.count_messages(messages[recent_start:])
+            - self._counter.count_text(self._note(recent_start - head, recent_start - head))
+            - MESSAGE_OVERHEAD
+        )
+        if remaining < 0:
+            return messages
+
+        blocks = self._blocks(messages, head, recent_start)
+        query = _message_text(messages[user_positions[-1]])
+        recent_anchors: set[str] = set()
+        for msg in messages[recent_start:]:
+            recent_anchors |= _anchors(msg)
+        await self._score(blocks, query, recent_anchors)
+
+        chosen: list[_Block] = []
+        for block in sorted(blocks, key=lambda b: b.score, reverse=True):
+            if block.tokens <= remaining:
+                chosen.append(block)
+                remaining -= block.tokens
+        chosen.sort(key=lambda b: b.start)
+        older = recent_start - head
+        kept = sum(b.end - b.start for b in chosen)
+        self.selections += 1
+        self.last_selected = kept
+        self.last_omitted = older - kept
+        logger.debug("History selection: kept %d of %d older messages", kept, older)
+        rest = [*(msg for block in chosen for msg in messages[block.start : block.end]), *messages[recent_start:]]
+        return [*messages[:head], *_with_note(self._note(older - kept, older), rest)]
+
+    @staticmethod
+    def _note(omitted: int, older: int) -> str:
+        return (
+            f"[{omitted} of {older} earlier messages in this conversation are omitted. "
+            "The earlier messages below were selected for relevance to the current request.]"
+        )
+
+    def _blocks(self, messages: list[dict[str, Any]], start: int, end: int) -> list[_Block]:
+        """Split ``messages[start:end]``; tool results stay in the block of the call that requested them."""
+        blocks: list[_Block] = []
+        i = start
+        while i < end:
+            j = i + 1
+            while j < end and messages[j].get("role") == "tool":
+                j += 1
+            span = messages[i:j]
+            if span[0].get("role") == "tool":
+                # Results whose call is not in the older history can never be sent alone
+                i = j
+                continue
+            anchors: set[str] = set()
+            for msg in span:
+                anchors |= _anchors(msg)
+            blocks.append(
+                _Block(
+                    start=i,
+                    end=j,
+                    text="\n".join(_message_text(m) for m in span),
+                    tokens=self._counter.count_messages(span),
+                    anchors=anchors,
+                )
+            )
+            i = j
+        return blocks
+
+    async def _score(self, blocks: list[_Block], query: str, recent_anchors: set[str]) -> None:
+        similarities = await embedding_similarities(self._embedding_service, query, [b.text for b in blocks])
+        if similarities is None:
+            # Cosine over term sets: dividing by the block's size too keeps long blocks from winning on volume
+            query_terms = _terms(query)
+            similarities = []
+            for block in blocks:
+                block_terms = _terms(block.text)
+                overlap = len(query_terms & block_terms)
+                similarities.append(overlap / math.sqrt(len(query_terms) * len(block_terms)) if overlap else 0.0)
+        for block, similarity in zip(blocks, similarities):
+            linked = any(a in query or a in recent_anchors for a in block.anchors)
+            block.score = similarity + (_LINK_BONUS if linked else 0.0)
+
+
+def _with_note(note: str, messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """*messages* with *note* in front, as user text (providers hoist system messages out of the history).
+
+    The note is merged into a leading plain-text user message, so roles keep
+    alternating for chat templates that require it.
+    """
+    first = messages[0] if messages else None
+    if first is not None and first.get("role") == "user" and isinstance(first.get("content"), str):
+        return [{**first, "content": f"{note}\n\n{first['content']}"}, *messages[1:]]
+    return [{"role": "user", "content": note}, *messages]
+
+
+async def embedding_similarities(
+    service: Any, query: str, texts: list[str], max_chars: int = _MAX_EMBED_CHARS
+) -> list[float] | None:
+    """Cosine similarity of *query* to each of *texts*; None without a working embedding service.
+
+    Vectors are cached per process by (model, content hash), so each text is
+    embedded once however often it is ranked.
+    """
+    if service is None:
+        return None
+    model = str(getattr(service, "model", "") or type(service).__name__)
+    keys = [hashlib.sha256(t[:max_chars].encode()).hexdigest() for t in [query, *texts]]
+    vectors: list[array[float] | None] = []
+    with _cache_lock:
+        for key in keys:
+            vec = _cache.get((model, key))
+            if vec is not None:
+                _cache.move_to_end((model, key))
+            vectors.append(vec)
+    missing = [i for i, vec in enumerate(vectors) if vec is None]
+    if missing:
+        all_texts = [query, *texts]
+        try:
+            embedded = await service.embed_batch([all_texts[i][:max_chars] for i in missing])
+        except Exception:
+            logger.debug("Embedding failed; ranking by term overlap", exc_info=True)
+            return None
+        with _cache_lock:
+            for i, vec in zip(missing, embedded):
+                if vec:
+                    vectors[i] = _cache[(model, keys[i])] = array("f", vec)
+            while len(_cache) > _MAX_CACHED:
+                _cache.popitem(last=False)
+    if vectors[0] is None:
+        return None
+    return [_cosine(vectors[0], vec) if vec is not None else 0.0 for vec in vectors[1:]]
+
+
+def clear_embedding_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,224 @@
+"""Process-wide registry of shared httpx clients for the AI provider SDKs.
+
+Every ``AIService``/``AnthropicService`` wraps an ``httpx.AsyncClient``.  Web
+requests, subagents and title generation all construct services of their
+own, so without sharing each of them would start on a cold connection pool
+and pay TCP+TLS setup again.  ``http_clients`` hands out one client per
+(endpoint, TLS settings, proxy environment, pool settings, event loop); the
+SDK wrapper around it stays cheap to rebuild, so rotating credentials keeps
+the warm pool.
+
+Clients are bound to the event loop that is running when they are requested
+(pooled connections cannot move between loops).  Outside a running loop an
+unshared client is returned, matching the previous per-service behaviour.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from collections.abc import Hashable
+from dataclasses import dataclass
+from importlib.util import find_spec
+from typing import Any
+from urllib.parse import urlsplit
+
+import httpx
+
+from .egress_allowlist import check_egress_allowed
+
+logger = logging.getLogger(__name__)
+
+_HAS_H2 = find_spec("h2") is not None
+
+# Environment read by httpx (trust_env) when a client is constructed
+_ENV_KEYS = (
+    "HTTPS_PROXY",
+    "HTTP_PROXY",
+    "ALL_PROXY",
+    "NO_PROXY",
+    "https_proxy",
+    "http_proxy",
+    "all_proxy",
+    "no_proxy",
+    "SSL_CERT_FILE",
+    "SSL_CERT_DIR",
+)
+
+# Seconds a retired client stays open so streams already running on it can finish
+_RETIRE_GRACE = 900.0
+
+
+def _origin(base_url: str) -> str:
+    parts = urlsplit(base_url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _timeout(config: Any) -> httpx.Timeout:
+    return httpx.Timeout(
+        connect=float(config.connect_timeout),
+        read=float(config.request_timeout),
+        write=float(config.write_timeout),
+        pool=float(config.pool_timeout),
+    )
+
+
+def _limits(config: Any) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(config.http_max_connections),
+        max_keepalive_connections=int(config.http_max_keepalive),
+        keepalive_expiry=float(config.http_keepalive_expiry),
+    )
+
+
+def _client_key(config: Any) -> Hashable:
+    timeout = _timeout(config)
+    return (
+        _origin(config.base_url),
+        bool(config.verify_ssl),
+        bool(config.http2) and _HAS_H2,
+        (timeout.connect, timeout.read, timeout.write, timeout.pool),
+        (int(config.http_max_connections), int(config.http_max_keepalive), float(config.http_keepalive_expiry)),
+        tuple(os.environ.get(k) for k in _ENV_KEYS),
+    )
+
+
+def _new_client(config: Any) -> httpx.AsyncClient:
+    # SECURITY-REVIEW: verify=False only when user explicitly sets verify_ssl: false in config
+    return httpx.AsyncClient(
+        verify=config.verify_ssl,
+        timeout=_timeout(config),
+        limits=_limits(config),
+        http2=bool(config.http2) and _HAS_H2,
+    )
+
+
+def _close_soon(client: httpx.AsyncClient, loop: asyncio.AbstractEventLoop | None, delay: float = 0.0) -> None:
+    """Best-effort async close of *client* on *loop* (skipped when no loop is running)."""
+    if loop is None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No running loop (e.g. during __init__); the pool is released on GC
+    if loop.is_closed():
+        return
+
+    def _close() -> None:
+        task = loop.create_task(client.aclose())
+        task.add_done_callback(lambda t: t.exception() if not t.cancelled() else None)
+
+    try:
+        if delay > 0:
+            loop.call_later(delay, _close)
+        else:
+            _close()
+    except RuntimeError:
+        logger.debug("Failed to schedule HTTP client close", exc_info=True)
+
+
+@dataclass
+class _Entry:
+    client: httpx.AsyncClient
+    loop: weakref.ReferenceType[asyncio.AbstractEventLoop]
+
+
+class HttpClientRegistry:
+    """Shared ``httpx.AsyncClient`` instances keyed by endpoint and transport settings."""
+
+    def __init__(self, retire_grace: float = _RETIRE_GRACE) -> None:
+        self._retire_grace = retire_grace
+        self._entries: dict[tuple[Hashable, int], _Entry] = {}
+        # Retired clients still open for their grace period
+        self._retired: weakref.WeakSet[httpx.AsyncClient] = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def get(self, config: Any) -> httpx.AsyncClient:
+        """Return the shared client for *config* on the running loop, creating it on first use."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return _new_client(config)
+        key = (_client_key(config), id(loop))
+        with self._lock:
+            self._prune()
+            entry = self._entries.get(key)
+            if entry is not None and entry.loop() is loop and not entry.client.is_closed:
+                self.reused += 1
+                return entry.client
+            client = _new_client(config)
+            self._entries[key] = _Entry(client=client, loop=weakref.ref(loop))
+            self.created += 1
+            return client
+
+    def retire(self, client: httpx.AsyncClient) -> None:
+        """Stop handing out *client* and close it once in-flight requests have had time to finish.
+
+        Called after connection-level errors so retries start on fresh
+        connections.  Only the pool for *client*'s endpoint and transport
+        settings is replaced; retiring an already retired client is a no-op.
+        Clients not owned by the registry are closed right away.
+        """
+        with self._lock:
+            if client in self._retired:
+                return
+            for key, entry in list(self._entries.items()):
+                if entry.client is client:
+                    del self._entries[key]
+                    self._retired.add(client)
+                    _close_soon(client, entry.loop(), self._retire_grace)
+                    return
+        _close_soon(client, None)
+
+    def is_retired(self, client: httpx.AsyncClient) -> bool:
+        """True once *client* was retired (by any service sharing it) or closed."""
+        return client.is_closed or client in self._retired
+
+    async def warmup(self, config: Any) -> bool:
+        """Open a connection to the configured endpoint so the first request skips TCP+TLS setup.
+
+        Sends an unauthenticated ``HEAD`` to the endpoint origin; any HTTP
+        response counts.  Returns False when the provider manages its own
+        transport, egress is blocked, or the endpoint is unreachable.
+        """
+        if config.provider == "litellm" or not config.base_url:
+            return False
+        try:
+            if not check_egress_allowed(
+                config.base_url, config.allowed_domains, block_localhost=config.block_localhost_api
+            ):
+                return False
+            client = self.get(config)
+            await client.head(_origin(config.base_url), timeout=float(config.connect_timeout))
+        except Exception as e:
+            logger.debug("HTTP warmup failed: %s", e)
+            return False
+        return True
+
+    async def aclose(self) -> None:
+        """Close every client created on the running loop (app shutdown)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            mine = [k for k, e in self._entries.items() if e.loop() is loop]
+            clients = [self._entries.pop(k).client for k in mine]
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception:
+                logger.debug("Failed to close HTTP client", exc_info=True)
+
+    def _prune(self) -> None:
+        for key, entry in list(self._entries.items()):
+            loop = entry.loop()
+            if loop is None or loop.is_closed():
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+http_clients = HttpClientRegistry()
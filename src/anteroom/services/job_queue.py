@@ -0,0 +1,272 @@
+"""Durable background job queue on the main SQLite database.
+
+Deferred work (embedding new messages, retention sweeps, ...) used to run as
+fire-and-forget ``asyncio`` tasks or inside dedicated polling workers, and
+anything in flight was lost on restart.  ``JobQueue`` persists each unit of
+work as a row in the ``jobs`` table and runs it with a registered handler:
+
+- **typed handlers**: ``register(job_type, handler, concurrency=...)``; each
+  handler receives the job's JSON payload,
+- **leases**: a claimed job is leased to this process and the lease is
+  renewed while the handler runs; if the process dies the lease expires and
+  another worker (or the next start) picks the job up again,
+- **retries**: failures are retried with exponential backoff and jitter up
+  to ``max_attempts``; handlers raise ``PermanentJobError`` for failures
+  retrying cannot fix,
+- **dead-lettering**: jobs that exhaust their attempts are kept with status
+  ``dead`` and their last error until retried or purged,
+- **priorities and concurrency**: lower ``priority`` values run first, and
+  each job type has its own concurrency limit.
+
+Storage lives in ``job_storage``; ``/api/jobs`` exposes backlog, failures
+and throughput.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from . import job_storage
+from .error_sanitizer import sanitize_provider_error
+
+if TYPE_CHECKING:
+    from ..db import ThreadSafeConnection
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[dict[str, Any]], Awaitable[None]]
+
+# Purge finished jobs at most this often (seconds)
+_PURGE_INTERVAL = 600.0
+
+
+def _describe(error: BaseException) -> str:
+    """Error text stored on the job (shown by ``/api/jobs``), with URLs and keys stripped."""
+    if isinstance(error, asyncio.TimeoutError):
+        return "Timed out"
+    name = type(error).__name__
+    return f"{name}: {sanitize_provider_error(str(error), fallback=name)}"
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help; the job is dead-lettered immediately."""
+
+
+@dataclass
+class JobType:
+    name: str
+    handler: JobHandler
+    concurrency: int = 1
+    max_attempts: int = 5
+    timeout: float = 300.0
+    backoff_base: float = 5.0
+    backoff_max: float = 3600.0
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait before retrying after failed attempt number *attempt*."""
+        delay = min(self.backoff_max, self.backoff_base * 2.0 ** max(0, attempt - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+
+class JobQueue:
+    """Leases due jobs from the ``jobs`` table and runs them with their registered handlers."""
+
+    def __init__(
+        self,
+        db: ThreadSafeConnection,
+        *,
+        poll_interval: float = 2.0,
+        lease_seconds: float = 120.0,
+        max_attempts: int = 5,
+        keep_finished_seconds: float = 86400.0,
+    ) -> None:
+        self._db = db
+        self._poll_interval = max(0.05, poll_interval)
+        self._lease_seconds = max(1.0, lease_seconds)
+        self._max_attempts = max(1, max_attempts)
+        self._keep_finished_seconds = keep_finished_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._types: dict[str, JobType] = {}
+        self._active: dict[str, set[asyncio.Task[None]]] = {}
+        self._wake: asyncio.Event | None = None
+        self._running = False
+        self._task: asyncio.Task[None] | None = None
+        self._last_purge = 0.0
+
+    @classmethod
+    def from_config(cls, db: ThreadSafeConnection, storage_config: Any) -> JobQueue:
+        """Build from ``StorageConfig`` (``storage.job_*``)."""
+        return cls(
+            db,
+            poll_interval=float(storage_config.job_poll_interval),
+            lease_seconds=float(storage_config.job_lease_seconds),
+            max_attempts=int(storage_config.job_max_attempts),
+            keep_finished_seconds=float(storage_config.job_retention_hours) * 3600,
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def register(
+        self,
+        job_type: str,
+        handler: JobHandler,
+        *,
+        concurrency: int = 1,
+        max_attempts: int | None = None,
+        timeout: float = 300.0,
+        backoff_base: float = 5.0,
+        backoff_max: float = 3600.0,
+    ) -> None:
+        """Register *handler* for *job_type*, replacing any previous registration."""
+        self._types[job_type] = JobType(
+            name=job_type,
+            handler=handler,
+            concurrency=max(1, concurrency),
+            max_attempts=max(1, max_attempts if max_attempts is not None else self._max_attempts),
+            timeout=timeout,
+            backoff_base=backoff_base,
+            backoff_max=backoff_max,
+        )
+        self._active.setdefault(job_type, set())
+
+    def enqueue(
+        self,
+        job_type: str,
+        payload: dict[str, Any] | None = None,
+        *,
+        priority: int = 0,
+        delay: float = 0,
+        dedupe_key: str | None = None,
+    ) -> str:
+        """Persist a job and wake the worker; returns the job id.
+
+        Raises ``ValueError`` for a job type with no registered handler.
+        """
+        jt = self._types.get(job_type)
+        if jt is None:
+            raise ValueError(f"No handler registered for job type {job_type!r}")
+        job = job_storage.create_job(
+            self._db,
+            job_type,
+            payload,
+            priority=priority,
+            delay=delay,
+            max_attempts=jt.max_attempts,
+            dedupe_key=dedupe_key,
+        )
+        if self._wake is not None:
+            self._wake.set()
+        return str(job["id"])
+
+    async def run_once(self) -> int:
+        """Claim the due jobs there is capacity for and start them; returns how many started."""
+        capacity = {name: jt.concurrency - len(self._active[name]) for name, jt in self._types.items()}
+        jobs = job_storage.claim_jobs(self._db, capacity, owner=self.owner, lease_seconds=self._lease_seconds)
+        for job in jobs:
+            jt = self._types[job["job_type"]]
+            task = asyncio.ensure_future(self._execute(jt, job))
+            active = self._active[jt.name]
+            active.add(task)
+            task.add_done_callback(active.discard)
+        return len(jobs)
+
+    async def join(self) -> None:
+        """Wait for every job started so far to finish."""
+        while any(self._active.values()):
+            await asyncio.gather(*(t for tasks in self._active.values() for t in tasks), return_exceptions=True)
+
+    async def _execute(self, jt: JobType, job: dict[str, Any]) -> None:
+        job_id = job["id"]
+        heartbeat = asyncio.ensure_future(self._renew_lease(job_id))
+        try:
+            await asyncio.wait_for(jt.handler(job["payload"]), timeout=jt.timeout)
+        except asyncio.CancelledError:
+            # Shutting down: keep the lease so the job is picked up again once it expires
+            raise
+        except PermanentJobError as e:
+            logger.warning("Job %s (%s) failed permanently: %s", job_id, jt.name, e)
+            job_storage.fail_job(self._db, job_id, owner=self.owner, error=_describe(e), retry_in=None)
+        except Exception as e:
+            error = _describe(e)
+            if job["attempts"] >= jt.max_attempts:
+                logger.error("Job %s (%s) dead-lettered after %d attempts: %s", job_id, jt.name, job["attempts"], error)
+                job_storage.fail_job(self._db, job_id, owner=self.owner, error=error, retry_in=None)
+            else:
+                retry_in = jt.backoff(job["attempts"])
+                logger.warning("Job %s (%s) failed, retrying in %.0fs: %s", job_id, jt.name, retry_in, error)
+                job_storage.fail_job(self._db, job_id, owner=self.owner, error=error, retry_in=retry_in)
+        else:
+            job_storage.complete_job(self._db, job_id, owner=self.owner)
+        finally:
+            heartbeat.cancel()
+            if self._wake is not None:
+                # A slot freed up; look for more work without waiting a full poll interval
+                self._wake.set()
+
+    async def _renew_lease(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self._lease_seconds / 3)
+            if not job_storage.renew_lease(self._db, job_id, owner=self.owner, lease_seconds=self._lease_seconds):
+                return
+
+    async def run_forever(self) -> None:
+        """Poll for due jobs, waking early when a job is enqueued or finishes."""
+        self._running = True
+        self._wake = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        logger.info("Job queue started (%d job types, owner=%s)", len(self._types), self.owner)
+        while self._running:
+            self._wake.clear()
+            try:
+                await self.run_once()
+                if loop.time() - self._last_purge >= _PURGE_INTERVAL:
+                    self._last_purge = loop.time()
+                    purged = job_storage.purge_finished_jobs(self._db, self._keep_finished_seconds)
+                    if purged:
+                        logger.debug("Job queue: purged %d finished job(s)", purged)
+            except Exception as e:
+                logger.error("Job queue error: %s", type(e).__name__, exc_info=True)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        """Start the background polling loop."""
+        self._task = asyncio.ensure_future(self.run_forever())
+
+    def stop(self) -> None:
+        """Stop polling and cancel running handlers; their leases expire and the jobs run again later."""
+        self._running = False
+        if self._task and not self._task.done():
+            self._task.cancel()
+        for tasks in self._active.values():
+            for task in list(tasks):
+                task.cancel()
+
+    def stats(self, window_seconds: float = 3600) -> dict[str, Any]:
+        """``job_storage.job_stats`` plus this process's registered types and in-flight counts."""
+        stats = job_storage.job_stats(self._db, window_seconds=window_seconds)
+        stats["worker"] = {
+            "owner": self.owner,
+            "running": self._running,
+            "types": {
+                name: {
+                    "concurrency": jt.concurrency,
+                    "active": len(self._active[name]),
+                    "max_attempts": jt.max_attempts,
+                }
+                for name, jt in self._types.items()
+            },
+        }
+        return stats
@@ -0,0 +1,322 @@
+"""Background job storage — CRUD, leasing and statistics for the ``jobs`` table."""
+
+from __future__ import annotations
+
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from ..db import ThreadSafeConnection
+
+logger = logging.getLogger(__name__)
+
+_VALID_JOB_STATUSES = frozenset({"queued", "running", "succeeded", "dead", "cancelled"})
+
+_ACTIVE_JOB_STATUSES = ("queued", "running")
+
+# Errors stored on a job are truncated to this many characters
+_MAX_ERROR_CHARS = 2000
+
+
+def _uuid() -> str:
+    return str(uuid.uuid4())
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _after(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+def _row_to_job(row: Any) -> dict[str, Any]:
+    job = dict(row)
+    raw = job.pop("payload_json", None)
+    try:
+        job["payload"] = json.loads(raw) if raw else {}
+    except ValueError:
+        job["payload"] = {}
+    return job
+
+
+def create_job(
+    db: ThreadSafeConnection,
+    job_type: str,
+    payload: dict[str, Any] | None = None,
+    *,
+    priority: int = 0,
+    delay: float = 0,
+    max_attempts: int = 5,
+    dedupe_key: str | None = None,
+) -> dict[str, Any]:
+    """Insert a queued job.
+
+    With *dedupe_key*, an existing queued or running job of the same type and
+    key is returned instead of inserting a duplicate.
+    """
+    now = _now()
+    run_after = _after(delay) if delay > 0 else now
+    with db.transaction() as tx:
+        if dedupe_key is not None:
+            row = tx.execute_fetchone(
+                "SELECT * FROM jobs WHERE job_type = ? AND dedupe_key = ? AND status IN (?, ?)",
+                (job_type, dedupe_key, *_ACTIVE_JOB_STATUSES),
+            )
+            if row is not None:
+                return _row_to_job(row)
+        jid = _uuid()
+        tx.execute(
+            "INSERT INTO jobs"
+            " (id, job_type, payload_json, status, priority, max_attempts, dedupe_key,"
+            "  run_after, created_at, updated_at)"
+            " VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (jid, job_type, json.dumps(payload or {}), priority, max(1, max_attempts), dedupe_key, run_after, now, now),
+        )
+    return {
+        "id": jid,
+        "job_type": job_type,
+        "payload": payload or {},
+        "status": "queued",
+        "priority": priority,
+        "attempts": 0,
+        "max_attempts": max(1, max_attempts),
+        "dedupe_key": dedupe_key,
+        "run_after": run_after,
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "last_error": None,
+        "created_at": now,
+        "updated_at": now,
+        "started_at": None,
+        "completed_at": None,
+    }
+
+
+def get_job(db: ThreadSafeConnection, job_id: str) -> dict[str, Any] | None:
+    row = db.execute_fetchone("SELECT * FROM jobs WHERE id = ?", (job_id,))
+    return _row_to_job(row) if row else None
+
+
+def list_jobs(
+    db: ThreadSafeConnection,
+    *,
+    status: str | None = None,
+    job_type: str | None = None,
+    limit: int = 50,
+    offset: int = 0,
+) -> list[dict[str, Any]]:
+    conditions: list[str] = []
+    params: list[Any] = []
+    if status and status in _VALID_JOB_STATUSES:
+        conditions.append("status = ?")
+        params.append(status)
+    if job_type:
+        conditions.append("job_type = ?")
+        params.append(job_type)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    params.extend([limit, offset])
+    rows = db.execute_fetchall(
+        f"SELECT * FROM jobs {where} ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+        tuple(params),
+    )
+    return [_row_to_job(r) for r in rows]
+
+
+def claim_jobs(
+    db: ThreadSafeConnection,
+    capacity: dict[str, int],
+    *,
+    owner: str,
+    lease_seconds: float,
+) -> list[dict[str, Any]]:
+    """Lease up to ``capacity[job_type]`` due jobs of each type to *owner*.
+
+    A job is due when it is queued and its ``run_after`` has passed, or when
+    it is running under a lease that has expired (its worker died).  Lower
+    ``priority`` values are claimed first, then oldest first.  Each claim
+    counts as an attempt.
+    """
+    types = [t for t, n in capacity.items() if n > 0]
+    if not types:
+        return []
+    now = _now()
+    expires = _after(lease_seconds)
+    claimed: list[dict[str, Any]] = []
+    with db.transaction() as tx:
+        # One query per type so a deep backlog of one type cannot crowd out the others
+        for job_type in types:
+            rows = tx.execute_fetchall(
+                "SELECT * FROM jobs WHERE job_type = ? AND ("
+                " (status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_expires_at < ?)"
+                ") ORDER BY priority, created_at LIMIT ?",
+                (job_type, now, now, capacity[job_type]),
+            )
+            for row in rows:
+                job = _row_to_job(row)
+                if job["status"] == "running" and job["attempts"] >= job["max_attempts"]:
+                    # The worker died on its last attempt; don't let a poison job loop forever
+                    tx.execute(
+                        "UPDATE jobs SET status = 'dead', lease_owner = NULL, lease_expires_at = NULL,"
+                        " last_error = ?, completed_at = ?, updated_at = ? WHERE id = ?",
+                        ("Lease expired on final attempt", now, now, job["id"]),
+                    )
+                    continue
+                tx.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?,"
+                    " lease_expires_at = ?, started_at = ?, updated_at = ? WHERE id = ?",
+                    (owner, expires, now, now, job["id"]),
+                )
+                job.update(
+                    status="running",
+                    attempts=job["attempts"] + 1,
+                    lease_owner=owner,
+                    lease_expires_at=expires,
+                    started_at=now,
+                    updated_at=now,
+                )
+                claimed.append(job)
+    return claimed
+
+
+def renew_lease(db: ThreadSafeConnection, job_id: str, *, owner: str, lease_seconds: float) -> bool:
+    """Extend a running job's lease; False if *owner* no longer holds it."""
+    cur = db.execute(
+        "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND status = 'running' AND lease_owner = ?",
+        (_after(lease_seconds), _now(), job_id, owner),
+    )
+    db.commit()
+    return cur.rowcount > 0
+
+
+def complete_job(db: ThreadSafeConnection, job_id: str, *, owner: str) -> bool:
+    now = _now()
+    cur = db.execute(
+        "UPDATE jobs SET status = 'succeeded', lease_owner = NULL, lease_expires_at = NULL, last_error = NULL,"
+        " completed_at = ?, updated_at = ? WHERE id = ? AND status = 'running' AND lease_owner = ?",
+        (now, now, job_id, owner),
+    )
+    db.commit()
+    return cur.rowcount > 0
+
+
+def fail_job(
+    db: ThreadSafeConnection,
+    job_id: str,
+    *,
+    owner: str,
+    error: str,
+    retry_in: float | None,
+) -> bool:
+    """Record a failed attempt: requeue after *retry_in* seconds, or dead-letter when None."""
+    now = _now()
+    error = error[:_MAX_ERROR_CHARS]
+    if retry_in is None:
+        cur = db.execute(
+            "UPDATE jobs SET status = 'dead', lease_owner = NULL, lease_expires_at = NULL, last_error = ?,"
+            " completed_at = ?, updated_at = ? WHERE id = ? AND status = 'running' AND lease_owner = ?",
+            (error, now, now, job_id, owner),
+        )
+    else:
+        cur = db.execute(
+            "UPDATE jobs SET status = 'queued', lease_owner = NULL, lease_expires_at = NULL, last_error = ?,"
+            " run_after = ?, updated_at = ? WHERE id = ? AND status = 'running' AND lease_owner = ?",
+            (error, _after(retry_in), now, job_id, owner),
+        )
+    db.commit()
+    return cur.rowcount > 0
+
+
+def retry_job(db: ThreadSafeConnection, job_id: str) -> dict[str, Any] | None:
+    """Requeue a dead-lettered or cancelled job with a fresh attempt budget."""
+    now = _now()
+    cur = db.execute(
+        "UPDATE jobs SET status = 'queued', attempts = 0, run_after = ?, completed_at = NULL, updated_at = ?"
+        " WHERE id = ? AND status IN ('dead', 'cancelled')",
+        (now, now, job_id),
+    )
+    db.commit()
+    return get_job(db, job_id) if cur.rowcount else None
+
+
+def cancel_job(db: ThreadSafeConnection, job_id: str) -> bool:
+    """Cancel a job that has not started yet."""
+    now = _now()
+    cur = db.execute(
+        "UPDATE jobs SET status = 'cancelled', completed_at = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+        (now, now, job_id),
+    )
+    db.commit()
+    return cur.rowcount > 0
+
+
+def purge_finished_jobs(db: ThreadSafeConnection, older_than_seconds: float) -> int:
+    """Delete succeeded and cancelled jobs finished more than *older_than_seconds* ago.
+
+    Dead-lettered jobs are kept until they are retried or purged explicitly.
+    """
+    cutoff = _after(-older_than_seconds)
+    cur = db.execute(
+        "DELETE FROM jobs WHERE status IN ('succeeded', 'cancelled') AND completed_at < ?",
+        (cutoff,),
+    )
+    db.commit()
+    return cur.rowcount
+
+
+def job_stats(db: ThreadSafeConnection, *, window_seconds: float = 3600) -> dict[str, Any]:
+    """Backlog, failures and throughput per job type.
+
+    ``succeeded`` and ``failing`` cover the last *window_seconds*;
+    ``oldest_queued_seconds`` is how long the oldest due job has waited.
+    """
+    now = datetime.now(timezone.utc)
+    since = (now - timedelta(seconds=window_seconds)).isoformat()
+    by_type: dict[str, dict[str, Any]] = {}
+
+    def _entry(job_type: str) -> dict[str, Any]:
+        return by_type.setdefault(
+            job_type,
+            {
+                "queued": 0,
+                "running": 0,
+                "dead": 0,
+                "succeeded": 0,
+                "failing": 0,
+                "oldest_queued_seconds": 0.0,
+            },
+        )
+
+    for row in db.execute_fetchall(
+        "SELECT job_type, status, COUNT(*) AS n, MIN(run_after) AS oldest FROM jobs"
+        " WHERE status IN ('queued', 'running', 'dead') GROUP BY job_type, status"
+    ):
+        entry = _entry(row["job_type"])
+        entry[row["status"]] = row["n"]
+        if row["status"] == "queued" and row["oldest"]:
+            waited = (now - datetime.fromisoformat(row["oldest"])).total_seconds()
+            entry["oldest_queued_seconds"] = round(max(0.0, waited), 1)
+    for row in db.execute_fetchall(
+        "SELECT job_type, COUNT(*) AS n FROM jobs WHERE status = 'succeeded' AND completed_at >= ? GROUP BY job_type",
+        (since,),
+    ):
+        _entry(row["job_type"])["succeeded"] = row["n"]
+    # Jobs that failed at least once in the window and are waiting for a retry or dead-lettered
+    for row in db.execute_fetchall(
+        "SELECT job_type, COUNT(*) AS n FROM jobs WHERE last_error IS NOT NULL AND updated_at >= ? GROUP BY job_type",
+        (since,),
+    ):
+        _entry(row["job_type"])["failing"] = row["n"]
+
+    totals = {
+        key: sum(e[key] for e in by_type.values()) for key in ("queued", "running", "dead", "succeeded", "failing")
+    }
+    return {
+        "window_seconds": int(window_seconds),
+        "totals": totals,
+        "throughput_per_minute": round(totals["succeeded"] / (window_seconds / 60), 2) if window_seconds else 0.0,
+        "by_type": by_type,
+    }
@@ -8,8 +8,11 @@ import logging
 from typing import Any, AsyncGenerator
 
 from ..config import AIConfig
+from . import response_cache, task_routing
 from .egress_allowlist import check_egress_allowed
 from .error_sanitizer import sanitize_provider_error
+from .prompt_sections import compose_system_prompt
+from .speculative_tools import tool_call_ready_event
 from .token_provider import TokenProvider, TokenProviderError
 
 logger = logging.getLogger(__name__)
@@ -115,10 +118,8 @@ class LiteLLMService:
         *,
         _retry_on_auth: bool = True,
     ) -> AsyncGenerator[dict[str, Any], None]:
-        system_content = self.config.system_prompt
-        if extra_system_prompt:
-            system_content = extra_system_prompt + "\n\n" + system_content
-        system_msg = {"role": "system", "content": system_content}
+        system_prompt = compose_system_prompt(self.config.system_prompt, extra_system_prompt)
+        system_msg = {"role": "system", "content": system_prompt}
         full_messages = [system_msg] + messages
 
         max_attempts = max(1, self.config.retry_max_attempts + 1)
@@ -139,6 +140,7 @@ class LiteLLMService:
                 yield {"event": "phase", "data": {"phase": "waiting"}}
 
                 current_tool_calls: dict[int, dict[str, Any]] = {}
+                announced_tool_calls: set[int] = set()
                 usage_data: dict[str, Any] | None = None
 
                 async for chunk in stream:
@@ -166,6 +168,12 @@ class LiteLLMService:
                         for tc in delta.tool_calls:
                             idx = tc.index
                             if idx not in current_tool_calls:
+                                # A new call starting means the earlier ones are complete
+                                for prev_idx in sorted(set(current_tool_calls) - announced_tool_calls):
+                                    announced_tool_calls.add(prev_idx)
+                                    ready = tool_call_ready_event(prev_idx, current_tool_calls[prev_idx])
+                                    if ready:
+                                        yield ready
                                 current_tool_calls[idx] = {
                                     "id": tc.id or "",
                                     "function_name": "",
@@ -326,23 +334,37 @@ class LiteLLMService:
         }
 
     async def generate_title(self, user_message: str) -> str:
+        """Short conversation title, generated on the ``title`` task model when one is configured."""
+        return await task_routing.run(
+            self,
+            task_routing.TASK_TITLE,
+            lambda svc: svc._generate_title(user_message),
+            failed=lambda title: title == "New Conversation",
+        )
+
+    async def _generate_title(self, user_message: str) -> str:
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "Generate a short title (3-6 words) for a conversation that starts"
+                    " with the following message. Return only the title, no quotes or punctuation."
+                ),
+            },
+            {"role": "user", "content": user_message},
+        ]
+        cached = response_cache.lookup(self.config, messages, params={"max_completion_tokens": 20}, cacheable=True)
+        if cached and cached.hit is not None:
+            return cached.hit
         try:
-            kwargs = self._build_kwargs(
-                [
-                    {
-                        "role": "system",
-                        "content": (
-                            "Generate a short title (3-6 words) for a conversation that starts"
-                            " with the following message. Return only the title, no quotes or punctuation."
-                        ),
-                    },
-                    {"role": "user", "content": user_message},
-                ],
-                max_completion_tokens=20,
-            )
+            kwargs = self._build_kwargs(messages, max_completion_tokens=20)
             response = await litellm.acompletion(**kwargs)
+            task_routing.note_tokens(response_cache.response_tokens(response))
             title = response.choices[0].message.content or "New Conversation"
-            return title.strip().strip('"').strip("'")
+            title = title.strip().strip('"').strip("'")
+            if cached and response.choices[0].message.content:
+                cached.store(title, response_cache.response_tokens(response))
+            return title
         except Exception:
             logger.exception("Failed to generate title")
             return "New Conversation"
@@ -365,11 +387,39 @@ class LiteLLMService:
         self,
         messages: list[dict[str, Any]],
         max_completion_tokens: int = 1000,
+        *,
+        cacheable: bool | None = None,
+        task: str = task_routing.TASK_MAIN,
+    ) -> str | None:
+        return await task_routing.run(
+            self,
+            task,
+            lambda svc: svc._complete(messages, max_completion_tokens, cacheable=cacheable),
+            failed=lambda text: text is None,
+        )
+
+    async def _complete(
+        self,
+        messages: list[dict[str, Any]],
+        max_completion_tokens: int = 1000,
+        *,
+        cacheable: bool | None = None,
     ) -> str | None:
         try:
             kwargs = self._build_kwargs(messages, max_completion_tokens=max_completion_tokens)
+            # The cache key and the temperature-0 check use exactly what is sent
+            params: dict[str, Any] = {
+                k: kwargs[k] for k in ("max_completion_tokens", "temperature", "top_p", "seed") if k in kwargs
+            }
+            cached = response_cache.lookup(self.config, messages, params=params, cacheable=cacheable)
+            if cached and cached.hit is not None:
+                return cached.hit
             response = await litellm.acompletion(**kwargs)
-            return response.choices[0].message.content if response.choices else None
+            task_routing.note_tokens(response_cache.response_tokens(response))
+            text = response.choices[0].message.content if response.choices else None
+            if cached:
+                cached.store(text, response_cache.response_tokens(response))
+            return text
         except Exception:
             logger.exception("Failed to generate completion")
             return None
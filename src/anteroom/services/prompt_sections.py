@@ -0,0 +1,168 @@
+"""Sectioned system-prompt assembly with per-section caching and timing.
+
+The web chat system prompt is built from independent sections (runtime
+context, instruction files, artifacts, skills, RAG, ...).  Sections whose
+inputs have not changed since the previous request are served from a
+process-wide ``PromptSectionCache``; each section's build time and cache
+status are recorded so they can be reported in ``prompt_meta``.
+
+Sections are ordered so the prompt is prefix-stable: everything that stays
+the same across a conversation comes first, and the sections rebuilt for
+every request (canvas, sources, RAG) come after ``turn_context_marker()``.
+Providers keep the part before the marker as a cacheable prefix.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+_MAX_ENTRIES = 256
+_TURN_CONTEXT_SECTION = "[PER-REQUEST CONTEXT]"
+
+
+def turn_context_marker() -> str:
+    """Return the marker that separates the stable prompt prefix from per-request sections."""
+    return f"\n{_TURN_CONTEXT_SECTION}\n"
+
+
+def compose_system_prompt(base: str, extra: str | None) -> str:
+    """Join the configured system prompt and the assembled extra prompt, stable part first."""
+    return f"{base}\n\n{extra}" if extra else base
+
+
+def split_system_prompt(prompt: str) -> tuple[str, str]:
+    """Split *prompt* into (stable prefix, per-request tail) at the turn context marker."""
+    pos = prompt.find(turn_context_marker())
+    if pos == -1:
+        return prompt, ""
+    return prompt[:pos], prompt[pos:]
+
+
+@dataclass
+class _CacheEntry:
+    value: str
+    pins: tuple[Any, ...]  # keeps objects referenced by id() in the key alive
+
+
+class PromptSectionCache:
+    """Bounded LRU of rendered prompt sections keyed by ``(section, key)``.
+
+    Keys may contain ``id()`` of registries or config objects; pass those
+    objects as *pins* so they cannot be garbage-collected (and their id
+    reused) while the entry is cached.
+    """
+
+    def __init__(self, max_entries: int = _MAX_ENTRIES) -> None:
+        self._max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, Hashable], _CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str, key: Hashable) -> str | None:
+        with self._lock:
+            entry = self._entries.get((name, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((name, key))
+            self.hits += 1
+            return entry.value
+
+    def put(self, name: str, key: Hashable, value: str, pins: tuple[Any, ...] = ()) -> None:
+        with self._lock:
+            self._entries[(name, key)] = _CacheEntry(value=value, pins=pins)
+            self._entries.move_to_end((name, key))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, name: str | None = None) -> None:
+        """Drop cached sections (all of them, or only those for *name*)."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+                return
+            for k in [k for k in self._entries if k[0] == name]:
+                del self._entries[k]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@dataclass
+class SectionStat:
+    name: str
+    cached: bool
+    ms: float
+    chars: int
+
+
+class PromptAssembler:
+    """Collects prompt sections in order, timing each one.
+
+    ``cached()`` sections are looked up in *cache* (when given) by key;
+    ``add()`` / ``add_async()`` sections are always rebuilt.
+    """
+
+    def __init__(self, cache: PromptSectionCache | None = None) -> None:
+        self._cache = cache
+        self._parts: list[str] = []
+        self.stats: list[SectionStat] = []
+
+    def cached(
+        self,
+        name: str,
+        key: Hashable,
+        build: Callable[[], str],
+        *,
+        pins: tuple[Any, ...] = (),
+    ) -> str:
+        start = time.perf_counter()
+        value = self._cache.get(name, key) if self._cache is not None else None
+        hit = value is not None
+        if value is None:
+            value = build()
+            if self._cache is not None:
+                self._cache.put(name, key, value, pins)
+        self._record(name, value, start, hit)
+        return value
+
+    def add(self, name: str, build: Callable[[], str]) -> str:
+        start = time.perf_counter()
+        value = build()
+        self._record(name, value, start, False)
+        return value
+
+    async def add_async(self, name: str, build: Callable[[], Awaitable[str]]) -> str:
+        start = time.perf_counter()
+        value = await build()
+        self._record(name, value, start, False)
+        return value
+
+    def _record(self, name: str, value: str, start: float, hit: bool) -> None:
+        self._parts.append(value)
+        self.stats.append(
+            SectionStat(name=name, cached=hit, ms=(time.perf_counter() - start) * 1000.0, chars=len(value))
+        )
+
+    def rewrite(self, fn: Callable[[str], str]) -> None:
+        """Apply *fn* to everything assembled so far."""
+        self._parts = [fn("".join(self._parts))]
+
+    def render(self) -> str:
+        return "".join(self._parts)
+
+    def meta(self) -> dict[str, Any]:
+        """Per-section timing and cache status for ``prompt_meta``."""
+        return {
+            "prompt_sections": [
+                {"name": s.name, "cached": s.cached, "ms": round(s.ms, 3), "chars": s.chars} for s in self.stats
+            ],
+            "prompt_cache_hits": sum(1 for s in self.stats if s.cached),
+            "prompt_build_ms": round(sum(s.ms for s in self.stats), 3),
+        }
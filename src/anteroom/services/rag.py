@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import hashlib
 import logging
 import re
 from dataclasses import dataclass
@@ -10,6 +11,7 @@ from typing import Any
 from ..config import RagConfig, RerankerConfig
 from . import storage
 from .context_trust import wrap_untrusted
+from .token_counter import TokenCounter, get_token_counter
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +42,8 @@ async def retrieve_context(
     vec_manager: Any | None = None,
     reranker_service: Any | None = None,
     reranker_config: RerankerConfig | None = None,
+    max_tokens: int | None = None,
+    token_counter: TokenCounter | None = None,
 ) -> tuple[list[RetrievedChunk], str | None]:
     """Embed the user query and retrieve the top-K most relevant chunks.
 
@@ -47,6 +51,10 @@ async def retrieve_context(
     belonging to that space, and source results are filtered to sources
     linked to that space.
 
+    The chunks are trimmed to *max_tokens* (default ``config.max_tokens``,
+    e.g. the share a ``ContextBudget`` allotted), counted with
+    *token_counter* (default: the ``cl100k_base`` counter).
+
     Returns ``(chunks, reason)`` where *reason* is ``None`` on success or a
     human-readable string explaining why no results were returned.  Never
     raises when embeddings are unavailable, the query is too short, or any
@@ -204,6 +212,9 @@ async def retrieve_context(
     # Sort by distance (most similar first) and deduplicate
     chunks.sort(key=lambda c: c.distance)
     chunks = _deduplicate(chunks)
+    near_dup_threshold = getattr(config, "near_duplicate_threshold", -1)
+    if near_dup_threshold >= 0:
+        chunks = _collapse_near_duplicates(chunks, near_dup_threshold)
 
     # Cross-encoder reranking (optional second stage)
     if reranker_service and reranker_config and reranker_config.enabled is not False and chunks:
@@ -219,19 +230,31 @@ async def retrieve_context(
         )
         chunks = await _rerank_chunks(query, chunks, reranker_service, capped_config)
 
-    # Trim to token budget (chars/4 estimate)
-    max_chars = config.max_tokens * 4
+    # Max-marginal-relevance diversification over the indexed candidate vectors
+    mmr_lambda = getattr(config, "mmr_lambda", 1.0)
+    if mmr_lambda < 1.0 and vec_manager is not None and len(chunks) > 2:
+        chunks = _mmr_rerank(chunks, vec_manager, mmr_lambda)
+
+    trimmed = _trim_to_budget(chunks, config.max_tokens if max_tokens is None else max_tokens, token_counter)
+    reason = None if trimmed else "No matching results found"
+    return trimmed, reason
+
+
+def _trim_to_budget(
+    chunks: list[RetrievedChunk], max_tokens: int, counter: TokenCounter | None = None
+) -> list[RetrievedChunk]:
+    """The leading (best-ranked) chunks whose content fits in *max_tokens*."""
+    if counter is None:
+        counter = get_token_counter()
     trimmed: list[RetrievedChunk] = []
-    total_chars = 0
+    total = 0
     for chunk in chunks:
-        chunk_chars = len(chunk.content)
-        if total_chars + chunk_chars > max_chars:
+        tokens = counter.count_text(chunk.content)
+        if total + tokens > max_tokens:
             break
         trimmed.append(chunk)
-        total_chars += chunk_chars
-
-    reason = None if trimmed else "No matching results found"
-    return trimmed, reason
+        total += tokens
+    return trimmed
 
 
 def format_rag_context(chunks: list[RetrievedChunk]) -> str:
@@ -380,6 +403,113 @@ def _deduplicate(chunks: list[RetrievedChunk]) -> list[RetrievedChunk]:
     return result
 
 
+_WORD_RE = re.compile(r"\w+")
+_SHINGLE_SIZE = 3
+
+
+def _simhash(text: str) -> int:
+    """64-bit SimHash over lower-cased word 3-shingles."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) >= _SHINGLE_SIZE:
+        features = [" ".join(words[i : i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)]
+    else:
+        features = words
+    if not features:
+        return 0
+    weights = [0] * 64
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    value = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            value |= 1 << bit
+    return value
+
+
+def _collapse_near_duplicates(chunks: list[RetrievedChunk], max_distance: int) -> list[RetrievedChunk]:
+    """Drop chunks whose SimHash is within *max_distance* bits of a better-ranked chunk.
+
+    Catches repeated tool outputs, quoted messages and re-pasted text that
+    differ only in whitespace, punctuation or a few words.  Input must already
+    be ordered best-first; the first chunk of each near-duplicate group wins.
+    """
+    kept: list[RetrievedChunk] = []
+    kept_hashes: list[int] = []
+    for chunk in chunks:
+        h = _simhash(chunk.content)
+        if any(bin(h ^ other).count("1") <= max_distance for other in kept_hashes):
+            continue
+        kept.append(chunk)
+        kept_hashes.append(h)
+    return kept
+
+
+def _chunk_key(chunk: RetrievedChunk) -> str | None:
+    return chunk.message_id if chunk.source_type == "message" else chunk.chunk_id
+
+
+def _fetch_chunk_vectors(chunks: list[RetrievedChunk], vec_manager: Any) -> dict[str, Any]:
+    """Look up unit-normalised vectors for *chunks* from the vector indexes."""
+    import numpy as np
+
+    found: dict[str, list[float]] = {}
+    msg_keys = [c.message_id for c in chunks if c.source_type == "message" and c.message_id]
+    src_keys = [c.chunk_id for c in chunks if c.source_type == "source_chunk" and c.chunk_id]
+    try:
+        if msg_keys and vec_manager.messages is not None:
+            found.update(vec_manager.messages.get_vectors(msg_keys))
+        if src_keys and vec_manager.source_chunks is not None:
+            found.update(vec_manager.source_chunks.get_vectors(src_keys))
+    except Exception:
+        logger.debug("RAG: candidate vector lookup failed", exc_info=True)
+        return {}
+
+    vectors: dict[str, Any] = {}
+    for key, vec in found.items():
+        arr = np.asarray(vec, dtype=np.float32)
+        norm = float(np.linalg.norm(arr))
+        if norm > 0:
+            vectors[key] = arr / norm
+    return vectors
+
+
+def _mmr_rerank(chunks: list[RetrievedChunk], vec_manager: Any, lam: float) -> list[RetrievedChunk]:
+    """Reorder *chunks* by max marginal relevance.
+
+    Relevance is the chunk's current rank score (``1 - distance``, min-max
+    normalised); redundancy is the max cosine similarity to an already
+    selected chunk.  Chunks without an indexed vector only compete on
+    relevance.  Returns the input unchanged if no vectors are available.
+    """
+    vectors = _fetch_chunk_vectors(chunks, vec_manager)
+    if len(vectors) < 2:
+        return chunks
+
+    raw_rel = [1.0 - c.distance for c in chunks]
+    lo, hi = min(raw_rel), max(raw_rel)
+    span = hi - lo
+    relevance = [(r - lo) / span if span > 0 else 1.0 for r in raw_rel]
+    chunk_vecs = [vectors.get(_chunk_key(c) or "") for c in chunks]
+
+    remaining = list(range(len(chunks)))
+    selected: list[int] = []
+    max_sim = [0.0] * len(chunks)
+    while remaining:
+        best = max(remaining, key=lambda i: lam * relevance[i] - (1.0 - lam) * max_sim[i])
+        remaining.remove(best)
+        selected.append(best)
+        best_vec = chunk_vecs[best]
+        if best_vec is None:
+            continue
+        for i in remaining:
+            vec = chunk_vecs[i]
+            if vec is not None:
+                max_sim[i] = max(max_sim[i], float(best_vec @ vec))
+    return [chunks[i] for i in selected]
+
+
 def _get_conversation_title(db: Any, conversation_id: str) -> str:
     """Get a conversation's title for attribution."""
     try:
@@ -0,0 +1,155 @@
+"""Per-space cache of artifact/skill/rule registries for web requests.
+
+A chat request that targets a space needs registries that combine global and
+space-attached pack artifacts.  Building them means loading every attached
+artifact row, copying the skill table and compiling rule regexes, so the
+result is cached per space and shared (read-only) between requests.
+
+An entry is reused while:
+
+- nothing called ``invalidate()`` for it (artifact/pack/space mutations do),
+- the cheap database fingerprint from ``space_registry_fingerprint()`` is
+  unchanged (catches writes from other processes, e.g. the CLI), and
+- the global skill registry it was layered on is the same object at the
+  same version.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_MAX_SPACES = 64
+
+_FINGERPRINT_SQL = (
+    "SELECT"
+    " (SELECT COUNT(*) FROM artifacts),"
+    " (SELECT MAX(updated_at) FROM artifacts),"
+    " (SELECT COUNT(*) FROM packs),"
+    " (SELECT MAX(updated_at) FROM packs),"
+    " (SELECT COUNT(*) FROM pack_artifacts),"
+    " (SELECT COUNT(*) FROM pack_attachments),"
+    " (SELECT MAX(created_at) FROM pack_attachments),"
+    " (SELECT TOTAL(priority) FROM pack_attachments),"
+    " (SELECT GROUP_CONCAT(local_path, char(31)) FROM space_paths WHERE space_id = ? AND local_path != '')"
+)
+
+
+def space_registry_fingerprint(db: Any, space_id: str) -> tuple[Any, ...]:
+    """Summarise the tables a space's registries are built from in one query."""
+    row = db.execute_fetchone(_FINGERPRINT_SQL, (space_id,))
+    return tuple(row) if row is not None else ()
+
+
+@dataclass(frozen=True)
+class SpaceRegistries:
+    """Registries scoped to one space.  Shared between requests; do not mutate."""
+
+    artifact_registry: Any
+    skill_registry: Any
+    rule_enforcer: Any
+
+
+def build_space_registries(db: Any, space_id: str, global_skill: Any, global_rules: Any) -> SpaceRegistries:
+    """Build artifact, skill and rule registries for *space_id* from the database."""
+    from ..cli.skills import SkillRegistry
+    from .artifact_registry import ArtifactRegistry
+    from .artifacts import ArtifactType
+    from .rule_enforcer import RuleEnforcer
+    from .space_storage import get_space_local_dirs
+
+    # Derive project_path from the space's first mapped directory
+    project_path: str | None = None
+    local_dirs = get_space_local_dirs(db, space_id)
+    if local_dirs:
+        project_path = local_dirs[0]
+
+    art_reg = ArtifactRegistry()
+    art_reg.load_from_db(db, space_id=space_id, project_path=project_path)
+
+    skill_reg = None
+    if global_skill is not None:
+        skill_reg = SkillRegistry()
+        # Copy global skills first, then overlay space-scoped ones
+        if hasattr(global_skill, "_skills"):
+            skill_reg._skills = dict(global_skill._skills)
+        skill_reg.load_from_artifacts(art_reg)
+
+    rule_enf = None
+    if global_rules is not None:
+        rule_enf = RuleEnforcer()
+        rule_enf.load_rules(art_reg.list_all(artifact_type=ArtifactType.RULE))
+
+    return SpaceRegistries(artifact_registry=art_reg, skill_registry=skill_reg, rule_enforcer=rule_enf)
+
+
+@dataclass
+class _Entry:
+    registries: SpaceRegistries
+    fingerprint: tuple[Any, ...]
+    global_skill: Any
+    global_skill_version: int | None
+    has_rules: bool
+
+
+def _version_of(registry: Any) -> int | None:
+    version = getattr(registry, "version", None)
+    return version if isinstance(version, int) else None
+
+
+class SpaceRegistryCache:
+    """Bounded LRU of ``SpaceRegistries`` keyed by space id."""
+
+    def __init__(self, max_spaces: int = _MAX_SPACES) -> None:
+        self._max_spaces = max(1, max_spaces)
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def get(self, db: Any, space_id: str, *, global_skill: Any, global_rules: Any) -> SpaceRegistries:
+        """Return cached registries for *space_id*, rebuilding them if stale."""
+        fingerprint = space_registry_fingerprint(db, space_id)
+        skill_version = _version_of(global_skill)
+        with self._lock:
+            entry = self._entries.get(space_id)
+            if (
+                entry is not None
+                and entry.fingerprint == fingerprint
+                and entry.global_skill is global_skill
+                and entry.global_skill_version == skill_version
+                and entry.has_rules == (global_rules is not None)
+            ):
+                self._entries.move_to_end(space_id)
+                self.hits += 1
+                return entry.registries
+
+            registries = build_space_registries(db, space_id, global_skill, global_rules)
+            self.builds += 1
+            self._entries[space_id] = _Entry(
+                registries=registries,
+                fingerprint=fingerprint,
+                global_skill=global_skill,
+                global_skill_version=skill_version,
+                has_rules=global_rules is not None,
+            )
+            self._entries.move_to_end(space_id)
+            while len(self._entries) > self._max_spaces:
+                self._entries.popitem(last=False)
+            return registries
+
+    def invalidate(self, space_id: str | None = None) -> None:
+        """Drop the entry for *space_id*, or every entry when None."""
+        with self._lock:
+            if space_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(space_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
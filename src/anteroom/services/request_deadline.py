@@ -0,0 +1,75 @@
+"""Per-request deadlines shared by provider calls, tool calls and sub-agents.
+
+With ``ai.request_deadline`` set, a chat turn gets an absolute deadline.
+It lives in a ``ContextVar``, so everything the turn starts -- tool calls,
+sub-agents and their own model calls -- inherits it without extra
+parameters.  Each layer bounds its own timeout by the time left
+(``bound()``), and a sub-agent can only shorten the deadline it inherited,
+never extend it.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextvars import ContextVar
+from typing import TypeVar
+
+T = TypeVar("T")
+
+# Absolute deadline on the time.monotonic() clock, or None
+_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current request's deadline, or None without one."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def bound(timeout: float) -> float:
+    """*timeout* shortened to the time left before the deadline (never negative)."""
+    left = remaining()
+    if left is None:
+        return timeout
+    return max(0.0, min(timeout, left))
+
+
+def with_deadline(events: AsyncIterator[T], seconds: float) -> AsyncIterator[T]:
+    """Run *events* (e.g. ``run_agent_loop(...)``) under a deadline *seconds* from now.
+
+    The deadline is only visible while *events* is producing its next item,
+    so the caller's own code between items never sees it.  Returns *events*
+    unchanged when *seconds* is 0.
+    """
+    if not isinstance(seconds, (int, float)) or seconds <= 0:
+        return events
+    deadline = time.monotonic() + seconds
+    inherited = _deadline.get()
+    if inherited is not None:
+        deadline = min(deadline, inherited)
+    return _iterate(events, deadline)
+
+
+async def _iterate(events: AsyncIterator[T], deadline: float) -> AsyncGenerator[T, None]:
+    try:
+        while True:
+            token = _deadline.set(deadline)
+            try:
+                item = await events.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _deadline.reset(token)
+            yield item
+    finally:
+        aclose = getattr(events, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,209 @@
+"""Hedged provider requests for a slow first byte.
+
+Some gateways have a heavy latency tail: the first token occasionally takes
+20+ seconds while an immediate retry answers in one.  With
+``ai.hedge_requests`` on, ``AIService.stream_chat`` starts a second,
+identical request when the first has produced no chunk within the recent
+p95 first-byte latency (never sooner than ``ai.hedge_min_delay``).  The first
+request to stream wins and the other is cancelled.
+
+- **threshold**: the p95 of recent first-byte latencies per endpoint and
+  model.  Nothing is hedged until enough samples exist.
+- **rate cap**: at most ``ai.hedge_max_rate`` of recent requests may be
+  hedged, so a slow provider is not hit with double load.
+- **duplicate spend**: the cancelled request's prompt was most likely
+  processed and billed upstream.  The winner's prompt tokens are reported
+  as ``hedge_tokens`` in its usage and counted against token budgets.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any, Generic, TypeVar
+from urllib.parse import urlparse
+
+T = TypeVar("T")
+
+# First-byte latencies kept per endpoint (for the p95 threshold)
+_LATENCY_SAMPLES = 200
+# Hedging starts once this many latencies have been observed
+_MIN_SAMPLES = 20
+# The hedge rate cap applies over this many recent requests
+_RATE_WINDOW = 100
+
+
+def _p95(values: list[float]) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class HedgeTracker:
+    """First-byte latency, hedge rate and duplicate spend for one endpoint and model."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self._recent: deque[bool] = deque(maxlen=_RATE_WINDOW)
+        self._inflight_hedges = 0
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.duplicate_tokens = 0
+
+    def hedge_delay(self, min_delay: float) -> float | None:
+        """Seconds to wait for a first byte before hedging; None until enough samples exist."""
+        with self._lock:
+            if len(self._latencies) < _MIN_SAMPLES:
+                return None
+            return max(min_delay, _p95(list(self._latencies)))
+
+    def try_hedge(self, max_rate: float) -> bool:
+        """Reserve a hedge if the recent hedge rate stays within *max_rate*."""
+        with self._lock:
+            hedges = sum(self._recent) + self._inflight_hedges
+            if hedges + 1 > max_rate * (len(self._recent) + 1):
+                return False
+            self._inflight_hedges += 1
+            return True
+
+    def record(self, latency: float, *, hedged: bool, hedge_won: bool) -> None:
+        """Record a finished first-byte race (*latency* is the winner's own)."""
+        with self._lock:
+            self._latencies.append(latency)
+            self._recent.append(hedged)
+            self.requests += 1
+            if hedged:
+                self._inflight_hedges = max(0, self._inflight_hedges - 1)
+                self.hedged += 1
+                self.hedge_wins += int(hedge_won)
+
+    def release(self) -> None:
+        """Give back a hedge reserved for a race that failed or was cancelled."""
+        with self._lock:
+            self._inflight_hedges = max(0, self._inflight_hedges - 1)
+
+    def add_duplicate_tokens(self, tokens: int) -> None:
+        with self._lock:
+            self.duplicate_tokens += max(0, tokens)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            latencies = list(self._latencies)
+            return {
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "hedge_rate": round(self.hedged / self.requests, 3) if self.requests else 0.0,
+                "duplicate_tokens": self.duplicate_tokens,
+                "first_byte_p95_ms": round(_p95(latencies) * 1000, 1) if latencies else 0.0,
+            }
+
+
+_trackers: dict[tuple[str, str], HedgeTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def tracker_for(base_url: str, model: str) -> HedgeTracker:
+    with _trackers_lock:
+        return _trackers.setdefault((base_url, model), HedgeTracker())
+
+
+def hedge_stats() -> list[dict[str, Any]]:
+    """Per endpoint (host only) and model statistics since this process started."""
+    with _trackers_lock:
+        items = sorted(_trackers.items())
+    return [
+        {"endpoint": urlparse(base_url).netloc or base_url, "model": model, **tracker.snapshot()}
+        for (base_url, model), tracker in items
+    ]
+
+
+def reset_hedge_stats() -> None:
+    with _trackers_lock:
+        _trackers.clear()
+
+
+@dataclass
+class RaceResult(Generic[T]):
+    value: T | None  # None when cancel_event fired first
+    hedged: bool
+    hedge_won: bool
+    latency: float  # seconds from the winning request's own start to its result
+
+
+async def race(
+    start: Callable[[], Awaitable[T]],
+    *,
+    hedge_after: float | None,
+    allow_hedge: Callable[[], bool],
+    timeout: float,
+    cancel_event: asyncio.Event | None,
+    discard: Callable[[T], Awaitable[None]],
+) -> RaceResult[T]:
+    """Await ``start()``, starting one identical hedge after *hedge_after* seconds.
+
+    The first successful result wins.  The other request is cancelled, or
+    passed to *discard* if it also finished.  A failure is only raised when
+    no request is left running.  Raises ``asyncio.TimeoutError`` after
+    *timeout* seconds.  *allow_hedge* is asked when the hedge is due; it
+    enforces the rate cap.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + timeout
+    primary = asyncio.ensure_future(start())
+    attempts: dict[asyncio.Future[T], float] = {primary: started}
+    cancel_wait = asyncio.ensure_future(cancel_event.wait()) if cancel_event else None
+    hedged = False
+    error: BaseException | None = None
+    try:
+        while attempts:
+            now = loop.time()
+            if now >= deadline:
+                raise asyncio.TimeoutError()
+            wait_for = deadline - now
+            hedge_pending = not hedged and hedge_after is not None
+            if hedge_pending:
+                wait_for = min(wait_for, max(0.0, started + hedge_after - now))  # type: ignore[operator]
+            waiting: set[asyncio.Future[Any]] = set(attempts)
+            if cancel_wait is not None:
+                waiting.add(cancel_wait)
+            done, _ = await asyncio.wait(waiting, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+
+            if cancel_wait is not None and cancel_wait in done:
+                return RaceResult(None, hedged, False, loop.time() - started)
+
+            winner: tuple[asyncio.Future[T], float] | None = None
+            for task in [t for t in attempts if t in done]:
+                task_start = attempts.pop(task)
+                if task.exception() is not None:
+                    error = task.exception()
+                elif winner is None:
+                    winner = (task, task_start)
+                else:
+                    await discard(task.result())
+            if winner is not None:
+                task, task_start = winner
+                return RaceResult(task.result(), hedged, task is not primary, loop.time() - task_start)
+
+            if not done and hedge_pending and loop.time() < deadline:
+                hedge_after = None
+                if allow_hedge():
+                    hedged = True
+                    attempts[asyncio.ensure_future(start())] = loop.time()
+        assert error is not None
+        raise error
+    finally:
+        if cancel_wait is not None:
+            cancel_wait.cancel()
+        for task in attempts:
+            task.cancel()
+        if attempts:
+            for result in await asyncio.gather(*attempts, return_exceptions=True):
+                if not isinstance(result, BaseException):
+                    # Finished just as it was cancelled
+                    await discard(result)
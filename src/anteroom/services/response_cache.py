@@ -0,0 +1,319 @@
+"""Opt-in SQLite cache for deterministic, non-streaming LLM calls.
+
+Title generation, compaction summaries and other ``complete()`` calls send
+the provider byte-identical requests surprisingly often: regenerating titles
+on import, retrying a compaction after an error, re-running the same
+summaries over the same history.  With ``ai.response_cache`` enabled those
+calls are answered from ``response_cache.db`` in the data directory.
+
+Entries are keyed by a SHA-256 over the canonical JSON of the endpoint,
+model, messages, tools and request parameters, so any difference in input
+is a miss.  Only calls that are deterministic enough to replay use the
+cache: temperature-0 calls, or calls the caller marks ``cacheable`` (titles
+and summaries, where any valid answer for the same input will do).  Streaming
+agent turns are never cached because their tool calls have side effects.
+
+Entries expire after ``response_cache_ttl`` seconds and the least recently
+used are evicted beyond ``response_cache_max_entries``.  Hits are counted per
+day and model together with the tokens the original call used, so usage
+reports can show what the cache saved.
+
+Cached prompts and completions are conversation content, so the cache follows
+the storage rules for it: it stays off when ``storage.encrypt_at_rest`` is on
+(``response_cache.db`` is a plain SQLite file), and deleting a conversation or
+a retention purge empties it.  Entries are keyed by hash alone and cannot be
+traced back to a conversation, so invalidation drops all of them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_DB_NAME = "response_cache.db"
+# Responses bigger than this are not worth a cache row
+_MAX_RESPONSE_CHARS = 256_000
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        model TEXT NOT NULL DEFAULT '',
+        response TEXT NOT NULL,
+        total_tokens INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        last_used_at REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used_at)",
+    """
+    CREATE TABLE IF NOT EXISTS hit_stats (
+        day TEXT NOT NULL,
+        model TEXT NOT NULL DEFAULT '',
+        hits INTEGER NOT NULL DEFAULT 0,
+        tokens_saved INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, model)
+    )
+    """,
+)
+
+
+def cache_key(
+    config: Any,
+    messages: list[dict[str, Any]],
+    *,
+    tools: list[dict[str, Any]] | None = None,
+    params: dict[str, Any] | None = None,
+) -> str:
+    """Canonical hash of everything that determines a provider response."""
+    payload = {
+        "provider": config.provider,
+        "base_url": config.base_url,
+        "model": config.model,
+        "messages": messages,
+        "tools": tools or [],
+        "params": {k: v for k, v in (params or {}).items() if v is not None},
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response store with TTL and LRU size limit."""
+
+    def __init__(self, db_path: str | Path, *, ttl: int = 604_800, max_entries: int = 10_000) -> None:
+        self._db_path = str(db_path)
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._puts = 0
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self._db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Deleted responses are overwritten on disk, not left in free pages
+            self._conn.execute("PRAGMA secure_delete=ON")
+            for stmt in _SCHEMA:
+                self._conn.execute(stmt)
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response for *key*, recording the hit; None on miss or expiry."""
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            row = conn.execute(
+                "SELECT response, model, total_tokens, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, model, tokens, created_at = row
+            if now - created_at > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            day = datetime.fromtimestamp(now, timezone.utc).date().isoformat()
+            conn.execute("UPDATE responses SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            conn.execute(
+                "INSERT INTO hit_stats (day, model, hits, tokens_saved) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(day, model) DO UPDATE SET hits = hits + 1, "
+                "tokens_saved = tokens_saved + excluded.tokens_saved",
+                (day, model, tokens),
+            )
+            conn.commit()
+            return str(response)
+
+    def put(self, key: str, response: str, *, model: str = "", total_tokens: int = 0) -> None:
+        """Store *response* under *key*; evicts expired and least recently used entries as needed."""
+        if not response or len(response) > _MAX_RESPONSE_CHARS:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, total_tokens, created_at, last_used_at, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, model, response, int(total_tokens or 0), now, now),
+            )
+            self._puts += 1
+            # Trim every so often rather than on every write
+            if self._puts % 50 == 1:
+                self._trim(conn, now)
+            conn.commit()
+
+    def _trim(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        conn.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self, since: str | None = None) -> dict[str, int]:
+        """Entries stored, plus hits and tokens saved since the ISO date/time *since* (all time if None)."""
+        with self._lock:
+            conn = self._get_conn()
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            row = conn.execute(
+                "SELECT COALESCE(SUM(hits), 0), COALESCE(SUM(tokens_saved), 0) FROM hit_stats WHERE day >= ?",
+                ((since or "")[:10],),
+            ).fetchone()
+        return {"entries": int(entries), "hits": int(row[0]), "tokens_saved": int(row[1])}
+
+    def clear(self) -> None:
+        """Drop every stored response (hit statistics hold no content and are kept)."""
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache: ResponseCache | None = None
+
+
+def configure_response_cache(
+    ai_config: Any, data_dir: str | Path | None, *, encrypt_at_rest: bool = False
+) -> ResponseCache | None:
+    """Open the process-wide cache when ``ai.response_cache`` is enabled (closing any previous one).
+
+    With *encrypt_at_rest* the cache stays off and entries left by earlier
+    unencrypted runs are dropped.
+    """
+    global _cache
+    close_response_cache()
+    if getattr(ai_config, "response_cache", False) is not True or not data_dir:
+        return None
+    if encrypt_at_rest is True:
+        logger.warning("ai.response_cache is disabled: storage.encrypt_at_rest is on and the cache is not encrypted")
+        invalidate_response_cache(data_dir)
+        return None
+    try:
+        path = Path(data_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        _cache = ResponseCache(
+            path / _DB_NAME, ttl=ai_config.response_cache_ttl, max_entries=ai_config.response_cache_max_entries
+        )
+    except (OSError, sqlite3.Error):
+        logger.warning("Response cache unavailable", exc_info=True)
+        _cache = None
+    return _cache
+
+
+def get_response_cache() -> ResponseCache | None:
+    return _cache
+
+
+def close_response_cache() -> None:
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+
+def invalidate_response_cache(data_dir: str | Path | None) -> None:
+    """Empty the cache after conversation content was deleted (open or not in this process)."""
+    if _cache is not None:
+        cache, owned = _cache, False
+    elif isinstance(data_dir, (str, Path)) and data_dir and (Path(data_dir) / _DB_NAME).exists():
+        cache, owned = ResponseCache(Path(data_dir) / _DB_NAME), True
+    else:
+        return
+    try:
+        cache.clear()
+    except sqlite3.Error:
+        logger.warning("Failed to clear the response cache", exc_info=True)
+    finally:
+        if owned:
+            cache.close()
+
+
+def response_cache_stats(data_dir: str | Path | None, since: str | None = None) -> dict[str, int] | None:
+    """Hit statistics for usage reports; None when no cache database exists."""
+    if _cache is not None:
+        return _cache.stats(since)
+    if not isinstance(data_dir, (str, Path)) or not data_dir or not (Path(data_dir) / _DB_NAME).exists():
+        return None
+    cache = ResponseCache(Path(data_dir) / _DB_NAME)
+    try:
+        return cache.stats(since)
+    except sqlite3.Error:
+        return None
+    finally:
+        cache.close()
+
+
+def response_tokens(response: Any) -> int:
+    """Tokens a non-streaming response used (OpenAI ``total_tokens`` or Anthropic input + output)."""
+    usage = getattr(response, "usage", None)
+    total = getattr(usage, "total_tokens", None)
+    if isinstance(total, int):
+        return total
+    parts = (getattr(usage, "input_tokens", None), getattr(usage, "output_tokens", None))
+    return sum(p for p in parts if isinstance(p, int))
+
+
+class CachedCall:
+    """A pending lookup: ``hit`` is the cached text, or ``store()`` the fresh response."""
+
+    def __init__(self, cache: ResponseCache, key: str, model: str, hit: str | None) -> None:
+        self._cache = cache
+        self.key = key
+        self.model = model
+        self.hit = hit
+
+    def store(self, response: str | None, total_tokens: int = 0) -> None:
+        if response:
+            try:
+                self._cache.put(self.key, response, model=self.model, total_tokens=total_tokens)
+            except sqlite3.Error:
+                logger.warning("Failed to store cached response", exc_info=True)
+
+
+def lookup(
+    config: Any,
+    messages: list[dict[str, Any]],
+    *,
+    params: dict[str, Any] | None = None,
+    cacheable: bool | None = None,
+) -> CachedCall | None:
+    """Look up a non-streaming call; None when caching does not apply to it.
+
+    *cacheable* None means "cache only if the call is temperature 0": *params*
+    must then hold the sampling parameters actually sent to the provider.
+    """
+    cache = _cache
+    if cache is None or getattr(config, "response_cache", False) is not True:
+        return None
+    if cacheable is None:
+        cacheable = (params or {}).get("temperature") == 0
+    if not cacheable:
+        return None
+    key = cache_key(config, messages, params=params)
+    try:
+        hit = cache.get(key)
+    except sqlite3.Error:
+        logger.warning("Response cache lookup failed", exc_info=True)
+        return None
+    if hit is not None:
+        logger.debug("Response cache hit for %s", config.model)
+    return CachedCall(cache, key, config.model, hit)
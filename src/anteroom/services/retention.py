@@ -12,10 +12,13 @@ import re
 import shutil
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
+
+from .response_cache import invalidate_response_cache
 
 if TYPE_CHECKING:
     from ..db import ThreadSafeConnection
+    from .job_queue import JobQueue
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +41,8 @@ def purge_conversations_before(
 ) -> int:
     """Delete conversations last updated before *cutoff*.
 
-    CASCADE handles messages, tool_calls, and embeddings.
+    CASCADE handles messages, tool_calls, and embeddings; the response cache
+    is emptied since its entries may hold their content.
     Attachment files are deleted from disk when *purge_attachments* is True.
 
     Returns the count of conversations purged.
@@ -70,6 +74,7 @@ def purge_conversations_before(
 
     if not dry_run and count:
         db.commit()
+        invalidate_response_cache(data_dir)
 
     return count
 
@@ -143,6 +148,15 @@ class RetentionWorker:
         self._task: asyncio.Task[None] | None = None
         self._consecutive_failures = 0
         self._current_interval = float(self._check_interval)
+        self._job_queue: JobQueue | None = None
+
+    def register_jobs(self, queue: JobQueue) -> None:
+        """Run sweeps as durable jobs: an interrupted sweep is resumed and failures are retried by the queue."""
+        self._job_queue = queue
+        queue.register("retention_sweep", self._run_sweep_job, timeout=3600.0, backoff_base=60.0)
+
+    async def _run_sweep_job(self, payload: dict[str, Any]) -> None:
+        await self.run_once()
 
     @property
     def retention_days(self) -> int:
@@ -202,6 +216,14 @@ class RetentionWorker:
             self._check_interval,
         )
         while self._running:
+            if self._job_queue is not None:
+                # The queue runs the sweep and owns retries; only one sweep is ever pending
+                try:
+                    self._job_queue.enqueue("retention_sweep", dedupe_key="retention")
+                except Exception as e:
+                    logger.error("Retention worker failed to enqueue sweep: %s", type(e).__name__)
+                await asyncio.sleep(self._check_interval)
+                continue
             try:
                 await self.run_once()
                 if self._consecutive_failures > 0:
@@ -19,8 +19,11 @@ artifact registry.
 
 from __future__ import annotations
 
+import json
 import logging
 import re
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import Any
 
@@ -29,6 +32,7 @@ from ..services.artifacts import Artifact, ArtifactType
 logger = logging.getLogger(__name__)
 
 MAX_PATTERN_LENGTH = 500  # Guard against ReDoS from overly complex patterns
+_PARSED_RULE_CACHE_SIZE = 1024
 
 
 @dataclass(frozen=True)
@@ -116,6 +120,33 @@ def parse_rule(artifact: Artifact) -> ParsedRule | None:
     return ParsedRule(fqn=artifact.fqn, reason=reason, matches=tuple(rule_matches))
 
 
+_parsed_rule_cache: OrderedDict[tuple[str, str, str], ParsedRule | None] = OrderedDict()
+_parsed_rule_lock = threading.Lock()
+
+
+def parse_rule_cached(artifact: Artifact) -> ParsedRule | None:
+    """``parse_rule`` memoised on (fqn, content hash, metadata).
+
+    ``ParsedRule`` is immutable, so every enforcer built from the same rule
+    artifact (global and per-space) shares one set of compiled patterns.
+    """
+    try:
+        meta_key = json.dumps(artifact.metadata or {}, sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        return parse_rule(artifact)
+    key = (artifact.fqn, artifact.content_hash, meta_key)
+    with _parsed_rule_lock:
+        if key in _parsed_rule_cache:
+            _parsed_rule_cache.move_to_end(key)
+            return _parsed_rule_cache[key]
+    parsed = parse_rule(artifact)
+    with _parsed_rule_lock:
+        _parsed_rule_cache[key] = parsed
+        while len(_parsed_rule_cache) > _PARSED_RULE_CACHE_SIZE:
+            _parsed_rule_cache.popitem(last=False)
+    return parsed
+
+
 def _stringify_arguments(tool_name: str, arguments: dict[str, Any]) -> str:
     """Build a single string from tool arguments for regex matching.
 
@@ -163,7 +194,7 @@ class RuleEnforcer:
         """Parse and cache hard-enforced rules from a list of rule artifacts."""
         self._rules = []
         for art in artifacts:
-            parsed = parse_rule(art)
+            parsed = parse_rule_cached(art)
             if parsed is not None:
                 self._rules.append(parsed)
 
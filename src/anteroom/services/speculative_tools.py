@@ -0,0 +1,174 @@
+"""Speculative execution of read-only tool calls while the model is streaming.
+
+Providers emit a ``tool_call_ready`` event as soon as one tool call's
+arguments are complete (i.e. the next call, or the next content block, has
+started).  The agent loop hands those to ``SpeculativeToolRunner``, which
+starts eligible calls right away.  When the stream finishes, each final tool
+call claims its matching speculative task instead of starting a new one; any
+task that is not claimed (cancelled turn, stream error, different final
+arguments) is cancelled and its result discarded; calls it recorded with a
+tool rate limiter are refunded.
+
+Eligibility is decided by the caller's ``can_speculate`` predicate
+(``ToolRegistry.can_speculate``: side-effect-free READ-tier tools that the
+safety gate would auto-allow).  A call is only speculated while every earlier
+call of the turn was too, so a read never runs ahead of an earlier write the
+model issued in the same turn.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from .tool_rate_limit import ToolRateLimiter, speculative_calls
+
+logger = logging.getLogger(__name__)
+
+ToolRun = Callable[[dict[str, Any]], Awaitable[tuple[dict[str, Any], Any, str]]]
+
+
+def tool_call_ready_event(index: int, tc_data: dict[str, Any]) -> dict[str, Any] | None:
+    """Build a ``tool_call_ready`` stream event once *tc_data*'s arguments are complete.
+
+    Returns None when the accumulated arguments are not a JSON object (the
+    call is then only handled after the stream finishes).
+    """
+    raw = tc_data.get("arguments") or "{}"
+    try:
+        args = json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(args, dict) or not tc_data.get("function_name"):
+        return None
+    return {
+        "event": "tool_call_ready",
+        "data": {
+            "index": index,
+            "id": tc_data.get("id", ""),
+            "function_name": tc_data["function_name"],
+            "arguments": args,
+        },
+    }
+
+
+@dataclass
+class _Speculation:
+    tc: dict[str, Any]
+    task: asyncio.Task[tuple[dict[str, Any], Any, str]]
+    started_at: float
+    finished_at: float | None = None
+    discarded: bool = False
+    # Rate-limited calls the run recorded, as (limiter, recorded_at)
+    recorded: list[tuple[ToolRateLimiter, float]] = field(default_factory=list)
+
+
+class SpeculativeToolRunner:
+    """Starts eligible tool calls early and hands their results to the final turn."""
+
+    def __init__(self, run: ToolRun, can_speculate: Callable[[str, dict[str, Any]], bool]) -> None:
+        self._run = run
+        self._can_speculate = can_speculate
+        self._pending: dict[str, _Speculation] = {}
+        self._next_index = 0
+        self._blocked = False
+        self.started = 0
+        self.used = 0
+        self.discarded = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _key(tc: dict[str, Any]) -> str:
+        return tc.get("id") or f"index:{tc.get('index', '')}"
+
+    def offer(self, ready: dict[str, Any]) -> bool:
+        """Start *ready* (a ``tool_call_ready`` payload) if it is eligible."""
+        key = self._key(ready)
+        if key in self._pending:
+            return False
+        if self._blocked or ready.get("index") != self._next_index:
+            self._blocked = True
+            return False
+        name = ready.get("function_name", "")
+        args = ready.get("arguments", {})
+        try:
+            eligible = self._can_speculate(name, args)
+        except Exception:
+            logger.debug("Speculation check failed for %s", name, exc_info=True)
+            eligible = False
+        if not eligible:
+            # Later calls of this turn may depend on this one
+            self._blocked = True
+            return False
+        self._next_index += 1
+        tc = {"id": ready.get("id", ""), "function_name": name, "arguments": args}
+        recorded: list[tuple[ToolRateLimiter, float]] = []
+        spec = _Speculation(
+            tc=tc, task=asyncio.create_task(self._tracked(tc, recorded)), started_at=time.monotonic(), recorded=recorded
+        )
+
+        def _done(_task: asyncio.Task[Any], spec: _Speculation = spec) -> None:
+            spec.finished_at = time.monotonic()
+            if spec.discarded:
+                self._refund(spec)
+
+        spec.task.add_done_callback(_done)
+        self._pending[key] = spec
+        self.started += 1
+        logger.debug("Speculatively started %s (%s)", name, key)
+        return True
+
+    def claim(self, tc: dict[str, Any]) -> asyncio.Task[tuple[dict[str, Any], Any, str]] | None:
+        """Return the speculative task for final call *tc* if its arguments match."""
+        spec = self._pending.pop(self._key(tc), None)
+        if spec is None:
+            return None
+        if spec.tc["function_name"] != tc.get("function_name") or spec.tc["arguments"] != tc.get("arguments"):
+            self._cancel(spec)
+            return None
+        now = time.monotonic()
+        # Time the tool spent running before the turn would have started it
+        self.saved_seconds += (spec.finished_at or now) - spec.started_at
+        self.used += 1
+        spec.tc["id"] = tc.get("id", spec.tc["id"])
+        return spec.task
+
+    async def _tracked(
+        self, tc: dict[str, Any], recorded: list[tuple[ToolRateLimiter, float]]
+    ) -> tuple[dict[str, Any], Any, str]:
+        # Set inside the task, so only this run's calls are tracked
+        speculative_calls.set(recorded)
+        return await self._run(tc)
+
+    @staticmethod
+    def _refund(spec: _Speculation) -> None:
+        for limiter, recorded_at in spec.recorded:
+            limiter.refund_call(recorded_at)
+        spec.recorded.clear()
+
+    def _cancel(self, spec: _Speculation) -> None:
+        spec.discarded = True
+        if spec.task.done():
+            self._refund(spec)
+        else:
+            # Refunded by the done callback, once the run has stopped
+            spec.task.cancel()
+        self.discarded += 1
+
+    def discard_all(self) -> None:
+        """Cancel and drop every unclaimed speculative call, ending the turn."""
+        for spec in self._pending.values():
+            self._cancel(spec)
+        if self._pending:
+            logger.debug("Discarded %d speculative tool call(s)", len(self._pending))
+        self._pending.clear()
+        self._next_index = 0
+        self._blocked = False
+
+    def __len__(self) -> int:
+        return len(self._pending)
@@ -859,11 +859,30 @@ def update_message_usage(
     completion_tokens: int,
     total_tokens: int,
     model: str,
+    cache_read_tokens: int | None = None,
+    cache_write_tokens: int | None = None,
+    hedge_tokens: int | None = None,
 ) -> None:
-    """Update token usage on an existing message (called after streaming completes)."""
+    """Update token usage on an existing message (called after streaming completes).
+
+    *cache_read_tokens* / *cache_write_tokens* are the parts of *prompt_tokens*
+    served from or written to the provider's prompt cache, when reported.
+    *hedge_tokens* estimates the prompt tokens billed for a cancelled hedge
+    request; they are not part of *total_tokens*.
+    """
     db.execute(
-        "UPDATE messages SET prompt_tokens = ?, completion_tokens = ?, total_tokens = ?, model = ? WHERE id = ?",
-        (prompt_tokens, completion_tokens, total_tokens, model, message_id),
+        "UPDATE messages SET prompt_tokens = ?, completion_tokens = ?, total_tokens = ?, model = ?,"
+        " cache_read_tokens = ?, cache_write_tokens = ?, hedge_tokens = ? WHERE id = ?",
+        (
+            prompt_tokens,
+            completion_tokens,
+            total_tokens,
+            model,
+            cache_read_tokens,
+            cache_write_tokens,
+            hedge_tokens,
+            message_id,
+        ),
     )
 
 
@@ -891,13 +910,17 @@ def get_usage_stats(
         conversation_id: Filter to a specific conversation. None = all conversations.
 
     Returns:
-        List of dicts with model, prompt_tokens, completion_tokens, total_tokens, message_count.
+        List of dicts with model, prompt_tokens, completion_tokens, total_tokens,
+        cache_read_tokens, cache_write_tokens, hedge_tokens, message_count.
     """
     query = (
         "SELECT model, "
         "SUM(prompt_tokens) as prompt_tokens, "
         "SUM(completion_tokens) as completion_tokens, "
         "SUM(total_tokens) as total_tokens, "
+        "COALESCE(SUM(cache_read_tokens), 0) as cache_read_tokens, "
+        "COALESCE(SUM(cache_write_tokens), 0) as cache_write_tokens, "
+        "COALESCE(SUM(hedge_tokens), 0) as hedge_tokens, "
         "COUNT(*) as message_count "
         "FROM messages WHERE prompt_tokens IS NOT NULL"
     )
@@ -914,21 +937,22 @@ def get_usage_stats(
 
 
 def get_conversation_token_total(db: ThreadSafeConnection, conversation_id: str) -> int:
-    """Get total tokens consumed in a conversation."""
+    """Get total tokens consumed in a conversation, including hedged duplicates."""
     row = db.execute_fetchone(
-        "SELECT COALESCE(SUM(total_tokens), 0) FROM messages WHERE conversation_id = ? AND total_tokens IS NOT NULL",
+        "SELECT COALESCE(SUM(total_tokens + COALESCE(hedge_tokens, 0)), 0) FROM messages"
+        " WHERE conversation_id = ? AND total_tokens IS NOT NULL",
         (conversation_id,),
     )
     return int(row[0]) if row else 0
 
 
 def get_daily_token_total(db: ThreadSafeConnection) -> int:
-    """Get total tokens consumed today (UTC calendar day).
+    """Get total tokens consumed today (UTC calendar day), including hedged duplicates.
 
     Uses date('now') which returns UTC midnight as the day boundary.
     """
     row = db.execute_fetchone(
-        "SELECT COALESCE(SUM(total_tokens), 0) FROM messages "
+        "SELECT COALESCE(SUM(total_tokens + COALESCE(hedge_tokens, 0)), 0) FROM messages "
         "WHERE created_at >= date('now') AND total_tokens IS NOT NULL",
     )
     return int(row[0]) if row else 0
@@ -954,6 +978,72 @@ def list_messages(db: ThreadSafeConnection, conversation_id: str) -> list[dict[s
     return messages
 
 
+def ensure_message_token_counts(
+    db: ThreadSafeConnection,
+    messages: list[dict[str, Any]],
+    counter: Any,
+) -> int:
+    """Fill ``content_tokens`` on *messages* (rows from ``list_messages``).
+
+    Counts are computed once per message with *counter* (a ``TokenCounter``)
+    and persisted, so later turns read them instead of re-tokenizing the
+    history.  Rows counted with a different encoding are recounted.  Returns
+    the summed content tokens.
+    """
+    encoding = counter.encoding_name
+    updates: list[tuple[int, str, str]] = []
+    total = 0
+    for msg in messages:
+        tokens = msg.get("content_tokens")
+        if tokens is None or msg.get("token_encoding") != encoding:
+            tokens = counter.count_text(msg.get("content") or "")
+            msg["content_tokens"] = tokens
+            msg["token_encoding"] = encoding
+            updates.append((tokens, encoding, msg["id"]))
+        total += tokens
+    if updates:
+        with db.transaction() as conn:
+            for params in updates:
+                conn.execute("UPDATE messages SET content_tokens = ?, token_encoding = ? WHERE id = ?", params)
+    return total
+
+
+def get_conversation_summary(db: ThreadSafeConnection, conversation_id: str) -> dict[str, Any] | None:
+    """Latest rolling compaction summary for a conversation, if any."""
+    row = db.execute_fetchone(
+        "SELECT * FROM conversation_summaries WHERE conversation_id = ?",
+        (conversation_id,),
+    )
+    return dict(row) if row else None
+
+
+def save_conversation_summary(
+    db: ThreadSafeConnection,
+    conversation_id: str,
+    content: str,
+    upto_position: int,
+    covered_messages: int,
+) -> None:
+    """Store the rolling summary that replaces messages up to *upto_position*."""
+    db.execute(
+        "INSERT INTO conversation_summaries (conversation_id, content, upto_position, covered_messages, updated_at)"
+        " VALUES (?, ?, ?, ?, ?)"
+        " ON CONFLICT(conversation_id) DO UPDATE SET content = excluded.content,"
+        " upto_position = excluded.upto_position, covered_messages = excluded.covered_messages,"
+        " updated_at = excluded.updated_at",
+        (conversation_id, content, upto_position, covered_messages, _now()),
+    )
+    db.commit()
+
+
+def _drop_summary_covering(db: ThreadSafeConnection, conversation_id: str, position: int) -> None:
+    """Discard a rolling summary that covers a message being edited or removed."""
+    db.execute(
+        "DELETE FROM conversation_summaries WHERE conversation_id = ? AND upto_position >= ?",
+        (conversation_id, position),
+    )
+
+
 def update_message_content(
     db: ThreadSafeConnection,
     conversation_id: str,
@@ -968,7 +1058,11 @@ def update_message_content(
     )
     if not row:
         return None
-    db.execute("UPDATE messages SET content = ? WHERE id = ?", (new_content, message_id))
+    db.execute(
+        "UPDATE messages SET content = ?, content_tokens = NULL, token_encoding = NULL WHERE id = ?",
+        (new_content, message_id),
+    )
+    _drop_summary_covering(db, conversation_id, row["position"])
     now = _now()
     db.execute("UPDATE conversations SET updated_at = ? WHERE id = ?", (now, conversation_id))
     db.commit()
@@ -987,7 +1081,7 @@ def delete_message(
 ) -> bool:
     """Delete a single message by ID, validating it belongs to the given conversation."""
     row = db.execute_fetchone(
-        "SELECT id FROM messages WHERE id = ? AND conversation_id = ?",
+        "SELECT id, position FROM messages WHERE id = ? AND conversation_id = ?",
         (message_id, conversation_id),
     )
     if not row:
@@ -996,6 +1090,7 @@ def delete_message(
     if vec_index is not None:
         vec_index.remove(message_id)
     db.execute("DELETE FROM messages WHERE id = ? AND conversation_id = ?", (message_id, conversation_id))
+    _drop_summary_covering(db, conversation_id, row["position"])
     now = _now()
     db.execute("UPDATE conversations SET updated_at = ? WHERE id = ?", (now, conversation_id))
     db.commit()
@@ -1025,6 +1120,7 @@ def replace_document_content(
     now = _now()
     with db.transaction() as conn:
         conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+        conn.execute("DELETE FROM conversation_summaries WHERE conversation_id = ?", (conversation_id,))
         conn.execute(
             "INSERT INTO messages (id, conversation_id, role, content, user_id, user_display_name,"
             " created_at, position) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
@@ -1087,6 +1183,7 @@ def delete_messages_after_position(
         "DELETE FROM messages WHERE conversation_id = ? AND position > ?",
         (conversation_id, position),
     )
+    _drop_summary_covering(db, conversation_id, position + 1)
     now = _now()
     db.execute("UPDATE conversations SET updated_at = ? WHERE id = ?", (now, conversation_id))
     db.commit()
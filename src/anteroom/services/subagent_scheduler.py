@@ -0,0 +1,265 @@
+"""Process-wide admission control for sub-agent runs.
+
+``tools/subagent.SubagentLimiter`` caps sub-agents per root request; the
+scheduler sits above it and decides when an admitted sub-agent may start its
+own LLM session:
+
+- a global concurrency cap and a per-user cap,
+- a priority queue: interactive turns (web chat, REPL) are served ahead of
+  background runs (``aroom exec``, workflow agent steps); within a priority
+  the user with the fewest running sub-agents goes first, then arrival
+  order,
+- token budgets: tokens spent by every sub-agent are charged to the parent
+  conversation, and once the budget is spent running sub-agents are stopped
+  and new ones are refused,
+- cancellation: a queued request leaves the queue as soon as the parent's
+  cancel event is set.
+
+Everything in one process queues on ``shared_scheduler()``, so interactive
+and background work contend for the same slots.
+
+Nested sub-agents run under their parent's admission: the parent is blocked
+on the ``run_agent`` tool call while its children run, so they bypass the
+concurrency caps (still bounded by ``SubagentLimiter``) instead of queueing
+behind it and deadlocking.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any
+
+from ..config import SubagentConfig
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+_PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+# Conversations whose token totals are remembered (oldest evicted first)
+_MAX_TRACKED_CONVERSATIONS = 1024
+# Completed waits kept for the average/max wait statistics
+_WAIT_SAMPLES = 200
+
+
+class SubagentAdmissionError(Exception):
+    """A sub-agent could not be admitted (budget spent, queue timeout, or cancelled)."""
+
+
+@dataclass
+class _Waiter:
+    scope: SubagentScope
+    seq: int
+    enqueued: float
+    future: asyncio.Future[None]
+
+
+class SubagentScope:
+    """Scheduling identity shared by the sub-agents of one parent turn."""
+
+    def __init__(self, scheduler: SubagentScheduler, user: str, conversation_id: str, priority: int) -> None:
+        self.scheduler = scheduler
+        self.user = user
+        self.conversation_id = conversation_id
+        self.priority = priority
+
+    async def acquire(self, cancel_event: asyncio.Event | None = None) -> float:
+        """Wait for a slot; returns seconds spent queued. Raises ``SubagentAdmissionError``."""
+        return await self.scheduler.acquire(self, cancel_event)
+
+    def release(self) -> None:
+        self.scheduler.release(self)
+
+    def charge(self, tokens: int) -> bool:
+        """Charge *tokens* to the conversation; returns False once its budget is spent."""
+        return self.scheduler.charge(self.conversation_id, tokens)
+
+    @property
+    def tokens_used(self) -> int:
+        return self.scheduler.conversation_tokens(self.conversation_id)
+
+    @property
+    def budget_exhausted(self) -> bool:
+        return self.scheduler.budget_exhausted(self.conversation_id)
+
+
+class SubagentScheduler:
+    """Global sub-agent queue with concurrency caps, priorities, fair sharing and token budgets."""
+
+    def __init__(
+        self,
+        max_concurrent: int = 8,
+        max_per_user: int = 4,
+        queue_timeout: float = 120.0,
+        max_tokens_per_conversation: int = 0,
+    ) -> None:
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_user = max(1, max_per_user)
+        self.queue_timeout = queue_timeout
+        self.max_tokens_per_conversation = max(0, max_tokens_per_conversation)
+        self._running: dict[str, int] = {}
+        self._running_total = 0
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._tokens: OrderedDict[str, int] = OrderedDict()
+        self._waits: deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self.admitted = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_config(cls, config: Any) -> SubagentScheduler:
+        """Build from a ``SubagentConfig`` (``safety.subagent``); missing fields keep the defaults."""
+        defaults = SubagentConfig()
+
+        def _int(name: str) -> int:
+            value = getattr(config, name, None)
+            return value if isinstance(value, int) else getattr(defaults, name)
+
+        return cls(
+            max_concurrent=_int("global_max_concurrent"),
+            max_per_user=_int("max_concurrent_per_user"),
+            queue_timeout=float(_int("queue_timeout")),
+            max_tokens_per_conversation=_int("max_tokens_per_conversation"),
+        )
+
+    def scope(
+        self, *, user: str = "", conversation_id: str = "", priority: int = PRIORITY_INTERACTIVE
+    ) -> SubagentScope:
+        return SubagentScope(self, user or "local", conversation_id, priority)
+
+    async def acquire(self, scope: SubagentScope, cancel_event: asyncio.Event | None = None) -> float:
+        """Queue *scope* for a slot and wait until it is dispatched.
+
+        Returns the seconds spent waiting.  Raises ``SubagentAdmissionError``
+        when the conversation's budget is spent, the wait exceeds
+        ``queue_timeout``, or *cancel_event* is set while queued.
+        """
+        if self.budget_exhausted(scope.conversation_id):
+            self.rejected += 1
+            raise SubagentAdmissionError(
+                f"Sub-agent token budget for this conversation is spent ({self.max_tokens_per_conversation} tokens)"
+            )
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(scope=scope, seq=next(self._seq), enqueued=time.monotonic(), future=loop.create_future())
+        self._waiters.append(waiter)
+        self._dispatch()
+
+        cancel_task: asyncio.Task[Any] | None = None
+        try:
+            if not waiter.future.done():
+                waits: set[asyncio.Future[Any]] = {waiter.future}
+                if cancel_event is not None:
+                    cancel_task = asyncio.ensure_future(cancel_event.wait())
+                    waits.add(cancel_task)
+                await asyncio.wait(waits, timeout=self.queue_timeout, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        finally:
+            if cancel_task is not None:
+                cancel_task.cancel()
+
+        if waiter.future.done() and not waiter.future.cancelled():
+            return time.monotonic() - waiter.enqueued
+        self._abandon(waiter)
+        self.rejected += 1
+        if cancel_event is not None and cancel_event.is_set():
+            raise SubagentAdmissionError("Sub-agent cancelled while queued")
+        raise SubagentAdmissionError(
+            f"Sub-agent queue is full; waited {self.queue_timeout:.0f}s for a slot. Retry later or reduce parallelism."
+        )
+
+    def release(self, scope: SubagentScope) -> None:
+        """Return the slot held by *scope* and dispatch the next waiter."""
+        self._running_total = max(0, self._running_total - 1)
+        remaining = self._running.get(scope.user, 0) - 1
+        if remaining > 0:
+            self._running[scope.user] = remaining
+        else:
+            self._running.pop(scope.user, None)
+        self._dispatch()
+
+    def charge(self, conversation_id: str, tokens: int) -> bool:
+        """Add *tokens* to the conversation total; returns False once the budget is exceeded."""
+        if tokens > 0:
+            self._tokens[conversation_id] = self._tokens.get(conversation_id, 0) + tokens
+            self._tokens.move_to_end(conversation_id)
+            while len(self._tokens) > _MAX_TRACKED_CONVERSATIONS:
+                self._tokens.popitem(last=False)
+        return not self.budget_exhausted(conversation_id)
+
+    def budget_exhausted(self, conversation_id: str) -> bool:
+        limit = self.max_tokens_per_conversation
+        return limit > 0 and self._tokens.get(conversation_id, 0) >= limit
+
+    def conversation_tokens(self, conversation_id: str) -> int:
+        return self._tokens.get(conversation_id, 0)
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth, running counts and wait times for the UI."""
+        now = time.monotonic()
+        queued_by_priority: dict[str, int] = {}
+        for w in self._waiters:
+            name = _PRIORITY_NAMES.get(w.scope.priority, str(w.scope.priority))
+            queued_by_priority[name] = queued_by_priority.get(name, 0) + 1
+        return {
+            "running": self._running_total,
+            "queued": len(self._waiters),
+            "queued_by_priority": queued_by_priority,
+            "max_concurrent": self.max_concurrent,
+            "max_per_user": self.max_per_user,
+            "oldest_wait_seconds": round(max((now - w.enqueued for w in self._waiters), default=0.0), 1),
+            "avg_wait_seconds": round(sum(self._waits) / len(self._waits), 2) if self._waits else 0.0,
+            "max_wait_seconds": round(max(self._waits, default=0.0), 2),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+    def _dispatch(self) -> None:
+        while self._running_total < self.max_concurrent:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self._waiters.remove(waiter)
+            user = waiter.scope.user
+            self._running[user] = self._running.get(user, 0) + 1
+            self._running_total += 1
+            self.admitted += 1
+            self._waits.append(time.monotonic() - waiter.enqueued)
+            waiter.future.set_result(None)
+
+    def _next_waiter(self) -> _Waiter | None:
+        eligible = [
+            w for w in self._waiters if not w.future.done() and self._running.get(w.scope.user, 0) < self.max_per_user
+        ]
+        if not eligible:
+            return None
+        return min(eligible, key=lambda w: (w.scope.priority, self._running.get(w.scope.user, 0), w.seq))
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Drop *waiter* from the queue, or give back its slot if it was dispatched meanwhile."""
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            waiter.future.cancel()
+        elif waiter.future.done() and not waiter.future.cancelled():
+            self.release(waiter.scope)
+
+
+_shared: SubagentScheduler | None = None
+
+
+def shared_scheduler(config: Any) -> SubagentScheduler:
+    """The process-wide scheduler, built from *config* (``safety.subagent``) on first use."""
+    global _shared
+    if _shared is None:
+        _shared = SubagentScheduler.from_config(config)
+    return _shared
+
+
+def reset_shared_scheduler() -> None:
+    global _shared
+    _shared = None
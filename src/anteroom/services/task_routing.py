@@ -0,0 +1,208 @@
+"""Cost-aware model routing for auxiliary LLM calls.
+
+Conversation titles and compaction summaries don't need the main chat model.
+``ai.task_models`` maps each auxiliary task class to a cheaper model (and
+optionally a different endpoint or provider)::
+
+    ai:
+      task_models:
+        title: gpt-4o-mini
+        summarize:
+          model: claude-3-5-haiku-latest
+          provider: anthropic
+          base_url: https://api.anthropic.com
+          api_key: ${ANTHROPIC_API_KEY}
+
+Task classes are ``title``, ``summarize`` and ``classify``; anything else
+(and any unrouted class) runs on the main model as ``main``.  When a routed
+call fails and the route has ``fallback`` on (the default), the call is
+retried once on the main model.
+
+Every call is recorded per ``(task, model)`` -- calls, errors, fallbacks,
+tokens and latency -- and surfaced by ``/api/usage`` under ``task_routing``.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+from ..config import AIConfig
+
+logger = logging.getLogger(__name__)
+
+TASK_MAIN = "main"
+TASK_TITLE = "title"
+TASK_SUMMARIZE = "summarize"
+TASK_CLASSIFY = "classify"
+TASK_CLASSES = (TASK_MAIN, TASK_TITLE, TASK_SUMMARIZE, TASK_CLASSIFY)
+
+# Latency percentiles are computed over this many recent calls per (task, model)
+_LATENCY_SAMPLES = 200
+
+T = TypeVar("T")
+
+_call_tokens: ContextVar[int] = ContextVar("task_call_tokens", default=0)
+
+
+def note_tokens(tokens: int) -> None:
+    """Record the token usage of the provider call in progress (called by providers)."""
+    _call_tokens.set(tokens)
+
+
+class _Entry:
+    __slots__ = ("calls", "errors", "fallbacks", "tokens", "latencies")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.fallbacks = 0
+        self.tokens = 0
+        self.latencies: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+
+
+class TaskStats:
+    """Process-wide call statistics per task class and model."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, str], _Entry] = {}
+
+    def record(self, task: str, model: str, *, latency: float, tokens: int, error: bool, fallback: bool) -> None:
+        with self._lock:
+            entry = self._entries.setdefault((task, model), _Entry())
+            entry.calls += 1
+            entry.errors += int(error)
+            entry.fallbacks += int(fallback)
+            entry.tokens += max(0, tokens)
+            entry.latencies.append(latency)
+
+    def snapshot(self) -> dict[str, dict[str, dict[str, Any]]]:
+        """``{task: {model: {calls, errors, error_rate, fallbacks, tokens, avg_latency_ms, p95_latency_ms}}}``.
+
+        ``fallbacks`` counts calls that ran on this model because the routed
+        model failed.
+        """
+        with self._lock:
+            result: dict[str, dict[str, dict[str, Any]]] = {}
+            for (task, model), entry in sorted(self._entries.items()):
+                latencies = sorted(entry.latencies)
+                p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+                result.setdefault(task, {})[model] = {
+                    "calls": entry.calls,
+                    "errors": entry.errors,
+                    "error_rate": round(entry.errors / entry.calls, 3) if entry.calls else 0.0,
+                    "fallbacks": entry.fallbacks,
+                    "tokens": entry.tokens,
+                    "avg_latency_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+                    "p95_latency_ms": round(p95 * 1000, 1),
+                }
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+task_stats = TaskStats()
+
+
+def routed_config(config: AIConfig, task: str) -> AIConfig | None:
+    """The ``AIConfig`` for *task*'s routed model, or None when *task* runs on the main model."""
+    route = config.task_models.get(task)
+    if route is None:
+        return None
+    overrides: dict[str, Any] = {"model": route.model, "task_models": {}}
+    if route.base_url:
+        overrides["base_url"] = route.base_url
+        overrides["endpoints"] = []  # ai.endpoints mirror the main base_url, not the routed one
+    if route.provider:
+        overrides["provider"] = route.provider
+    if route.api_key:
+        overrides["api_key"] = route.api_key
+        overrides["api_key_command"] = ""
+    return dataclasses.replace(config, **overrides)
+
+
+def _routed_service(service: Any, task: str) -> Any | None:
+    """Service for *task*'s route, built once per main service and cached on it."""
+    cache: dict[str, Any] = service.__dict__.setdefault("_task_services", {})
+    if task in cache:
+        return cache[task]
+    cfg = routed_config(service.config, task)
+    routed = None
+    if cfg is not None:
+        from .ai_service import create_ai_service
+
+        try:
+            routed = create_ai_service(cfg)
+        except Exception as e:
+            # Egress allowlist or a missing provider SDK: run this task on the main model
+            logger.warning("Cannot use model %s for %s calls, using the main model: %s", cfg.model, task, e)
+    cache[task] = routed
+    return routed
+
+
+async def _attempt(
+    task: str,
+    service: Any,
+    call: Callable[[Any], Awaitable[T]],
+    failed: Callable[[T], bool],
+    *,
+    fallback: bool = False,
+) -> tuple[T, bool]:
+    token = _call_tokens.set(0)
+    start = time.monotonic()
+    ok = False
+    try:
+        result = await call(service)
+        ok = not failed(result)
+        return result, ok
+    finally:
+        task_stats.record(
+            task,
+            service.config.model,
+            latency=time.monotonic() - start,
+            tokens=_call_tokens.get(),
+            error=not ok,
+            fallback=fallback,
+        )
+        _call_tokens.reset(token)
+
+
+async def run(
+    service: Any,
+    task: str,
+    call: Callable[[Any], Awaitable[T]],
+    *,
+    failed: Callable[[T], bool],
+) -> T:
+    """Run ``call(svc)`` on the service for *task*, falling back to *service* on failure.
+
+    *call* receives the service to use; *failed* tells whether its result
+    means the call failed (providers return a sentinel rather than raising).
+    """
+    if task not in TASK_CLASSES:
+        task = TASK_MAIN
+    routed = _routed_service(service, task) if task != TASK_MAIN else None
+    if routed is None:
+        result, _ = await _attempt(task, service, call, failed)
+        return result
+
+    try:
+        result, ok = await _attempt(task, routed, call, failed)
+    except Exception:
+        if not service.config.task_models[task].fallback:
+            raise
+        ok = False
+    if ok or not service.config.task_models[task].fallback:
+        return result
+    logger.info("%s call on %s failed, falling back to %s", task, routed.config.model, service.config.model)
+    result, _ = await _attempt(task, service, call, failed, fallback=True)
+    return result
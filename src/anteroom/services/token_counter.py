@@ -0,0 +1,183 @@
+"""Model-aware, memoised token counting for conversation history.
+
+Context-window checks (CLI gauge, auto-compaction, agent loop) used to
+re-encode the whole history on every call.  ``TokenCounter`` counts each
+distinct message content once and remembers the result by a hash of that
+content, so repeated totals over a growing history only encode the new
+messages, edited messages are recounted, and no message objects are kept
+alive by the cache.
+
+The tokenizer follows the configured model: OpenAI models use the encoding
+tiktoken maps them to; other models (Claude, local models) use
+``cl100k_base`` as the closest public approximation.  When tiktoken or its
+encoding files are unavailable, counts fall back to ``len(text) // 4``.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = "cl100k_base"
+FALLBACK_ENCODING = "chars/4"
+
+# Per-message overhead (~4 tokens for role/separators)
+MESSAGE_OVERHEAD = 4
+
+_MAX_CACHED_MESSAGES = 20_000
+
+_O200K_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4", "chatgpt-4o")
+
+_encodings: dict[str, Any] = {}
+_counters: dict[str, TokenCounter] = {}
+_lock = threading.Lock()
+
+
+def encoding_name_for(model: str | None, provider: str | None = None) -> str:
+    """Pick the tiktoken encoding name for *model* (and optionally *provider*)."""
+    name = model.strip().lower() if isinstance(model, str) else ""
+    if provider == "anthropic" or name.startswith("claude") or not name:
+        return DEFAULT_ENCODING
+    # Strip LiteLLM-style "provider/model" prefixes
+    base = name.rsplit("/", 1)[-1]
+    try:
+        from tiktoken.model import encoding_name_for_model
+
+        return encoding_name_for_model(base)
+    except Exception:
+        pass
+    if base.startswith(_O200K_PREFIXES):
+        return "o200k_base"
+    return DEFAULT_ENCODING
+
+
+def _get_encoding(name: str) -> Any:
+    """Load a tiktoken encoding once; returns False when unavailable."""
+    with _lock:
+        if name in _encodings:
+            return _encodings[name]
+    try:
+        import tiktoken
+
+        enc: Any = tiktoken.get_encoding(name)
+    except Exception:
+        logger.debug("tiktoken encoding %s unavailable; using chars/4 estimate", name, exc_info=True)
+        enc = False
+    with _lock:
+        _encodings.setdefault(name, enc)
+        return _encodings[name]
+
+
+def _fingerprint(msg: dict[str, Any]) -> tuple[Any, ...]:
+    """Hash of a message's countable fields (str hashes are cached by CPython)."""
+    content = msg.get("content", "")
+    if isinstance(content, str):
+        content_key: Any = (len(content), hash(content))
+    elif isinstance(content, list):
+        content_key = ("list", tuple(hash(str(part)) if isinstance(part, dict) else None for part in content))
+    else:
+        content_key = None
+    calls: list[tuple[Any, ...]] = []
+    for tc in msg.get("tool_calls", None) or []:
+        if isinstance(tc, dict):
+            func = tc.get("function", {})
+            calls.append((func.get("name", ""), hash(str(func.get("arguments", "")))))
+    return (content_key, tuple(calls))
+
+
+class TokenCounter:
+    """Counts tokens for one encoding, memoising per-message results.
+
+    Results are keyed by a fingerprint of the message's content and tool
+    calls, so in-place edits (e.g. truncated tool output) are recounted and
+    identical messages in different histories share one entry.
+    """
+
+    def __init__(self, encoding_name: str = DEFAULT_ENCODING, *, max_cached: int = _MAX_CACHED_MESSAGES) -> None:
+        self._encoding_name = encoding_name
+        self._max_cached = max(1, max_cached)
+        self._cache: OrderedDict[tuple[Any, ...], int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def encoding_name(self) -> str:
+        """Name recorded alongside persisted counts (``chars/4`` when tiktoken is unavailable)."""
+        return self._encoding_name if _get_encoding(self._encoding_name) else FALLBACK_ENCODING
+
+    def count_text(self, text: str) -> int:
+        enc = _get_encoding(self._encoding_name)
+        if enc:
+            return len(enc.encode(text, allowed_special="all"))
+        return len(text) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of *text* that fits in *max_tokens*."""
+        if max_tokens <= 0:
+            return ""
+        enc = _get_encoding(self._encoding_name)
+        if not enc:
+            return text[: max_tokens * 4]
+        tokens = enc.encode(text, allowed_special="all")
+        if len(tokens) <= max_tokens:
+            return text
+        return str(enc.decode(tokens[:max_tokens]))
+
+    def _count_uncached(self, msg: dict[str, Any]) -> int:
+        total = MESSAGE_OVERHEAD
+        content = msg.get("content", "")
+        if isinstance(content, str):
+            total += self.count_text(content)
+        elif isinstance(content, list):
+            for part in content:
+                total += self.count_text(str(part) if isinstance(part, dict) else "")
+        for tc in msg.get("tool_calls", None) or []:
+            if isinstance(tc, dict):
+                func = tc.get("function", {})
+                total += self.count_text(func.get("arguments", "")) + self.count_text(func.get("name", ""))
+        return total
+
+    def count_message(self, msg: dict[str, Any]) -> int:
+        """Tokens for one chat message, computed once per distinct content."""
+        fp = _fingerprint(msg)
+        with self._lock:
+            cached = self._cache.get(fp)
+            if cached is not None:
+                self._cache.move_to_end(fp)
+                self.hits += 1
+                return cached
+        count = self._count_uncached(msg)
+        self._store(fp, count)
+        self.misses += 1
+        return count
+
+    def seed(self, msg: dict[str, Any], count: int) -> None:
+        """Record a count computed elsewhere (e.g. persisted with the message)."""
+        self._store(_fingerprint(msg), count)
+
+    def _store(self, fp: tuple[Any, ...], count: int) -> None:
+        with self._lock:
+            self._cache[fp] = count
+            self._cache.move_to_end(fp)
+            while len(self._cache) > self._max_cached:
+                self._cache.popitem(last=False)
+
+    def count_messages(self, messages: list[dict[str, Any]]) -> int:
+        """Total tokens for a history; only new or changed messages are encoded."""
+        return sum(self.count_message(m) for m in messages)
+
+
+def get_token_counter(model: str | None = None, provider: str | None = None) -> TokenCounter:
+    """Shared ``TokenCounter`` for the encoding *model* uses."""
+    name = encoding_name_for(model, provider)
+    with _lock:
+        counter = _counters.get(name)
+        if counter is None:
+            counter = TokenCounter(name)
+            _counters[name] = counter
+        return counter
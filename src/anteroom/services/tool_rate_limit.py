@@ -5,10 +5,16 @@ from __future__ import annotations
 import logging
 import time
 from collections import deque
+from contextvars import ContextVar
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
+# Calls recorded by a speculative tool run, refunded if the speculation is discarded
+speculative_calls: ContextVar[list[tuple[ToolRateLimiter, float]] | None] = ContextVar(
+    "speculative_calls", default=None
+)
+
 
 @dataclass
 class ToolRateLimitConfig:
@@ -100,13 +106,25 @@ class ToolRateLimiter:
     def record_call(self, *, success: bool = True) -> None:
         """Record a tool call after execution."""
         self._total_calls += 1
-        self._call_timestamps.append(time.monotonic())
+        now = time.monotonic()
+        self._call_timestamps.append(now)
+        ledger = speculative_calls.get()
+        if ledger is not None:
+            ledger.append((self, now))
 
         if success:
             self._consecutive_failures = 0
         else:
             self._consecutive_failures += 1
 
+    def refund_call(self, recorded_at: float) -> None:
+        """Take back a call recorded at *recorded_at* whose result was thrown away."""
+        self._total_calls = max(0, self._total_calls - 1)
+        try:
+            self._call_timestamps.remove(recorded_at)
+        except ValueError:
+            pass  # already outside the per-minute window
+
     def reset(self) -> None:
         """Reset all counters for a new conversation."""
         self._call_timestamps.clear()
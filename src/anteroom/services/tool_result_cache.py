@@ -0,0 +1,258 @@
+"""Per-conversation cache for the results of deterministic read-only tools.
+
+In agentic sessions the model keeps re-reading the same files and re-running
+the same ``grep``/``glob_files`` queries.  Every repeat hits the filesystem
+again and puts the full result into the context again.  ``ToolResultCache``
+remembers the last successful result of each ``read_file``/``grep``/
+``glob_files`` call, keyed by its normalized arguments, together with a
+fingerprint of what it read: the (mtime, size) of the file, or of every file
+under the searched directory.  Directory fingerprints skip into the project
+tree's excluded directories (``codebase_index.exclude_dirs``: ``.git``,
+``node_modules``, virtualenvs) and only record their own (mtime, size).
+The fingerprint is taken once per call, before the tool runs.
+
+A repeated call is answered with a short "unchanged since call X" result
+when the fingerprint still matches *and* the earlier result is still in the
+conversation (compaction or truncation may have removed it).  Entries are
+dropped when ``write_file``/``edit_file`` touch their paths and all of them
+when ``bash`` (or any other tool that can change files) runs.
+
+A hit does not go through the tool executor: the stub only points at a
+result the model already has, so nothing new is read or disclosed.  Hits
+are logged and reported to *on_hit* (the CLI writes them to the audit log;
+the web UI audits every tool result it streams).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from collections.abc import Callable, Collection
+from dataclasses import dataclass
+from typing import Any
+
+from ..config import DEFAULT_EXCLUDE_DIRS
+from ..tools.tiers import DEFAULT_TOOL_TIERS, ToolTier, get_tool_tier
+from .tool_scheduler import _paths_overlap
+
+logger = logging.getLogger(__name__)
+
+CACHEABLE_TOOLS = frozenset({"read_file", "grep", "glob_files"})
+_FILE_WRITE_TOOLS = frozenset({"write_file", "edit_file"})
+_TREE_TOOLS = frozenset({"grep", "glob_files"})
+
+# Argument values equivalent to leaving the argument out
+_DEFAULT_ARGS: dict[str, dict[str, Any]] = {
+    "read_file": {"offset": 1},
+    "grep": {"context": 0, "case_insensitive": False},
+}
+
+_MAX_ENTRIES = 256
+_MAX_TREE_FILES = 20_000  # fingerprinting bigger trees costs more than it saves
+
+
+@dataclass
+class _Entry:
+    call_id: str
+    path: str
+    fingerprint: str
+    result: Any
+    tokens: int | None = None
+
+
+class ToolResultCache:
+    """Remembers read-only tool results for one conversation.
+
+    *working_dir* resolves relative paths the way the tools do; *tier_overrides*
+    (``safety.tool_tiers``) decides which other tools are read-only and so
+    leave the cache alone; *exclude_dirs* are not walked when fingerprinting
+    a directory; *on_hit* is called with (tool name, arguments, stub) for
+    every hit.
+    """
+
+    def __init__(
+        self,
+        *,
+        working_dir: str | None = None,
+        tier_overrides: dict[str, str] | None = None,
+        max_entries: int = _MAX_ENTRIES,
+        exclude_dirs: Collection[str] = DEFAULT_EXCLUDE_DIRS,
+        on_hit: Callable[[str, dict[str, Any], dict[str, Any]], None] | None = None,
+    ) -> None:
+        self._working_dir = working_dir or os.getcwd()
+        self._tier_overrides = tier_overrides
+        self._max_entries = max(1, max_entries)
+        self._exclude_dirs = frozenset(exclude_dirs)
+        self._on_hit = on_hit
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        # Fingerprints taken by lookup() for calls that then ran, by cache key
+        self._pending: dict[str, str | None] = {}
+        self.lookups = 0
+        self.hits = 0
+        self.tokens_saved = 0
+
+    @property
+    def working_dir(self) -> str:
+        return self._working_dir
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hit_rate, 3),
+            "tokens_saved": self.tokens_saved,
+            "entries": len(self._entries),
+        }
+
+    # --- keys and fingerprints ---
+
+    def _normalize(self, path: str) -> str:
+        path = os.path.expanduser(path)
+        if not os.path.isabs(path):
+            path = os.path.join(self._working_dir, path)
+        return os.path.normpath(path)
+
+    def _key(self, tool_name: str, arguments: dict[str, Any]) -> tuple[str, str]:
+        """Return (cache key, absolute path the call reads)."""
+        defaults = _DEFAULT_ARGS.get(tool_name, {})
+        args = {
+            k: v
+            for k, v in arguments.items()
+            if v is not None and not k.startswith("_") and k != "path" and defaults.get(k, object()) != v
+        }
+        raw_path = arguments.get("path")
+        path = self._normalize(raw_path if isinstance(raw_path, str) and raw_path else self._working_dir)
+        key = json.dumps([tool_name, path, args], sort_keys=True, default=str)
+        return key, path
+
+    def _excluded(self, dirname: str) -> bool:
+        return dirname in self._exclude_dirs or any(dirname.endswith(exc) for exc in self._exclude_dirs)
+
+    def _fingerprint(self, tool_name: str, path: str) -> str | None:
+        """Hash of the mtimes/sizes the call depends on, or None if uncacheable."""
+        digest = hashlib.blake2b(digest_size=16)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        digest.update(f"{st.st_mtime_ns}:{st.st_size}".encode())
+        if tool_name not in _TREE_TOOLS or not os.path.isdir(path):
+            return digest.hexdigest()
+        count = 0
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files) + dirs:
+                try:
+                    st = os.stat(os.path.join(root, name), follow_symlinks=False)
+                except OSError:
+                    continue
+                digest.update(f"{root}/{name}:{st.st_mtime_ns}:{st.st_size}\n".encode())
+                count += 1
+            dirs[:] = [d for d in dirs if not self._excluded(d)]
+            if count > _MAX_TREE_FILES:
+                return None
+        return digest.hexdigest()
+
+    # --- lookup / record ---
+
+    def lookup(
+        self,
+        tool_name: str,
+        arguments: dict[str, Any],
+        visible_call_ids: Collection[str],
+    ) -> dict[str, Any] | None:
+        """Return a compact "unchanged" result for a repeated call, or None to run the tool.
+
+        *visible_call_ids* are the tool call ids whose results are still in
+        the conversation; a hit needs the earlier result to be among them.
+        """
+        if tool_name not in CACHEABLE_TOOLS or not isinstance(arguments, dict):
+            return None
+        self.lookups += 1
+        key, path = self._key(tool_name, arguments)
+        fingerprint = self._fingerprint(tool_name, path)
+        entry = self._entries.get(key)
+        if entry is None or entry.call_id not in visible_call_ids or fingerprint != entry.fingerprint:
+            if entry is not None and fingerprint != entry.fingerprint:
+                del self._entries[key]
+            # record() stores the result under the state the tool is about to read
+            self._pending[key] = fingerprint
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        stub = {
+            "unchanged_since": entry.call_id,
+            "content": (
+                f"Result unchanged since tool call {entry.call_id}: the {tool_name} result returned there "
+                "(earlier in this conversation) is still current."
+            ),
+        }
+        if entry.tokens is None:
+            entry.tokens = _count_tokens(entry.result)
+        self.tokens_saved += max(0, entry.tokens - _count_tokens(stub))
+        logger.info("Tool result cache hit: %s %s (unchanged since call %s)", tool_name, path, entry.call_id)
+        if self._on_hit is not None:
+            try:
+                self._on_hit(tool_name, arguments, stub)
+            except Exception:
+                logger.debug("Tool result cache hit callback failed", exc_info=True)
+        return stub
+
+    def record(self, tool_name: str, arguments: dict[str, Any], call_id: str, result: Any, status: str) -> None:
+        """Store a fresh result, or invalidate what a call may have changed."""
+        if not isinstance(arguments, dict):
+            arguments = {}
+        if tool_name in CACHEABLE_TOOLS:
+            key, path = self._key(tool_name, arguments)
+            pending = self._pending.pop(key, "")
+            if status != "success" or not isinstance(result, dict) or "error" in result:
+                return
+            if "unchanged_since" in result:
+                return
+            fingerprint = pending if pending != "" else self._fingerprint(tool_name, path)
+            if fingerprint is None:
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = _Entry(call_id=call_id, path=path, fingerprint=fingerprint, result=result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+            return
+        if tool_name in _FILE_WRITE_TOOLS:
+            raw_path = arguments.get("path")
+            if isinstance(raw_path, str) and raw_path:
+                self.invalidate_path(self._normalize(raw_path))
+                return
+            self.clear()
+            return
+        if tool_name in DEFAULT_TOOL_TIERS and get_tool_tier(tool_name, self._tier_overrides) == ToolTier.READ:
+            return
+        # bash, MCP and anything else that may write files: nothing is safe to reuse
+        self.clear()
+
+    def invalidate_path(self, path: str) -> None:
+        """Drop entries for *path* and for directory searches that contain it."""
+        stale = [key for key, entry in self._entries.items() if _paths_overlap(entry.path, path)]
+        for key in stale:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._pending.clear()
+
+
+def _count_tokens(result: Any) -> int:
+    from .token_counter import get_token_counter
+
+    visible = {k: v for k, v in result.items() if not k.startswith("_")} if isinstance(result, dict) else result
+    return get_token_counter().count_text(json.dumps(visible, default=str))
@@ -0,0 +1,293 @@
+"""Dependency-aware scheduling for the tool calls of one assistant turn.
+
+The agent loop used to start every tool call of a turn at once.  Two edits
+to the same file could then race, and a burst of ``bash`` or MCP calls could
+swamp the machine or an MCP server.  ``ToolScheduler`` infers the resources
+each call touches from its arguments:
+
+- file tools (anything with a ``path`` argument) read or write that path,
+  depending on the tool's tier; ``grep``/``glob_files`` read a directory tree
+- canvas tools write the conversation's canvas, ``ask_user`` holds the user
+- ``bash`` and MCP tools are limited by concurrency caps instead (their
+  effects cannot be inferred from the arguments)
+
+A call waits for every *earlier* call in the same turn that it conflicts
+with (write/write or read/write on overlapping paths), so conflicting calls
+keep the order the model gave them, while independent calls - including any
+number of reads of the same file - still run in parallel.
+
+Concurrency caps are applied by the executor wrapper from
+``ToolScheduler.limit``, so waiting for a permit counts against the tool's
+timeout and ends on cancel.  Per-tool and per-MCP-server caps are shared by
+every run that uses the same scheduler; the global ``max_parallel`` cap is
+per wrapper, i.e. per agent run.  ``run_agent`` and ``ask_user`` are not
+capped (they wait on nested runs or on the user, and a nested run needs
+permits of its own), and a call waiting for approval gives its permits back
+for the wait (``released_permits``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+from ..tools.tiers import DEFAULT_TOOL_TIERS, ToolTier, get_tool_tier
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+READ = "read"
+WRITE = "write"
+
+_TREE_TOOLS = frozenset({"grep", "glob_files"})
+_CANVAS_TOOLS = frozenset({"create_canvas", "update_canvas", "patch_canvas"})
+# Tools that wait on nested runs or the user rather than use the machine
+UNCAPPED_TOOLS = frozenset({"run_agent", "ask_user"})
+
+# Permits held by the running tool call (tasks it creates share the list)
+_held_permits: ContextVar[list[asyncio.Semaphore] | None] = ContextVar("tool_permits", default=None)
+
+
+@contextlib.asynccontextmanager
+async def released_permits() -> AsyncIterator[None]:
+    """Give back the current tool call's concurrency permits for the duration of a wait.
+
+    Used around approval prompts, so a call waiting on a user does not block
+    other users' calls to the same tool.  The permits are re-acquired before
+    the call continues.
+    """
+    held = _held_permits.get()
+    if not held:
+        yield
+        return
+    permits = list(held)
+    held.clear()
+    for sem in reversed(permits):
+        sem.release()
+    try:
+        yield
+    finally:
+        for sem in permits:
+            await sem.acquire()
+            held.append(sem)
+
+
+@dataclass(frozen=True)
+class ResourceClaim:
+    """One resource a tool call touches.  ``key`` is ``path:<abs path>`` or a named resource."""
+
+    key: str
+    mode: str = WRITE
+
+    @property
+    def path(self) -> str | None:
+        return self.key[5:] if self.key.startswith("path:") else None
+
+
+def _paths_overlap(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    return b.startswith(a.rstrip(os.sep) + os.sep) or a.startswith(b.rstrip(os.sep) + os.sep)
+
+
+def claims_conflict(a: ResourceClaim, b: ResourceClaim) -> bool:
+    """Two claims conflict when they overlap and at least one of them writes."""
+    if a.mode == READ and b.mode == READ:
+        return False
+    pa, pb = a.path, b.path
+    if pa is not None and pb is not None:
+        return _paths_overlap(pa, pb)
+    return a.key == b.key
+
+
+class ToolScheduler:
+    """Orders conflicting tool calls and caps concurrency per tool and per MCP server.
+
+    *tool_limits* maps tool names to their maximum number of concurrent
+    calls; *mcp_server_limit* caps calls per MCP server and *max_parallel*
+    caps the calls of one agent run (0 disables a cap).  *resolve_server*
+    maps an MCP tool name to its server, or None for built-in tools.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_parallel: int = 0,
+        tool_limits: dict[str, int] | None = None,
+        mcp_server_limit: int = 0,
+        resolve_server: Callable[[str], str | None] | None = None,
+        working_dir: str | None = None,
+        tier_overrides: dict[str, str] | None = None,
+    ) -> None:
+        self._max_parallel = max(0, max_parallel)
+        self._tool_limits = {k: v for k, v in (tool_limits or {}).items() if v > 0}
+        for name in UNCAPPED_TOOLS.intersection(self._tool_limits):
+            logger.warning("tool_concurrency.tool_limits: %s is never capped; ignoring its limit", name)
+            del self._tool_limits[name]
+        self._mcp_server_limit = max(0, mcp_server_limit)
+        self._resolve_server = resolve_server
+        self._working_dir = working_dir
+        self._tier_overrides = tier_overrides
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self.waits = 0
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Any,
+        *,
+        resolve_server: Callable[[str], str | None] | None = None,
+        working_dir: str | None = None,
+    ) -> ToolScheduler:
+        """Build a scheduler from an ``AppConfig`` (``cli.tool_concurrency``)."""
+        cc = getattr(getattr(config, "cli", None), "tool_concurrency", None)
+        limits: dict[str, int] = {}
+        bash = getattr(cc, "bash", None)
+        if isinstance(bash, int):
+            limits["bash"] = bash
+        extra = getattr(cc, "tool_limits", None)
+        if isinstance(extra, dict):
+            limits.update({k: v for k, v in extra.items() if isinstance(v, int)})
+        max_parallel = getattr(cc, "max_parallel", None)
+        server_limit = getattr(cc, "mcp_per_server", None)
+        tiers = getattr(getattr(config, "safety", None), "tool_tiers", None)
+        return cls(
+            max_parallel=max_parallel if isinstance(max_parallel, int) else 0,
+            tool_limits=limits,
+            mcp_server_limit=server_limit if isinstance(server_limit, int) else 0,
+            resolve_server=resolve_server,
+            working_dir=working_dir,
+            tier_overrides=tiers if isinstance(tiers, dict) else None,
+        )
+
+    def _normalize(self, path: str) -> str:
+        path = os.path.expanduser(path)
+        if not os.path.isabs(path) and self._working_dir:
+            path = os.path.join(self._working_dir, path)
+        return os.path.normcase(os.path.normpath(path))
+
+    def _server_for(self, tool_name: str) -> str | None:
+        if tool_name in DEFAULT_TOOL_TIERS or self._resolve_server is None:
+            return None
+        try:
+            server = self._resolve_server(tool_name)
+        except Exception:
+            return None
+        return server if server and server != "unknown" else None
+
+    def resources(self, tool_name: str, arguments: dict[str, Any]) -> list[ResourceClaim]:
+        """Resources a call to *tool_name* with *arguments* reads or writes."""
+        if tool_name in _CANVAS_TOOLS:
+            return [ResourceClaim("canvas", WRITE)]
+        if tool_name == "ask_user":
+            return [ResourceClaim("user", WRITE)]
+        path = arguments.get("path") if isinstance(arguments, dict) else None
+        if tool_name in _TREE_TOOLS:
+            root = path if isinstance(path, str) and path else (self._working_dir or ".")
+            return [ResourceClaim("path:" + self._normalize(root), READ)]
+        if isinstance(path, str) and path and tool_name in DEFAULT_TOOL_TIERS:
+            tier = get_tool_tier(tool_name, self._tier_overrides)
+            return [ResourceClaim("path:" + self._normalize(path), READ if tier == ToolTier.READ else WRITE)]
+        return []
+
+    def _caps(self, tool_name: str) -> list[tuple[str, int]]:
+        """Shared caps for *tool_name* (the per-run ``max_parallel`` cap is in ``limit``)."""
+        caps: list[tuple[str, int]] = []
+        if tool_name in UNCAPPED_TOOLS:
+            return caps
+        if tool_name in self._tool_limits:
+            caps.append((f"tool:{tool_name}", self._tool_limits[tool_name]))
+        if self._mcp_server_limit:
+            server = self._server_for(tool_name)
+            if server is not None:
+                caps.append((f"mcp:{server}", self._mcp_server_limit))
+        return caps
+
+    def _semaphore(self, name: str, limit: int) -> asyncio.Semaphore:
+        sem = self._semaphores.get(name)
+        if sem is None:
+            sem = asyncio.Semaphore(limit)
+            self._semaphores[name] = sem
+        return sem
+
+    def limit(
+        self, executor: Callable[[str, dict[str, Any]], Awaitable[T]]
+    ) -> Callable[[str, dict[str, Any]], Awaitable[T]]:
+        """Wrap a tool executor ``(name, arguments)`` so each call holds its concurrency permits.
+
+        Each wrapper has its own ``max_parallel`` cap; the per-tool and
+        per-server caps are shared with every other wrapper of this scheduler.
+        """
+        run_slots = asyncio.Semaphore(self._max_parallel) if self._max_parallel else None
+
+        async def _limited(tool_name: str, arguments: dict[str, Any]) -> T:
+            # Fixed acquisition order (run, tool, server) so caps cannot deadlock
+            permits: list[asyncio.Semaphore] = []
+            if run_slots is not None and tool_name not in UNCAPPED_TOOLS:
+                permits.append(run_slots)
+            permits.extend(self._semaphore(name, cap) for name, cap in self._caps(tool_name))
+            held: list[asyncio.Semaphore] = []
+            token = _held_permits.set(held)
+            try:
+                for sem in permits:
+                    await sem.acquire()
+                    held.append(sem)
+                return await executor(tool_name, arguments)
+            finally:
+                for sem in reversed(held):
+                    sem.release()
+                _held_permits.reset(token)
+
+        return _limited
+
+    def dependencies(self, calls: list[dict[str, Any]]) -> list[list[int]]:
+        """For each call, the indexes of earlier calls it must wait for."""
+        claims = [self.resources(tc.get("function_name", ""), tc.get("arguments", {})) for tc in calls]
+        deps: list[list[int]] = []
+        for i, mine in enumerate(claims):
+            deps.append(
+                [j for j in range(i) if any(claims_conflict(a, b) for a in mine for b in claims[j])],
+            )
+        return deps
+
+    async def _run(
+        self,
+        tc: dict[str, Any],
+        wait_for: list[asyncio.Task[Any]],
+        start: Callable[[dict[str, Any]], Awaitable[T]],
+    ) -> T:
+        if wait_for:
+            self.waits += 1
+            await asyncio.wait(wait_for)
+        return await start(tc)
+
+    def schedule(
+        self,
+        calls: list[dict[str, Any]],
+        start: Callable[[dict[str, Any]], Awaitable[T]],
+        started: dict[int, asyncio.Task[T]] | None = None,
+    ) -> list[asyncio.Task[T]]:
+        """Create one task per call, in order, honouring conflicts.
+
+        *started* maps call indexes to tasks that are already running (e.g.
+        speculative reads); they are reused as-is and later conflicting calls
+        wait for them.
+        """
+        started = started or {}
+        deps = self.dependencies(calls)
+        tasks: list[asyncio.Task[T]] = []
+        for i, tc in enumerate(calls):
+            task = started.get(i)
+            if task is None:
+                task = asyncio.create_task(self._run(tc, [tasks[j] for j in deps[i]], start))
+            tasks.append(task)
+        if any(deps):
+            logger.debug("Tool scheduler: %d of %d calls wait on earlier calls", sum(1 for d in deps if d), len(calls))
+        return tasks
@@ -0,0 +1,201 @@
+"""Per-run tool subset selection for large tool catalogs.
+
+Built-in tools, office tools, canvas and a few MCP servers add up to
+hundreds of tool schemas, and every model call used to send all of them.
+With ``ai.tool_selection`` on, each agent run sends a subset instead:
+
+- the pinned core tools (``ai.tool_selection_pinned``) are always sent;
+- the rest are ranked by embedding similarity between the latest user
+  messages and each tool's name, description and parameters, plus a bonus
+  for tools called recently in the conversation, and the best
+  ``ai.tool_selection_top_n`` are sent;
+- a ``load_all_tools`` meta-tool is added, so the model can ask for the
+  full catalog when nothing it was sent fits; every tool is then sent for
+  the rest of the run.
+
+The subset is chosen once per run, so the tool prefix stays the same (and
+cacheable) across the run's iterations, and it keeps the catalog's order.
+Tool texts are derived from their schemas and embedded once per process
+(cached by content hash); without an embedding service, or when embedding
+fails, tools are ranked by term overlap.  Catalogs that would not shrink
+are sent unchanged.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+from typing import Any
+
+from .history_selection import embedding_similarities
+
+logger = logging.getLogger(__name__)
+
+LOAD_ALL_TOOLS = "load_all_tools"
+
+# Score bonus for a tool called among the conversation's recent tool calls
+_USAGE_BONUS = 0.3
+# Tool calls, newest first, that count as recent usage
+_USAGE_WINDOW = 20
+# Newest user messages that make up the query
+_QUERY_TURNS = 2
+# Characters of a tool's text sent to the embedding model
+_MAX_EMBED_CHARS = 2000
+
+_TERM_RE = re.compile(r"[A-Za-z][A-Za-z0-9]{2,}")
+_STOPWORDS = frozenset(
+    "the and for with this that from into are was you your can not all any its use using when what which".split()
+)
+
+
+def _tool_name(tool: dict[str, Any]) -> str:
+    return str(tool.get("function", {}).get("name", ""))
+
+
+def tool_text(tool: dict[str, Any]) -> str:
+    """What a tool is ranked on: its name, description and parameter names/descriptions."""
+    func = tool.get("function", {})
+    name = str(func.get("name", ""))
+    parts = [f"{name.replace('_', ' ')}: {func.get('description', '')}"]
+    props = (func.get("parameters") or {}).get("properties") or {}
+    if isinstance(props, dict):
+        for pname, spec in props.items():
+            desc = spec.get("description", "") if isinstance(spec, dict) else ""
+            parts.append(f"{pname}: {desc}" if desc else str(pname))
+    return "\n".join(parts)[:_MAX_EMBED_CHARS]
+
+
+def _terms(text: str) -> set[str]:
+    return {t for t in (w.lower() for w in _TERM_RE.findall(text.replace("_", " "))) if t not in _STOPWORDS}
+
+
+def _query(messages: list[dict[str, Any]]) -> str:
+    texts: list[str] = []
+    for msg in reversed(messages):
+        if msg.get("role") != "user":
+            continue
+        content = msg.get("content")
+        if isinstance(content, list):
+            content = " ".join(str(p.get("text", "")) for p in content if isinstance(p, dict))
+        if isinstance(content, str) and content:
+            texts.append(content)
+        if len(texts) >= _QUERY_TURNS:
+            break
+    return "\n".join(reversed(texts))
+
+
+def _recent_tool_names(messages: list[dict[str, Any]]) -> set[str]:
+    names: set[str] = set()
+    seen = 0
+    for msg in reversed(messages):
+        for tc in reversed(msg.get("tool_calls", None) or []):
+            func = tc.get("function", {}) if isinstance(tc, dict) else {}
+            names.add(str(func.get("name", "")))
+            seen += 1
+            if seen >= _USAGE_WINDOW:
+                return names
+    return names
+
+
+def load_all_tools_definition(hidden: int) -> dict[str, Any]:
+    """Schema of the meta-tool that swaps the subset for the full catalog."""
+    return {
+        "type": "function",
+        "function": {
+            "name": LOAD_ALL_TOOLS,
+            "description": (
+                f"Only the tools most relevant to this request were loaded; {hidden} more are available. "
+                "Call this when none of the loaded tools can do what is needed. "
+                "All tools are available from your next step on."
+            ),
+            "parameters": {"type": "object", "properties": {}},
+        },
+    }
+
+
+class ToolSelector:
+    """Chooses the tools sent with each agent run; holds the full catalog for ``load_all_tools``."""
+
+    def __init__(
+        self,
+        *,
+        top_n: int = 24,
+        pinned: list[str] | tuple[str, ...] = (),
+        embedding_service: Any = None,
+    ) -> None:
+        self.top_n = max(1, top_n)
+        self.pinned = frozenset(pinned)
+        self._embedding_service = embedding_service
+        self.catalog: list[dict[str, Any]] | None = None
+        self.expanded = False
+        self.selections = 0
+        self.expansions = 0
+        self.last_sent = 0
+        self.last_hidden = 0
+        # (catalog, history, their lengths) of the last selection, and its result
+        self._last: tuple[list[dict[str, Any]], list[dict[str, Any]], int, int, list[dict[str, Any]]] | None = None
+
+    async def select(self, tools: list[dict[str, Any]], messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """The tools to send for a run over *messages*; *tools* itself when nothing would be left out.
+
+        Asking again for the same catalog and history returns the same subset
+        without ranking again (the web route selects before the agent loop does).
+        """
+        self.expanded = False
+        last = self._last
+        if last is not None and last[0] is tools and last[1] is messages and last[2:4] == (len(tools), len(messages)):
+            return last[4]
+        self.catalog = tools
+        subset = await self._select(tools, messages)
+        self._last = (tools, messages, len(tools), len(messages), subset)
+        return subset
+
+    async def _select(self, tools: list[dict[str, Any]], messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        candidates = [t for t in tools if _tool_name(t) not in self.pinned and _tool_name(t) != LOAD_ALL_TOOLS]
+        # Hiding a single tool behind the meta-tool saves nothing
+        if len(candidates) <= self.top_n + 1:
+            self.last_sent, self.last_hidden = len(tools), 0
+            return tools
+
+        scores = await self._score(candidates, _query(messages), _recent_tool_names(messages))
+        ranked = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)
+        chosen = {id(candidates[i]) for i in ranked[: self.top_n]}
+        subset = [t for t in tools if id(t) in chosen or _tool_name(t) in self.pinned]
+        hidden = len(tools) - len(subset)
+        subset.append(load_all_tools_definition(hidden))
+        self.selections += 1
+        self.last_sent, self.last_hidden = len(subset) - 1, hidden
+        logger.debug("Tool selection: sending %d of %d tools", len(subset) - 1, len(tools))
+        return subset
+
+    def expand(self) -> dict[str, Any]:
+        """Result of a ``load_all_tools`` call; the loop sends :attr:`catalog` from then on."""
+        self.expanded = True
+        self.expansions += 1
+        names = [_tool_name(t) for t in self.catalog or []]
+        return {"loaded": len(names), "tools": names}
+
+    async def _score(self, tools: list[dict[str, Any]], query: str, recent: set[str]) -> list[float]:
+        texts = [tool_text(t) for t in tools]
+        similarities = await embedding_similarities(self._embedding_service, query, texts, _MAX_EMBED_CHARS)
+        if similarities is None:
+            query_terms = _terms(query)
+            similarities = []
+            for text in texts:
+                tool_terms = _terms(text)
+                overlap = len(query_terms & tool_terms)
+                similarities.append(overlap / math.sqrt(len(query_terms) * len(tool_terms)) if overlap else 0.0)
+        return [s + (_USAGE_BONUS if _tool_name(t) in recent else 0.0) for t, s in zip(tools, similarities)]
+
+
+def selector_for(config: Any, embedding_service: Any = None) -> ToolSelector | None:
+    """A ``ToolSelector`` per ``ai.tool_selection*``, or None when selection is off."""
+    ai = config.ai
+    if ai.tool_selection is not True:
+        return None
+    return ToolSelector(
+        top_n=ai.tool_selection_top_n,
+        pinned=list(ai.tool_selection_pinned),
+        embedding_service=embedding_service,
+    )
@@ -170,6 +170,22 @@ class VectorIndex:
 
         return matches
 
+    def get_vectors(self, keys: list[str]) -> dict[str, list[float]]:
+        """Return the stored vectors for *keys*. Missing keys are omitted."""
+        import numpy as np
+
+        found: dict[str, list[float]] = {}
+        with self._lock:
+            for key in keys:
+                int_key = _string_key_to_int(key)
+                if int_key not in self._index:
+                    continue
+                vector = self._index.get(int_key)
+                if vector is None:
+                    continue
+                found[key] = [float(v) for v in np.asarray(vector, dtype=np.float32).reshape(-1)]
+        return found
+
     def contains(self, key: str) -> bool:
         """Check if a key exists in the index."""
         int_key = _string_key_to_int(key)
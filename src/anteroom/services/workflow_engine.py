@@ -338,6 +338,7 @@ class WorkflowEngine:
         event_bus: Any | None = None,
         egress_allowed_domains: list[str] | None = None,
         egress_block_localhost: bool = False,
+        subagent_scheduler: Any | None = None,
     ) -> None:
         self._db = db
         self._config = config
@@ -349,6 +350,7 @@ class WorkflowEngine:
         self._event_bus = event_bus
         self._egress_allowed_domains = egress_allowed_domains or []
         self._egress_block_localhost = egress_block_localhost
+        self._subagent_scheduler = subagent_scheduler
         self._pending_hook_tasks: list[Any] = []
         self._progress_callback: Any | None = None  # Callable[[str, str, dict], None]
 
@@ -867,6 +869,7 @@ class WorkflowEngine:
         inputs: dict[str, Any],
         step_results: dict[str, dict[str, Any]],
     ) -> RunnerResult:
+        from .subagent_scheduler import PRIORITY_BACKGROUND
         from .workflow_runners import execute_agent_runner, execute_opaque_runner
 
         if not step_def.runner:
@@ -895,6 +898,12 @@ class WorkflowEngine:
                 ai_service=self._ai_service,
                 tool_executor=self._tool_executor,
                 tools_openai=self._tools_openai,
+                # Agent steps queue behind interactive work for the process's sub-agent slots
+                schedule=(
+                    self._subagent_scheduler.scope(conversation_id=run["id"], priority=PRIORITY_BACKGROUND)
+                    if self._subagent_scheduler is not None
+                    else None
+                ),
             )
         else:
             if step_def.runner == "shell":
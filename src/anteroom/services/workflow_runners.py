@@ -13,7 +13,10 @@ import logging
 import sys
 import time
 from dataclasses import dataclass, field
-from typing import Any
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .subagent_scheduler import SubagentScope
 
 logger = logging.getLogger(__name__)
 
@@ -98,6 +101,7 @@ async def execute_agent_runner(
     tool_executor: Any | None = None,
     tools_openai: list[dict[str, Any]] | None = None,
     pause_signal: Any | None = None,
+    schedule: SubagentScope | None = None,
 ) -> RunnerResult:
     """Execute an agent runner step through Anteroom's agent loop.
 
@@ -105,6 +109,10 @@ async def execute_agent_runner(
     Uses serialize_tools=True so the pause signal can be checked between
     tool calls. The agent runner is one runner category among equals — shell
     and python_script runners are equally first-class.
+
+    With *schedule*, the step waits for a slot in the sub-agent scheduler
+    first (workflow steps are background work) and its tokens are charged
+    to the scope's conversation.
     """
     start = time.monotonic()
 
@@ -114,6 +122,40 @@ async def execute_agent_runner(
             "Configure the WorkflowEngine with AI service dependencies."
         )
 
+    from .subagent_scheduler import SubagentAdmissionError
+
+    if schedule is not None:
+        try:
+            await schedule.acquire()
+        except SubagentAdmissionError as e:
+            return RunnerResult(status="failed", summary=str(e), duration_ms=int((time.monotonic() - start) * 1000))
+    try:
+        return await _run_agent_step(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            ai_service=ai_service,
+            tool_executor=tool_executor,
+            tools_openai=tools_openai,
+            pause_signal=pause_signal,
+            schedule=schedule,
+            start=start,
+        )
+    finally:
+        if schedule is not None:
+            schedule.release()
+
+
+async def _run_agent_step(
+    *,
+    prompt: str,
+    system_prompt: str | None,
+    ai_service: Any,
+    tool_executor: Any,
+    tools_openai: list[dict[str, Any]] | None,
+    pause_signal: Any | None,
+    schedule: SubagentScope | None,
+    start: float,
+) -> RunnerResult:
     from .agent_loop import run_agent_loop
 
     # Fresh message list — session isolation per step (FR-006)
@@ -139,6 +181,8 @@ async def execute_agent_runner(
             assistant_content += event.data.get("content", "")
         elif event.kind == "tool_call_end":
             tool_outputs.append(event.data)
+        elif event.kind == "usage" and schedule is not None:
+            schedule.charge(int(event.data.get("total_tokens") or 0) + int(event.data.get("hedge_tokens") or 0))
         elif event.kind == "workflow_pause":
             paused = True
             break
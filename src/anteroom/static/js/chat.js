@@ -356,6 +356,9 @@ const Chat = (() => {
                 hideThinking();
                 renderToolCallStart(data);
                 break;
+            case 'tool_output':
+                renderToolOutput(data);
+                break;
             case 'tool_call_end':
                 renderToolCallEnd(data);
                 break;
@@ -1662,11 +1665,21 @@ const Chat = (() => {
             const elapsed = document.createElement('span');
             elapsed.className = 'tool-elapsed';
             summary.appendChild(elapsed);
+            const queueEl = document.createElement('span');
+            queueEl.className = 'subagent-queue';
+            summary.appendChild(queueEl);
             details.appendChild(summary);
             const startTime = Date.now();
+            let ticks = 0;
+            let polling = false;
             details._toolTimer = setInterval(() => {
                 const secs = Math.floor((Date.now() - startTime) / 1000);
                 elapsed.textContent = ` ${secs}s`;
+                // Global sub-agent queue depth, every 3s while running
+                if (ticks++ % 6 === 0 && !polling) {
+                    polling = true;
+                    _pollSubagentQueue(queueEl).finally(() => { polling = false; });
+                }
             }, 500);
 
             const toolContent = document.createElement('div');
@@ -1763,9 +1776,30 @@ const Chat = (() => {
         });
     }
 
+    const _LIVE_OUTPUT_MAX_CHARS = 8000;
+
+    function renderToolOutput(data) {
+        const details = document.getElementById(`tool-${_sanitizeId(data.id)}`);
+        if (!details || typeof data.text !== 'string') return;
+        const toolContent = details.querySelector('.tool-content');
+        if (!toolContent) return;
+        let livePre = toolContent.querySelector('.tool-live-output');
+        if (!livePre) {
+            livePre = document.createElement('pre');
+            livePre.className = 'tool-live-output';
+            toolContent.appendChild(livePre);
+        }
+        // Keep only the newest output so a noisy command can't grow the DOM unbounded
+        const text = (livePre.textContent + data.text).slice(-_LIVE_OUTPUT_MAX_CHARS);
+        livePre.textContent = text;
+        livePre.scrollTop = livePre.scrollHeight;
+    }
+
     function renderToolCallEnd(data) {
         const details = document.getElementById(`tool-${_sanitizeId(data.id)}`);
         if (!details) return;
+        const livePre = details.querySelector('.tool-live-output');
+        if (livePre) livePre.remove();
         if (details._toolTimer) {
             clearInterval(details._toolTimer);
             details._toolTimer = null;
@@ -1839,6 +1873,12 @@ const Chat = (() => {
             model.textContent = data.model || '';
             header.appendChild(label);
             header.appendChild(model);
+            if (data.queue_wait_seconds >= 0.1) {
+                const queued = document.createElement('span');
+                queued.className = 'subagent-queued';
+                queued.textContent = `queued ${data.queue_wait_seconds.toFixed(1)}s`;
+                header.appendChild(queued);
+            }
 
             const prompt = document.createElement('div');
             prompt.className = 'subagent-prompt';
@@ -1871,10 +1911,11 @@ const Chat = (() => {
                 footer.className = 'subagent-footer';
                 const elapsed = data.elapsed_seconds != null ? `${data.elapsed_seconds.toFixed(1)}s` : '';
                 const toolCount = (data.tool_calls || []).length;
+                const tokens = data.tokens_used ? ` · ${data.tokens_used.toLocaleString()} tokens` : '';
                 const errorMsg = data.error ? String(data.error).slice(0, 200) : '';
                 footer.textContent = errorMsg
                     ? `Failed: ${errorMsg}`
-                    : `Done in ${elapsed} · ${toolCount} tool call${toolCount !== 1 ? 's' : ''}`;
+                    : `Done in ${elapsed} · ${toolCount} tool call${toolCount !== 1 ? 's' : ''}${tokens}`;
                 card.appendChild(footer);
 
                 // Clear running animation from parent if all sub-agents are done
@@ -1885,6 +1926,17 @@ const Chat = (() => {
         }
     }
 
+    async function _pollSubagentQueue(el) {
+        try {
+            const stats = await App.api('/api/subagents/queue');
+            el.textContent = stats && stats.queued
+                ? ` \u00b7 ${stats.queued} queued, oldest ${Math.round(stats.oldest_wait_seconds)}s`
+                : '';
+        } catch (_) {
+            el.textContent = '';
+        }
+    }
+
     function setStreaming(streaming) {
         App.state.isStreaming = streaming;
         document.getElementById('btn-stop').style.display = streaming ? 'flex' : 'none';
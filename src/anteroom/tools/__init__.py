@@ -11,7 +11,7 @@ from ..services.tool_rate_limit import ToolRateLimiter
 from .safety import SafetyVerdict, check_bash_command, check_write_path
 from .security import check_hard_block
 from .tiers import ToolTier as ToolTier
-from .tiers import get_tool_tier, parse_approval_mode, should_require_approval
+from .tiers import get_tool_tier, is_speculation_safe, parse_approval_mode, should_require_approval
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +32,11 @@ _UNTRUSTED_TOOLS = {
     "pptx",
 }
 
+# Tools that write the ``path`` they return; reported to file-change listeners.
+_FILE_WRITE_TOOLS = {"write_file", "edit_file"}
+
+FileChangeListener = Callable[[list[str] | None], None]
+
 
 class ToolRegistry:
     """Registry of built-in tools with OpenAI function-call format."""
@@ -45,6 +50,7 @@ class ToolRegistry:
         self._session_allowed: set[str] = set()
         self._rate_limiter: ToolRateLimiter | None = None
         self._rule_enforcer: RuleEnforcer | None = None
+        self._file_change_listeners: list[FileChangeListener] = []
 
     def set_confirm_callback(self, callback: ConfirmCallback | None) -> None:
         self._confirm_callback = callback
@@ -70,6 +76,32 @@ class ToolRegistry:
     def set_rule_enforcer(self, enforcer: RuleEnforcer | None) -> None:
         self._rule_enforcer = enforcer
 
+    def add_file_change_listener(self, listener: FileChangeListener) -> None:
+        """Call *listener* after tools modify files.
+
+        It receives the list of changed paths, or None when a tool (bash) may
+        have changed arbitrary files.
+        """
+        self._file_change_listeners.append(listener)
+
+    def _notify_file_change(self, name: str, result: dict[str, Any]) -> None:
+        if not self._file_change_listeners or "error" in result:
+            return
+        if name in _FILE_WRITE_TOOLS:
+            path = result.get("path")
+            if not path:
+                return
+            paths: list[str] | None = [str(path)]
+        elif name == "bash":
+            paths = None
+        else:
+            return
+        for listener in self._file_change_listeners:
+            try:
+                listener(paths)
+            except Exception:
+                logger.debug("File change listener failed for %s", name, exc_info=True)
+
     def register(self, name: str, handler: ToolHandler, definition: dict[str, Any]) -> None:
         self._handlers[name] = handler
         self._definitions[name] = definition
@@ -77,6 +109,25 @@ class ToolRegistry:
     def has_tool(self, name: str) -> bool:
         return name in self._handlers
 
+    def can_speculate(
+        self,
+        tool_name: str,
+        arguments: dict[str, Any],
+        *,
+        rule_enforcer_override: RuleEnforcer | None = None,
+    ) -> bool:
+        """Whether *tool_name* may run before the assistant turn finishes streaming.
+
+        Requires a built-in, side-effect-free READ-tier tool that the safety
+        gate would auto-allow, so speculation can never prompt the user.
+        """
+        if not self.has_tool(tool_name):
+            return False
+        config = self._safety_config
+        if not is_speculation_safe(tool_name, config.tool_tiers if config else None):
+            return False
+        return self.check_safety(tool_name, arguments, rule_enforcer_override=rule_enforcer_override) is None
+
     def get_openai_tools(self) -> list[dict[str, Any]]:
         return [
             {
@@ -295,6 +346,7 @@ class ToolRegistry:
         result["_context_trust"] = "untrusted" if name in _UNTRUSTED_TOOLS else "trusted"
         if name in _UNTRUSTED_TOOLS:
             result["_context_origin"] = f"builtin:{name}"
+        self._notify_file_change(name, result)
 
         # Record the call for rate limiting
         if self._rate_limiter:
@@ -3,9 +3,14 @@
 from __future__ import annotations
 
 import asyncio
+import atexit
+import codecs
+import inspect
 import logging
 import os
 import sys
+from collections import deque
+from collections.abc import Callable
 from typing import TYPE_CHECKING, Any
 
 from .security import (
@@ -18,6 +23,7 @@ from .security import (
 
 if TYPE_CHECKING:
     from ..config import BashSandboxConfig
+    from .shell_session import ShellSession
 
 import re
 import shutil
@@ -28,6 +34,12 @@ security_logger = logging.getLogger("anteroom.security")
 
 _MAX_OUTPUT = 100_000
 _DEFAULT_TIMEOUT = 120
+_READ_CHUNK = 64 * 1024
+_PROGRESS_INTERVAL = 0.25  # seconds between output callbacks
+_PROGRESS_MAX_CHARS = 4096  # newest output sent per callback
+_MAX_SPILL_FILES = 20  # full-output files kept for paging; older ones are deleted
+
+OutputCallback = Callable[[str, str], Any]
 
 # Regex to detect `python -c "..."` or `python3 -c '...'` with multiline content
 _PYTHON_C_RE = re.compile(
@@ -128,13 +140,170 @@ def _resolve_python_binary(command: str) -> str:
     return re.sub(r"\bpython3\b", "python", command, count=1)
 
 
+# Full-output files of recent commands, oldest first
+_spill_files: deque[str] = deque()
+
+
+def _remove_spill_files() -> None:
+    while _spill_files:
+        try:
+            os.unlink(_spill_files.popleft())
+        except OSError:
+            pass
+
+
+atexit.register(_remove_spill_files)
+
+
+class _OutputCapture:
+    """Keeps the head and a ring-buffered tail of one output stream.
+
+    Once the stream outgrows the two buffers, every byte (including the head
+    and the tail seen so far) is written to a temporary spill file.
+    """
+
+    def __init__(self, name: str, max_chars: int) -> None:
+        self.name = name
+        self._head_limit = max_chars // 2
+        self._tail_limit = max_chars - self._head_limit
+        self._head = bytearray()
+        self._tail: deque[bytes] = deque()
+        self._tail_size = 0
+        self.total = 0
+        self.spill_path: str | None = None
+        self._spill: Any = None
+
+    def feed(self, chunk: bytes) -> None:
+        if self._spill is None and self.total + len(chunk) > self._head_limit + self._tail_limit:
+            self._start_spill()
+        self.total += len(chunk)
+        if self._spill:
+            self._spill.write(chunk)
+        room = self._head_limit - len(self._head)
+        if room > 0:
+            self._head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk:
+            self._tail.append(chunk)
+            self._tail_size += len(chunk)
+            while self._tail and self._tail_size - len(self._tail[0]) >= self._tail_limit:
+                self._tail_size -= len(self._tail.popleft())
+
+    def _start_spill(self) -> None:
+        try:
+            fd, path = tempfile.mkstemp(prefix=f"anteroom-bash-{self.name}-", suffix=".log")
+            self._spill = os.fdopen(fd, "wb")
+        except OSError:
+            logger.warning("Could not create bash output spill file", exc_info=True)
+            self._spill = False  # don't retry on every chunk
+            return
+        self.spill_path = path
+        _spill_files.append(path)
+        while len(_spill_files) > _MAX_SPILL_FILES:
+            try:
+                os.unlink(_spill_files.popleft())
+            except OSError:
+                pass
+        # Nothing has left the tail yet: head + tail is the whole stream so far
+        self._spill.write(bytes(self._head))
+        for part in self._tail:
+            self._spill.write(part)
+
+    def close(self) -> None:
+        if self._spill:
+            self._spill.close()
+        self._spill = False
+
+    def text(self) -> str:
+        head = bytes(self._head).decode("utf-8", errors="replace")
+        if self.total <= self._head_limit + self._tail_limit:
+            return head + b"".join(self._tail).decode("utf-8", errors="replace")
+        tail = b"".join(self._tail)[-self._tail_limit :] if self._tail_limit else b""
+        omitted = self.total - len(self._head) - len(tail)
+        where = (
+            f"full output in {self.spill_path}; page through it with read_file"
+            if self.spill_path
+            else "full output unavailable"
+        )
+        return (
+            head
+            + f"\n... (truncated: {omitted:,} bytes omitted; {where}) ...\n"
+            + tail.decode("utf-8", errors="replace")
+        )
+
+
+def _captured_output(stdout: _OutputCapture, stderr: _OutputCapture) -> dict[str, Any]:
+    result: dict[str, Any] = {"stdout": stdout.text(), "stderr": stderr.text()}
+    for cap in (stdout, stderr):
+        if cap.spill_path:
+            result[f"{cap.name}_file"] = cap.spill_path
+            result[f"{cap.name}_bytes"] = cap.total
+    return result
+
+
+class _Progress:
+    """Batches new output and hands it to a callback at a bounded rate."""
+
+    def __init__(self, callback: OutputCallback) -> None:
+        self._callback = callback
+        decoder = codecs.getincrementaldecoder("utf-8")
+        self._decoders = {name: decoder(errors="replace") for name in ("stdout", "stderr")}
+        self._pending: dict[str, str] = {}
+
+    def feed(self, name: str, chunk: bytes) -> None:
+        text = self._decoders[name].decode(chunk)
+        if text:
+            self._pending[name] = (self._pending.get(name, "") + text)[-_PROGRESS_MAX_CHARS:]
+
+    async def run(self) -> None:
+        """Flush pending output every ``_PROGRESS_INTERVAL`` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(_PROGRESS_INTERVAL)
+            await self.flush()
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        for name, text in pending.items():
+            try:
+                outcome = self._callback(name, text)
+                if inspect.isawaitable(outcome):
+                    await outcome
+            except Exception:
+                logger.debug("bash output callback failed", exc_info=True)
+
+
+async def _pump(stream: asyncio.StreamReader | None, capture: _OutputCapture, progress: _Progress | None) -> None:
+    if stream is None:
+        return
+    while True:
+        chunk = await stream.read(_READ_CHUNK)
+        if not chunk:
+            return
+        capture.feed(chunk)
+        if progress is not None:
+            progress.feed(capture.name, chunk)
+
+
 async def handle(
     command: str,
     timeout: int = _DEFAULT_TIMEOUT,
     _bypass_hard_block: bool = False,
     _sandbox_config: BashSandboxConfig | None = None,
+    _output_callback: OutputCallback | None = None,
+    _shell_session: ShellSession | None = None,
     **_: Any,
 ) -> dict[str, Any]:
+    """Run *command* in the working directory.
+
+    stdout and stderr are read as they are produced.  Each stream keeps its
+    first and last ``max_output / 2`` bytes in memory; when a stream
+    overflows that, its complete output is spilled to a temporary file and
+    the inline text shows where the middle was cut.  *_output_callback*
+    (``(stream, text)``, sync or async) receives new output at most every
+    ``_PROGRESS_INTERVAL`` seconds while the command runs.  With
+    *_shell_session* the command runs in that persistent shell instead of a
+    new one, after the same safety and sandbox checks.
+    """
     # Null byte check runs unconditionally — never bypassable.
     if "\x00" in command:
         return {"error": "Command contains null bytes", "exit_code": -1}
@@ -170,6 +339,17 @@ async def handle(
     # Set up OS-level sandbox (Win32 Job Object) if configured
     use_os_sandbox = sys.platform == "win32" and _sandbox_config is not None and _sandbox_config.sandbox.is_enabled
 
+    if _shell_session is not None and sys.platform != "win32":
+        try:
+            return await _shell_session.run(
+                command, timeout=timeout, max_output=max_output, output_callback=_output_callback
+            )
+        except OSError as e:
+            return {"error": str(e), "exit_code": -1}
+
+    stdout_cap = _OutputCapture("stdout", max_output)
+    stderr_cap = _OutputCapture("stderr", max_output)
+    progress = _Progress(_output_callback) if callable(_output_callback) else None
     try:
         proc = await asyncio.create_subprocess_shell(
             command,
@@ -188,38 +368,45 @@ async def handle(
             if job_handle is None:
                 security_logger.warning("Job Object setup failed, running without OS sandbox")
 
+        ticker = asyncio.create_task(progress.run()) if progress is not None else None
         try:
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
-        except asyncio.TimeoutError:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    _pump(proc.stdout, stdout_cap, progress),
+                    _pump(proc.stderr, stderr_cap, progress),
+                    proc.wait(),
+                ),
+                timeout=timeout,
+            )
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
             if job_handle is not None:
                 from .sandbox_win32 import terminate_job
 
                 terminate_job(job_handle)
-            proc.kill()
+            if proc.returncode is None:
+                proc.kill()
             await proc.wait()
-            return {"error": f"Command timed out after {timeout}s", "exit_code": -1}
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            result: dict[str, Any] = {"error": f"Command timed out after {timeout}s", "exit_code": -1}
+            result.update(_captured_output(stdout_cap, stderr_cap))
+            return result
         finally:
             if job_handle is not None:
                 from .sandbox_win32 import close_job
 
                 close_job(job_handle)
+            if ticker is not None:
+                ticker.cancel()
+            if progress is not None:
+                await progress.flush()
 
-        stdout_str = stdout.decode("utf-8", errors="replace")
-        stderr_str = stderr.decode("utf-8", errors="replace")
-
-        if len(stdout_str) > max_output:
-            stdout_str = stdout_str[:max_output] + "\n... (truncated)"
-        if len(stderr_str) > max_output:
-            stderr_str = stderr_str[:max_output] + "\n... (truncated)"
-
-        return {
-            "stdout": stdout_str,
-            "stderr": stderr_str,
-            "exit_code": proc.returncode or 0,
-        }
+        return {**_captured_output(stdout_cap, stderr_cap), "exit_code": proc.returncode or 0}
     except OSError as e:
         return {"error": str(e), "exit_code": -1}
     finally:
+        stdout_cap.close()
+        stderr_cap.close()
         if tmp_script is not None:
             try:
                 os.unlink(tmp_script)
@@ -0,0 +1,310 @@
+"""Persistent shell sessions for the bash tool.
+
+By default every ``bash`` call spawns a fresh shell, so ``cd``, ``source
+venv/bin/activate`` and exported variables are lost between calls and each
+call pays process startup.  A ``ShellSession`` keeps one shell process alive
+and runs each command inside it:
+
+- commands are framed with a random sentinel: the shell ``eval``s the
+  command (quoted, so syntax errors are reported instead of desyncing the
+  stream), then prints the sentinel and exit status on stdout and stderr
+- output is captured with the same head/tail buffers and spill files as the
+  one-shot bash tool, and streamed to an optional progress callback
+- on timeout the command is interrupted with SIGINT (the shell survives and
+  keeps its state); if it does not stop, the whole shell is killed
+- a shell that exits (``exit``, ``set -e`` failures, crashes) is replaced by
+  a fresh one on the next command, and idle shells are closed after
+  *idle_timeout* seconds; either way the next result reports
+  ``shell_restarted`` so the model knows its directory and environment are gone
+
+POSIX only: the bash tool falls back to one-shot execution on Windows.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import shutil
+import signal
+import uuid
+from collections import OrderedDict
+from typing import Any
+
+from .bash import _captured_output, _OutputCapture, _Progress
+
+logger = logging.getLogger(__name__)
+
+_READ_CHUNK = 64 * 1024
+_INTERRUPT_GRACE = 2.0  # seconds a timed-out command gets to exit after SIGINT
+_DEFAULT_IDLE_TIMEOUT = 600.0
+_DEFAULT_MAX_SESSIONS = 32
+
+
+def _quote(text: str) -> str:
+    return "'" + text.replace("'", "'\\''") + "'"
+
+
+class ShellSession:
+    """One long-lived shell process running commands one at a time."""
+
+    def __init__(self, working_dir: str, *, idle_timeout: float = _DEFAULT_IDLE_TIMEOUT) -> None:
+        self.working_dir = working_dir
+        self._idle_timeout = idle_timeout
+        self._proc: asyncio.subprocess.Process | None = None
+        self._lock = asyncio.Lock()
+        self._idle_handle: asyncio.TimerHandle | None = None
+        self._idle_closed = False
+        self.commands_run = 0
+        self.restarts = 0
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.returncode is None
+
+    async def _start(self) -> None:
+        shell = shutil.which("bash") or "/bin/sh"
+        args = [shell, "--noprofile", "--norc"] if os.path.basename(shell) == "bash" else [shell]
+        self._proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=self.working_dir,
+            start_new_session=True,
+        )
+        # A handler (not an ignore) so SIGINT stops the running command but not
+        # the shell; commands get the default disposition back on exec
+        await self._write("trap : INT\n")
+
+    async def _write(self, text: str) -> None:
+        assert self._proc is not None and self._proc.stdin is not None
+        self._proc.stdin.write(text.encode("utf-8"))
+        await self._proc.stdin.drain()
+
+    def _signal(self, sig: int) -> None:
+        if self._proc is None or self._proc.returncode is not None:
+            return
+        try:
+            os.killpg(self._proc.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def close(self) -> None:
+        """Kill the shell and everything it started."""
+        self._cancel_idle()
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        if proc.returncode is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                proc.kill()
+            await proc.wait()
+
+    def _cancel_idle(self) -> None:
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+
+    def _arm_idle(self) -> None:
+        if self._idle_timeout <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        self._idle_handle = loop.call_later(self._idle_timeout, lambda: loop.create_task(self._close_if_idle()))
+
+    async def _close_if_idle(self) -> None:
+        if not self._lock.locked():
+            logger.debug("Closing idle shell session in %s", self.working_dir)
+            await self.close()
+            self._idle_closed = True
+
+    async def run(
+        self,
+        command: str,
+        *,
+        timeout: float,
+        max_output: int,
+        output_callback: Any = None,
+    ) -> dict[str, Any]:
+        """Run *command* in the session; returns the bash tool's result shape."""
+        async with self._lock:
+            self._cancel_idle()
+            try:
+                return await self._run_locked(command, timeout, max_output, output_callback)
+            finally:
+                self._arm_idle()
+
+    async def _run_locked(self, command: str, timeout: float, max_output: int, output_callback: Any) -> dict[str, Any]:
+        restarted = False
+        if not self.alive:
+            if self._proc is not None or self._idle_closed:
+                self.restarts += 1
+                restarted = True
+            self._idle_closed = False
+            await self._start()
+        proc = self._proc
+        assert proc is not None
+
+        sentinel = f"__ANTEROOM_DONE_{uuid.uuid4().hex}__"
+        stdout_cap = _OutputCapture("stdout", max_output)
+        stderr_cap = _OutputCapture("stderr", max_output)
+        progress = _Progress(output_callback) if callable(output_callback) else None
+        status: list[int] = []
+        script = (
+            f"__anteroom_cmd={_quote(command)}\n"
+            'eval "$__anteroom_cmd" </dev/null\n'
+            "__anteroom_rc=$?\n"
+            "unset __anteroom_cmd\n"
+            f"printf '\\n{sentinel} %d\\n' \"$__anteroom_rc\"\n"
+            f"printf '\\n{sentinel}\\n' >&2\n"
+        )
+        self.commands_run += 1
+        ticker = asyncio.create_task(progress.run()) if progress is not None else None
+        readers = asyncio.ensure_future(
+            asyncio.gather(
+                _read_framed(proc.stdout, sentinel.encode(), stdout_cap, progress, status),
+                _read_framed(proc.stderr, sentinel.encode(), stderr_cap, progress, None),
+            )
+        )
+        timed_out = False
+        try:
+            try:
+                await self._write(script)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the shell died; the readers see EOF
+            done, _ = await asyncio.wait({readers}, timeout=timeout)
+            if not done:
+                timed_out = True
+                self._signal(signal.SIGINT)
+                done, _ = await asyncio.wait({readers}, timeout=_INTERRUPT_GRACE)
+                if not done:
+                    await self.close()
+                    readers.cancel()
+        except asyncio.CancelledError:
+            readers.cancel()
+            await self.close()
+            raise
+        finally:
+            if ticker is not None:
+                ticker.cancel()
+            if progress is not None:
+                await progress.flush()
+            stdout_cap.close()
+            stderr_cap.close()
+
+        result: dict[str, Any] = _captured_output(stdout_cap, stderr_cap)
+        if restarted:
+            result["shell_restarted"] = True
+        if timed_out:
+            result["error"] = f"Command timed out after {int(timeout)}s"
+            result["exit_code"] = -1
+            if not self.alive:
+                result["shell_restarted"] = True
+            return result
+        if status:
+            result["exit_code"] = status[0]
+            return result
+        # EOF before the sentinel: the command ended the shell
+        returncode = await proc.wait()
+        result["exit_code"] = returncode
+        result["shell_exited"] = True
+        return result
+
+
+async def _read_framed(
+    stream: asyncio.StreamReader | None,
+    sentinel: bytes,
+    capture: _OutputCapture,
+    progress: _Progress | None,
+    status: list[int] | None,
+) -> None:
+    """Feed *stream* into *capture* up to the sentinel line; parse the exit status after it."""
+    if stream is None:
+        return
+    marker = b"\n" + sentinel
+    keep = len(marker) - 1
+    buf = b""
+
+    def _emit(data: bytes) -> None:
+        if data:
+            capture.feed(data)
+            if progress is not None:
+                progress.feed(capture.name, data)
+
+    while True:
+        chunk = await stream.read(_READ_CHUNK)
+        if not chunk:
+            _emit(buf)
+            return
+        buf += chunk
+        idx = buf.find(marker)
+        if idx < 0:
+            _emit(buf[:-keep])
+            buf = buf[-keep:]
+            continue
+        _emit(buf[:idx])
+        rest = buf[idx + len(marker) :]
+        while b"\n" not in rest:
+            more = await stream.read(_READ_CHUNK)
+            if not more:
+                break
+            rest += more
+        if status is not None:
+            try:
+                status.append(int(rest.split(b"\n", 1)[0].strip()))
+            except ValueError:
+                status.append(-1)
+        return
+
+
+class ShellSessionPool:
+    """Persistent shells keyed by conversation, capped at *max_sessions* (least recently used closes first)."""
+
+    def __init__(
+        self,
+        *,
+        idle_timeout: float = _DEFAULT_IDLE_TIMEOUT,
+        max_sessions: int = _DEFAULT_MAX_SESSIONS,
+    ) -> None:
+        self._idle_timeout = idle_timeout
+        self._max_sessions = max(1, max_sessions)
+        self._sessions: OrderedDict[str, ShellSession] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, key: str, working_dir: str) -> ShellSession:
+        """The session for *key*, replaced when *working_dir* changes."""
+        session = self._sessions.get(key)
+        if session is not None and session.working_dir != working_dir:
+            self._close_later(session)
+            session = None
+        if session is None:
+            session = ShellSession(working_dir, idle_timeout=self._idle_timeout)
+            self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self._max_sessions:
+            _, oldest = self._sessions.popitem(last=False)
+            self._close_later(oldest)
+        return session
+
+    @staticmethod
+    def _close_later(session: ShellSession) -> None:
+        try:
+            asyncio.get_running_loop().create_task(session.close())
+        except RuntimeError:
+            pass
+
+    async def close(self, key: str) -> None:
+        """Close the session for *key* (its conversation was deleted)."""
+        session = self._sessions.pop(key, None)
+        if session is not None:
+            await session.close()
+
+    async def close_all(self) -> None:
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            await session.close()
@@ -10,8 +10,10 @@ import time
 from typing import Any, Callable, Coroutine
 
 from ..config import SubagentConfig
+from ..services import request_deadline
 from ..services.agent_loop import AgentEvent, run_agent_loop
 from ..services.ai_service import AIService
+from ..services.subagent_scheduler import SubagentAdmissionError, SubagentScope
 
 logger = logging.getLogger(__name__)
 
@@ -113,6 +115,22 @@ class SubagentLimiter:
         return self._total_spawned
 
 
+def _link_cancel(parent: asyncio.Event | None, child: asyncio.Event) -> Callable[[], None]:
+    """Set *child* when *parent* is set; returns a callable that removes the link."""
+    if parent is None:
+        return lambda: None
+    if parent.is_set():
+        child.set()
+        return lambda: None
+    watcher = asyncio.ensure_future(parent.wait())
+    watcher.add_done_callback(lambda t: None if t.cancelled() else child.set())
+
+    def _unlink() -> None:
+        watcher.cancel()
+
+    return _unlink
+
+
 async def handle(
     prompt: str,
     model: str | None = None,
@@ -127,6 +145,8 @@ async def handle(
     _limiter: SubagentLimiter | None = None,
     _confirm_callback: Any | None = None,
     _config: SubagentConfig | None = None,
+    _tool_scheduler: Any | None = None,
+    _schedule: SubagentScope | None = None,
 ) -> dict[str, Any]:
     """Execute a sub-agent with an isolated conversation context."""
     if _ai_service is None:
@@ -159,6 +179,21 @@ async def handle(
             "error": "Sub-agent limit reached for this request. Reuse existing sub-agent results or reduce parallelism."
         }
 
+    # Global admission: top-level sub-agents queue for a scheduler slot; nested
+    # ones run under their parent's slot but still respect the token budget
+    queue_wait = 0.0
+    scheduled = False
+    if _schedule is not None:
+        try:
+            if _depth == 0:
+                queue_wait = await _schedule.acquire(_cancel_event)
+                scheduled = True
+            elif _schedule.budget_exhausted:
+                raise SubagentAdmissionError("Sub-agent token budget for this conversation is spent")
+        except SubagentAdmissionError as e:
+            _limiter.release()
+            return {"error": str(e)}
+
     try:
         return await _run_subagent(
             prompt=prompt,
@@ -173,9 +208,14 @@ async def handle(
             _limiter=_limiter,
             _confirm_callback=_confirm_callback,
             _config=_config,
+            _tool_scheduler=_tool_scheduler,
+            _schedule=_schedule,
+            _queue_wait=queue_wait,
         )
     finally:
         _limiter.release()
+        if scheduled and _schedule is not None:
+            _schedule.release()
 
 
 async def _run_subagent(
@@ -192,12 +232,19 @@ async def _run_subagent(
     _limiter: SubagentLimiter,
     _confirm_callback: Any | None = None,
     _config: SubagentConfig | None = None,
+    _tool_scheduler: Any | None = None,
+    _schedule: SubagentScope | None = None,
+    _queue_wait: float = 0.0,
 ) -> dict[str, Any]:
     """Internal: run the sub-agent after limiter acquisition."""
     max_depth = _config.max_depth if _config else MAX_SUBAGENT_DEPTH
     max_iterations = _config.max_iterations if _config else SUBAGENT_MAX_ITERATIONS
     max_output = _config.max_output_chars if _config else MAX_OUTPUT_CHARS
-    timeout = _config.timeout if _config else SUBAGENT_TIMEOUT
+    configured_timeout = _config.timeout if _config else SUBAGENT_TIMEOUT
+    # A sub-agent never outlives the request that started it
+    deadline_left = request_deadline.remaining()
+    stopped_by_deadline = deadline_left is not None and deadline_left < configured_timeout
+    timeout = request_deadline.bound(configured_timeout)
 
     child_depth = _depth + 1
     start_time = time.monotonic()
@@ -232,6 +279,10 @@ async def _run_subagent(
 
         child_tools = filter_read_only_tools(child_tools, _safety_cfg.tool_tiers or None)
 
+    # The child stops when the parent is cancelled, and can be stopped on its
+    # own (token budget) without cancelling the parent's other work
+    child_cancel = asyncio.Event()
+
     # Child tool executor wraps the registry, injecting depth and limiter for nested sub-agents
     _child_counter = 0
 
@@ -243,13 +294,15 @@ async def _run_subagent(
             arguments["_ai_service"] = child_ai
             arguments["_tool_registry"] = _tool_registry
             arguments["_mcp_manager"] = _mcp_manager
-            arguments["_cancel_event"] = _cancel_event
+            arguments["_cancel_event"] = child_cancel
             arguments["_depth"] = child_depth
             arguments["_agent_id"] = f"{_agent_id}.{_child_counter}"
             arguments["_event_sink"] = _event_sink
             arguments["_limiter"] = _limiter
             arguments["_confirm_callback"] = _confirm_callback
             arguments["_config"] = _config
+            arguments["_tool_scheduler"] = _tool_scheduler
+            arguments["_schedule"] = _schedule
         if _tool_registry.has_tool(tool_name):
             return dict(await _tool_registry.call_tool(tool_name, arguments, confirm_callback=_confirm_callback))
         if _mcp_manager:
@@ -291,6 +344,7 @@ async def _run_subagent(
                     "prompt": prompt[:200],
                     "model": model or child_config.model,
                     "depth": child_depth,
+                    "queue_wait_seconds": round(_queue_wait, 1),
                 },
             ),
         )
@@ -299,17 +353,20 @@ async def _run_subagent(
     output_parts: list[str] = []
     tool_calls_made: list[str] = []
     error_message: str | None = None
+    tokens_used = 0
+    over_budget = False
 
     async def _run_loop() -> None:
-        nonlocal error_message
+        nonlocal error_message, tokens_used, over_budget
         async for event in run_agent_loop(
             ai_service=child_ai,
             messages=messages,
             tool_executor=child_tool_executor,
             tools_openai=child_tools,
-            cancel_event=_cancel_event,
+            cancel_event=child_cancel,
             extra_system_prompt=_SUBAGENT_SYSTEM_PROMPT,
             max_iterations=max_iterations,
+            tool_scheduler=_tool_scheduler,
         ):
             if _event_sink:
                 await _event_sink(_agent_id, event)
@@ -320,25 +377,34 @@ async def _run_subagent(
                     output_parts.append(content)
             elif event.kind == "tool_call_start":
                 tool_calls_made.append(event.data.get("tool_name", "unknown"))
+            elif event.kind == "usage":
+                tokens = int(event.data.get("total_tokens") or 0) + int(event.data.get("hedge_tokens") or 0)
+                tokens_used += tokens
+                if _schedule is not None and not _schedule.charge(tokens):
+                    over_budget = True
+                    child_cancel.set()
             elif event.kind == "error":
                 # Cap error message to avoid leaking internal details to parent AI
                 raw_err = event.data.get("message", "Unknown error")
                 error_message = raw_err[:200] if raw_err else "Unknown error"
 
+    unlink_cancel = _link_cancel(_cancel_event, child_cancel)
     try:
         await asyncio.wait_for(_run_loop(), timeout=timeout)
     except asyncio.TimeoutError:
         logger.warning("Sub-agent %s timed out after %ds", _agent_id, timeout)
-        error_message = f"Sub-agent timed out after {timeout}s"
+        if stopped_by_deadline:
+            error_message = "Sub-agent stopped at the request deadline"
+        else:
+            error_message = f"Sub-agent timed out after {configured_timeout}s"
     except Exception:
         logger.exception("Sub-agent execution failed")
         error_message = "Sub-agent execution failed"
     finally:
-        # Close the child AI service's HTTP client to prevent connection leaks
-        try:
-            await asyncio.wait_for(child_ai.client.close(), timeout=2.0)
-        except Exception:
-            pass
+        unlink_cancel()
+    if over_budget:
+        error_message = "Sub-agent stopped: token budget for this conversation is spent"
+    # The child's HTTP client is the shared connection pool (services/http_pool); leave it open
 
     elapsed = round(time.monotonic() - start_time, 1)
     output = "".join(output_parts)
@@ -361,6 +427,7 @@ async def _run_subagent(
                     "tool_calls": tool_calls_made,
                     "truncated": truncated,
                     "error": error_message,
+                    "tokens_used": tokens_used,
                 },
             ),
         )
@@ -370,6 +437,7 @@ async def _run_subagent(
         "elapsed_seconds": elapsed,
         "tool_calls_made": tool_calls_made,
         "model_used": model or child_config.model,
+        "tokens_used": tokens_used,
     }
     if truncated:
         result["truncated"] = True
@@ -60,6 +60,11 @@ DEFAULT_TOOL_TIERS: dict[str, ToolTier] = {
 # MCP tools and unknown tools default to this tier
 DEFAULT_MCP_TIER = ToolTier.EXECUTE
 
+# READ-tier tools whose only effect is returning data.  Canvas tools,
+# ask_user and invoke_skill are READ tier but act on the conversation or
+# the user, so they are never run ahead of the finished stream.
+SPECULATION_SAFE_TOOLS: frozenset[str] = frozenset({"read_file", "glob_files", "grep"})
+
 
 def get_tool_tier(
     tool_name: str,
@@ -79,6 +84,18 @@ def get_tool_tier(
     return DEFAULT_TOOL_TIERS.get(tool_name, DEFAULT_MCP_TIER)
 
 
+def is_speculation_safe(
+    tool_name: str,
+    tier_overrides: dict[str, str] | None = None,
+) -> bool:
+    """Whether a tool may run speculatively before the model finishes its turn.
+
+    Only side-effect-free tools qualify, and only while they are still READ
+    tier (a config override raising the tier disables speculation).
+    """
+    return tool_name in SPECULATION_SAFE_TOOLS and get_tool_tier(tool_name, tier_overrides) == ToolTier.READ
+
+
 def parse_approval_mode(raw: str) -> ApprovalMode:
     """Parse an approval mode string. Returns ASK_FOR_WRITES on invalid input."""
     return APPROVAL_MODE_NAMES.get(raw.lower().strip(), ApprovalMode.ASK_FOR_WRITES)
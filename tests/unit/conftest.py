@@ -0,0 +1,132 @@
+"""Shared helpers for unit tests: a local HTTP/1.1 stub for provider APIs."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import ssl
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Any
+
+
+@dataclass
+class StubRequest:
+    """One request received by a ``StubHTTPServer``."""
+
+    index: int  # position among every request the server received
+    body: Any  # parsed JSON body, None when empty
+    fresh: bool  # first request on its connection
+
+
+Respond = Callable[[StubRequest], AsyncIterator[bytes]]
+
+
+class StubHTTPServer:
+    """Local keep-alive HTTP/1.1 server answering each request through *respond*.
+
+    *respond* is an async generator; every chunk it yields is written and
+    flushed on its own, so a handler can sleep between the headers and the
+    body.  The connection is closed after a response whose headers say
+    ``connection: close``.  ``requests`` holds the parsed bodies,
+    ``connections`` counts accepted connections (TLS handshakes with
+    *ssl_context*) and ``finished`` counts responses written in full.
+    """
+
+    def __init__(self, respond: Respond, *, ssl_context: ssl.SSLContext | None = None) -> None:
+        self._respond = respond
+        self._ssl = ssl_context
+        self.requests: list[Any] = []
+        self.connections = 0
+        self.finished = 0
+        self._server: asyncio.AbstractServer | None = None
+        self.base_url = ""
+
+    async def __aenter__(self) -> StubHTTPServer:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0, ssl=self._ssl)
+        port = self._server.sockets[0].getsockname()[1]
+        self.base_url = f"{'https' if self._ssl else 'http'}://127.0.0.1:{port}/v1"
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        assert self._server is not None
+        self._server.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        fresh = True
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                raw = await reader.readexactly(length)
+                request = StubRequest(index=len(self.requests), body=json.loads(raw) if raw else None, fresh=fresh)
+                self.requests.append(request.body)
+                fresh = False
+                close = False
+                async for chunk in self._respond(request):
+                    close = close or b"\r\nconnection: close\r\n" in chunk.lower()
+                    writer.write(chunk)
+                    await writer.drain()
+                self.finished += 1
+                if close:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+
+def json_response(payload: Any, status: int = 200) -> bytes:
+    """A complete ``application/json`` response."""
+    body = json.dumps(payload).encode()
+    return (
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\ncontent-type: application/json\r\n"
+        f"content-length: {len(body)}\r\n\r\n"
+    ).encode() + body
+
+
+def chat_completion(content: str, *, model: str = "stub-model", usage: dict[str, int] | None = None) -> dict[str, Any]:
+    """A non-streaming ``/v1/chat/completions`` reply body."""
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage or {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+def completion_chunks(content: str, *, usage: dict[str, int] | None = None) -> list[dict[str, Any]]:
+    """Streaming chunks for a reply of *content*; *usage* rides on the final chunk."""
+    base = {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "m"}
+    last: dict[str, Any] = {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+    if usage is not None:
+        last["usage"] = usage
+    return [{**base, "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]}, last]
+
+
+def sse_body(chunks: list[dict[str, Any]]) -> bytes:
+    return b"".join(f"data: {json.dumps(c)}\n\n".encode() for c in chunks) + b"data: [DONE]\n\n"
+
+
+def sse_response(chunks: list[dict[str, Any]]) -> bytes:
+    """A complete event-stream response with a content-length (connection kept alive)."""
+    payload = sse_body(chunks)
+    return (
+        b"HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\n"
+        + f"content-length: {len(payload)}\r\n\r\n".encode()
+        + payload
+    )
+
+
+async def sse_stream(chunks: list[dict[str, Any]], *, delay: float = 0.0) -> AsyncIterator[bytes]:
+    """Event-stream headers, then *delay* seconds later the chunks; the connection is closed after."""
+    yield b"HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\nconnection: close\r\n\r\n"
+    await asyncio.sleep(delay)
+    yield sse_body(chunks)
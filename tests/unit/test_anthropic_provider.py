@@ -738,8 +738,8 @@ class TestErrorHandling:
             assert "done" in event_types
 
     @pytest.mark.asyncio
-    async def test_extra_system_prompt_prepended(self):
-        """extra_system_prompt is prepended to the system prompt."""
+    async def test_extra_system_prompt_included(self):
+        """extra_system_prompt follows the configured system prompt."""
         with (
             patch("anteroom.services.anthropic_provider.anthropic"),
             patch("anteroom.services.anthropic_provider.HAS_ANTHROPIC", True),
@@ -766,7 +766,8 @@ class TestErrorHandling:
                 events.append(event)
 
             call_kwargs = svc.client.messages.stream.call_args[1]
-            assert "Be concise." in call_kwargs["system"]
+            system_text = "".join(block["text"] for block in call_kwargs["system"])
+            assert system_text == config.system_prompt + "\n\nBe concise."
 
     @pytest.mark.asyncio
     async def test_bad_request_context_length(self):
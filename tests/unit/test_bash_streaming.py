@@ -0,0 +1,111 @@
+"""Tests for incremental bash output capture, spill files and live progress."""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from anteroom.tools.bash import _OutputCapture, handle
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="uses POSIX shell commands")
+
+
+class TestOutputCapture:
+    def test_small_output_is_kept_verbatim(self) -> None:
+        cap = _OutputCapture("stdout", 100)
+        cap.feed(b"hello ")
+        cap.feed(b"world")
+        assert cap.text() == "hello world"
+        assert cap.spill_path is None
+
+    def test_head_and_tail_are_bounded_and_full_output_spills(self) -> None:
+        cap = _OutputCapture("stdout", 1000)
+        lines = [f"line {i:06d}\n".encode() for i in range(50_000)]
+        for line in lines:
+            cap.feed(line)
+        cap.close()
+
+        assert cap._tail_size - len(cap._tail[0]) < 500
+        text = cap.text()
+        assert text.startswith("line 000000\n")
+        assert text.endswith("line 049999\n")
+        assert "truncated" in text and len(text) < 1300
+        assert cap.spill_path is not None
+        assert Path(cap.spill_path).read_bytes() == b"".join(lines)
+
+
+class TestStreamingHandle:
+    @pytest.mark.asyncio
+    async def test_large_output_reports_spill_file(self) -> None:
+        result = await handle("seq 1 200000")
+        assert result["exit_code"] == 0
+        assert result["stdout"].startswith("1\n2\n")
+        assert result["stdout"].endswith("199999\n200000\n")
+        assert result["stdout_bytes"] == len("".join(f"{i}\n" for i in range(1, 200_001)))
+        assert Path(result["stdout_file"]).read_text().splitlines()[-1] == "200000"
+        assert "stderr_file" not in result
+
+    @pytest.mark.asyncio
+    async def test_progress_arrives_before_the_command_ends(self) -> None:
+        seen: list[tuple[float, str, str]] = []
+        start = time.monotonic()
+
+        async def _on_output(stream: str, text: str) -> None:
+            seen.append((time.monotonic() - start, stream, text))
+
+        result = await handle("echo first; sleep 0.6; echo second >&2", _output_callback=_on_output)
+        elapsed = time.monotonic() - start
+
+        assert result["stdout"] == "first\n" and result["stderr"] == "second\n"
+        first = next(t for t, stream, text in seen if "first" in text)
+        assert first < elapsed - 0.3
+        assert ("stderr", "second\n") in [(stream, text) for _, stream, text in seen]
+
+    @pytest.mark.asyncio
+    async def test_failing_callback_does_not_break_the_command(self) -> None:
+        def _broken(stream: str, text: str) -> None:
+            raise RuntimeError("renderer gone")
+
+        result = await handle("echo ok", _output_callback=_broken)
+        assert result == {"stdout": "ok\n", "stderr": "", "exit_code": 0}
+
+    @pytest.mark.asyncio
+    async def test_timeout_kills_and_keeps_partial_output(self) -> None:
+        result = await handle("echo partial; sleep 10", timeout=1)
+        assert result["exit_code"] == -1
+        assert "timed out after 1s" in result["error"]
+        assert result["stdout"] == "partial\n"
+
+    @pytest.mark.asyncio
+    async def test_cancellation_kills_the_process(self, tmp_path: Path) -> None:
+        marker = tmp_path / "survived"
+        task = asyncio.create_task(handle(f"sleep 1 && touch {marker}"))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(1.2)
+        assert not marker.exists()
+
+
+class TestKeepaliveSideEvents:
+    @pytest.mark.asyncio
+    async def test_tool_output_is_yielded_while_generator_blocks(self) -> None:
+        from anteroom.routers.chat import _with_keepalive
+
+        queue: asyncio.Queue[dict[str, str]] = asyncio.Queue()
+
+        async def _gen():
+            await queue.put({"id": "call_1", "stream": "stdout", "text": "building\n"})
+            await asyncio.sleep(0.05)
+            yield "done"
+
+        events = [e async for e in _with_keepalive(_gen(), interval=10, side_events=queue)]
+
+        assert events[0]["event"] == "tool_output"
+        assert '"building\\n"' in events[0]["data"]
+        assert events[-1] == "done"
@@ -26,6 +26,8 @@ from anteroom.services.codebase_index import (
     _parse_file,
     _rank_files,
     create_index_service,
+    index_cache_dir,
+    resolve_index_workers,
 )
 
 
@@ -404,6 +406,246 @@ class TestCodebaseIndexService:
         assert result == ""
 
 
+def _fake_parse(calls: list[str]) -> Any:
+    """Stand-in for _parse_file that records which files were parsed."""
+
+    def _parse(file_path: Path, root: Path, language: str, parser: Any, ts_language: Any) -> FileSymbols:
+        calls.append(file_path.name)
+        st = file_path.stat()
+        return FileSymbols(
+            path=str(file_path.relative_to(root)),
+            language=language,
+            symbols=[SymbolInfo(name=file_path.stem, kind="function", signature=f"def {file_path.stem}():")],
+            mtime=st.st_mtime,
+            size=st.st_size,
+        )
+
+    return _parse
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    root = tmp_path / "proj"
+    root.mkdir()
+    (root / "pyproject.toml").write_text("")
+    (root / "a.py").write_text("def a(): pass\n")
+    (root / "b.py").write_text("def b(): pass\n")
+    return root
+
+
+def _service(**kwargs: Any) -> CodebaseIndexService:
+    service = CodebaseIndexService(**kwargs)
+    service._available = True
+    service._parser = MagicMock()
+    service._lang_cache["python"] = MagicMock()
+    return service
+
+
+class TestPersistentIndex:
+    def test_warm_scan_skips_walk(self, project: Path) -> None:
+        calls: list[str] = []
+        service = _service()
+        with patch("anteroom.services.codebase_index._parse_file", side_effect=_fake_parse(calls)):
+            first = service.scan(str(project))
+            with patch("anteroom.services.codebase_index.os.walk") as walk:
+                second = service.scan(str(project))
+        walk.assert_not_called()
+        assert second is first
+        assert sorted(calls) == ["a.py", "b.py"]
+
+    def test_notify_changed_reparses_only_that_file(self, project: Path) -> None:
+        calls: list[str] = []
+        service = _service()
+        with patch("anteroom.services.codebase_index._parse_file", side_effect=_fake_parse(calls)):
+            service.scan(str(project))
+            calls.clear()
+            (project / "a.py").write_text("def a(): return 1\n")
+            (project / "c.py").write_text("def c(): pass\n")
+            service.notify_changed([str(project / "a.py"), str(project / "c.py"), "/elsewhere/x.py"])
+            cmap = service.scan(str(project))
+        assert sorted(calls) == ["a.py", "c.py"]
+        assert cmap.reparsed == 2
+        assert sorted(f.path for f in cmap.files) == ["a.py", "b.py", "c.py"]
+
+    def test_notify_deleted_file_drops_it(self, project: Path) -> None:
+        service = _service()
+        with patch("anteroom.services.codebase_index._parse_file", side_effect=_fake_parse([])):
+            service.scan(str(project))
+            (project / "b.py").unlink()
+            service.notify_changed([str(project / "b.py")])
+            cmap = service.scan(str(project))
+        assert [f.path for f in cmap.files] == ["a.py"]
+
+    def test_unknown_changes_revalidate_by_stat(self, project: Path) -> None:
+        calls: list[str] = []
+        service = _service()
+        with patch("anteroom.services.codebase_index._parse_file", side_effect=_fake_parse(calls)):
+            service.scan(str(project))
+            calls.clear()
+            (project / "b.py").write_text("def b(): return 'changed size'\n")
+            service.notify_changed(None)
+            cmap = service.scan(str(project))
+        assert calls == ["b.py"]
+        assert cmap.reparsed == 1
+
+    def test_refresh_interval_zero_always_walks(self, project: Path) -> None:
+        calls: list[str] = []
+        service = _service(refresh_interval=0)
+        with patch("anteroom.services.codebase_index._parse_file", side_effect=_fake_parse(calls)):
+            service.scan(str(project))
+            (project / "d.py").write_text("def d(): pass\n")
+            cmap = service.scan(str(project))
+        assert "d.py" in [f.path for f in cmap.files]
+        assert sorted(calls) == ["a.py", "b.py", "d.py"]
+
+    def test_symbols_persist_across_services(self, project: Path, tmp_path: Path) -> None:
+        cache_dir = tmp_path / "cache"
+        with patch("anteroom.services.codebase_index._parse_file", side_effect=_fake_parse([])):
+            _service(cache_dir=cache_dir).scan(str(project))
+        assert list(cache_dir.glob("*.json"))
+
+        calls: list[str] = []
+        with patch("anteroom.services.codebase_index._parse_file", side_effect=_fake_parse(calls)):
+            cmap = _service(cache_dir=cache_dir).scan(str(project))
+        assert calls == []
+        assert {f.path: f.symbols[0].name for f in cmap.files} == {"a.py": "a", "b.py": "b"}
+
+    def test_grammar_change_invalidates_disk_cache(self, project: Path, tmp_path: Path) -> None:
+        cache_dir = tmp_path / "cache"
+        with patch("anteroom.services.codebase_index._parse_file", side_effect=_fake_parse([])):
+            _service(cache_dir=cache_dir).scan(str(project))
+
+        calls: list[str] = []
+        with (
+            patch("anteroom.services.codebase_index._grammar_version", return_value="other"),
+            patch("anteroom.services.codebase_index._parse_file", side_effect=_fake_parse(calls)),
+        ):
+            _service(cache_dir=cache_dir).scan(str(project))
+        assert sorted(calls) == ["a.py", "b.py"]
+
+    def test_corrupt_disk_cache_is_ignored(self, project: Path, tmp_path: Path) -> None:
+        cache_dir = tmp_path / "cache"
+        service = _service(cache_dir=cache_dir)
+        path = service._cache_path(project.resolve())
+        assert path is not None
+        path.parent.mkdir(parents=True)
+        path.write_text("{not json")
+        with patch("anteroom.services.codebase_index._parse_file", side_effect=_fake_parse([])):
+            cmap = service.scan(str(project))
+        assert len(cmap.files) == 2
+
+    def test_get_map_reuses_formatted_output(self, project: Path) -> None:
+        service = _service()
+        with patch("anteroom.services.codebase_index._parse_file", side_effect=_fake_parse([])):
+            first = service.get_map(str(project), token_budget=500)
+            with patch.object(service, "format_map", wraps=service.format_map) as fmt:
+                assert service.get_map(str(project), token_budget=500) == first
+                fmt.assert_not_called()
+                service.get_map(str(project), token_budget=50)
+                fmt.assert_called_once()
+
+    def test_index_cache_dir(self, tmp_path: Path) -> None:
+        config = MagicMock()
+        config.app.data_dir = tmp_path
+        config.codebase_index.persist_cache = True
+        assert index_cache_dir(config) == tmp_path / "cache" / "codebase_index"
+        config.codebase_index.persist_cache = False
+        assert index_cache_dir(config) is None
+
+
+def _many_files(root: Path, count: int) -> None:
+    for i in range(count):
+        pkg = root / f"pkg{i % 5}"
+        pkg.mkdir(exist_ok=True)
+        (pkg / f"mod{i}.py").write_text(f"def f{i}(): pass\n")
+
+
+class TestParallelScan:
+    def test_process_pool_matches_serial_and_is_deterministic(self, project: Path) -> None:
+        _many_files(project, 40)
+        serial = _service(workers=1).scan(str(project))
+        with (
+            patch("anteroom.services.codebase_index._PARALLEL_MIN_FILES", 10),
+            patch("anteroom.services.codebase_index._SHARD_SIZE", 7),
+        ):
+            first = _service(workers=2).scan(str(project))
+            second = _service(workers=2).scan(str(project))
+        # Workers here have no tree-sitter, so they emit filename-only entries.
+        assert [f.path for f in first.files] == [f.path for f in second.files]
+        assert sorted(f.path for f in first.files) == sorted(f.path for f in serial.files)
+        assert first.reparsed == 42
+        assert first.partial is False
+
+    def test_serial_budget_yields_partial_map_then_resumes(self, project: Path) -> None:
+        _many_files(project, 10)
+        calls: list[str] = []
+        parse = _fake_parse(calls)
+
+        def _slow(*args: Any) -> FileSymbols:
+            import time
+
+            time.sleep(0.02)
+            return parse(*args)
+
+        service = _service(scan_budget=0.05)
+        with patch("anteroom.services.codebase_index._parse_file", side_effect=_slow):
+            first = service.scan(str(project))
+            assert first.partial is True
+            assert len(first.files) == 12  # unparsed files are still listed
+            assert "partial" in service.format_map(first)
+            parsed_first = len(calls)
+
+            service._scan_budget = 0.0
+            second = service.scan(str(project))
+        assert second.partial is False
+        assert second.reparsed == 12 - parsed_first
+        assert len(calls) == 12
+
+    def test_pool_timeout_cancels_outstanding_shards(self, project: Path) -> None:
+        _many_files(project, 20)
+        with (
+            patch("anteroom.services.codebase_index._PARALLEL_MIN_FILES", 5),
+            patch(
+                "anteroom.services.codebase_index.wait",
+                side_effect=lambda fs, timeout=None, return_when=None: (set(), set(fs)),
+            ),
+        ):
+            cmap = _service(workers=2, scan_budget=1.0).scan(str(project))
+        assert cmap.partial is True
+        assert cmap.reparsed == 0
+        assert len(cmap.files) == 22
+
+    def test_failed_worker_shard_parsed_in_process(self, project: Path) -> None:
+        from concurrent.futures import Future
+
+        class _BrokenPool:
+            def __init__(self, *args: Any, **kwargs: Any) -> None:
+                pass
+
+            def submit(self, fn: Any, *args: Any) -> Future:
+                fut: Future = Future()
+                fut.set_exception(RuntimeError("worker died"))
+                return fut
+
+            def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+                pass
+
+        _many_files(project, 10)
+        calls: list[str] = []
+        with (
+            patch("anteroom.services.codebase_index._PARALLEL_MIN_FILES", 5),
+            patch("anteroom.services.codebase_index.ProcessPoolExecutor", _BrokenPool),
+            patch("anteroom.services.codebase_index._parse_file", side_effect=_fake_parse(calls)),
+        ):
+            cmap = _service(workers=2).scan(str(project))
+        assert cmap.partial is False
+        assert len(calls) == 12
+
+    def test_resolve_index_workers(self) -> None:
+        assert resolve_index_workers(3) == 3
+        assert 1 <= resolve_index_workers(0) <= 8
+
+
 class TestCreateIndexService:
     def test_returns_service_when_enabled(self) -> None:
         config = MagicMock()
@@ -663,6 +663,52 @@ class TestCliConfig:
         config, _ = load_config(cfg)
         assert config.cli.skills.auto_invoke is True
 
+    def test_compaction_from_yaml_is_clamped(self, tmp_path: Path) -> None:
+        cfg = _write_config(
+            tmp_path,
+            {
+                "ai": {"base_url": "http://t", "api_key": "k"},
+                "cli": {
+                    "compaction": {
+                        "enabled": False,
+                        "soft_threshold": 0.7,
+                        "hard_threshold": 0.5,
+                        "keep_recent_messages": 1,
+                        "summary_max_tokens": "bad",
+                    }
+                },
+            },
+        )
+        config, _ = load_config(cfg)
+        comp = config.cli.compaction
+        assert comp.enabled is False
+        assert comp.soft_threshold == 0.7
+        assert comp.hard_threshold == 0.7  # never below the soft threshold
+        assert comp.keep_recent_messages == 2
+        assert comp.summary_max_tokens == 1000
+
+    def test_tool_concurrency_from_yaml_is_clamped(self, tmp_path: Path) -> None:
+        cfg = _write_config(
+            tmp_path,
+            {
+                "ai": {"base_url": "http://t", "api_key": "k"},
+                "cli": {
+                    "tool_concurrency": {
+                        "max_parallel": 1000,
+                        "bash": 0,
+                        "mcp_per_server": "bad",
+                        "tool_limits": {"run_agent": 2, "broken": "x"},
+                    }
+                },
+            },
+        )
+        config, _ = load_config(cfg)
+        cc = config.cli.tool_concurrency
+        assert cc.max_parallel == 256
+        assert cc.bash == 1
+        assert cc.mcp_per_server == 4
+        assert cc.tool_limits == {"run_agent": 2}
+
 
 # ---------------------------------------------------------------------------
 # Usage config (lines 1199-1224)
@@ -981,6 +1027,12 @@ class TestBashSandboxConfig:
         config, _ = load_config(cfg)
         assert config.safety.bash.timeout == 120
 
+    def test_bash_shell_max_sessions(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        assert load_config(_minimal(tmp_path))[0].safety.bash.shell_max_sessions == 32
+        monkeypatch.setenv("AI_CHAT_BASH_SHELL_MAX_SESSIONS", "0")
+        config, _ = load_config(_minimal(tmp_path))
+        assert config.safety.bash.shell_max_sessions == 1
+
     def test_bash_max_output_env_var(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
         monkeypatch.setenv("AI_CHAT_BASH_MAX_OUTPUT", "50000")
         cfg = _minimal(tmp_path)
@@ -2103,6 +2155,27 @@ class TestCodebaseIndexConfig:
         config, _ = load_config(cfg)
         assert config.codebase_index.enabled is True
         assert config.codebase_index.map_tokens == 1000
+        assert config.codebase_index.persist_cache is True
+        assert config.codebase_index.refresh_interval == 30
+
+    def test_ci_cache_settings(self, tmp_path: Path) -> None:
+        cfg = _write_config(
+            tmp_path,
+            {
+                "ai": {"base_url": "http://t", "api_key": "k"},
+                "codebase_index": {
+                    "persist_cache": False,
+                    "refresh_interval": 120,
+                    "parallel_workers": 4,
+                    "scan_budget": 2.5,
+                },
+            },
+        )
+        config, _ = load_config(cfg)
+        assert config.codebase_index.persist_cache is False
+        assert config.codebase_index.refresh_interval == 120
+        assert config.codebase_index.parallel_workers == 4
+        assert config.codebase_index.scan_budget == 2.5
 
     def test_ci_from_yaml(self, tmp_path: Path) -> None:
         cfg = _write_config(
@@ -311,6 +311,13 @@ class TestProxyOriginValidation:
         assert result.has_warnings
 
 
+class TestToolLimitValidation:
+    def test_uncapped_tool_warning(self) -> None:
+        result = validate_config({"cli": {"tool_concurrency": {"tool_limits": {"run_agent": 2, "grep": 2}}}})
+        assert result.is_valid
+        assert [e.path for e in result.errors] == ["cli.tool_concurrency.tool_limits.run_agent"]
+
+
 class TestComplexConfig:
     def test_full_valid_config(self) -> None:
         raw = {
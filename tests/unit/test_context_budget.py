@@ -0,0 +1,275 @@
+"""Tests for the per-request context budget (services/context_budget.py)."""
+
+from __future__ import annotations
+
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from anteroom.services.context_budget import (
+    SECTION_MINIMUMS,
+    ContextBudget,
+    UsefulnessTracker,
+    budget_for,
+    split_pool,
+)
+from anteroom.services.rag import RetrievedChunk, _trim_to_budget
+from anteroom.services.token_counter import TokenCounter
+
+
+def _counter() -> TokenCounter:
+    return TokenCounter()
+
+
+class TestSplitPool:
+    def test_everything_fits(self) -> None:
+        assert split_pool(10_000, {"a": 100, "b": 200}, {"a": 1.0, "b": 1.0}) == {"a": 100, "b": 200}
+
+    def test_split_by_weight_when_tight(self) -> None:
+        budgets = split_pool(300, {"a": 1000, "b": 1000}, {"a": 2.0, "b": 1.0})
+        assert budgets == {"a": 200, "b": 100}
+
+    def test_small_demand_passes_surplus_on(self) -> None:
+        budgets = split_pool(1000, {"small": 100, "big": 5000}, {"small": 1.0, "big": 1.0})
+        assert budgets == {"small": 100, "big": 900}
+
+    def test_empty_pool_and_zero_demand(self) -> None:
+        assert split_pool(0, {"a": 100}, {"a": 1.0}) == {"a": 0}
+        assert split_pool(1000, {"a": 0, "b": 50}, {}) == {"a": 0, "b": 50}
+
+
+class TestUsefulnessTracker:
+    def test_unobserved_sections_get_neutral_weight(self) -> None:
+        assert UsefulnessTracker().weight("rag") == pytest.approx(1.0)
+
+    def test_sections_the_reply_draws_on_gain_weight(self) -> None:
+        tracker = UsefulnessTracker()
+        reply = "The retrieval pipeline reranks chunks before formatting citations for answers"
+        for _ in range(5):
+            tracker.observe(
+                {
+                    "rag": "retrieval pipeline reranks chunks formatting citations answers",
+                    "codebase_map": "src/anteroom/config.py dataclass AppConfig loader",
+                },
+                reply,
+            )
+        assert tracker.weight("rag") > 1.0 > tracker.weight("codebase_map")
+        assert 0.5 <= tracker.weight("codebase_map") and tracker.weight("rag") <= 1.5
+
+    def test_short_replies_and_empty_sections_are_ignored(self) -> None:
+        tracker = UsefulnessTracker()
+        tracker.observe({"rag": "anything at all here"}, "Thanks!")
+        tracker.observe({"canvas": ""}, "a reasonably detailed explanation about several unrelated topics")
+        assert tracker.snapshot() == {}
+
+
+class TestContextBudget:
+    def test_reserved_parts_shrink_the_pool(self) -> None:
+        budget = ContextBudget(10_000, _counter(), usefulness=UsefulnessTracker())
+        budget.reserve("output", 4000)
+        budget.reserve("history", 5000)
+        budgets = budget.allocate({"sources": 5000, "rag": 5000})
+        assert sum(budgets.values()) <= 1000
+        assert budgets["sources"] > budgets["rag"]
+
+    def test_overfull_history_leaves_nothing(self) -> None:
+        budget = ContextBudget(1000, _counter(), usefulness=UsefulnessTracker())
+        budget.reserve("history", 5000)
+        assert budget.available == 0
+        assert budget.allocate({"rag": 2000}) == {"rag": 0}
+
+    def test_attached_sources_keep_a_minimum(self) -> None:
+        budget = ContextBudget(1000, _counter(), usefulness=UsefulnessTracker())
+        budget.reserve("history", 5000)
+        assert budget.allocate({"sources": 5000, "rag": 2000}) == {"sources": SECTION_MINIMUMS["sources"], "rag": 0}
+        assert budget.allocate({"sources": 300})["sources"] == 300
+
+    def test_history_near_the_window_is_reserved_at_the_soft_limit(self) -> None:
+        budget = ContextBudget(16_000, _counter(), usefulness=UsefulnessTracker())
+        budget.reserve("output", 2000)
+        budget.reserve_history(15_500, soft_limit=9000)
+        assert budget.reserved["history"] == 9000
+        budgets = budget.allocate({"sources": 4000, "rag": 2000})
+        assert budgets["rag"] > 0
+        assert 16_000 - 2000 - 9000 - 2 <= sum(budgets.values()) <= 16_000 - 2000 - 9000
+
+    def test_allocation_reports_used_tokens(self) -> None:
+        counter = _counter()
+        budget = ContextBudget(8000, counter, usefulness=UsefulnessTracker())
+        budget.reserve("output", 1000)
+        budget.allocate({"canvas": 500})
+        budget.record("canvas", "some canvas text " * 10)
+        report = budget.allocation()
+        assert report["window"] == 8000
+        assert report["reserved"] == {"output": 1000}
+        assert report["budgets"] == {"canvas": 500}
+        assert report["used"]["canvas"] == counter.count_text("some canvas text " * 10)
+        assert report["free"] == 8000 - 1000 - report["used"]["canvas"]
+
+    def test_observe_reply_scores_recorded_sections(self) -> None:
+        tracker = UsefulnessTracker()
+        budget = ContextBudget(8000, _counter(), usefulness=tracker)
+        budget.record("sources", "quarterly revenue forecast spreadsheet assumptions")
+        budget.observe_reply("The quarterly revenue forecast relies on spreadsheet assumptions about churn")
+        assert tracker.weight("sources") > 1.0
+
+
+class TestBudgetFor:
+    def test_disabled(self) -> None:
+        config = SimpleNamespace(cli=SimpleNamespace(context_budget=False, model_context_window=128_000))
+        assert budget_for(config, _counter()) is None
+
+    def test_reserves_reply(self) -> None:
+        config = SimpleNamespace(
+            cli=SimpleNamespace(context_budget=True, model_context_window=32_000),
+            ai=SimpleNamespace(max_output_tokens=4096),
+        )
+        budget = budget_for(config, _counter())
+        assert budget is not None
+        assert budget.window == 32_000
+        assert budget.available == 32_000 - 4096
+
+    def test_mock_config_is_ignored(self) -> None:
+        assert budget_for(MagicMock(), _counter()) is None
+
+
+class TestTokenFitting:
+    def test_truncate(self) -> None:
+        counter = _counter()
+        text = "alpha beta gamma delta " * 50
+        fitted = counter.truncate(text, 20)
+        assert text.startswith(fitted)
+        assert counter.count_text(fitted) <= 20
+        assert counter.truncate("short", 100) == "short"
+        assert counter.truncate(text, 0) == ""
+
+    def test_rag_trim_counts_tokens(self) -> None:
+        counter = _counter()
+        chunks = [
+            RetrievedChunk(content="first chunk " * 20, source_type="message", source_label="a", distance=0.1),
+            RetrievedChunk(content="second chunk " * 20, source_type="message", source_label="b", distance=0.2),
+        ]
+        first = counter.count_text(chunks[0].content)
+        assert _trim_to_budget(chunks, first, counter) == chunks[:1]
+        assert _trim_to_budget(chunks, 10_000, counter) == chunks
+        assert _trim_to_budget(chunks, first - 1, counter) == []
+
+
+class TestSystemPromptWithBudget:
+    async def _build(
+        self,
+        budget: ContextBudget,
+        *,
+        canvas: str,
+        rag_max_tokens: int = 2000,
+        sources: list[dict] | None = None,
+    ) -> tuple[str, dict]:
+        from anteroom.routers.chat import _build_chat_system_prompt
+
+        ai_service = MagicMock()
+        ai_service.config.model = "gpt-4o"
+        ai_service.config.system_prompt = "You are helpful."
+        tool_registry = MagicMock()
+        tool_registry.list_tools.return_value = []
+        tool_registry._working_dir = "/tmp"
+        mcp_manager = MagicMock()
+        mcp_manager.get_server_statuses.return_value = []
+        config = MagicMock()
+        config.app.tls = False
+        config.codebase_index.enabled = True
+        config.codebase_index.map_tokens = 1000
+        config.rag = SimpleNamespace(enabled=True, retrieval_mode="keyword", max_tokens=rag_max_tokens)
+        index_service = MagicMock()
+        index_service.get_map.return_value = "<codebase_index>map</codebase_index>"
+        self.index_service = index_service
+        self.retrieve = AsyncMock(return_value=([], "No matching results found"))
+
+        with (
+            patch("anteroom.routers.chat.build_runtime_context", return_value="RUNTIME_CTX"),
+            patch("anteroom.routers.chat.load_instructions", return_value=None),
+            patch("anteroom.routers.chat.storage") as mock_storage,
+            patch("anteroom.services.rag.retrieve_context", self.retrieve),
+        ):
+            mock_storage.get_canvas_for_conversation.return_value = {
+                "title": "Draft",
+                "language": "markdown",
+                "version": 1,
+                "content": canvas,
+            }
+            by_id = {src["id"]: src for src in sources or []}
+            mock_storage.get_source.side_effect = lambda _db, sid: by_id.get(sid)
+            return await _build_chat_system_prompt(
+                ai_service=ai_service,
+                tool_registry=tool_registry,
+                mcp_manager=mcp_manager,
+                config=config,
+                db=MagicMock(),
+                conversation_id=str(uuid.uuid4()),
+                plan_prompt="",
+                plan_mode=False,
+                message_text="how does the loader work?",
+                source_ids=list(by_id),
+                source_tag=None,
+                source_group_id=None,
+                index_service=index_service,
+                context_budget=budget,
+            )
+
+    @pytest.mark.asyncio
+    async def test_roomy_window_keeps_configured_caps(self) -> None:
+        budget = ContextBudget(128_000, _counter(), usefulness=UsefulnessTracker())
+        prompt, meta = await self._build(budget, canvas="# Notes\nshort canvas")
+
+        assert "short canvas" in prompt
+        assert self.index_service.get_map.call_args.kwargs["token_budget"] == 1000
+        assert self.retrieve.call_args.kwargs["max_tokens"] == 2000
+        allocation = meta["context_budget"]
+        assert allocation["reserved"]["system"] > 0
+        assert allocation["budgets"]["rag"] == 2000
+        assert allocation["used"]["canvas"] > 0
+
+    @pytest.mark.asyncio
+    async def test_tight_window_shrinks_flexible_sections(self) -> None:
+        counter = _counter()
+        budget = ContextBudget(4000, counter, usefulness=UsefulnessTracker())
+        budget.reserve("history", 2500)
+        canvas = "canvas line with content\n" * 400
+        prompt, meta = await self._build(budget, canvas=canvas)
+
+        allocation = meta["context_budget"]
+        budgets = allocation["budgets"]
+        assert sum(budgets.values()) <= budget.window - sum(allocation["reserved"].values())
+        assert budgets["canvas"] < counter.count_text(canvas)
+        assert "truncated" in prompt
+        assert self.index_service.get_map.call_args is None or (
+            self.index_service.get_map.call_args.kwargs["token_budget"] < 1000
+        )
+        if budgets["rag"] > 0:
+            assert self.retrieve.call_args.kwargs["max_tokens"] == budgets["rag"]
+
+    @pytest.mark.asyncio
+    async def test_no_room_skips_rag(self) -> None:
+        budget = ContextBudget(1000, _counter(), usefulness=UsefulnessTracker())
+        budget.reserve("history", 5000)
+        _prompt, meta = await self._build(budget, canvas="")
+
+        assert meta["rag_status"] == "no_budget"
+        self.retrieve.assert_not_called()
+        self.index_service.get_map.assert_not_called()
+        assert meta["context_budget"]["free"] < 0
+
+    @pytest.mark.asyncio
+    async def test_history_filling_the_window_keeps_attached_sources(self) -> None:
+        budget = ContextBudget(8000, _counter(), usefulness=UsefulnessTracker())
+        budget.reserve("output", 2000)
+        budget.reserve_history(40_000, soft_limit=7000)
+        source = {"id": "s1", "title": "Spec", "type": "text", "content": "requirement details " * 2000}
+        prompt, meta = await self._build(budget, canvas="", sources=[source])
+
+        assert meta["sources_attached"] == [{"id": "s1", "title": "Spec", "type": "text"}]
+        assert meta["sources_truncated"] is True
+        assert "requirement details" in prompt
+        assert meta["context_budget"]["budgets"]["sources"] == SECTION_MINIMUMS["sources"]
+        assert meta["rag_status"] == "no_budget"
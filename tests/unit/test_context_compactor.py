@@ -0,0 +1,246 @@
+"""Tests for token-budget context compaction (services/context_compactor.py).
+
+The harness drives ``run_agent_loop`` with a deterministic stub model: every
+call returns one tool call whose result is a large blob, so the history grows
+by a fixed amount per iteration.  The stub records the context size of every
+model call and whether a summary was in flight at the time.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+from anteroom.services.agent_loop import run_agent_loop
+from anteroom.services.context_compactor import (
+    SUMMARY_PREFIX,
+    CompactionPolicy,
+    ContextCompactor,
+    RollingSummary,
+    format_summary_message,
+)
+from anteroom.services.token_counter import TokenCounter
+
+
+class _CharCounter(TokenCounter):
+    """Deterministic 4-chars-per-token counter, independent of tiktoken data."""
+
+    def count_text(self, text: str) -> int:
+        return len(text) // 4
+
+
+class _StubModel:
+    def __init__(self, counter: TokenCounter, window: int, tool_turns: int) -> None:
+        self.config = SimpleNamespace(model="stub-model", provider="openai")
+        self._counter = counter
+        self._window = window
+        self._tool_turns = tool_turns
+        self.calls = 0
+        self.max_context = 0
+        self.summaries_started = 0
+        self.summaries_done = 0
+        self.calls_while_summarizing = 0
+        self.summary_prompts: list[str] = []
+
+    async def stream_chat(
+        self,
+        messages: list[dict[str, Any]],
+        tools: Any = None,
+        cancel_event: Any = None,
+        extra_system_prompt: Any = None,
+    ) -> Any:
+        self.calls += 1
+        used = self._counter.count_messages(messages)
+        self.max_context = max(self.max_context, used)
+        assert used <= self._window, f"context overflow: {used} > {self._window}"
+        if self.summaries_started > self.summaries_done:
+            self.calls_while_summarizing += 1
+        await asyncio.sleep(0)
+        if self.calls <= self._tool_turns:
+            yield {
+                "event": "tool_call",
+                "data": {"id": f"call_{self.calls}", "function_name": "read_file", "arguments": {"n": self.calls}},
+            }
+        else:
+            yield {"event": "token", "data": {"content": "all done"}}
+        yield {"event": "done", "data": {}}
+
+    async def complete(self, messages: list[dict[str, Any]], max_completion_tokens: int = 1000, **kwargs: Any) -> str:
+        """Summaries finish only after the next model call has started (or a blocking wait)."""
+        self.summaries_started += 1
+        self.summary_prompts.append(messages[0]["content"])
+        start = self.calls
+        for _ in range(50):
+            if self.calls > start:
+                break
+            await asyncio.sleep(0)
+        self.summaries_done += 1
+        return f"summary #{self.summaries_done}"
+
+
+async def _tool_executor(name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+    await asyncio.sleep(0)
+    return {"content": "x" * 2000}
+
+
+async def _drive(stub: _StubModel, messages: list[dict[str, Any]], compactor: ContextCompactor) -> list[Any]:
+    events = []
+    async for event in run_agent_loop(
+        ai_service=stub,  # type: ignore[arg-type]
+        messages=messages,
+        tool_executor=_tool_executor,
+        tools_openai=None,
+        max_iterations=100,
+        compactor=compactor,
+    ):
+        events.append(event)
+    return events
+
+
+def _policy() -> CompactionPolicy:
+    return CompactionPolicy(
+        context_window=8000, soft_threshold=0.5, hard_threshold=0.9, keep_recent_messages=4, summary_max_tokens=200
+    )
+
+
+class TestAgentLoopCompaction:
+    def test_background_summaries_keep_context_in_window_off_critical_path(self) -> None:
+        counter = _CharCounter()
+        stub = _StubModel(counter, window=8000, tool_turns=40)
+        compactor = ContextCompactor(stub, _policy(), counter=counter)
+        messages: list[dict[str, Any]] = [{"role": "user", "content": "start"}]
+
+        events = asyncio.run(_drive(stub, messages, compactor))
+
+        assert events[-1].kind == "done"
+        assert stub.max_context <= 8000
+        assert compactor.swaps >= 2
+        assert compactor.blocking_waits == 0
+        assert stub.calls_while_summarizing >= compactor.swaps
+        assert any(e.kind == "compaction" for e in events)
+        assert messages[0]["content"].startswith(SUMMARY_PREFIX)
+        # Later summaries fold the earlier one in rather than starting over
+        assert any("Running summary so far:\nsummary #1" in p for p in stub.summary_prompts)
+
+    def test_foreground_compaction_blocks_only_at_hard_limit(self) -> None:
+        counter = _CharCounter()
+        stub = _StubModel(counter, window=8000, tool_turns=40)
+        compactor = ContextCompactor(stub, _policy(), counter=counter, background=False)
+        messages: list[dict[str, Any]] = [{"role": "user", "content": "start"}]
+
+        asyncio.run(_drive(stub, messages, compactor))
+
+        assert stub.max_context <= 8000
+        assert compactor.background_runs == 0
+        assert compactor.blocking_waits >= 1
+        assert compactor.swaps == compactor.blocking_waits
+
+    def test_short_conversation_never_summarizes(self) -> None:
+        counter = _CharCounter()
+        stub = _StubModel(counter, window=8000, tool_turns=2)
+        compactor = ContextCompactor(stub, _policy(), counter=counter)
+        messages: list[dict[str, Any]] = [{"role": "user", "content": "start"}]
+
+        asyncio.run(_drive(stub, messages, compactor))
+
+        assert stub.summaries_started == 0
+        assert compactor.swaps == 0
+
+    def test_on_summary_receives_covered_span(self) -> None:
+        counter = _CharCounter()
+        stub = _StubModel(counter, window=8000, tool_turns=40)
+        persisted: list[tuple[RollingSummary, int]] = []
+        compactor = ContextCompactor(
+            stub, _policy(), counter=counter, on_summary=lambda s, span: persisted.append((s, len(span)))
+        )
+        messages: list[dict[str, Any]] = [{"role": "user", "content": "start"}]
+
+        asyncio.run(_drive(stub, messages, compactor))
+
+        assert persisted
+        covered = [s.covered_messages for s, _ in persisted]
+        assert covered == sorted(covered)
+        assert persisted[0][0].covered_messages == persisted[0][1]
+
+
+class TestContextCompactor:
+    def _messages(self, n: int) -> list[dict[str, Any]]:
+        msgs: list[dict[str, Any]] = []
+        for i in range(n):
+            msgs.append(
+                {
+                    "role": "assistant",
+                    "content": "",
+                    "tool_calls": [{"id": f"c{i}", "function": {"name": "read_file", "arguments": "{}"}}],
+                }
+            )
+            msgs.append({"role": "tool", "tool_call_id": f"c{i}", "content": "y" * 400})
+        return msgs
+
+    def test_span_never_splits_tool_results(self) -> None:
+        counter = _CharCounter()
+        compactor = ContextCompactor(SimpleNamespace(config=None), _policy(), counter=counter)
+        msgs = self._messages(10)
+        for target in (1, 150, 300, 700):
+            start, end = compactor._select_span(msgs, target)
+            assert start == 0
+            assert end < len(msgs)
+            assert msgs[end]["role"] != "tool"
+
+    def test_rewritten_list_discards_stale_summary(self) -> None:
+        counter = _CharCounter()
+
+        class _Model:
+            config = None
+
+            async def complete(self, messages: Any, max_completion_tokens: int = 1000, **kwargs: Any) -> str:
+                return "late summary"
+
+        async def _run() -> tuple[bool, list[dict[str, Any]]]:
+            compactor = ContextCompactor(_Model(), _policy(), counter=counter)
+            msgs = self._messages(40)
+            assert compactor.maybe_start(msgs)
+            msgs[:] = [{"role": "system", "content": "emergency"}]
+            await asyncio.sleep(0.01)
+            return compactor.apply_ready(msgs), msgs
+
+        applied, msgs = asyncio.run(_run())
+        assert applied is False
+        assert msgs == [{"role": "system", "content": "emergency"}]
+
+    def test_adopted_summary_is_folded_into_next_one(self) -> None:
+        counter = _CharCounter()
+        prompts: list[str] = []
+
+        class _Model:
+            config = None
+
+            async def complete(self, messages: Any, max_completion_tokens: int = 1000, **kwargs: Any) -> str:
+                prompts.append(messages[0]["content"])
+                return "newer"
+
+        async def _run() -> list[dict[str, Any]]:
+            compactor = ContextCompactor(_Model(), _policy(), counter=counter)
+            stored = RollingSummary(text="stored summary", covered_messages=12)
+            head = format_summary_message(stored)
+            msgs = [head, *self._messages(40)]
+            compactor.adopt(head, stored)
+            assert compactor.maybe_start(msgs)
+            await asyncio.sleep(0.01)
+            assert compactor.apply_ready(msgs)
+            return msgs
+
+        msgs = asyncio.run(_run())
+        assert "stored summary" in prompts[0]
+        assert "auto-compacted from" in msgs[0]["content"]
+        assert msgs[0]["content"].count(SUMMARY_PREFIX) == 1
+
+    def test_policy_from_config(self) -> None:
+        from anteroom.config import CliConfig, CompactionConfig
+
+        cli = CliConfig(model_context_window=50_000, compaction=CompactionConfig(soft_threshold=0.4))
+        policy = CompactionPolicy.from_config(SimpleNamespace(cli=cli))
+        assert policy.context_window == 50_000
+        assert policy.soft_limit == 20_000
+        assert policy.hard_limit == int(50_000 * 0.85)
@@ -394,6 +394,31 @@ class TestUUIDValidation:
         resp = client.delete("/api/conversations/not-a-uuid")
         assert resp.status_code == 400
 
+    def test_delete_conversation_closes_its_shell(self) -> None:
+        from anteroom.tools.shell_session import ShellSessionPool
+
+        app = _make_app()
+        pool = MagicMock(spec=ShellSessionPool)
+        app.state.shell_sessions = pool
+        conv_id = str(uuid.uuid4())
+        with patch("anteroom.routers.conversations.storage") as mock_storage:
+            mock_storage.delete_conversation.return_value = True
+            resp = TestClient(app).delete(f"/api/conversations/{conv_id}")
+        assert resp.status_code == 204
+        pool.close.assert_awaited_once_with(conv_id)
+
+    def test_delete_conversation_invalidates_response_cache(self) -> None:
+        app = _make_app()
+        conv_id = str(uuid.uuid4())
+        with (
+            patch("anteroom.routers.conversations.storage") as mock_storage,
+            patch("anteroom.routers.conversations.invalidate_response_cache") as invalidate,
+        ):
+            mock_storage.delete_conversation.return_value = True
+            resp = TestClient(app).delete(f"/api/conversations/{conv_id}")
+        assert resp.status_code == 204
+        invalidate.assert_called_once_with(app.state.config.app.data_dir)
+
     def test_patch_conversation_invalid_identifier(self) -> None:
         app = _make_app()
         client = TestClient(app)
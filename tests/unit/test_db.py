@@ -127,6 +127,11 @@ class TestInitDb:
             "total_tokens",
             "model",
             "metadata",
+            "content_tokens",
+            "token_encoding",
+            "cache_read_tokens",
+            "cache_write_tokens",
+            "hedge_tokens",
         }
 
     def test_creates_users_table(self) -> None:
@@ -0,0 +1,300 @@
+"""Tests for load balancing across ai.endpoints (services/endpoint_pool.py)."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from anteroom.config import AIConfig
+from anteroom.services import endpoint_pool
+from anteroom.services.ai_service import AIService
+from anteroom.services.endpoint_pool import EndpointPool, conversation_key
+from tests.unit.conftest import StubHTTPServer, StubRequest, completion_chunks, json_response, sse_response
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _replica(name: str, *, delay: float = 0.0, status: int = 200) -> StubHTTPServer:
+    """A streaming ``/v1/chat/completions`` stub with injectable latency and failures; replies with *name*."""
+
+    async def respond(request: StubRequest) -> AsyncIterator[bytes]:
+        await asyncio.sleep(delay)
+        if status != 200:
+            yield json_response({"error": {"message": "replica down", "type": "server_error"}}, status)
+        else:
+            yield sse_response(completion_chunks(name))
+
+    return StubHTTPServer(respond)
+
+
+def _config(*replicas: StubHTTPServer, **overrides: Any) -> AIConfig:
+    defaults: dict[str, Any] = {
+        "base_url": replicas[0].base_url,
+        "endpoints": [r.base_url for r in replicas[1:]],
+        "api_key": "k",
+        "model": "m",
+        "retry_max_attempts": 2,
+        "retry_backoff_base": 0.0,
+        "endpoint_failure_threshold": 2,
+    }
+    defaults.update(overrides)
+    return AIConfig(**defaults)
+
+
+async def _ask(service: AIService, text: str = "hi") -> str:
+    events = [e async for e in service.stream_chat([{"role": "user", "content": text}])]
+    return "".join(e["data"]["content"] for e in events if e["event"] == "token")
+
+
+@pytest.fixture(autouse=True)
+def _reset_pools():
+    endpoint_pool.reset_endpoint_pools()
+    yield
+    endpoint_pool.reset_endpoint_pools()
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self) -> None:
+        clock = _Clock()
+        pool = EndpointPool(["a", "b"], failure_threshold=2, cooldown=10, clock=clock)
+        pool.record_failure("a")
+        assert {e["endpoint"]: e["state"] for e in pool.snapshot()}["a"] == "closed"
+        pool.record_failure("a")
+        assert {e["endpoint"]: e["state"] for e in pool.snapshot()}["a"] == "open"
+        for _ in range(5):
+            assert pool.choose() == "b"
+            pool.release("b")
+
+    def test_success_resets_failure_count(self) -> None:
+        pool = EndpointPool(["a", "b"], failure_threshold=2)
+        pool.record_failure("a")
+        pool.record_success("a", 0.1)
+        pool.record_failure("a")
+        assert pool.snapshot()[0]["state"] == "closed"
+
+    def test_half_open_allows_one_probe(self) -> None:
+        clock = _Clock()
+        pool = EndpointPool(["a", "b"], failure_threshold=1, cooldown=10, clock=clock)
+        pool.record_failure("a")
+        pool.record_success("b", 5.0)  # b is slow, so a wins any comparison it is part of
+        clock.now += 10
+        assert pool.choose(exclude={"b"}) == "a"  # the probe
+        assert pool.choose(exclude={"b"}) == "b"  # no second probe while the first runs
+        pool.record_success("a", 0.1)
+        assert pool.snapshot()[0]["state"] == "closed"
+
+    def test_failed_probe_doubles_cooldown(self) -> None:
+        clock = _Clock()
+        pool = EndpointPool(["a", "b"], failure_threshold=1, cooldown=10, clock=clock)
+        pool.record_failure("a")
+        clock.now += 10
+        assert pool.choose(exclude={"b"}) == "a"
+        pool.record_failure("a")
+        pool.release("a")
+        clock.now += 10
+        assert pool.snapshot()[0]["state"] == "open"
+        clock.now += 10
+        assert pool.snapshot()[0]["state"] == "half_open"
+
+    def test_unfinished_probe_frees_the_slot(self) -> None:
+        clock = _Clock()
+        pool = EndpointPool(["a", "b"], failure_threshold=1, cooldown=10, clock=clock)
+        pool.record_failure("a")
+        clock.now += 10
+        assert pool.choose(exclude={"b"}) == "a"
+        pool.release("a")  # cancelled: no verdict
+        assert pool.choose(exclude={"b"}) == "a"
+
+    def test_all_open_uses_closest_to_probe(self) -> None:
+        clock = _Clock()
+        pool = EndpointPool(["a", "b"], failure_threshold=1, cooldown=10, clock=clock)
+        pool.record_failure("b")
+        clock.now += 5
+        pool.record_failure("a")
+        assert pool.choose() == "b"
+
+    def test_health_checks(self) -> None:
+        clock = _Clock()
+        pool = EndpointPool(["a", "b"], failure_threshold=2, cooldown=60, clock=clock)
+        pool.record_health("a", False)
+        pool.record_health("a", False)
+        assert pool.snapshot()[0]["state"] == "open"
+        pool.record_health("a", True)
+        assert pool.snapshot()[0]["state"] == "half_open"
+
+
+class TestSelection:
+    def test_prefers_lower_latency(self) -> None:
+        pool = EndpointPool(["slow", "fast"])
+        pool.record_success("slow", 2.0)
+        pool.record_success("fast", 0.2)
+        assert pool.choose() == "fast"
+
+    def test_prefers_fewer_outstanding(self) -> None:
+        pool = EndpointPool(["a", "b"])
+        pool.record_success("a", 0.5)
+        pool.record_success("b", 0.5)
+        first = pool.choose()
+        second = pool.choose()
+        assert {first, second} == {"a", "b"}
+        assert [e["outstanding"] for e in pool.snapshot()] == [1, 1]
+
+    def test_error_rate_penalty(self) -> None:
+        pool = EndpointPool(["a", "b"], failure_threshold=10)
+        pool.record_success("a", 0.5)
+        pool.record_success("b", 0.5)
+        pool.record_failure("a")
+        assert pool.choose() == "b"
+
+    def test_unmeasured_endpoint_is_explored(self) -> None:
+        pool = EndpointPool(["known", "new"])
+        pool.record_success("known", 0.2)
+        # Scored like the fastest endpoint rather than a pessimistic default
+        assert {pool.choose(), pool.choose()} == {"known", "new"}
+
+    def test_latency_is_ewma(self) -> None:
+        pool = EndpointPool(["a", "b"])
+        pool.record_success("a", 1.0)
+        pool.record_success("a", 2.0)
+        assert pool.snapshot()[0]["latency_ms"] == pytest.approx(1300.0)
+
+    def test_sticky_until_unhealthy(self) -> None:
+        pool = EndpointPool(["a", "b"], failure_threshold=1)
+        pool.record_success("a", 0.1)
+        pool.record_success("b", 5.0)
+        assert pool.choose("conv") == "a"
+        pool.release("a")
+        pool.record_success("a", 9.0)  # a is slower now, but the conversation stays
+        assert pool.choose("conv") == "a"
+        pool.release("a")
+        pool.record_failure("a")
+        assert pool.choose("conv") == "b"
+        pool.release("b")
+        pool.record_success("a", 0.01)
+        assert pool.choose("conv") == "b"
+
+    def test_exclude_avoids_failed_endpoint(self) -> None:
+        pool = EndpointPool(["a", "b"])
+        pool.record_success("a", 0.1)
+        pool.record_success("b", 5.0)
+        assert pool.choose("conv", exclude={"a"}) == "b"
+        assert pool.choose(exclude={"a", "b"}) in {"a", "b"}
+
+    def test_conversation_key(self) -> None:
+        first = [{"role": "user", "content": "plan a trip"}]
+        later = first + [{"role": "assistant", "content": "sure"}, {"role": "user", "content": "to Rome"}]
+        assert conversation_key(first) == conversation_key(later)
+        assert conversation_key([{"role": "user", "content": "other"}]) != conversation_key(first)
+        assert conversation_key([{"role": "assistant", "content": "x"}]) is None
+
+
+class TestService:
+    @pytest.mark.asyncio
+    async def test_failing_replica_is_skipped(self) -> None:
+        async with _replica("down", status=503) as down, _replica("up") as up:
+            service = AIService(_config(down, up, endpoint_sticky=False))
+            assert service._endpoint_pool is not None
+            service._endpoint_pool.record_success(down.base_url, 0.001)  # looks best until it fails
+            answers = [await _ask(service, f"q{i}") for i in range(8)]
+        assert answers == ["up"] * 8
+        # Two failed attempts open the circuit; after that the broken replica gets no traffic
+        stats = {e["endpoint"]: e for e in endpoint_pool.endpoint_stats()}
+        assert stats[down.base_url.split("/")[2]]["state"] == "open"
+        assert stats[down.base_url.split("/")[2]]["errors"] == 2
+        assert stats[up.base_url.split("/")[2]]["requests"] == 8
+
+    @pytest.mark.asyncio
+    async def test_traffic_follows_latency(self) -> None:
+        async with _replica("slow", delay=0.3) as slow, _replica("fast") as fast:
+            service = AIService(_config(slow, fast, endpoint_sticky=False))
+            await asyncio.gather(*(_ask(service, f"warm{i}") for i in range(4)))
+            for i in range(10):
+                await _ask(service, f"q{i}")
+        assert len(fast.requests) > len(slow.requests)
+        assert len(slow.requests) <= 3
+
+    @pytest.mark.asyncio
+    async def test_conversation_is_sticky(self) -> None:
+        async with _replica("r1") as r1, _replica("r2") as r2, _replica("r3") as r3:
+            service = AIService(_config(r1, r2, r3))
+            history = [{"role": "user", "content": "start"}]
+            seen = set()
+            for turn in range(6):
+                events = [e async for e in service.stream_chat(history)]
+                reply = "".join(e["data"]["content"] for e in events if e["event"] == "token")
+                seen.add(reply)
+                history += [{"role": "assistant", "content": reply}, {"role": "user", "content": f"more {turn}"}]
+        assert len(seen) == 1
+
+    @pytest.mark.asyncio
+    async def test_single_endpoint_has_no_pool(self) -> None:
+        async with _replica("only") as only:
+            service = AIService(_config(only))
+            assert service._endpoint_pool is None
+            assert await _ask(service) == "only"
+        assert endpoint_pool.endpoint_stats() == []
+
+    def test_blocked_endpoint_rejected(self) -> None:
+        config = AIConfig(
+            base_url="https://api.example.com/v1",
+            api_key="k",
+            endpoints=["https://other.example.net/v1"],
+            allowed_domains=["api.example.com"],
+        )
+        with pytest.raises(ValueError, match="Egress blocked"):
+            AIService(config)
+
+    @pytest.mark.asyncio
+    async def test_health_check_marks_unreachable(self) -> None:
+        async with _replica("up") as up:
+            config = _config(up, endpoint_failure_threshold=1)
+            config.endpoints = ["http://127.0.0.1:9/v1"]
+            pool = endpoint_pool.pool_for(config)
+            assert pool is not None
+            await pool.check_health(config)
+        states = [e["state"] for e in pool.snapshot()]
+        assert states == ["closed", "open"]
+
+
+class TestConfig:
+    def test_load_config_parses_endpoints(self, tmp_path: Path) -> None:
+        from anteroom.config import load_config
+
+        cfg_file = tmp_path / "config.yaml"
+        cfg_file.write_text(
+            "ai:\n  base_url: http://a:8000/v1\n  api_key: test\n"
+            "  endpoints:\n    - http://b:8000/v1\n    - http://a:8000/v1\n    - http://b:8000/v1\n"
+            "  endpoint_failure_threshold: 0\n  endpoint_cooldown: 5\n  endpoint_sticky: false\n"
+        )
+        config, _ = load_config(cfg_file)
+        assert config.ai.endpoints == ["http://b:8000/v1"]
+        assert config.ai.endpoint_failure_threshold == 1
+        assert config.ai.endpoint_cooldown == 5.0
+        assert config.ai.endpoint_sticky is False
+        assert endpoint_pool.endpoint_urls(config.ai) == ["http://a:8000/v1", "http://b:8000/v1"]
+
+    def test_routed_task_model_drops_endpoints(self) -> None:
+        from anteroom.config import TaskModelConfig
+        from anteroom.services.task_routing import routed_config
+
+        config = AIConfig(
+            base_url="http://a/v1",
+            api_key="k",
+            endpoints=["http://b/v1"],
+            task_models={
+                "title": TaskModelConfig(model="tiny", base_url="http://c/v1"),
+                "summarize": TaskModelConfig(model="mid"),
+            },
+        )
+        assert routed_config(config, "title").endpoints == []  # type: ignore[union-attr]
+        assert routed_config(config, "summarize").endpoints == ["http://b/v1"]  # type: ignore[union-attr]
@@ -0,0 +1,297 @@
+"""Tests for relevance-based history selection (services/history_selection.py)."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from anteroom.services import history_selection
+from anteroom.services.agent_loop import run_agent_loop
+from anteroom.services.context_compactor import CompactionPolicy, ContextCompactor
+from anteroom.services.history_selection import HistorySelector
+from anteroom.services.token_counter import TokenCounter
+
+_FILLER = [
+    "Let us plan the team offsite agenda and pick a venue near the river.",
+    "Draft a friendly reminder email about the quarterly expense reports.",
+    "Summarize the marketing newsletter ideas for the spring campaign.",
+    "Which pizza toppings should we order for the hackathon evening?",
+    "Rewrite the onboarding checklist so it reads more clearly.",
+    "Compare three note taking apps for personal journaling.",
+]
+
+
+def _turn(question: str, answer: str) -> list[dict[str, Any]]:
+    return [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+
+
+def _tool_turn(question: str, call_id: str, path: str, result: str) -> list[dict[str, Any]]:
+    return [
+        {"role": "user", "content": question},
+        {
+            "role": "assistant",
+            "content": "",
+            "tool_calls": [
+                {
+                    "id": call_id,
+                    "type": "function",
+                    "function": {"name": "read_file", "arguments": json.dumps({"path": path})},
+                }
+            ],
+        },
+        {"role": "tool", "tool_call_id": call_id, "content": result},
+        {"role": "assistant", "content": "Done reading."},
+    ]
+
+
+def _history() -> list[dict[str, Any]]:
+    messages: list[dict[str, Any]] = []
+    messages += _turn(
+        "Why is postgres replication lag growing on the standby database?",
+        "Replication lag grows when the standby replays WAL slower than the primary writes it.",
+    )
+    for i, text in enumerate(_FILLER * 3):
+        messages += _turn(f"{text} ({i})", "Here are some thoughts on that. " * 10)
+    messages += _turn("Now let us talk about something else entirely.", "Sure.")
+    messages += _turn("What should I cook tonight?", "Maybe pasta.")
+    messages += _turn("How do I reduce the postgres replication lag we discussed?", "")
+    messages.pop()  # the current request is the last user message
+    return messages
+
+
+def _selector(**kwargs: Any) -> HistorySelector:
+    return HistorySelector(TokenCounter(), recent_turns=2, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache() -> None:
+    history_selection.clear_embedding_cache()
+
+
+class TestSelect:
+    @pytest.mark.asyncio
+    async def test_fits_unchanged(self) -> None:
+        messages = _history()
+        assert await _selector().select(messages, 1_000_000) is messages
+
+    @pytest.mark.asyncio
+    async def test_keeps_recent_turns_and_relevant_old_turn(self) -> None:
+        messages = _history()
+        original = list(messages)
+        selector = _selector()
+
+        sent = await selector.select(messages, 300)
+
+        assert messages == original
+        # The note travels as user text: providers hoist system messages into the system prompt
+        assert sent[0]["role"] == "user" and sent[0]["content"].startswith("[") and "omitted" in sent[0]["content"]
+        assert not any(m["role"] == "system" for m in sent)
+        assert sent[-3:] == messages[-3:]
+        contents = [m["content"] for m in sent]
+        assert any("Replication lag grows" in c for c in contents)
+        assert TokenCounter().count_messages(sent) <= 300
+        assert selector.last_omitted > 0
+
+    @pytest.mark.asyncio
+    async def test_recent_turns_too_large_returns_messages(self) -> None:
+        messages = _history()
+        assert await _selector().select(messages, 20) is messages
+
+    @pytest.mark.asyncio
+    async def test_leading_system_messages_are_kept(self) -> None:
+        messages = [{"role": "system", "content": "Previous conversation summary: ..."}, *_history()]
+        sent = await _selector().select(messages, 300)
+        assert sent[0] is messages[0]
+        assert sent[1]["role"] == "user" and "omitted" in sent[1]["content"]
+
+    @pytest.mark.asyncio
+    async def test_note_before_an_assistant_block_is_its_own_user_message(self) -> None:
+        note = history_selection._with_note("[note]", [{"role": "assistant", "content": "a"}])
+        assert note == [{"role": "user", "content": "[note]"}, {"role": "assistant", "content": "a"}]
+
+    @pytest.mark.asyncio
+    async def test_tool_calls_stay_with_results(self) -> None:
+        messages: list[dict[str, Any]] = []
+        messages += _tool_turn("Open the config loader", "c1", "src/config.py", "def load_config(): ...")
+        for i, text in enumerate(_FILLER * 2):
+            messages += _turn(f"{text} ({i})", "Some answer text here. " * 10)
+        messages += _turn("Something unrelated", "ok")
+        messages += [{"role": "user", "content": "Why does load_config ignore the env override?"}]
+
+        sent = await _selector().select(messages, 250)
+
+        ids_called = {tc["id"] for m in sent for tc in m.get("tool_calls", [])}
+        ids_answered = {m["tool_call_id"] for m in sent if m.get("role") == "tool"}
+        assert ids_called == ids_answered
+        assert "c1" in ids_called
+
+    @pytest.mark.asyncio
+    async def test_tool_linkage_bonus(self) -> None:
+        counter = TokenCounter()
+        messages: list[dict[str, Any]] = []
+        messages += _tool_turn("and that", "c2", "src/other/thing.py", "contents " * 60)
+        messages += _tool_turn("look at this", "c1", "src/app/routes.py", "contents " * 60)
+        for i, text in enumerate(_FILLER):
+            messages += _turn(f"{text} ({i})", "Filler answer. " * 12)
+        recent = _tool_turn("now edit it", "c3", "src/app/routes.py", "ok")
+        recent += [{"role": "user", "content": "apply the same fix there"}]
+        messages += recent
+        c1_block = messages[5:7]  # the call and its result
+        note = counter.count_text(HistorySelector._note(99, 99)) + 4
+        budget = counter.count_messages(recent) + note + counter.count_messages(c1_block) + 2
+
+        sent = await HistorySelector(counter, recent_turns=2).select(messages, budget)
+
+        ids = {tc["id"] for m in sent for tc in m.get("tool_calls", [])}
+        assert "c1" in ids
+        assert "c2" not in ids
+
+    @pytest.mark.asyncio
+    async def test_term_overlap_is_normalized_by_block_size(self) -> None:
+        def block(text: str) -> history_selection._Block:
+            return history_selection._Block(start=0, end=1, text=text, tokens=10, anchors=set())
+
+        focused = block("Replication lag on the standby.")
+        sprawling = block("Replication lag on the standby. " + " ".join(f"topic{i}" for i in range(200)))
+
+        await _selector()._score([focused, sprawling], "Why is replication lag growing?", set())
+
+        assert focused.score > sprawling.score > 0
+
+
+class _Embeddings:
+    """Bag-of-topics embeddings: one dimension per keyword."""
+
+    model = "stub-embed"
+    _TOPICS = ("replication", "offsite", "expense", "newsletter", "pizza", "onboarding", "journaling", "cook")
+
+    def __init__(self, *, fail: bool = False) -> None:
+        self.fail = fail
+        self.embedded: list[str] = []
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float] | None]:
+        if self.fail:
+            raise RuntimeError("embedding endpoint down")
+        self.embedded += texts
+        return [[float(topic in t.lower()) for topic in self._TOPICS] + [0.1] for t in texts]
+
+
+class TestEmbeddings:
+    @pytest.mark.asyncio
+    async def test_ranks_by_embedding_and_caches(self) -> None:
+        embeddings = _Embeddings()
+        messages = _history()
+        selector = _selector(embedding_service=embeddings)
+
+        sent = await selector.select(messages, 300)
+        first_calls = len(embeddings.embedded)
+        await selector.select(messages, 300)
+
+        assert any("Replication lag grows" in m["content"] for m in sent)
+        assert first_calls > 0
+        assert len(embeddings.embedded) == first_calls
+
+    @pytest.mark.asyncio
+    async def test_embedding_failure_falls_back_to_terms(self) -> None:
+        sent = await _selector(embedding_service=_Embeddings(fail=True)).select(_history(), 300)
+        assert any("Replication lag grows" in m["content"] for m in sent)
+
+
+class TestAgentLoop:
+    def test_model_sees_selection_and_history_is_kept(self) -> None:
+        messages = _history()
+        original_len = len(messages)
+        seen: list[list[dict[str, Any]]] = []
+
+        class _Model:
+            config = SimpleNamespace(model="stub", provider="openai")
+
+            async def stream_chat(self, msgs: Any, **kwargs: Any) -> Any:
+                seen.append(list(msgs))
+                yield {"event": "token", "data": {"content": "Use a faster disk for the standby."}}
+                yield {"event": "done", "data": {}}
+
+        counter = TokenCounter()
+        compactor = ContextCompactor(
+            _Model(),
+            CompactionPolicy(context_window=500, soft_threshold=0.6, summary_max_tokens=100),
+            counter=counter,
+            background=False,
+        )
+
+        async def _executor(name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+            return {}
+
+        async def _run() -> None:
+            async for _ in run_agent_loop(
+                ai_service=_Model(),  # type: ignore[arg-type]
+                messages=messages,
+                tool_executor=_executor,
+                tools_openai=None,
+                compactor=compactor,
+                history_selector=HistorySelector(counter, recent_turns=2),
+            ):
+                pass
+
+        asyncio.run(_run())
+
+        assert len(seen) == 1
+        assert len(seen[0]) < original_len
+        assert any("Replication lag grows" in str(m["content"]) for m in seen[0])
+        # Nothing was summarized away
+        assert messages[0]["content"].startswith("Why is postgres replication lag")
+        assert compactor.swaps == 0
+
+    def test_narration_is_sent_the_selection(self) -> None:
+        messages = _history()
+        original_len = len(messages)
+        seen: list[list[dict[str, Any]]] = []
+
+        class _Model:
+            config = SimpleNamespace(model="stub", provider="openai")
+
+            async def stream_chat(self, msgs: Any, **kwargs: Any) -> Any:
+                seen.append(list(msgs))
+                if len(seen) == 1:
+                    yield {
+                        "event": "tool_call",
+                        "data": {"id": "n1", "function_name": "read_file", "arguments": {"path": "pg.conf"}},
+                    }
+                else:
+                    yield {"event": "token", "data": {"content": "Checked the standby config."}}
+                yield {"event": "done", "data": {}}
+
+        counter = TokenCounter()
+        compactor = ContextCompactor(
+            _Model(),
+            CompactionPolicy(context_window=500, soft_threshold=0.6, summary_max_tokens=100),
+            counter=counter,
+            background=False,
+        )
+
+        async def _executor(name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+            return {"content": "max_standby_streaming_delay = 30s"}
+
+        async def _run() -> None:
+            async for _ in run_agent_loop(
+                ai_service=_Model(),  # type: ignore[arg-type]
+                messages=messages,
+                tool_executor=_executor,
+                tools_openai=[{"type": "function", "function": {"name": "read_file", "parameters": {}}}],
+                compactor=compactor,
+                history_selector=HistorySelector(counter, recent_turns=2),
+                narration_cadence=1,
+            ):
+                pass
+
+        asyncio.run(_run())
+
+        narration = next(req for req in seen if "summarize your progress" in str(req[-1]["content"]))
+        assert len(narration) < original_len
+        assert any(m.get("tool_call_id") == "n1" for m in narration)
+        assert any("omitted" in str(m["content"]) for m in narration)
+        assert not any("summarize your progress" in str(m.get("content")) for m in messages)
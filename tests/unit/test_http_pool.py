@@ -0,0 +1,148 @@
+"""Tests for the process-wide shared httpx client registry."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+
+import pytest
+
+from anteroom.config import AIConfig
+from anteroom.services.http_pool import HttpClientRegistry
+from tests.unit.conftest import StubHTTPServer, StubRequest
+
+
+def _config(**overrides) -> AIConfig:
+    defaults = {"base_url": "http://127.0.0.1:9/v1", "api_key": "k", "model": "gpt-4"}
+    defaults.update(overrides)
+    return AIConfig(**defaults)
+
+
+class TestGet:
+    def test_no_running_loop_returns_unshared_client(self) -> None:
+        registry = HttpClientRegistry()
+        assert registry.get(_config()) is not registry.get(_config())
+        assert len(registry) == 0
+
+    @pytest.mark.asyncio
+    async def test_same_endpoint_shares_client(self) -> None:
+        registry = HttpClientRegistry()
+        a = registry.get(_config(base_url="http://127.0.0.1:9/v1"))
+        b = registry.get(_config(base_url="http://127.0.0.1:9/other"))
+        assert a is b
+        assert (registry.created, registry.reused) == (1, 1)
+        await registry.aclose()
+
+    @pytest.mark.asyncio
+    async def test_transport_settings_split_pools(self) -> None:
+        registry = HttpClientRegistry()
+        base = registry.get(_config())
+        assert registry.get(_config(verify_ssl=False)) is not base
+        assert registry.get(_config(base_url="http://127.0.0.1:10/v1")) is not base
+        assert registry.get(_config(http_max_connections=5, http_max_keepalive=5)) is not base
+        assert registry.get(_config(request_timeout=300)) is not base
+        await registry.aclose()
+        assert len(registry) == 0
+
+    @pytest.mark.asyncio
+    async def test_proxy_environment_is_part_of_the_key(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        registry = HttpClientRegistry()
+        base = registry.get(_config())
+        monkeypatch.setenv("HTTPS_PROXY", "http://proxy.internal:3128")
+        assert registry.get(_config()) is not base
+        await registry.aclose()
+
+    def test_clients_are_not_shared_across_event_loops(self) -> None:
+        registry = HttpClientRegistry()
+
+        async def _get():
+            return registry.get(_config())
+
+        first = asyncio.run(_get())
+        second = asyncio.run(_get())
+        assert first is not second
+        # The entry for the closed loop was pruned
+        assert len(registry) == 1
+
+    @pytest.mark.asyncio
+    async def test_pool_limits_applied(self) -> None:
+        registry = HttpClientRegistry()
+        client = registry.get(_config(http_max_connections=7, http_max_keepalive=3, http_keepalive_expiry=42))
+        pool = client._transport._pool
+        assert pool._max_connections == 7
+        assert pool._max_keepalive_connections == 3
+        assert pool._keepalive_expiry == 42.0
+        await registry.aclose()
+
+
+class TestRetire:
+    @pytest.mark.asyncio
+    async def test_retired_client_is_replaced_and_closed_after_grace(self) -> None:
+        registry = HttpClientRegistry(retire_grace=0.01)
+        old = registry.get(_config())
+        registry.retire(old)
+        new = registry.get(_config())
+        assert new is not old
+        assert not old.is_closed  # in-flight requests may still be using it
+        await asyncio.sleep(0.05)
+        assert old.is_closed
+        await registry.aclose()
+
+    @pytest.mark.asyncio
+    async def test_retiring_twice_keeps_the_grace_period(self) -> None:
+        """A second service on the same pool hitting the same error must not close it early."""
+        registry = HttpClientRegistry(retire_grace=0.05)
+        old = registry.get(_config())
+        other = registry.get(_config(base_url="http://127.0.0.1:10/v1"))
+        registry.retire(old)
+        registry.retire(old)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert not old.is_closed
+        assert registry.is_retired(old)
+        # Other endpoints keep their pool
+        assert not registry.is_retired(other)
+        assert registry.get(_config(base_url="http://127.0.0.1:10/v1")) is other
+        await asyncio.sleep(0.1)
+        assert old.is_closed
+        await registry.aclose()
+
+    @pytest.mark.asyncio
+    async def test_unregistered_client_closed_immediately(self) -> None:
+        registry = HttpClientRegistry()
+        client = HttpClientRegistry().get(_config())
+        registry.retire(client)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert client.is_closed
+
+
+class TestWarmup:
+    @pytest.mark.asyncio
+    async def test_warmup_opens_a_pooled_connection(self) -> None:
+        async def respond(request: StubRequest) -> AsyncIterator[bytes]:
+            yield b"HTTP/1.1 404 Not Found\r\ncontent-length: 0\r\n\r\n"
+
+        registry = HttpClientRegistry()
+        async with StubHTTPServer(respond) as stub:
+            config = _config(base_url=stub.base_url)
+            try:
+                assert await registry.warmup(config) is True
+                await registry.get(config).get(f"{stub.base_url}/models")
+                assert stub.connections == 1
+            finally:
+                await registry.aclose()
+
+    @pytest.mark.asyncio
+    async def test_warmup_respects_egress_allowlist(self) -> None:
+        registry = HttpClientRegistry()
+        config = _config(allowed_domains=["api.example.com"])
+        assert await registry.warmup(config) is False
+        assert len(registry) == 0
+
+    @pytest.mark.asyncio
+    async def test_warmup_skips_litellm_and_unreachable_hosts(self) -> None:
+        registry = HttpClientRegistry()
+        assert await registry.warmup(_config(provider="litellm")) is False
+        assert await registry.warmup(_config(connect_timeout=1)) is False
+        await registry.aclose()
@@ -13,6 +13,7 @@ from anteroom.cli.instructions import (
     estimate_tokens,
     find_project_instructions,
     find_project_instructions_path,
+    instructions_fingerprint,
 )
 
 
@@ -151,3 +152,41 @@ class TestDiscoverConventions:
         assert info.content == "hidden conventions"
         assert info.path is not None
         assert info.path.name == ".anteroom.md"
+
+
+class TestInstructionsFingerprint:
+    """The fingerprint must change exactly when load_instructions() output could."""
+
+    def test_stable_without_changes(self, tmp_path: Path):
+        (tmp_path / "ANTEROOM.md").write_text("rules")
+        with patch("anteroom.config._resolve_data_dir", return_value=tmp_path / "home"):
+            assert instructions_fingerprint(str(tmp_path)) == instructions_fingerprint(str(tmp_path))
+
+    def test_changes_when_file_edited(self, tmp_path: Path):
+        path = tmp_path / "ANTEROOM.md"
+        path.write_text("rules")
+        with patch("anteroom.config._resolve_data_dir", return_value=tmp_path / "home"):
+            before = instructions_fingerprint(str(tmp_path))
+            path.write_text("rules, but longer")
+            assert instructions_fingerprint(str(tmp_path)) != before
+
+    def test_changes_when_nearer_file_appears(self, tmp_path: Path):
+        (tmp_path / "ANTEROOM.md").write_text("parent")
+        child = tmp_path / "subdir"
+        child.mkdir()
+        with patch("anteroom.config._resolve_data_dir", return_value=tmp_path / "home"):
+            before = instructions_fingerprint(str(child))
+            (child / "ANTEROOM.md").write_text("child")
+            after = instructions_fingerprint(str(child))
+        assert before != after
+        assert after[1][0] == str((child / "ANTEROOM.md").resolve())
+
+    def test_includes_global_file(self, tmp_path: Path):
+        home = tmp_path / "home"
+        home.mkdir()
+        project = tmp_path / "project"
+        project.mkdir()
+        with patch("anteroom.config._resolve_data_dir", return_value=home):
+            before = instructions_fingerprint(str(project))
+            (home / "ANTEROOM.md").write_text("global")
+            assert instructions_fingerprint(str(project)) != before
@@ -0,0 +1,466 @@
+"""Tests for the durable background job queue (services/job_queue.py, services/job_storage.py)."""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from anteroom.db import init_db
+from anteroom.services import job_storage
+from anteroom.services.job_queue import JobQueue, JobType, PermanentJobError
+
+
+@pytest.fixture()
+def db(tmp_path: Path):
+    conn = init_db(tmp_path / "jobs.db")
+    yield conn
+    conn.close()
+
+
+@pytest.fixture()
+def no_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(JobType, "backoff", lambda self, attempt: 0.0)
+
+
+async def _drain(queue: JobQueue) -> None:
+    """Finish running jobs, then run jobs until nothing is due."""
+    await queue.join()
+    while await queue.run_once():
+        await queue.join()
+
+
+class TestExecution:
+    @pytest.mark.asyncio
+    async def test_job_runs_and_succeeds(self, db) -> None:
+        seen: list[dict[str, Any]] = []
+
+        async def handler(payload: dict[str, Any]) -> None:
+            seen.append(payload)
+
+        queue = JobQueue(db)
+        queue.register("echo", handler)
+        job_id = queue.enqueue("echo", {"n": 1})
+        await _drain(queue)
+
+        assert seen == [{"n": 1}]
+        job = job_storage.get_job(db, job_id)
+        assert job["status"] == "succeeded"
+        assert job["attempts"] == 1
+        assert job["lease_owner"] is None
+
+    def test_unknown_job_type_rejected(self, db) -> None:
+        with pytest.raises(ValueError, match="No handler"):
+            JobQueue(db).enqueue("missing")
+
+    @pytest.mark.asyncio
+    async def test_failure_is_retried_with_backoff(self, db) -> None:
+        calls = 0
+
+        async def flaky(payload: dict[str, Any]) -> None:
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise ConnectionError("upstream reset")
+
+        queue = JobQueue(db)
+        queue.register("flaky", flaky, backoff_base=60.0)
+        job_id = queue.enqueue("flaky")
+        await _drain(queue)
+
+        job = job_storage.get_job(db, job_id)
+        assert job["status"] == "queued"
+        assert job["last_error"] == "ConnectionError: upstream reset"
+        assert job["run_after"] > job["updated_at"]
+        assert await queue.run_once() == 0  # not due yet
+
+        db.execute("UPDATE jobs SET run_after = created_at WHERE id = ?", (job_id,))
+        db.commit()
+        await _drain(queue)
+        job = job_storage.get_job(db, job_id)
+        assert (job["status"], job["attempts"], job["last_error"]) == ("succeeded", 2, None)
+
+    @pytest.mark.asyncio
+    async def test_dead_lettered_after_max_attempts_and_retryable(self, db, no_backoff) -> None:
+        async def broken(payload: dict[str, Any]) -> None:
+            raise RuntimeError("boom")
+
+        queue = JobQueue(db, max_attempts=3)
+        queue.register("broken", broken)
+        job_id = queue.enqueue("broken")
+        await _drain(queue)
+
+        job = job_storage.get_job(db, job_id)
+        assert (job["status"], job["attempts"]) == ("dead", 3)
+        assert "boom" in job["last_error"]
+
+        retried = job_storage.retry_job(db, job_id)
+        assert (retried["status"], retried["attempts"]) == ("queued", 0)
+        assert job_storage.retry_job(db, job_id) is None  # only dead/cancelled jobs
+
+    @pytest.mark.asyncio
+    async def test_permanent_error_skips_retries(self, db) -> None:
+        async def handler(payload: dict[str, Any]) -> None:
+            raise PermanentJobError("bad api key")
+
+        queue = JobQueue(db)
+        queue.register("perm", handler)
+        job_id = queue.enqueue("perm")
+        await _drain(queue)
+        job = job_storage.get_job(db, job_id)
+        assert (job["status"], job["attempts"]) == ("dead", 1)
+
+    @pytest.mark.asyncio
+    async def test_timeout_counts_as_failure(self, db) -> None:
+        async def slow(payload: dict[str, Any]) -> None:
+            await asyncio.sleep(5)
+
+        queue = JobQueue(db)
+        queue.register("slow", slow, timeout=0.01, max_attempts=1)
+        job_id = queue.enqueue("slow")
+        await _drain(queue)
+        job = job_storage.get_job(db, job_id)
+        assert (job["status"], job["last_error"]) == ("dead", "Timed out")
+
+    @pytest.mark.asyncio
+    async def test_stored_errors_are_sanitized(self, db) -> None:
+        async def leaky(payload: dict[str, Any]) -> None:
+            raise RuntimeError("failed calling https://api.example.com with sk-abcdefghijklmnop")
+
+        queue = JobQueue(db)
+        queue.register("leaky", leaky, max_attempts=1)
+        job_id = queue.enqueue("leaky")
+        await _drain(queue)
+        error = job_storage.get_job(db, job_id)["last_error"]
+        assert "example.com" not in error
+        assert "sk-abcdefghijklmnop" not in error
+
+
+class TestScheduling:
+    @pytest.mark.asyncio
+    async def test_per_type_concurrency(self, db) -> None:
+        release = asyncio.Event()
+        started = 0
+
+        async def blocking(payload: dict[str, Any]) -> None:
+            nonlocal started
+            started += 1
+            await release.wait()
+
+        async def quick(payload: dict[str, Any]) -> None:
+            pass
+
+        queue = JobQueue(db)
+        queue.register("blocking", blocking, concurrency=2)
+        queue.register("quick", quick, concurrency=1)
+        for _ in range(5):
+            queue.enqueue("blocking")
+        queue.enqueue("quick")
+
+        assert await queue.run_once() == 3
+        for _ in range(100):
+            if started == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert started == 2
+        assert await queue.run_once() == 0
+        assert queue.stats()["worker"]["types"]["blocking"]["active"] == 2
+
+        release.set()
+        await _drain(queue)
+        assert started == 5
+
+    @pytest.mark.asyncio
+    async def test_lower_priority_value_runs_first(self, db) -> None:
+        order: list[str] = []
+
+        async def handler(payload: dict[str, Any]) -> None:
+            order.append(payload["name"])
+
+        queue = JobQueue(db)
+        queue.register("work", handler)
+        queue.enqueue("work", {"name": "background"}, priority=10)
+        queue.enqueue("work", {"name": "urgent"}, priority=0)
+        await _drain(queue)
+        assert order == ["urgent", "background"]
+
+    def test_dedupe_key_returns_active_job(self, db) -> None:
+        queue = JobQueue(db)
+        queue.register("work", AsyncMock())
+        first = queue.enqueue("work", dedupe_key="m1")
+        assert queue.enqueue("work", dedupe_key="m1") == first
+        assert queue.enqueue("work", dedupe_key="m2") != first
+
+    @pytest.mark.asyncio
+    async def test_delayed_job_waits(self, db) -> None:
+        handler = AsyncMock()
+        queue = JobQueue(db)
+        queue.register("later", handler)
+        queue.enqueue("later", delay=3600)
+        assert await queue.run_once() == 0
+        handler.assert_not_called()
+
+
+class TestLeases:
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_reclaimed(self, db) -> None:
+        handler = AsyncMock()
+        queue = JobQueue(db)
+        queue.register("work", handler)
+        job_id = queue.enqueue("work")
+
+        # A worker that died right after claiming the job
+        claimed = job_storage.claim_jobs(db, {"work": 1}, owner="dead-worker", lease_seconds=-1)
+        assert [j["id"] for j in claimed] == [job_id]
+
+        await _drain(queue)
+        handler.assert_awaited_once()
+        job = job_storage.get_job(db, job_id)
+        assert (job["status"], job["attempts"]) == ("succeeded", 2)
+
+    @pytest.mark.asyncio
+    async def test_live_lease_is_not_stolen(self, db) -> None:
+        queue = JobQueue(db)
+        queue.register("work", AsyncMock())
+        queue.enqueue("work")
+        job_storage.claim_jobs(db, {"work": 1}, owner="other-worker", lease_seconds=60)
+        assert await queue.run_once() == 0
+
+    def test_poison_job_dead_lettered_when_lease_expires_on_last_attempt(self, db) -> None:
+        queue = JobQueue(db, max_attempts=1)
+        queue.register("work", AsyncMock())
+        job_id = queue.enqueue("work")
+        job_storage.claim_jobs(db, {"work": 1}, owner="crashed", lease_seconds=-1)
+
+        assert job_storage.claim_jobs(db, {"work": 1}, owner="next", lease_seconds=60) == []
+        job = job_storage.get_job(db, job_id)
+        assert job["status"] == "dead"
+        assert "Lease expired" in job["last_error"]
+
+    @pytest.mark.asyncio
+    async def test_stale_owner_cannot_complete(self, db) -> None:
+        queue = JobQueue(db)
+        queue.register("work", AsyncMock())
+        job_id = queue.enqueue("work")
+        job_storage.claim_jobs(db, {"work": 1}, owner="a", lease_seconds=-1)
+        job_storage.claim_jobs(db, {"work": 1}, owner="b", lease_seconds=60)
+        assert not job_storage.complete_job(db, job_id, owner="a")
+        assert job_storage.complete_job(db, job_id, owner="b")
+
+    @pytest.mark.asyncio
+    async def test_lease_renewed_while_running(self, db) -> None:
+        release = asyncio.Event()
+
+        async def blocking(payload: dict[str, Any]) -> None:
+            await release.wait()
+
+        queue = JobQueue(db, lease_seconds=1.0)
+        queue.register("work", blocking)
+        job_id = queue.enqueue("work")
+        await queue.run_once()
+        first_lease = job_storage.get_job(db, job_id)["lease_expires_at"]
+        await asyncio.sleep(0.5)
+        assert job_storage.get_job(db, job_id)["lease_expires_at"] > first_lease
+        release.set()
+        await queue.join()
+
+
+class TestLifecycle:
+    @pytest.mark.asyncio
+    async def test_run_forever_wakes_on_enqueue(self, db) -> None:
+        done = asyncio.Event()
+
+        async def handler(payload: dict[str, Any]) -> None:
+            done.set()
+
+        queue = JobQueue(db, poll_interval=30)
+        queue.register("work", handler)
+        queue.start()
+        try:
+            await asyncio.sleep(0.05)
+            queue.enqueue("work")
+            await asyncio.wait_for(done.wait(), timeout=2)
+            assert queue.running
+        finally:
+            queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_stop_leaves_job_leased_for_recovery(self, db) -> None:
+        async def blocking(payload: dict[str, Any]) -> None:
+            await asyncio.sleep(10)
+
+        queue = JobQueue(db)
+        queue.register("work", blocking)
+        job_id = queue.enqueue("work")
+        await queue.run_once()
+        queue.stop()
+        await queue.join()
+        assert job_storage.get_job(db, job_id)["status"] == "running"
+
+    def test_purge_keeps_dead_jobs(self, db) -> None:
+        queue = JobQueue(db)
+        queue.register("work", AsyncMock())
+        done_id = queue.enqueue("work")
+        dead_id = queue.enqueue("work")
+        db.execute("UPDATE jobs SET status = 'succeeded', completed_at = '2000-01-01' WHERE id = ?", (done_id,))
+        db.execute("UPDATE jobs SET status = 'dead', completed_at = '2000-01-01' WHERE id = ?", (dead_id,))
+        db.commit()
+        assert job_storage.purge_finished_jobs(db, 3600) == 1
+        assert job_storage.get_job(db, dead_id) is not None
+
+    @pytest.mark.asyncio
+    async def test_stats(self, db, no_backoff) -> None:
+        async def handler(payload: dict[str, Any]) -> None:
+            if payload.get("fail"):
+                raise RuntimeError("x")
+
+        queue = JobQueue(db, max_attempts=1)
+        queue.register("work", handler)
+        queue.enqueue("work")
+        queue.enqueue("work", {"fail": True})
+        queue.enqueue("work", delay=3600)
+        await _drain(queue)
+
+        stats = queue.stats()
+        assert stats["by_type"]["work"]["succeeded"] == 1
+        assert stats["by_type"]["work"]["dead"] == 1
+        assert stats["by_type"]["work"]["failing"] == 1
+        assert stats["totals"]["queued"] == 1
+        assert stats["throughput_per_minute"] > 0
+
+
+class TestMigratedWorkers:
+    @pytest.mark.asyncio
+    async def test_embedding_runs_through_queue(self, db) -> None:
+        from anteroom.services import storage
+        from anteroom.services.embedding_worker import EmbeddingWorker
+        from anteroom.services.embeddings import EmbeddingTransientError
+
+        conv = storage.create_conversation(db)
+        msg = storage.create_message(db, conv["id"], "user", "This is long enough to embed")
+        service = MagicMock()
+        service.embed = AsyncMock(side_effect=[EmbeddingTransientError("503"), [0.1, 0.2, 0.3]])
+        worker = EmbeddingWorker(db, service)
+        queue = JobQueue(db)
+        worker.register_jobs(queue)
+
+        worker.enqueue_message(msg["id"], "This is long enough to embed", conv["id"])
+        worker.enqueue_message(msg["id"], "This is long enough to embed", conv["id"])  # deduplicated
+        worker.enqueue_message("m-short", "hi", conv["id"])
+        [job] = job_storage.list_jobs(db, status="queued")
+        assert job["payload"] == {"message_id": msg["id"], "conversation_id": conv["id"]}
+
+        await _drain(queue)
+        job = job_storage.get_job(db, job["id"])
+        assert job["status"] == "queued"
+        assert job["last_error"].startswith("EmbeddingTransientError")
+
+        db.execute("UPDATE jobs SET run_after = created_at WHERE id = ?", (job["id"],))
+        db.commit()
+        await _drain(queue)
+        assert job_storage.get_job(db, job["id"])["status"] == "succeeded"
+        assert service.embed.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_permanent_embedding_error_dead_letters(self, db) -> None:
+        from anteroom.services import storage
+        from anteroom.services.embedding_worker import EmbeddingWorker
+        from anteroom.services.embeddings import EmbeddingPermanentError
+
+        conv = storage.create_conversation(db)
+        msg = storage.create_message(db, conv["id"], "user", "This is long enough to embed")
+        service = MagicMock()
+        service.embed = AsyncMock(side_effect=EmbeddingPermanentError("bad key", status_code=401))
+        worker = EmbeddingWorker(db, service)
+        queue = JobQueue(db)
+        worker.register_jobs(queue)
+        worker.enqueue_message(msg["id"], "This is long enough to embed", conv["id"])
+        await _drain(queue)
+        [job] = job_storage.list_jobs(db, status="dead")
+        assert "status=401" in job["last_error"]
+
+    @pytest.mark.asyncio
+    async def test_retention_sweep_enqueued_once(self, db, tmp_path: Path) -> None:
+        from anteroom.services.retention import RetentionWorker
+
+        worker = RetentionWorker(db, tmp_path, retention_days=30, check_interval=60)
+        queue = JobQueue(db)
+        worker.register_jobs(queue)
+        worker.start()
+        await asyncio.sleep(0.05)
+        worker.stop()
+        queue.enqueue("retention_sweep", dedupe_key="retention")
+
+        [job] = job_storage.list_jobs(db, status="queued")
+        assert job["job_type"] == "retention_sweep"
+        await _drain(queue)
+        assert job_storage.get_job(db, job["id"])["status"] == "succeeded"
+
+
+class TestJobsEndpoint:
+    def _request(self, db, queue: JobQueue | None) -> MagicMock:
+        request = MagicMock()
+        request.app.state.db = db
+        request.app.state.job_queue = queue
+        return request
+
+    @pytest.mark.asyncio
+    async def test_lists_dead_jobs_by_default_and_retries(self, db) -> None:
+        from anteroom.routers import jobs
+
+        queue = JobQueue(db, max_attempts=1)
+        queue.register("work", AsyncMock(side_effect=RuntimeError("x")))
+        job_id = queue.enqueue("work")
+        await _drain(queue)
+
+        request = self._request(db, queue)
+        body = await jobs.get_jobs(request, status=None, job_type=None, window=3600, limit=50, offset=0)
+        assert [j["id"] for j in body["jobs"]] == [job_id]
+        assert body["totals"]["dead"] == 1
+
+        retried = await jobs.retry_job(request, job_id)
+        assert retried["status"] == "queued"
+        assert (await jobs.cancel_job(request, job_id)) == {"status": "cancelled"}
+
+    @pytest.mark.asyncio
+    async def test_errors(self, db) -> None:
+        from fastapi import HTTPException
+
+        from anteroom.routers import jobs
+
+        queue = JobQueue(db)
+        request = self._request(db, queue)
+        with pytest.raises(HTTPException) as exc:
+            await jobs.get_job(request, "not-a-uuid")
+        assert exc.value.status_code == 400
+        with pytest.raises(HTTPException) as exc:
+            await jobs.get_job(request, "8f14e45f-ceea-4e7a-9a2b-2d7a1f1c6b10")
+        assert exc.value.status_code == 404
+        with pytest.raises(HTTPException) as exc:
+            await jobs.get_job(self._request(db, None), "8f14e45f-ceea-4e7a-9a2b-2d7a1f1c6b10")
+        assert exc.value.status_code == 503
+
+
+class TestConfig:
+    def test_load_config_clamps_job_fields(self, tmp_path: Path) -> None:
+        from anteroom.config import load_config
+
+        cfg_file = tmp_path / "config.yaml"
+        cfg_file.write_text(
+            "ai:\n  base_url: http://localhost:8080\n  api_key: test\n"
+            "storage:\n  job_poll_interval: 0\n  job_lease_seconds: 99999\n"
+            "  job_max_attempts: abc\n  job_retention_hours: 48\n"
+        )
+        config, _ = load_config(cfg_file)
+        st = config.storage
+        assert (st.job_poll_interval, st.job_lease_seconds, st.job_max_attempts, st.job_retention_hours) == (
+            1,
+            3600,
+            5,
+            48,
+        )
+        queue = JobQueue.from_config(MagicMock(), st)
+        assert queue._keep_finished_seconds == 48 * 3600
@@ -471,7 +471,7 @@ class TestLiteLLMStreamErrors:
 
 class TestLiteLLMExtraSystemPrompt:
     @pytest.mark.asyncio
-    async def test_extra_system_prompt_prepended(self) -> None:
+    async def test_extra_system_prompt_follows_base_prompt(self) -> None:
         svc = _make_service()
         done_chunk = MagicMock()
         done_chunk.choices = [MagicMock()]
@@ -497,7 +497,7 @@ class TestLiteLLMExtraSystemPrompt:
 
         system_msg = capture_call.messages[0]
         assert system_msg["role"] == "system"
-        assert system_msg["content"].startswith("Extra context here\n\n")
+        assert system_msg["content"] == svc.config.system_prompt + "\n\nExtra context here"
 
 
 # ---------------------------------------------------------------------------
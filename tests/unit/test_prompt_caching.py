@@ -0,0 +1,204 @@
+"""Tests for prefix-stable prompt construction and Anthropic prompt caching."""
+
+from __future__ import annotations
+
+import copy
+import json
+import uuid
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from anteroom.config import AIConfig
+from anteroom.services.anthropic_provider import _build_request, _usage_int, _with_cache_breakpoints
+from anteroom.services.prompt_sections import (
+    PromptSectionCache,
+    compose_system_prompt,
+    split_system_prompt,
+    turn_context_marker,
+)
+
+# Recorded from a two-turn web session: turn 1 reads a file and answers,
+# turn 2 asks a follow-up while a different canvas is open.
+_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "read_file",
+            "description": "Read a file",
+            "parameters": {"type": "object", "properties": {"path": {"type": "string"}}, "required": ["path"]},
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "grep",
+            "description": "Search files",
+            "parameters": {"type": "object", "properties": {"pattern": {"type": "string"}}, "required": ["pattern"]},
+        },
+    },
+]
+_TURN_1 = [
+    {"role": "user", "content": "What does config.py export?"},
+    {
+        "role": "assistant",
+        "content": "",
+        "tool_calls": [
+            {
+                "id": "toolu_01",
+                "type": "function",
+                "function": {"name": "read_file", "arguments": '{"path": "config.py"}'},
+            }
+        ],
+    },
+    {"role": "tool", "tool_call_id": "toolu_01", "content": '{"content": "__all__ = [\\"load_config\\"]"}'},
+    {"role": "assistant", "content": "It exports `load_config`."},
+]
+_TURN_2 = [*_TURN_1, {"role": "user", "content": "And where is it called?"}]
+_CANVASES = ["# Draft v1\n", "# Draft v2\nmore text\n"]
+
+
+def _config(**overrides: Any) -> AIConfig:
+    defaults: dict[str, Any] = {
+        "base_url": "https://api.anthropic.com",
+        "api_key": "test-key",
+        "model": "claude-sonnet-4-20250514",
+        "provider": "anthropic",
+    }
+    defaults.update(overrides)
+    return AIConfig(**defaults)
+
+
+async def _web_extra_prompt(cache: PromptSectionCache, canvas: str, conversation_id: str) -> str:
+    from anteroom.routers.chat import _build_chat_system_prompt
+
+    ai_service = MagicMock()
+    ai_service.config.model = "claude-sonnet-4-20250514"
+    tool_registry = MagicMock()
+    tool_registry.list_tools.return_value = ["read_file", "grep"]
+    tool_registry._working_dir = None
+    mcp_manager = MagicMock()
+    mcp_manager.get_server_statuses.return_value = {}
+    config = MagicMock()
+    config.app.tls = False
+    config.rag = None
+    with (
+        patch("anteroom.routers.chat.build_runtime_context", return_value="RUNTIME"),
+        patch("anteroom.routers.chat.load_instructions", return_value="INSTR"),
+        patch("anteroom.cli.instructions.instructions_fingerprint", return_value=("fp",)),
+        patch("anteroom.routers.chat.storage") as mock_storage,
+        patch("anteroom.services.codebase_index.create_index_service", return_value=None),
+    ):
+        mock_storage.get_canvas_for_conversation.return_value = {
+            "id": "c1",
+            "title": "Draft",
+            "content": canvas,
+            "language": None,
+            "version": 1,
+        }
+        prompt, _ = await _build_chat_system_prompt(
+            ai_service=ai_service,
+            tool_registry=tool_registry,
+            mcp_manager=mcp_manager,
+            config=config,
+            db=MagicMock(),
+            conversation_id=conversation_id,
+            space_instructions="Be terse.",
+            plan_prompt="",
+            plan_mode=False,
+            message_text="hello",
+            source_ids=[],
+            source_tag=None,
+            source_group_id=None,
+            space_id="space-1",
+            prompt_cache=cache,
+        )
+    return prompt
+
+
+def _cached_prefix(request: dict[str, Any], n_messages: int) -> bytes:
+    """Bytes of everything up to the history breakpoint, ignoring the cache_control markers."""
+
+    def _strip(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {k: _strip(v) for k, v in value.items() if k != "cache_control"}
+        if isinstance(value, list):
+            return [_strip(v) for v in value]
+        return value
+
+    prefix = {
+        "tools": request["tools"],
+        "system": request["system"][0],
+        "messages": _strip(request["messages"][:n_messages]),
+    }
+    return json.dumps(prefix, ensure_ascii=False).encode()
+
+
+class TestPrefixStability:
+    @pytest.mark.asyncio
+    async def test_consecutive_turns_share_a_byte_identical_prefix(self) -> None:
+        cache = PromptSectionCache()
+        conversation_id = str(uuid.uuid4())
+        extra_1 = await _web_extra_prompt(cache, _CANVASES[0], conversation_id)
+        extra_2 = await _web_extra_prompt(cache, _CANVASES[1], conversation_id)
+        assert extra_1 != extra_2
+
+        config = _config()
+        first = _build_request(config, copy.deepcopy(_TURN_1), _TOOLS, extra_1)
+        second = _build_request(config, copy.deepcopy(_TURN_2), _TOOLS, extra_2)
+
+        n_turn_1 = len(first["messages"])
+        assert _cached_prefix(first, n_turn_1) == _cached_prefix(second, n_turn_1)
+        # The per-request canvas sits after the stable block, not inside it
+        assert "Draft v1" not in first["system"][0]["text"]
+        assert "Draft v1" in first["system"][1]["text"]
+        assert first["system"][1]["text"].startswith(turn_context_marker())
+
+    @pytest.mark.asyncio
+    async def test_breakpoints_on_tools_system_and_history(self) -> None:
+        extra = await _web_extra_prompt(PromptSectionCache(), _CANVASES[0], str(uuid.uuid4()))
+        request = _build_request(_config(), copy.deepcopy(_TURN_2), _TOOLS, extra)
+
+        assert "cache_control" in request["tools"][-1]
+        assert "cache_control" not in request["tools"][0]
+        assert request["system"][0]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in request["system"][1]
+        last = request["messages"][-1]["content"]
+        assert last == [{"type": "text", "text": "And where is it called?", "cache_control": {"type": "ephemeral"}}]
+
+    def test_openai_style_system_prompt_keeps_the_stable_part_first(self) -> None:
+        stable = "TRUSTED INSTRUCTIONS" + turn_context_marker()
+        first = compose_system_prompt("BASE", stable + "canvas v1")
+        second = compose_system_prompt("BASE", stable + "canvas v2")
+        assert split_system_prompt(first)[0] == split_system_prompt(second)[0] == "BASE\n\nTRUSTED INSTRUCTIONS"
+
+
+class TestCacheBreakpoints:
+    def test_disabled_sends_plain_system_prompt(self) -> None:
+        request = _build_request(_config(prompt_caching=False), copy.deepcopy(_TURN_2), _TOOLS, "EXTRA")
+        assert isinstance(request["system"], str)
+        assert "cache_control" not in request["tools"][-1]
+        assert request["messages"][-1]["content"] == "And where is it called?"
+
+    def test_caller_history_is_not_mutated(self) -> None:
+        shared_block = {"type": "text", "text": "look at this"}
+        kwargs: dict[str, Any] = {
+            "system": "S",
+            "messages": [{"role": "user", "content": [shared_block]}],
+            "tools": [{"name": "t", "input_schema": {}}],
+        }
+        _with_cache_breakpoints(kwargs)
+        assert "cache_control" in kwargs["messages"][0]["content"][-1]
+        assert shared_block == {"type": "text", "text": "look at this"}
+
+    def test_system_without_marker_is_one_cached_block(self) -> None:
+        kwargs: dict[str, Any] = {"system": "only stable", "messages": []}
+        _with_cache_breakpoints(kwargs)
+        assert kwargs["system"] == [{"type": "text", "text": "only stable", "cache_control": {"type": "ephemeral"}}]
+
+    def test_usage_ignores_missing_cache_fields(self) -> None:
+        usage = MagicMock()
+        usage.cache_read_input_tokens = 800
+        assert _usage_int(usage, "cache_read_input_tokens") == 800
+        assert _usage_int(usage, "cache_creation_input_tokens") == 0
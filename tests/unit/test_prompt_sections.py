@@ -0,0 +1,191 @@
+"""Tests for sectioned, cached system-prompt assembly (services/prompt_sections.py)."""
+
+from __future__ import annotations
+
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from anteroom.services.prompt_sections import PromptAssembler, PromptSectionCache
+
+
+class TestPromptSectionCache:
+    def test_miss_then_hit(self) -> None:
+        cache = PromptSectionCache()
+        assert cache.get("runtime", ("k",)) is None
+        cache.put("runtime", ("k",), "value")
+        assert cache.get("runtime", ("k",)) == "value"
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_lru_eviction(self) -> None:
+        cache = PromptSectionCache(max_entries=2)
+        cache.put("a", 1, "a")
+        cache.put("b", 1, "b")
+        cache.get("a", 1)
+        cache.put("c", 1, "c")
+        assert cache.get("b", 1) is None
+        assert cache.get("a", 1) == "a"
+
+    def test_invalidate_by_name(self) -> None:
+        cache = PromptSectionCache()
+        cache.put("skills", 1, "s")
+        cache.put("artifacts", 1, "a")
+        cache.invalidate("skills")
+        assert cache.get("skills", 1) is None
+        assert cache.get("artifacts", 1) == "a"
+        cache.invalidate()
+        assert len(cache) == 0
+
+
+class TestPromptAssembler:
+    def test_renders_in_order_and_reports_sections(self) -> None:
+        asm = PromptAssembler(PromptSectionCache())
+        asm.add("first", lambda: "A")
+        asm.cached("second", "key", lambda: "B")
+        assert asm.render() == "AB"
+        meta = asm.meta()
+        assert [s["name"] for s in meta["prompt_sections"]] == ["first", "second"]
+        assert meta["prompt_cache_hits"] == 0
+        assert meta["prompt_build_ms"] >= 0
+
+    def test_cached_section_built_once(self) -> None:
+        cache = PromptSectionCache()
+        build = MagicMock(return_value="X")
+        PromptAssembler(cache).cached("s", 1, build)
+        asm = PromptAssembler(cache)
+        assert asm.cached("s", 1, build) == "X"
+        build.assert_called_once()
+        assert asm.meta()["prompt_sections"][0]["cached"] is True
+
+    def test_without_cache_always_builds(self) -> None:
+        build = MagicMock(return_value="X")
+        PromptAssembler().cached("s", 1, build)
+        PromptAssembler().cached("s", 1, build)
+        assert build.call_count == 2
+
+    def test_rewrite_applies_to_prior_parts(self) -> None:
+        asm = PromptAssembler()
+        asm.add("a", lambda: "hello ")
+        asm.add("b", lambda: "world")
+        asm.rewrite(str.upper)
+        asm.add("c", lambda: "!")
+        assert asm.render() == "HELLO WORLD!"
+
+
+async def _build(cache: PromptSectionCache, *, artifact_registry=None, skill_registry=None, config=None):
+    from anteroom.routers.chat import _build_chat_system_prompt
+
+    ai_service = MagicMock()
+    ai_service.config.model = "gpt-4o"
+    tool_registry = MagicMock()
+    tool_registry.list_tools.return_value = ["read_file"]
+    tool_registry._working_dir = None
+    mcp_manager = MagicMock()
+    mcp_manager.get_server_statuses.return_value = {}
+    if config is None:
+        config = MagicMock()
+        config.app.tls = False
+        config.rag = None
+    return await _build_chat_system_prompt(
+        ai_service=ai_service,
+        tool_registry=tool_registry,
+        mcp_manager=mcp_manager,
+        config=config,
+        db=MagicMock(),
+        conversation_id=str(uuid.uuid4()),
+        space_instructions="Be terse.",
+        plan_prompt="",
+        plan_mode=False,
+        message_text="hello",
+        source_ids=[],
+        source_tag=None,
+        source_group_id=None,
+        artifact_registry=artifact_registry,
+        skill_registry=skill_registry,
+        space_id="space-1",
+        prompt_cache=cache,
+    )
+
+
+class TestBuildChatSystemPromptCaching:
+    @pytest.fixture
+    def patched(self):
+        with (
+            patch("anteroom.routers.chat.build_runtime_context", return_value="RUNTIME") as runtime,
+            patch("anteroom.routers.chat.load_instructions", return_value="INSTR") as instructions,
+            patch("anteroom.cli.instructions.instructions_fingerprint", return_value=("fp",)) as fingerprint,
+            patch("anteroom.routers.chat.storage") as mock_storage,
+            patch("anteroom.services.codebase_index.create_index_service", return_value=None),
+        ):
+            mock_storage.get_canvas_for_conversation.return_value = None
+            yield {"runtime": runtime, "instructions": instructions, "fingerprint": fingerprint}
+
+    @pytest.mark.asyncio
+    async def test_follow_up_reuses_unchanged_sections(self, patched) -> None:
+        from anteroom.cli.skills import SkillRegistry
+        from anteroom.services.artifact_registry import ArtifactRegistry
+
+        cache = PromptSectionCache()
+        art_reg, skill_reg = ArtifactRegistry(), SkillRegistry()
+        config = MagicMock()
+        config.app.tls = False
+        config.rag = None
+
+        first, meta1 = await _build(cache, artifact_registry=art_reg, skill_registry=skill_reg, config=config)
+        second, meta2 = await _build(cache, artifact_registry=art_reg, skill_registry=skill_reg, config=config)
+
+        assert first == second
+        assert patched["runtime"].call_count == 1
+        assert patched["instructions"].call_count == 1
+        assert meta1["prompt_cache_hits"] == 0
+        cached = {s["name"] for s in meta2["prompt_sections"] if s["cached"]}
+        assert {"runtime", "space_instructions", "instructions", "artifacts", "skills"} <= cached
+        assert "canvas" not in cached
+
+    @pytest.mark.asyncio
+    async def test_instruction_file_change_rebuilds_only_that_section(self, patched) -> None:
+        cache = PromptSectionCache()
+        config = MagicMock()
+        config.app.tls = False
+        config.rag = None
+        await _build(cache, config=config)
+        patched["fingerprint"].return_value = ("changed",)
+        patched["instructions"].return_value = "NEW INSTR"
+        prompt, meta = await _build(cache, config=config)
+
+        assert "NEW INSTR" in prompt
+        by_name = {s["name"]: s["cached"] for s in meta["prompt_sections"]}
+        assert by_name["instructions"] is False
+        assert by_name["runtime"] is True
+
+    @pytest.mark.asyncio
+    async def test_artifact_mutation_invalidates_artifact_section(self, patched) -> None:
+        from anteroom.services.artifact_registry import ArtifactRegistry
+        from anteroom.services.artifacts import Artifact, ArtifactSource, ArtifactType
+
+        cache = PromptSectionCache()
+        art_reg = ArtifactRegistry()
+        await _build(cache, artifact_registry=art_reg)
+        art_reg.register(
+            Artifact(
+                fqn="@core/rule/no-secrets",
+                type=ArtifactType.RULE,
+                namespace="core",
+                name="no-secrets",
+                content="Never print secrets.",
+                source=ArtifactSource.BUILT_IN,
+            )
+        )
+        prompt, meta = await _build(cache, artifact_registry=art_reg)
+
+        assert "Never print secrets." in prompt
+        by_name = {s["name"]: s["cached"] for s in meta["prompt_sections"]}
+        assert by_name["artifacts"] is False
+
+    @pytest.mark.asyncio
+    async def test_config_reload_invalidates_runtime_section(self, patched) -> None:
+        cache = PromptSectionCache()
+        await _build(cache)
+        await _build(cache)  # fresh MagicMock config == new config generation
+        assert patched["runtime"].call_count == 2
@@ -331,3 +331,225 @@ proxy:
             config, _ = load_config(Path(f.name))
 
         assert config.proxy.allowed_origins == ["http://localhost:3000"]
+
+    def test_proxy_embeddings_settings_parsed_and_clamped(self) -> None:
+        import tempfile
+        from pathlib import Path
+
+        from anteroom.config import load_config
+
+        yaml_content = """
+ai:
+  base_url: http://localhost:8080/v1
+  api_key: test-key
+proxy:
+  enabled: true
+  embeddings_max_batch: 0
+  embeddings_batch_wait_ms: 25
+  embeddings_cache_size: not-a-number
+  embeddings_rate_limit: 30
+"""
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".yaml", delete=False) as f:
+            f.write(yaml_content)
+            f.flush()
+            config, _ = load_config(Path(f.name))
+
+        assert config.proxy.embeddings_max_batch == 1
+        assert config.proxy.embeddings_batch_wait_ms == 25
+        assert config.proxy.embeddings_cache_size == 2048
+        assert config.proxy.embeddings_rate_limit == 30
+
+
+class _FakeEmbeddingService:
+    """Deterministic stand-in for LocalEmbeddingService."""
+
+    model = "fake-embed"
+    dimensions = 3
+
+    def __init__(self, error: Exception | None = None) -> None:
+        self.calls: list[list[str]] = []
+        self._error = error
+
+    async def embed_batch(self, texts: list[str], batch_size: int = 100) -> list[list[float] | None]:
+        self.calls.append(list(texts))
+        if self._error:
+            raise self._error
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+
+def _make_embeddings_app(service: _FakeEmbeddingService, *, rate_limit: int = 0, wait_ms: int = 5) -> FastAPI:
+    from anteroom.services.embedding_batcher import EmbeddingBatcher, KeyedRateLimiter
+
+    app = _make_app()
+    app.state.proxy_embedding_batcher = EmbeddingBatcher(service, max_batch_size=8, max_wait_ms=wait_ms)
+    app.state.proxy_embedding_rate_limiter = KeyedRateLimiter(rate_limit)
+    return app
+
+
+class TestEmbeddings:
+    def test_returns_openai_shaped_response(self) -> None:
+        service = _FakeEmbeddingService()
+        client = TestClient(_make_embeddings_app(service))
+        resp = client.post("/v1/embeddings", json={"model": "text-embedding-3-small", "input": ["ab", "abcd"]})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["object"] == "list"
+        assert data["model"] == "fake-embed"
+        assert [d["index"] for d in data["data"]] == [0, 1]
+        assert data["data"][1]["embedding"] == [4.0, 1.0, 0.5]
+        assert data["usage"]["prompt_tokens"] >= 2
+
+    def test_single_string_input(self) -> None:
+        service = _FakeEmbeddingService()
+        client = TestClient(_make_embeddings_app(service))
+        resp = client.post("/v1/embeddings", json={"input": "hello"})
+        assert resp.status_code == 200
+        assert len(resp.json()["data"]) == 1
+
+    def test_base64_encoding(self) -> None:
+        import base64
+        import struct
+
+        service = _FakeEmbeddingService()
+        client = TestClient(_make_embeddings_app(service))
+        resp = client.post("/v1/embeddings", json={"input": "abc", "encoding_format": "base64"})
+        assert resp.status_code == 200
+        raw = base64.b64decode(resp.json()["data"][0]["embedding"])
+        assert struct.unpack("<3f", raw) == (3.0, 1.0, 0.5)
+
+    def test_repeated_input_served_from_cache(self) -> None:
+        service = _FakeEmbeddingService()
+        client = TestClient(_make_embeddings_app(service))
+        client.post("/v1/embeddings", json={"input": "same text"})
+        client.post("/v1/embeddings", json={"input": "same text"})
+        assert service.calls == [["same text"]]
+
+    def test_rejects_token_array_input(self) -> None:
+        client = TestClient(_make_embeddings_app(_FakeEmbeddingService()))
+        resp = client.post("/v1/embeddings", json={"input": [[1, 2, 3]]})
+        assert resp.status_code == 400
+
+    def test_rejects_empty_item(self) -> None:
+        client = TestClient(_make_embeddings_app(_FakeEmbeddingService()))
+        resp = client.post("/v1/embeddings", json={"input": ["ok", "  "]})
+        assert resp.status_code == 400
+
+    def test_rejects_mismatched_dimensions(self) -> None:
+        client = TestClient(_make_embeddings_app(_FakeEmbeddingService()))
+        resp = client.post("/v1/embeddings", json={"input": "x", "dimensions": 1536})
+        assert resp.status_code == 400
+        assert "3-dimensional" in resp.json()["error"]["message"]
+
+    def test_unavailable_without_embedding_service(self) -> None:
+        client = TestClient(_make_app())
+        resp = client.post("/v1/embeddings", json={"input": "x"})
+        assert resp.status_code == 503
+
+    def test_rate_limited_per_key(self) -> None:
+        client = TestClient(_make_embeddings_app(_FakeEmbeddingService(), rate_limit=2))
+        headers_a = {"Authorization": "Bearer key-a"}
+        assert client.post("/v1/embeddings", json={"input": "x"}, headers=headers_a).status_code == 200
+        assert client.post("/v1/embeddings", json={"input": "y"}, headers=headers_a).status_code == 200
+        resp = client.post("/v1/embeddings", json={"input": "z"}, headers=headers_a)
+        assert resp.status_code == 429
+        assert int(resp.headers["Retry-After"]) >= 1
+        headers_b = {"Authorization": "Bearer key-b"}
+        assert client.post("/v1/embeddings", json={"input": "z"}, headers=headers_b).status_code == 200
+
+    def test_transient_backend_error_returns_503(self) -> None:
+        from anteroom.services.embeddings import EmbeddingTransientError
+
+        service = _FakeEmbeddingService(error=EmbeddingTransientError("busy"))
+        client = TestClient(_make_embeddings_app(service))
+        resp = client.post("/v1/embeddings", json={"input": "x"})
+        assert resp.status_code == 503
+
+    def test_models_lists_embedding_model(self) -> None:
+        client = TestClient(_make_embeddings_app(_FakeEmbeddingService()))
+        ids = [m["id"] for m in client.get("/v1/models").json()["data"]]
+        assert ids == ["gpt-4", "fake-embed"]
+
+
+class TestEmbeddingBatcher:
+    async def test_concurrent_requests_share_one_batch(self) -> None:
+        import asyncio
+
+        from anteroom.services.embedding_batcher import EmbeddingBatcher
+
+        service = _FakeEmbeddingService()
+        batcher = EmbeddingBatcher(service, max_batch_size=64, max_wait_ms=20)
+        results = await asyncio.gather(*(batcher.embed([f"text {i}"]) for i in range(10)))
+        assert len(service.calls) == 1
+        assert len(service.calls[0]) == 10
+        assert all(r[0] is not None for r in results)
+        assert batcher.stats.batches == 1
+
+    async def test_full_batch_flushes_without_waiting(self) -> None:
+        import asyncio
+
+        from anteroom.services.embedding_batcher import EmbeddingBatcher
+
+        service = _FakeEmbeddingService()
+        batcher = EmbeddingBatcher(service, max_batch_size=2, max_wait_ms=10_000)
+        result = await asyncio.wait_for(batcher.embed(["a", "b", "c"]), timeout=2)
+        assert len(result) == 3
+        assert [len(c) for c in service.calls] == [2, 1]
+
+    async def test_identical_inflight_texts_deduplicated(self) -> None:
+        import asyncio
+
+        from anteroom.services.embedding_batcher import EmbeddingBatcher
+
+        service = _FakeEmbeddingService()
+        batcher = EmbeddingBatcher(service, max_wait_ms=10)
+        await asyncio.gather(batcher.embed(["dup"]), batcher.embed(["dup", "other"]))
+        assert sorted(sum(service.calls, [])) == ["dup", "other"]
+
+    async def test_errors_propagate_and_are_not_cached(self) -> None:
+        import pytest
+
+        from anteroom.services.embedding_batcher import EmbeddingBatcher
+        from anteroom.services.embeddings import EmbeddingTransientError
+
+        service = _FakeEmbeddingService(error=EmbeddingTransientError("down"))
+        batcher = EmbeddingBatcher(service, max_wait_ms=0)
+        with pytest.raises(EmbeddingTransientError):
+            await batcher.embed(["x"])
+        service._error = None
+        assert (await batcher.embed(["x"]))[0] == [1.0, 1.0, 0.5]
+
+    async def test_short_response_fails_every_text_of_the_batch(self) -> None:
+        import asyncio
+
+        import pytest
+
+        from anteroom.services.embedding_batcher import EmbeddingBatcher
+        from anteroom.services.embeddings import EmbeddingTransientError
+
+        service = _FakeEmbeddingService()
+        full = service.embed_batch
+
+        async def _short(texts: list[str], batch_size: int = 100) -> list[list[float] | None]:
+            return (await full(texts, batch_size))[:1]
+
+        service.embed_batch = _short  # type: ignore[method-assign]
+        batcher = EmbeddingBatcher(service, max_wait_ms=0)
+        results = await asyncio.wait_for(
+            asyncio.gather(batcher.embed(["a"]), batcher.embed(["b"]), return_exceptions=True), timeout=2
+        )
+        assert all(isinstance(r, EmbeddingTransientError) for r in results)
+        with pytest.raises(EmbeddingTransientError):
+            await asyncio.wait_for(batcher.embed(["c", "d"]), timeout=2)
+
+    async def test_cache_evicts_least_recently_used(self) -> None:
+        from anteroom.services.embedding_batcher import EmbeddingBatcher
+
+        service = _FakeEmbeddingService()
+        batcher = EmbeddingBatcher(service, max_wait_ms=0, cache_size=2)
+        await batcher.embed(["a"])
+        await batcher.embed(["b"])
+        await batcher.embed(["a"])
+        await batcher.embed(["c"])
+        await batcher.embed(["a"])
+        await batcher.embed(["b"])
+        assert sum(service.calls, []) == ["a", "b", "c", "b"]
@@ -9,6 +9,8 @@ import pytest
 from anteroom.config import RagConfig
 from anteroom.services.rag import (
     RetrievedChunk,
+    _collapse_near_duplicates,
+    _mmr_rerank,
     _rrf_merge_messages,
     _rrf_merge_source_chunks,
     format_rag_context,
@@ -75,10 +77,10 @@ class TestRetrieveContext:
         embedding_service = AsyncMock()
         embedding_service.embed = AsyncMock(return_value=_fake_embedding())
         db = MagicMock()
-        # Very small token budget: 100 tokens = 400 chars
+        # Very small token budget: 100 tokens
         config = _make_config(max_tokens=100)
 
-        long_content = "x" * 500  # exceeds 400 char budget
+        long_content = "word " * 150  # ~150 tokens, exceeds the budget
         msg_results = [
             {"message_id": "m1", "conversation_id": "c1", "content": "short", "role": "user", "distance": 0.1},
             {"message_id": "m2", "conversation_id": "c2", "content": long_content, "role": "user", "distance": 0.2},
@@ -642,6 +644,11 @@ class TestRagConfigDefaults:
         config = RagConfig()
         assert config.retrieval_mode == "dense"
 
+    def test_diversification_defaults(self) -> None:
+        config = RagConfig()
+        assert config.mmr_lambda == 0.7
+        assert config.near_duplicate_threshold == 3
+
 
 class TestRrfMergeMessages:
     def test_merges_disjoint_results(self) -> None:
@@ -933,3 +940,95 @@ class TestRetrieveContextHybridMode:
 
         # Both results should survive — threshold should not apply in hybrid mode
         assert len(chunks) == 2
+
+
+def _src_chunk(chunk_id: str, content: str, distance: float) -> RetrievedChunk:
+    return RetrievedChunk(
+        content=content,
+        source_type="source_chunk",
+        source_label="Doc",
+        distance=distance,
+        source_id="s1",
+        chunk_id=chunk_id,
+    )
+
+
+class TestCollapseNearDuplicates:
+    def test_collapses_whitespace_and_punctuation_variants(self) -> None:
+        text = "Build finished with 3 warnings in module foo; run the linter before committing changes"
+        chunks = [
+            _src_chunk("a", text, 0.1),
+            _src_chunk("b", text.replace(";", ",") + "  ", 0.2),
+            _src_chunk("c", "Completely unrelated paragraph about deployment targets and Helm charts", 0.3),
+        ]
+        result = _collapse_near_duplicates(chunks, 3)
+        assert [c.chunk_id for c in result] == ["a", "c"]
+
+    def test_keeps_best_ranked_of_group(self) -> None:
+        text = "the quick brown fox jumps over the lazy dog near the river bank today"
+        chunks = [_src_chunk("best", text, 0.05), _src_chunk("worse", text.upper(), 0.4)]
+        assert [c.chunk_id for c in _collapse_near_duplicates(chunks, 3)] == ["best"]
+
+    def test_distinct_texts_survive(self) -> None:
+        chunks = [
+            _src_chunk("a", "Use pytest fixtures instead of setUp and tearDown methods", 0.1),
+            _src_chunk("b", "Passwords must be hashed with Argon2id or bcrypt", 0.2),
+        ]
+        assert len(_collapse_near_duplicates(chunks, 3)) == 2
+
+    @pytest.mark.asyncio
+    async def test_applied_in_retrieve_context(self) -> None:
+        embedding_service = AsyncMock()
+        embedding_service.embed = AsyncMock(return_value=_fake_embedding())
+        text = "tool output: 42 files changed, 1200 insertions, 300 deletions in the repository"
+        msg_results = [
+            {"message_id": "m1", "conversation_id": "c1", "content": text, "role": "tool", "distance": 0.1},
+            {"message_id": "m2", "conversation_id": "c2", "content": text + " ", "role": "tool", "distance": 0.2},
+        ]
+        with patch("anteroom.services.rag.storage") as mock_storage:
+            mock_storage.search_similar_messages = MagicMock(return_value=msg_results)
+            mock_storage.search_similar_source_chunks = MagicMock(return_value=[])
+            mock_storage.get_conversation = MagicMock(return_value={"title": "Conv"})
+
+            chunks, _ = await retrieve_context("how many files changed", MagicMock(), embedding_service, _make_config())
+            assert [c.message_id for c in chunks] == ["m1"]
+
+            off = _make_config(near_duplicate_threshold=-1)
+            chunks, _ = await retrieve_context("how many files changed", MagicMock(), embedding_service, off)
+            assert [c.message_id for c in chunks] == ["m1", "m2"]
+
+
+def _vec_manager(vectors: dict[str, list[float]]) -> MagicMock:
+    index = MagicMock()
+    index.get_vectors = MagicMock(side_effect=lambda keys: {k: vectors[k] for k in keys if k in vectors})
+    manager = MagicMock()
+    manager.messages = index
+    manager.source_chunks = index
+    return manager
+
+
+class TestMmrRerank:
+    def test_promotes_diverse_chunk_over_redundant_one(self) -> None:
+        chunks = [
+            _src_chunk("a", "alpha", 0.10),
+            _src_chunk("a2", "alpha again", 0.12),
+            _src_chunk("b", "beta", 0.20),
+        ]
+        manager = _vec_manager({"a": [1.0, 0.0], "a2": [0.99, 0.01], "b": [0.0, 1.0]})
+        result = _mmr_rerank(chunks, manager, 0.5)
+        assert [c.chunk_id for c in result] == ["a", "b", "a2"]
+
+    def test_lambda_one_keeps_relevance_order(self) -> None:
+        chunks = [_src_chunk("a", "x", 0.1), _src_chunk("a2", "y", 0.12), _src_chunk("b", "z", 0.2)]
+        manager = _vec_manager({"a": [1.0, 0.0], "a2": [0.99, 0.01], "b": [0.0, 1.0]})
+        assert [c.chunk_id for c in _mmr_rerank(chunks, manager, 1.0)] == ["a", "a2", "b"]
+
+    def test_without_vectors_returns_input(self) -> None:
+        chunks = [_src_chunk("a", "x", 0.1), _src_chunk("b", "y", 0.2), _src_chunk("c", "z", 0.3)]
+        assert _mmr_rerank(chunks, _vec_manager({}), 0.5) == chunks
+
+    def test_vector_lookup_failure_is_ignored(self) -> None:
+        chunks = [_src_chunk("a", "x", 0.1), _src_chunk("b", "y", 0.2), _src_chunk("c", "z", 0.3)]
+        manager = MagicMock()
+        manager.source_chunks.get_vectors = MagicMock(side_effect=RuntimeError("boom"))
+        assert _mmr_rerank(chunks, manager, 0.5) == chunks
@@ -0,0 +1,175 @@
+"""Tests for the per-space registry cache (services/registry_cache.py)."""
+
+from __future__ import annotations
+
+import sqlite3
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from anteroom.cli.skills import SkillRegistry
+from anteroom.db import _SCHEMA, ThreadSafeConnection
+from anteroom.services.artifact_storage import create_artifact, get_artifact_by_fqn, update_artifact
+from anteroom.services.artifacts import Artifact, ArtifactSource, ArtifactType
+from anteroom.services.registry_cache import SpaceRegistryCache, space_registry_fingerprint
+from anteroom.services.rule_enforcer import RuleEnforcer, parse_rule_cached
+from anteroom.services.space_storage import create_space
+
+_HARD_RULE = {"enforce": "hard", "matches": [{"tool": "bash", "pattern": "rm -rf"}]}
+
+
+@pytest.fixture()
+def db() -> ThreadSafeConnection:
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(_SCHEMA)
+    conn.commit()
+    return ThreadSafeConnection(conn)
+
+
+@pytest.fixture()
+def space_id(db: ThreadSafeConnection) -> str:
+    create_artifact(
+        db,
+        fqn="@local/rule/no-rm",
+        artifact_type="rule",
+        namespace="local",
+        name="no-rm",
+        content="Never rm -rf.",
+        source="local",
+        metadata=_HARD_RULE,
+    )
+    return create_space(db, "work")["id"]
+
+
+def _get(cache: SpaceRegistryCache, db: ThreadSafeConnection, space_id: str, skills: SkillRegistry):
+    return cache.get(db, space_id, global_skill=skills, global_rules=RuleEnforcer())
+
+
+class TestSpaceRegistryCache:
+    def test_steady_state_requests_reuse_registries(self, db: ThreadSafeConnection, space_id: str) -> None:
+        cache, skills = SpaceRegistryCache(), SkillRegistry()
+        first = _get(cache, db, space_id, skills)
+        with patch("anteroom.services.registry_cache.build_space_registries") as build:
+            second = _get(cache, db, space_id, skills)
+        build.assert_not_called()
+        assert second is first
+        assert (cache.builds, cache.hits) == (1, 1)
+        assert first.rule_enforcer.rule_count == 1
+
+    def test_artifact_change_in_db_rebuilds(self, db: ThreadSafeConnection, space_id: str) -> None:
+        cache, skills = SpaceRegistryCache(), SkillRegistry()
+        first = _get(cache, db, space_id, skills)
+        art = get_artifact_by_fqn(db, "@local/rule/no-rm")
+        update_artifact(db, art["id"], content="Never, ever rm -rf.")
+        second = _get(cache, db, space_id, skills)
+        assert second is not first
+        assert "ever" in second.artifact_registry.get("@local/rule/no-rm").content
+
+    def test_new_artifact_rebuilds(self, db: ThreadSafeConnection, space_id: str) -> None:
+        cache, skills = SpaceRegistryCache(), SkillRegistry()
+        _get(cache, db, space_id, skills)
+        create_artifact(
+            db,
+            fqn="@local/skill/deploy",
+            artifact_type="skill",
+            namespace="local",
+            name="deploy",
+            content="Deploy it.",
+            source="local",
+        )
+        regs = _get(cache, db, space_id, skills)
+        assert cache.builds == 2
+        assert regs.artifact_registry.get("@local/skill/deploy") is not None
+
+    def test_global_skill_reload_rebuilds(self, db: ThreadSafeConnection, space_id: str) -> None:
+        from anteroom.services.artifact_registry import ArtifactRegistry
+
+        cache, skills = SpaceRegistryCache(), SkillRegistry()
+        _get(cache, db, space_id, skills)
+        skills.load_from_artifacts(ArtifactRegistry())
+        _get(cache, db, space_id, skills)
+        assert cache.builds == 2
+
+    def test_invalidate(self, db: ThreadSafeConnection, space_id: str) -> None:
+        cache, skills = SpaceRegistryCache(), SkillRegistry()
+        _get(cache, db, space_id, skills)
+        cache.invalidate(space_id)
+        _get(cache, db, space_id, skills)
+        cache.invalidate()
+        assert len(cache) == 0
+        assert cache.builds == 2
+
+    def test_lru_bound(self, db: ThreadSafeConnection) -> None:
+        cache, skills = SpaceRegistryCache(max_spaces=2), SkillRegistry()
+        for name in ("a", "b", "c"):
+            _get(cache, db, create_space(db, name)["id"], skills)
+        assert len(cache) == 2
+
+    def test_fingerprint_tracks_space_paths(self, db: ThreadSafeConnection, space_id: str) -> None:
+        before = space_registry_fingerprint(db, space_id)
+        db.execute(
+            "INSERT INTO space_paths (id, space_id, local_path, created_at) VALUES ('p1', ?, '/repo', 'now')",
+            (space_id,),
+        )
+        db.commit()
+        assert space_registry_fingerprint(db, space_id) != before
+
+
+class TestGetRequestRegistries:
+    def _request(self, cache: SpaceRegistryCache | None) -> MagicMock:
+        from anteroom.services.artifact_registry import ArtifactRegistry
+
+        request = MagicMock()
+        request.app.state.artifact_registry = ArtifactRegistry()
+        request.app.state.skill_registry = SkillRegistry()
+        request.app.state.rule_enforcer = RuleEnforcer()
+        request.app.state.space_registry_cache = cache
+        return request
+
+    def test_uses_app_cache(self, db: ThreadSafeConnection, space_id: str) -> None:
+        from anteroom.routers.chat import _get_request_registries
+
+        request = self._request(SpaceRegistryCache())
+        first = _get_request_registries(request, db, space_id)
+        second = _get_request_registries(request, db, space_id)
+        assert all(a is b for a, b in zip(first, second))
+
+    def test_without_cache_builds_per_request(self, db: ThreadSafeConnection, space_id: str) -> None:
+        from anteroom.routers.chat import _get_request_registries
+
+        request = self._request(None)
+        first = _get_request_registries(request, db, space_id)
+        second = _get_request_registries(request, db, space_id)
+        assert first[0] is not second[0]
+
+    def test_no_space_returns_globals(self, db: ThreadSafeConnection) -> None:
+        from anteroom.routers.chat import _get_request_registries
+
+        request = self._request(SpaceRegistryCache())
+        art, skills, rules = _get_request_registries(request, db, None)
+        assert art is request.app.state.artifact_registry
+        assert rules is request.app.state.rule_enforcer
+
+
+class TestParseRuleCached:
+    def _rule(self, pattern: str) -> Artifact:
+        return Artifact(
+            fqn="@core/rule/guard",
+            type=ArtifactType.RULE,
+            namespace="core",
+            name="guard",
+            content="guard",
+            source=ArtifactSource.BUILT_IN,
+            metadata={"enforce": "hard", "matches": [{"tool": "bash", "pattern": pattern}]},
+        )
+
+    def test_same_artifact_shares_compiled_rule(self) -> None:
+        assert parse_rule_cached(self._rule("curl .*")) is parse_rule_cached(self._rule("curl .*"))
+
+    def test_metadata_change_recompiles(self) -> None:
+        first = parse_rule_cached(self._rule("wget .*"))
+        second = parse_rule_cached(self._rule("scp .*"))
+        assert first is not None and second is not None
+        assert second.matches[0].pattern.pattern == "scp .*"
@@ -0,0 +1,375 @@
+"""Tests for hedged provider requests and per-request deadlines."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+
+from anteroom.config import AIConfig
+from anteroom.services import request_deadline, request_hedging
+from anteroom.services.agent_loop import _execute_tool
+from anteroom.services.ai_service import AIService
+from anteroom.services.request_deadline import with_deadline
+from anteroom.services.request_hedging import HedgeTracker, race
+from tests.unit.conftest import StubHTTPServer, StubRequest, completion_chunks, sse_stream
+
+
+def _slow_stream_provider(delays: list[float]) -> StubHTTPServer:
+    """A streaming ``/v1/chat/completions`` stub.
+
+    Request *n* waits ``delays[n]`` seconds (0 when not listed) after the
+    response headers before sending its first chunk.
+    """
+
+    async def respond(request: StubRequest) -> AsyncIterator[bytes]:
+        n = request.index
+        usage = {"prompt_tokens": 100, "completion_tokens": 5, "total_tokens": 105}
+        async for chunk in sse_stream(
+            completion_chunks(f"reply {n}", usage=usage), delay=delays[n] if n < len(delays) else 0
+        ):
+            yield chunk
+
+    return StubHTTPServer(respond)
+
+
+def _config(base_url: str, **overrides: Any) -> AIConfig:
+    defaults: dict[str, Any] = {
+        "base_url": base_url,
+        "api_key": "k",
+        "model": "m",
+        "retry_max_attempts": 0,
+        "hedge_requests": True,
+        "hedge_min_delay": 0.1,
+        "hedge_max_rate": 0.5,
+    }
+    defaults.update(overrides)
+    return AIConfig(**defaults)
+
+
+def _warm(tracker: HedgeTracker, latency: float = 0.01, n: int = 20) -> None:
+    for _ in range(n):
+        tracker.record(latency, hedged=False, hedge_won=False)
+
+
+async def _collect(service: AIService) -> list[dict[str, Any]]:
+    return [e async for e in service.stream_chat([{"role": "user", "content": "hi"}])]
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats():
+    request_hedging.reset_hedge_stats()
+    yield
+    request_hedging.reset_hedge_stats()
+
+
+async def _after(delay: float, value: Any) -> Any:
+    await asyncio.sleep(delay)
+    if isinstance(value, BaseException):
+        raise value
+    return value
+
+
+class TestRace:
+    @pytest.mark.asyncio
+    async def test_fast_primary_is_not_hedged(self) -> None:
+        calls: list[int] = []
+
+        async def start() -> str:
+            calls.append(1)
+            return "primary"
+
+        result = await race(
+            start, hedge_after=0.5, allow_hedge=lambda: True, timeout=5, cancel_event=None, discard=_noop
+        )
+        assert (result.value, result.hedged, result.hedge_won) == ("primary", False, False)
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_loses_to_hedge_and_is_cancelled(self) -> None:
+        delays = iter([5.0, 0.01])
+        cancelled: list[bool] = []
+
+        async def start() -> float:
+            delay = next(delays)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return delay
+
+        begun = time.monotonic()
+        result = await race(
+            start, hedge_after=0.05, allow_hedge=lambda: True, timeout=5, cancel_event=None, discard=_noop
+        )
+        assert (result.value, result.hedged, result.hedge_won) == (0.01, True, True)
+        assert time.monotonic() - begun < 1
+        assert cancelled == [True]
+
+    @pytest.mark.asyncio
+    async def test_rate_cap_refusal_waits_for_primary(self) -> None:
+        result = await race(
+            lambda: _after(0.15, "primary"),
+            hedge_after=0.01,
+            allow_hedge=lambda: False,
+            timeout=5,
+            cancel_event=None,
+            discard=_noop,
+        )
+        assert (result.value, result.hedged) == ("primary", False)
+
+    @pytest.mark.asyncio
+    async def test_failed_primary_after_hedge_uses_hedge(self) -> None:
+        outcomes = iter([_after(0.1, RuntimeError("boom")), _after(0.2, "hedge")])
+        result = await race(
+            lambda: next(outcomes),
+            hedge_after=0.02,
+            allow_hedge=lambda: True,
+            timeout=5,
+            cancel_event=None,
+            discard=_noop,
+        )
+        assert (result.value, result.hedge_won) == ("hedge", True)
+
+    @pytest.mark.asyncio
+    async def test_early_failure_is_raised_without_hedging(self) -> None:
+        with pytest.raises(RuntimeError):
+            await race(
+                lambda: _after(0, RuntimeError("boom")),
+                hedge_after=1,
+                allow_hedge=lambda: pytest.fail("should not hedge"),
+                timeout=5,
+                cancel_event=None,
+                discard=_noop,
+            )
+
+    @pytest.mark.asyncio
+    async def test_timeout(self) -> None:
+        with pytest.raises(asyncio.TimeoutError):
+            await race(
+                lambda: _after(5, "late"),
+                hedge_after=0.01,
+                allow_hedge=lambda: True,
+                timeout=0.1,
+                cancel_event=None,
+                discard=_noop,
+            )
+
+    @pytest.mark.asyncio
+    async def test_cancel_event(self) -> None:
+        cancel = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.05, cancel.set)
+        result = await race(
+            lambda: _after(5, "late"),
+            hedge_after=None,
+            allow_hedge=lambda: True,
+            timeout=5,
+            cancel_event=cancel,
+            discard=_noop,
+        )
+        assert result.value is None
+
+    @pytest.mark.asyncio
+    async def test_simultaneous_finish_discards_loser(self) -> None:
+        discarded: list[str] = []
+        values = iter(["a", "b"])
+        gate = asyncio.Event()
+
+        async def start() -> str:
+            value = next(values)
+            await gate.wait()
+            return value
+
+        async def discard(value: str) -> None:
+            discarded.append(value)
+
+        asyncio.get_running_loop().call_later(0.1, gate.set)
+        result = await race(
+            start, hedge_after=0.01, allow_hedge=lambda: True, timeout=5, cancel_event=None, discard=discard
+        )
+        assert result.value == "a"
+        assert discarded == ["b"]
+
+
+async def _noop(_value: Any) -> None:
+    return None
+
+
+class TestTracker:
+    def test_no_threshold_until_enough_samples(self) -> None:
+        tracker = HedgeTracker()
+        _warm(tracker, n=19)
+        assert tracker.hedge_delay(0.5) is None
+        _warm(tracker, n=1)
+        assert tracker.hedge_delay(0.5) == 0.5
+
+    def test_threshold_is_p95(self) -> None:
+        tracker = HedgeTracker()
+        for i in range(1, 101):
+            tracker.record(i / 10, hedged=False, hedge_won=False)
+        assert tracker.hedge_delay(0.1) == pytest.approx(9.6)
+
+    def test_rate_cap(self) -> None:
+        tracker = HedgeTracker()
+        _warm(tracker, n=9)
+        assert tracker.try_hedge(0.1)
+        assert not tracker.try_hedge(0.1)  # 2 of 10 would exceed 10%
+        tracker.record(0.5, hedged=True, hedge_won=True)
+        _warm(tracker, n=10)
+        assert tracker.try_hedge(0.1)
+        tracker.release()
+        assert tracker.try_hedge(0.0) is False
+
+
+class TestHedgedStream:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("primary_delay", [1.0, 10.0])
+    async def test_slow_first_byte_is_hedged(self, primary_delay: float) -> None:
+        async with _slow_stream_provider([primary_delay, 0.0]) as stub:
+            config = _config(stub.base_url)
+            _warm(request_hedging.tracker_for(config.base_url, config.model))
+            begun = time.monotonic()
+            events = await _collect(AIService(config))
+            elapsed = time.monotonic() - begun
+
+        assert elapsed < 5
+        assert len(stub.requests) == 2
+        assert [e["data"]["content"] for e in events if e["event"] == "token"] == ["reply 1"]
+        usage = next(e["data"] for e in events if e["event"] == "usage")
+        assert usage["total_tokens"] == 105
+        assert usage["hedge_tokens"] == 100
+        [stats] = request_hedging.hedge_stats()
+        assert (stats["hedged"], stats["hedge_wins"], stats["duplicate_tokens"]) == (1, 1, 100)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("delay", [0.0, 0.05])
+    async def test_fast_first_byte_not_hedged(self, delay: float) -> None:
+        async with _slow_stream_provider([delay]) as stub:
+            config = _config(stub.base_url)
+            _warm(request_hedging.tracker_for(config.base_url, config.model))
+            events = await _collect(AIService(config))
+        assert len(stub.requests) == 1
+        usage = next(e["data"] for e in events if e["event"] == "usage")
+        assert "hedge_tokens" not in usage
+
+    @pytest.mark.asyncio
+    async def test_cold_tracker_never_hedges(self) -> None:
+        async with _slow_stream_provider([0.5]) as stub:
+            events = await _collect(AIService(_config(stub.base_url)))
+        assert len(stub.requests) == 1
+        assert any(e["event"] == "done" for e in events)
+        [stats] = request_hedging.hedge_stats()
+        assert stats["requests"] == 1
+
+    @pytest.mark.asyncio
+    async def test_first_chunk_bounded_by_first_token_timeout(self) -> None:
+        async with _slow_stream_provider([10.0]) as stub:
+            config = _config(stub.base_url, first_token_timeout=0.5)
+            begun = time.monotonic()
+            events = await _collect(AIService(config))
+            elapsed = time.monotonic() - begun
+
+        assert elapsed < 5
+        assert len(stub.requests) == 1
+        phases = [e["data"]["phase"] for e in events if e["event"] == "phase"]
+        assert phases == ["connecting", "waiting"]
+        assert events[-1]["event"] == "error"
+        assert not any(e["event"] == "token" for e in events)
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self) -> None:
+        async with _slow_stream_provider([0.3, 0.0]) as stub:
+            config = _config(stub.base_url, hedge_requests=False)
+            _warm(request_hedging.tracker_for(config.base_url, config.model))
+            await _collect(AIService(config))
+        assert len(stub.requests) == 1
+
+
+class TestDeadline:
+    @pytest.mark.asyncio
+    async def test_deadline_visible_only_inside_the_generator(self) -> None:
+        seen: list[float | None] = []
+
+        async def events():
+            for _ in range(2):
+                seen.append(request_deadline.remaining())
+                yield 1
+
+        async for _ in with_deadline(events(), 30):
+            assert request_deadline.remaining() is None
+        assert all(r is not None and 29 < r <= 30 for r in seen)
+
+    @pytest.mark.asyncio
+    async def test_inner_deadline_cannot_extend_outer(self) -> None:
+        seen: list[float | None] = []
+
+        async def inner():
+            seen.append(request_deadline.remaining())
+            yield 1
+
+        async def outer():
+            async for item in with_deadline(inner(), 300):
+                yield item
+
+        async for _ in with_deadline(outer(), 5):
+            pass
+        assert seen[0] is not None and seen[0] <= 5
+
+    @pytest.mark.asyncio
+    async def test_zero_means_no_deadline(self) -> None:
+        async def events():
+            yield request_deadline.remaining()
+
+        gen = events()
+        assert with_deadline(gen, 0) is gen
+        assert [r async for r in with_deadline(events(), 0)] == [None]
+
+    @pytest.mark.asyncio
+    async def test_tool_timeout_bounded_by_deadline(self) -> None:
+        async def slow_tool(name: str, args: dict[str, Any]) -> dict[str, Any]:
+            await asyncio.sleep(5)
+            return {}
+
+        async def run():
+            yield await _execute_tool({"id": "1", "function_name": "slow", "arguments": {}}, slow_tool, None)
+
+        begun = time.monotonic()
+        [(_tc, result, status)] = [r async for r in with_deadline(run(), 0.2)]
+        assert status == "timeout"
+        assert "timed out" in result["error"]
+        assert time.monotonic() - begun < 2
+
+    @pytest.mark.asyncio
+    async def test_expired_deadline_skips_tool_and_model(self) -> None:
+        async def never(name: str, args: dict[str, Any]) -> dict[str, Any]:
+            raise AssertionError("tool should not run")
+
+        async def run():
+            await asyncio.sleep(0.05)
+            yield await _execute_tool({"id": "1", "function_name": "t", "arguments": {}}, never, None)
+            service = AIService(_config("http://127.0.0.1:9/v1", hedge_requests=False))
+            async for event in service.stream_chat([{"role": "user", "content": "hi"}]):
+                yield event
+
+        results = [r async for r in with_deadline(run(), 0.01)]
+        assert results[0][2] == "timeout"
+        assert results[0][1]["error"] == "Request deadline exceeded; tool not run"
+        assert results[-1]["data"]["code"] == "deadline_exceeded"
+
+
+class TestHedgeAccounting:
+    def test_hedge_tokens_stored_and_counted_in_budgets(self, tmp_path: Any) -> None:
+        from anteroom.db import init_db
+        from anteroom.services import storage
+
+        db = init_db(tmp_path / "t.db")
+        conv = storage.create_conversation(db)
+        msg = storage.create_message(db, conv["id"], "assistant", "hi")
+        storage.update_message_usage(db, msg["id"], 100, 5, 105, "m", hedge_tokens=100)
+        assert storage.get_conversation_token_total(db, conv["id"]) == 205
+        [stats] = storage.get_usage_stats(db)
+        assert (stats["total_tokens"], stats["hedge_tokens"]) == (105, 100)
@@ -0,0 +1,218 @@
+"""Tests for the opt-in SQLite response cache (services/response_cache.py)."""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from anteroom.config import AIConfig
+from anteroom.services import response_cache
+from anteroom.services.ai_service import AIService
+from anteroom.services.response_cache import ResponseCache, cache_key
+from tests.unit.conftest import StubHTTPServer, StubRequest, chat_completion, json_response
+
+
+def _stub_provider() -> StubHTTPServer:
+    """A ``/v1/chat/completions`` stub that answers with a numbered reply."""
+
+    async def respond(request: StubRequest) -> AsyncIterator[bytes]:
+        usage = {"prompt_tokens": 30, "completion_tokens": 12, "total_tokens": 42}
+        yield json_response(chat_completion(f"Reply {request.index + 1}", usage=usage))
+
+    return StubHTTPServer(respond)
+
+
+def _config(base_url: str, **overrides: Any) -> AIConfig:
+    defaults: dict[str, Any] = {
+        "base_url": base_url,
+        "api_key": "k",
+        "model": "stub-model",
+        "retry_max_attempts": 0,
+        "response_cache": True,
+    }
+    defaults.update(overrides)
+    return AIConfig(**defaults)
+
+
+@pytest.fixture()
+def cache_dir(tmp_path: Path):
+    yield tmp_path
+    response_cache.close_response_cache()
+
+
+class TestReplay:
+    @pytest.mark.asyncio
+    async def test_title_replayed_from_cache(self, cache_dir: Path) -> None:
+        async with _stub_provider() as stub:
+            config = _config(stub.base_url)
+            response_cache.configure_response_cache(config, cache_dir)
+            first = await AIService(config).generate_title("Plan the Q3 migration")
+            second = await AIService(config).generate_title("Plan the Q3 migration")
+            other = await AIService(config).generate_title("Something else")
+
+        assert first == second == "Reply 1"
+        assert other == "Reply 2"
+        assert len(stub.requests) == 2
+        assert response_cache.get_response_cache().stats() == {"entries": 2, "hits": 1, "tokens_saved": 42}
+
+    @pytest.mark.asyncio
+    async def test_compaction_summary_replayed(self, cache_dir: Path) -> None:
+        messages = [{"role": "user", "content": "Summarize: a, b, c"}]
+        async with _stub_provider() as stub:
+            config = _config(stub.base_url)
+            response_cache.configure_response_cache(config, cache_dir)
+            service = AIService(config)
+            assert await service.complete(messages, max_completion_tokens=500, cacheable=True) == "Reply 1"
+            assert await service.complete(messages, max_completion_tokens=500, cacheable=True) == "Reply 1"
+            # Different parameters are a different key
+            assert await service.complete(messages, max_completion_tokens=800, cacheable=True) == "Reply 2"
+        assert len(stub.requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_only_temperature_zero_cached_by_default(self, cache_dir: Path) -> None:
+        messages = [{"role": "user", "content": "hi"}]
+        async with _stub_provider() as stub:
+            sampled = _config(stub.base_url, temperature=0.7)
+            response_cache.configure_response_cache(sampled, cache_dir)
+            await AIService(sampled).complete(messages)
+            await AIService(sampled).complete(messages)
+            assert len(stub.requests) == 2
+
+            greedy = _config(stub.base_url, temperature=0.0)
+            await AIService(greedy).complete(messages)
+            assert await AIService(greedy).complete(messages) == "Reply 3"
+            assert len(stub.requests) == 3
+        # The temperature that makes a call cacheable is the one the provider sampled with
+        assert [r.get("temperature") for r in stub.requests] == [0.7, 0.7, 0.0]
+
+    @pytest.mark.asyncio
+    async def test_unset_temperature_is_not_treated_as_greedy(self, cache_dir: Path) -> None:
+        messages = [{"role": "user", "content": "hi"}]
+        async with _stub_provider() as stub:
+            config = _config(stub.base_url, temperature=None)
+            response_cache.configure_response_cache(config, cache_dir)
+            await AIService(config).complete(messages)
+            await AIService(config).complete(messages)
+        assert len(stub.requests) == 2
+        assert "temperature" not in stub.requests[0]
+
+    @pytest.mark.asyncio
+    async def test_disabled_never_touches_the_cache(self, cache_dir: Path) -> None:
+        async with _stub_provider() as stub:
+            config = _config(stub.base_url, response_cache=False)
+            assert response_cache.configure_response_cache(config, cache_dir) is None
+            await AIService(config).generate_title("same")
+            await AIService(config).generate_title("same")
+        assert len(stub.requests) == 2
+        assert not (cache_dir / "response_cache.db").exists()
+
+    @pytest.mark.asyncio
+    async def test_failed_calls_are_not_cached(self, cache_dir: Path) -> None:
+        config = _config("http://127.0.0.1:9/v1", connect_timeout=1)
+        response_cache.configure_response_cache(config, cache_dir)
+        assert await AIService(config).generate_title("x") == "New Conversation"
+        assert response_cache.get_response_cache().stats()["entries"] == 0
+
+
+class TestResponseCache:
+    def test_key_is_canonical(self) -> None:
+        config = _config("http://127.0.0.1:9/v1")
+        a = cache_key(config, [{"role": "user", "content": "hi"}], params={"a": 1, "b": 2})
+        b = cache_key(config, [{"content": "hi", "role": "user"}], params={"b": 2, "a": 1, "c": None})
+        assert a == b
+        assert a != cache_key(_config("http://127.0.0.1:9/v1", model="other"), [{"role": "user", "content": "hi"}])
+
+    def test_ttl_expiry(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        cache = ResponseCache(tmp_path / "c.db", ttl=60)
+        cache.put("k", "v", model="m", total_tokens=5)
+        assert cache.get("k") == "v"
+        now = response_cache.time.time()
+        monkeypatch.setattr(response_cache.time, "time", lambda: now + 61)
+        assert cache.get("k") is None
+        assert cache.stats()["entries"] == 0
+        cache.close()
+
+    def test_least_recently_used_evicted(self, tmp_path: Path) -> None:
+        cache = ResponseCache(tmp_path / "c.db", max_entries=2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        cache.get("a")
+        cache.put("c", "3")
+        cache._trim(cache._get_conn(), response_cache.time.time())
+        assert cache.get("a") == "1"
+        assert cache.get("b") is None
+        assert cache.get("c") == "3"
+        cache.close()
+
+    def test_usage_stats_from_another_process(self, cache_dir: Path) -> None:
+        cache = ResponseCache(cache_dir / "response_cache.db")
+        cache.put("k", "v", model="m", total_tokens=100)
+        cache.get("k")
+        cache.get("k")
+        cache.close()
+        assert response_cache.response_cache_stats(cache_dir) == {"entries": 1, "hits": 2, "tokens_saved": 200}
+        assert response_cache.response_cache_stats(cache_dir, since="2999-01-01T00:00:00")["hits"] == 0
+        assert response_cache.response_cache_stats(cache_dir / "missing") is None
+
+
+class TestStoragePolicy:
+    def test_encrypt_at_rest_disables_and_empties_the_cache(
+        self, cache_dir: Path, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        cache = ResponseCache(cache_dir / "response_cache.db")
+        cache.put("k", "left by an unencrypted run")
+        cache.close()
+
+        opened = response_cache.configure_response_cache(
+            _config("http://127.0.0.1:9/v1"), cache_dir, encrypt_at_rest=True
+        )
+
+        assert opened is None
+        assert response_cache.get_response_cache() is None
+        assert "encrypt_at_rest" in caplog.text
+        assert response_cache.response_cache_stats(cache_dir)["entries"] == 0
+
+    def test_invalidate_clears_the_open_cache(self, cache_dir: Path) -> None:
+        cache = response_cache.configure_response_cache(_config("http://127.0.0.1:9/v1"), cache_dir)
+        assert cache is not None
+        cache.put("k", "v", model="m", total_tokens=10)
+        cache.get("k")
+
+        response_cache.invalidate_response_cache(cache_dir)
+
+        assert cache.get("k") is None
+        assert cache.stats() == {"entries": 0, "hits": 1, "tokens_saved": 10}
+
+    def test_invalidate_clears_a_cache_another_process_wrote(self, cache_dir: Path) -> None:
+        cache = ResponseCache(cache_dir / "response_cache.db")
+        cache.put("k", "v")
+        cache.close()
+
+        response_cache.invalidate_response_cache(cache_dir)
+        response_cache.invalidate_response_cache(cache_dir / "missing")
+
+        assert response_cache.response_cache_stats(cache_dir)["entries"] == 0
+        assert not (cache_dir / "missing").exists()
+
+
+class TestConfig:
+    def test_defaults_off(self) -> None:
+        config = AIConfig(base_url="http://x", api_key="k")
+        assert config.response_cache is False
+        assert (config.response_cache_ttl, config.response_cache_max_entries) == (604_800, 10_000)
+
+    def test_load_config_parses_and_clamps(self, tmp_path: Path) -> None:
+        from anteroom.config import load_config
+
+        cfg_file = tmp_path / "config.yaml"
+        cfg_file.write_text(
+            "ai:\n  base_url: http://localhost:8080\n  api_key: test\n"
+            "  response_cache: true\n  response_cache_ttl: 5\n  response_cache_max_entries: nope\n"
+        )
+        config, _ = load_config(cfg_file)
+        assert config.ai.response_cache is True
+        assert config.ai.response_cache_ttl == 60
+        assert config.ai.response_cache_max_entries == 10_000
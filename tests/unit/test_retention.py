@@ -112,6 +112,21 @@ class TestPurgeConversationsBefore:
         rows = conn.execute("SELECT id FROM conversations").fetchall()
         assert len(rows) == 1  # Still there
 
+    def test_empties_the_response_cache(self, tmp_path: Path) -> None:
+        from anteroom.services.response_cache import ResponseCache, response_cache_stats
+
+        cache = ResponseCache(tmp_path / "response_cache.db")
+        cache.put("k", "summary of an old conversation")
+        cache.close()
+        conn = _create_test_db(tmp_path)
+        _insert_conversation(conn, "old-conv", "2024-01-01T00:00:00")
+
+        purge_conversations_before(conn, datetime(2025, 6, 1, tzinfo=timezone.utc), tmp_path, dry_run=True)
+        assert response_cache_stats(tmp_path)["entries"] == 1
+
+        purge_conversations_before(conn, datetime(2025, 6, 1, tzinfo=timezone.utc), tmp_path)
+        assert response_cache_stats(tmp_path)["entries"] == 0
+
     def test_deletes_attachment_files(self, tmp_path: Path) -> None:
         conn = _create_test_db(tmp_path)
         cid = "a1b2c3d4-e5f6-7890-abcd-ef1234567890"
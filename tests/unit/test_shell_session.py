@@ -0,0 +1,166 @@
+"""Tests for persistent bash shell sessions (tools/shell_session.py)."""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+from anteroom.tools.bash import handle
+from anteroom.tools.shell_session import ShellSession, ShellSessionPool
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="persistent shells are POSIX only")
+
+
+async def _run(session: ShellSession, command: str, timeout: float = 10) -> dict:
+    return await session.run(command, timeout=timeout, max_output=10_000)
+
+
+class TestShellSession:
+    @pytest.mark.asyncio
+    async def test_directory_and_environment_persist(self, tmp_path: Path) -> None:
+        (tmp_path / "sub").mkdir()
+        session = ShellSession(str(tmp_path))
+        try:
+            await _run(session, "cd sub && export GREETING=hi")
+            result = await _run(session, 'pwd; echo "$GREETING"')
+        finally:
+            await session.close()
+        assert result == {"stdout": f"{tmp_path / 'sub'}\nhi\n", "stderr": "", "exit_code": 0}
+        assert session.commands_run == 2 and session.restarts == 0
+
+    @pytest.mark.asyncio
+    async def test_exit_status_and_stderr(self, tmp_path: Path) -> None:
+        session = ShellSession(str(tmp_path))
+        try:
+            failed = await _run(session, "echo oops >&2; false")
+            syntax = await _run(session, "if then fi")
+            after = await _run(session, "echo still here")
+        finally:
+            await session.close()
+        assert failed == {"stdout": "", "stderr": "oops\n", "exit_code": 1}
+        assert syntax["exit_code"] != 0 and syntax["stderr"]
+        assert after["stdout"] == "still here\n"
+
+    @pytest.mark.asyncio
+    async def test_output_without_trailing_newline_is_kept(self, tmp_path: Path) -> None:
+        session = ShellSession(str(tmp_path))
+        try:
+            result = await _run(session, "printf abc")
+        finally:
+            await session.close()
+        assert result["stdout"] == "abc"
+
+    @pytest.mark.asyncio
+    async def test_timeout_interrupts_command_and_keeps_state(self, tmp_path: Path) -> None:
+        session = ShellSession(str(tmp_path))
+        try:
+            await _run(session, "export KEEP=yes")
+            timed_out = await _run(session, "echo partial; sleep 30", timeout=0.5)
+            result = await _run(session, 'echo "$KEEP"')
+        finally:
+            await session.close()
+        assert timed_out["exit_code"] == -1
+        assert "timed out" in timed_out["error"]
+        assert timed_out["stdout"] == "partial\n"
+        assert result["stdout"] == "yes\n"
+        assert session.restarts == 0
+
+    @pytest.mark.asyncio
+    async def test_exited_shell_is_restarted(self, tmp_path: Path) -> None:
+        session = ShellSession(str(tmp_path))
+        try:
+            await _run(session, "export GONE=1")
+            exited = await _run(session, "exit 7")
+            result = await _run(session, 'echo "[$GONE]"')
+        finally:
+            await session.close()
+        assert exited["exit_code"] == 7 and exited["shell_exited"] is True
+        assert result["stdout"] == "[]\n" and result["shell_restarted"] is True
+        assert session.restarts == 1
+
+    @pytest.mark.asyncio
+    async def test_idle_shell_is_closed(self, tmp_path: Path) -> None:
+        session = ShellSession(str(tmp_path), idle_timeout=0.2)
+        await _run(session, "true")
+        assert session.alive
+        await asyncio.sleep(0.5)
+        assert not session.alive
+        result = await _run(session, "echo back")
+        second = await _run(session, "true")
+        await session.close()
+        assert result["stdout"] == "back\n"
+        # The model is told its cd/export state is gone
+        assert result["shell_restarted"] is True
+        assert "shell_restarted" not in second
+
+    @pytest.mark.asyncio
+    async def test_concurrent_commands_are_serialized(self, tmp_path: Path) -> None:
+        session = ShellSession(str(tmp_path))
+        try:
+            results = await asyncio.gather(*(_run(session, f"sleep 0.05; echo {i}") for i in range(5)))
+        finally:
+            await session.close()
+        assert [r["stdout"] for r in results] == [f"{i}\n" for i in range(5)]
+
+
+class TestShellSessionPool:
+    @pytest.mark.asyncio
+    async def test_sessions_are_keyed_and_evicted(self, tmp_path: Path) -> None:
+        pool = ShellSessionPool(max_sessions=2)
+        a = pool.get("a", str(tmp_path))
+        assert pool.get("a", str(tmp_path)) is a
+        pool.get("b", str(tmp_path))
+        pool.get("c", str(tmp_path))
+        assert len(pool) == 2
+        assert pool.get("a", str(tmp_path)) is not a
+        await pool.close_all()
+        assert len(pool) == 0
+
+    @pytest.mark.asyncio
+    async def test_close_one_conversation(self, tmp_path: Path) -> None:
+        pool = ShellSessionPool()
+        a = pool.get("a", str(tmp_path))
+        b = pool.get("b", str(tmp_path))
+        await _run(a, "true")
+        await _run(b, "true")
+        await pool.close("a")
+        await pool.close("missing")
+        assert not a.alive and b.alive
+        assert len(pool) == 1
+        await pool.close_all()
+
+    @pytest.mark.asyncio
+    async def test_working_dir_change_replaces_session(self, tmp_path: Path) -> None:
+        pool = ShellSessionPool()
+        first = pool.get("conv", str(tmp_path))
+        await _run(first, "true")
+        second = pool.get("conv", str(tmp_path / ".."))
+        await asyncio.sleep(0.05)
+        assert second is not first and not first.alive
+        await pool.close_all()
+
+
+class TestBashHandle:
+    @pytest.mark.asyncio
+    async def test_handle_runs_in_session(self, tmp_path: Path) -> None:
+        (tmp_path / "sub").mkdir()
+        session = ShellSession(str(tmp_path))
+        try:
+            await handle("cd sub", _shell_session=session)
+            result = await handle("pwd", _shell_session=session)
+        finally:
+            await session.close()
+        assert result["stdout"] == f"{tmp_path / 'sub'}\n"
+
+    @pytest.mark.asyncio
+    async def test_safety_checks_still_apply(self, tmp_path: Path) -> None:
+        session = ShellSession(str(tmp_path))
+        try:
+            result = await handle("rm -rf /", _shell_session=session)
+        finally:
+            await session.close()
+        assert "error" in result
+        assert session.commands_run == 0
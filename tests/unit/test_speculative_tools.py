@@ -0,0 +1,346 @@
+"""Tests for speculative tool execution (services/speculative_tools.py)."""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from anteroom.config import SafetyConfig
+from anteroom.services.agent_loop import _execute_tool, run_agent_loop
+from anteroom.services.speculative_tools import SpeculativeToolRunner, tool_call_ready_event
+from anteroom.tools import ToolRegistry
+
+# --- Helpers ---
+
+
+@dataclass
+class _Fn:
+    name: str | None = None
+    arguments: str | None = None
+
+
+@dataclass
+class _TcDelta:
+    index: int = 0
+    id: str | None = None
+    function: _Fn | None = None
+
+
+@dataclass
+class _Delta:
+    content: str | None = None
+    tool_calls: list[Any] | None = None
+
+
+@dataclass
+class _Choice:
+    delta: _Delta | None = None
+    finish_reason: str | None = None
+
+
+@dataclass
+class _Chunk:
+    choices: list[_Choice] | None = None
+
+
+def _tc_chunk(index: int, *, id: str | None = None, name: str | None = None, args: str | None = None) -> _Chunk:
+    delta = _Delta(tool_calls=[_TcDelta(index=index, id=id, function=_Fn(name=name, arguments=args))])
+    return _Chunk(choices=[_Choice(delta=delta)])
+
+
+class _ScriptedModel:
+    """Streams a fixed tool-call turn, pausing between calls like a real model."""
+
+    def __init__(self, calls: list[tuple[str, dict[str, Any]]], gap: float = 0.05, cancel_after_ready: bool = False):
+        self.config = SimpleNamespace(model="stub-model", provider="openai")
+        self._calls = calls
+        self._gap = gap
+        self._cancel_after_ready = cancel_after_ready
+        self.turns = 0
+        self.cancel_event: asyncio.Event | None = None
+
+    async def stream_chat(self, messages: Any, tools: Any = None, cancel_event: Any = None, **kwargs: Any) -> Any:
+        self.turns += 1
+        if self.turns > 1:
+            yield {"event": "token", "data": {"content": "done"}}
+            yield {"event": "done", "data": {}}
+            return
+        for i, (name, args) in enumerate(self._calls):
+            await asyncio.sleep(self._gap)
+            yield {
+                "event": "tool_call_ready",
+                "data": {"index": i, "id": f"call_{i}", "function_name": name, "arguments": args},
+            }
+            if self._cancel_after_ready and cancel_event is not None:
+                await asyncio.sleep(self._gap)
+                cancel_event.set()
+                return
+        await asyncio.sleep(self._gap)
+        for i, (name, args) in enumerate(self._calls):
+            yield {"event": "tool_call", "data": {"id": f"call_{i}", "function_name": name, "arguments": args}}
+
+
+class _RecordingExecutor:
+    def __init__(self, delay: float = 0.05) -> None:
+        self.delay = delay
+        self.calls: list[str] = []
+        self.finished: list[str] = []
+
+    async def __call__(self, name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+        self.calls.append(name)
+        await asyncio.sleep(self.delay)
+        self.finished.append(name)
+        return {"content": f"{name} ok"}
+
+
+def _read_only(name: str, arguments: dict[str, Any]) -> bool:
+    return name in ("read_file", "grep")
+
+
+async def _drive(model: _ScriptedModel, executor: _RecordingExecutor, **kwargs: Any) -> list[Any]:
+    events = []
+    async for event in run_agent_loop(
+        ai_service=model,  # type: ignore[arg-type]
+        messages=[{"role": "user", "content": "go"}],
+        tool_executor=executor,
+        tools_openai=None,
+        **kwargs,
+    ):
+        events.append(event)
+    return events
+
+
+# --- tool_call_ready_event ---
+
+
+class TestToolCallReadyEvent:
+    def test_parses_complete_arguments(self) -> None:
+        event = tool_call_ready_event(2, {"id": "c", "function_name": "grep", "arguments": '{"pattern": "x"}'})
+        assert event == {
+            "event": "tool_call_ready",
+            "data": {"index": 2, "id": "c", "function_name": "grep", "arguments": {"pattern": "x"}},
+        }
+
+    def test_incomplete_or_non_object_arguments(self) -> None:
+        assert tool_call_ready_event(0, {"id": "c", "function_name": "grep", "arguments": '{"pat'}) is None
+        assert tool_call_ready_event(0, {"id": "c", "function_name": "grep", "arguments": "[1]"}) is None
+        assert tool_call_ready_event(0, {"id": "c", "function_name": "", "arguments": "{}"}) is None
+
+
+# --- Provider emission ---
+
+
+class TestAiServiceEmitsReady:
+    @pytest.mark.asyncio
+    async def test_previous_call_ready_when_next_starts(self) -> None:
+        from anteroom.services.ai_service import AIService
+
+        chunks = [
+            _tc_chunk(0, id="call_a", name="read_file"),
+            _tc_chunk(0, args='{"path": "a.py"}'),
+            _tc_chunk(1, id="call_b", name="grep"),
+            _tc_chunk(1, args='{"pattern": "x"}'),
+            _Chunk(choices=[_Choice(delta=_Delta(), finish_reason="tool_calls")]),
+        ]
+
+        async def fake_stream():
+            for c in chunks:
+                yield c
+
+        mock_client = MagicMock()
+        mock_client.chat.completions.create = AsyncMock(return_value=fake_stream())
+        config = MagicMock()
+        config.model = "test-model"
+        config.system_prompt = None
+        config.retry_max_attempts = 0
+        config.first_token_timeout = 30
+
+        with patch.object(AIService, "_build_client"), patch.object(AIService, "_validate_egress"):
+            service = AIService(config)
+        service.client = mock_client
+
+        events = [e async for e in service.stream_chat([{"role": "user", "content": "t"}])]
+        kinds = [e["event"] for e in events]
+
+        ready = [e["data"] for e in events if e["event"] == "tool_call_ready"]
+        assert ready == [{"index": 0, "id": "call_a", "function_name": "read_file", "arguments": {"path": "a.py"}}]
+        # Announced before the second call's first delta, long before finish
+        assert kinds.index("tool_call_ready") < kinds.index("tool_call")
+        assert len([e for e in events if e["event"] == "tool_call"]) == 2
+
+
+# --- SpeculativeToolRunner ---
+
+
+class TestSpeculativeToolRunner:
+    @pytest.mark.asyncio
+    async def test_claim_reuses_matching_task(self) -> None:
+        executor = _RecordingExecutor(delay=0)
+        runner = SpeculativeToolRunner(lambda tc: _execute_tool(tc, executor, None), _read_only)
+        assert runner.offer({"index": 0, "id": "c1", "function_name": "read_file", "arguments": {"path": "a"}})
+        task = runner.claim({"id": "c1", "function_name": "read_file", "arguments": {"path": "a"}})
+        assert task is not None
+        tc, result, status = await task
+        assert (tc["id"], result, status) == ("c1", {"content": "read_file ok"}, "success")
+        assert runner.used == 1 and runner.discarded == 0
+        assert executor.calls == ["read_file"]
+
+    @pytest.mark.asyncio
+    async def test_ineligible_call_not_started(self) -> None:
+        executor = _RecordingExecutor(delay=0)
+        runner = SpeculativeToolRunner(lambda tc: _execute_tool(tc, executor, None), _read_only)
+        assert not runner.offer({"index": 0, "id": "c1", "function_name": "write_file", "arguments": {}})
+        await asyncio.sleep(0)
+        assert executor.calls == []
+        assert runner.claim({"id": "c1", "function_name": "write_file", "arguments": {}}) is None
+
+    @pytest.mark.asyncio
+    async def test_mismatched_arguments_discarded(self) -> None:
+        executor = _RecordingExecutor(delay=1)
+        runner = SpeculativeToolRunner(lambda tc: _execute_tool(tc, executor, None), _read_only)
+        runner.offer({"index": 0, "id": "c1", "function_name": "read_file", "arguments": {"path": "a"}})
+        await asyncio.sleep(0)
+        assert runner.claim({"id": "c1", "function_name": "read_file", "arguments": {"path": "b"}}) is None
+        assert runner.discarded == 1
+        assert len(runner) == 0
+
+    @pytest.mark.asyncio
+    async def test_discard_all_cancels_pending(self) -> None:
+        executor = _RecordingExecutor(delay=1)
+        runner = SpeculativeToolRunner(lambda tc: _execute_tool(tc, executor, None), _read_only)
+        runner.offer({"index": 0, "id": "c1", "function_name": "grep", "arguments": {}})
+        await asyncio.sleep(0)
+        runner.discard_all()
+        await asyncio.sleep(0)
+        assert runner.discarded == 1
+        assert executor.finished == []
+
+    @pytest.mark.asyncio
+    async def test_reads_after_an_ineligible_call_wait_for_the_turn(self) -> None:
+        executor = _RecordingExecutor(delay=0)
+        runner = SpeculativeToolRunner(lambda tc: _execute_tool(tc, executor, None), _read_only)
+        assert runner.offer({"index": 0, "id": "c0", "function_name": "read_file", "arguments": {}})
+        assert not runner.offer({"index": 1, "id": "c1", "function_name": "write_file", "arguments": {}})
+        assert not runner.offer({"index": 2, "id": "c2", "function_name": "read_file", "arguments": {}})
+        runner.discard_all()
+        # The next turn starts unblocked
+        assert runner.offer({"index": 0, "id": "c3", "function_name": "grep", "arguments": {}})
+        runner.discard_all()
+
+    @pytest.mark.asyncio
+    async def test_discarded_run_refunds_rate_limited_calls(self) -> None:
+        from anteroom.services.tool_rate_limit import ToolRateLimiter
+
+        limiter = ToolRateLimiter()
+
+        async def _executor(name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+            limiter.record_call()
+            return {"content": "ok"}
+
+        runner = SpeculativeToolRunner(lambda tc: _execute_tool(tc, _executor, None), _read_only)
+        runner.offer({"index": 0, "id": "c1", "function_name": "read_file", "arguments": {"path": "a"}})
+        runner.offer({"index": 1, "id": "c2", "function_name": "grep", "arguments": {}})
+        await asyncio.sleep(0.01)
+        assert limiter.total_calls == 2
+
+        task = runner.claim({"id": "c1", "function_name": "read_file", "arguments": {"path": "a"}})
+        assert task is not None
+        await task
+        runner.discard_all()
+        assert limiter.total_calls == 1
+        assert limiter.check() is None
+
+    @pytest.mark.asyncio
+    async def test_predicate_errors_mean_no_speculation(self) -> None:
+        def _boom(name: str, arguments: dict[str, Any]) -> bool:
+            raise RuntimeError("nope")
+
+        runner = SpeculativeToolRunner(lambda tc: _execute_tool(tc, _RecordingExecutor(), None), _boom)
+        assert not runner.offer({"index": 0, "id": "c1", "function_name": "grep", "arguments": {}})
+
+
+# --- Agent loop integration ---
+
+
+class TestAgentLoopSpeculation:
+    def test_read_only_calls_start_before_stream_finishes(self) -> None:
+        model = _ScriptedModel([("read_file", {"path": "a"}), ("grep", {"pattern": "b"}), ("write_file", {})])
+        executor = _RecordingExecutor(delay=0.05)
+
+        events = asyncio.run(_drive(model, executor, can_speculate=_read_only))
+
+        ends = {e.data["tool_name"]: e.data for e in events if e.kind == "tool_call_end"}
+        assert ends["read_file"].get("speculative") is True
+        assert ends["grep"].get("speculative") is True
+        assert "speculative" not in ends["write_file"]
+        # Each call ran exactly once
+        assert sorted(executor.calls) == ["grep", "read_file", "write_file"]
+        assert events[-1].kind == "done"
+
+    def test_disabled_without_predicate(self) -> None:
+        model = _ScriptedModel([("read_file", {"path": "a"})])
+        executor = _RecordingExecutor(delay=0)
+
+        events = asyncio.run(_drive(model, executor))
+
+        ends = [e.data for e in events if e.kind == "tool_call_end"]
+        assert len(ends) == 1 and "speculative" not in ends[0]
+
+    def test_serialized_tools_never_speculate(self) -> None:
+        model = _ScriptedModel([("read_file", {"path": "a"}), ("grep", {"pattern": "b"})])
+        executor = _RecordingExecutor(delay=0)
+
+        events = asyncio.run(_drive(model, executor, can_speculate=_read_only, serialize_tools=True))
+
+        assert all("speculative" not in e.data for e in events if e.kind == "tool_call_end")
+        assert executor.calls == ["read_file", "grep"]
+
+    def test_cancelled_turn_discards_results(self) -> None:
+        model = _ScriptedModel([("read_file", {"path": "a"})], cancel_after_ready=True)
+        executor = _RecordingExecutor(delay=0.2)
+
+        async def _run() -> list[Any]:
+            events = await _drive(model, executor, can_speculate=_read_only, cancel_event=asyncio.Event())
+            await asyncio.sleep(0.3)
+            return events
+
+        events = asyncio.run(_run())
+
+        assert not any(e.kind == "tool_call_end" for e in events)
+        assert executor.calls == ["read_file"]
+        assert executor.finished == []
+
+
+# --- ToolRegistry.can_speculate ---
+
+
+class TestRegistryCanSpeculate:
+    def _registry(self, **safety: Any) -> ToolRegistry:
+        registry = ToolRegistry()
+
+        async def _handler(**kwargs: Any) -> dict[str, Any]:
+            return {}
+
+        for name in ("read_file", "write_file", "create_canvas"):
+            registry.register(name, _handler, {"name": name})
+        registry.set_safety_config(SafetyConfig(**safety))
+        return registry
+
+    def test_auto_allowed_read_tool(self) -> None:
+        assert self._registry().can_speculate("read_file", {"path": "a"})
+
+    def test_write_and_canvas_tools_rejected(self) -> None:
+        registry = self._registry()
+        assert not registry.can_speculate("write_file", {"path": "a", "content": ""})
+        assert not registry.can_speculate("create_canvas", {"title": "t"})
+
+    def test_denied_tool_rejected(self) -> None:
+        assert not self._registry(denied_tools=["read_file"]).can_speculate("read_file", {"path": "a"})
+
+    def test_unregistered_tool_rejected(self) -> None:
+        assert not self._registry().can_speculate("grep", {"pattern": "x"})
@@ -22,8 +22,10 @@ from anteroom.services.storage import (
     delete_message,
     delete_messages_after_position,
     delete_tag,
+    ensure_message_token_counts,
     fork_conversation,
     get_conversation,
+    get_conversation_summary,
     get_conversation_tags,
     list_conversations,
     list_folders,
@@ -35,6 +37,7 @@ from anteroom.services.storage import (
     remove_tag_from_conversation,
     replace_document_content,
     save_attachment,
+    save_conversation_summary,
     update_conversation_slug,
     update_conversation_title,
     update_conversation_type,
@@ -494,6 +497,70 @@ class TestUpdateMessageContent:
         assert result is None
 
 
+class TestMessageTokenCounts:
+    def test_counts_are_persisted_once(self, db: sqlite3.Connection) -> None:
+        from anteroom.services.token_counter import TokenCounter
+
+        conv = create_conversation(db, title="Tokens")
+        create_message(db, conv["id"], "user", "hello world")
+        create_message(db, conv["id"], "assistant", "hi there")
+        counter = TokenCounter()
+        total = ensure_message_token_counts(db, list_messages(db, conv["id"]), counter)
+        assert total > 0
+
+        rows = list_messages(db, conv["id"])
+        assert all(r["content_tokens"] is not None for r in rows)
+        assert all(r["token_encoding"] == counter.encoding_name for r in rows)
+
+        counter.count_text = lambda text: pytest.fail("stored counts should be reused")  # type: ignore[method-assign]
+        assert ensure_message_token_counts(db, rows, counter) == total
+
+    def test_edit_clears_stored_count(self, db: sqlite3.Connection) -> None:
+        from anteroom.services.token_counter import TokenCounter
+
+        conv = create_conversation(db, title="Tokens")
+        msg = create_message(db, conv["id"], "user", "original")
+        ensure_message_token_counts(db, list_messages(db, conv["id"]), TokenCounter())
+        updated = update_message_content(db, conv["id"], msg["id"], "edited " * 50)
+        assert updated is not None
+        assert updated["content_tokens"] is None
+
+
+class TestConversationSummaries:
+    def test_save_and_replace(self, db: sqlite3.Connection) -> None:
+        conv = create_conversation(db, title="Summary")
+        assert get_conversation_summary(db, conv["id"]) is None
+        save_conversation_summary(db, conv["id"], "first", upto_position=3, covered_messages=4)
+        save_conversation_summary(db, conv["id"], "second", upto_position=7, covered_messages=8)
+        row = get_conversation_summary(db, conv["id"])
+        assert row is not None
+        assert (row["content"], row["upto_position"], row["covered_messages"]) == ("second", 7, 8)
+
+    def test_editing_covered_message_drops_summary(self, db: sqlite3.Connection) -> None:
+        conv = create_conversation(db, title="Summary")
+        first = create_message(db, conv["id"], "user", "a")
+        create_message(db, conv["id"], "assistant", "b")
+        save_conversation_summary(db, conv["id"], "s", upto_position=0, covered_messages=1)
+        update_message_content(db, conv["id"], first["id"], "changed")
+        assert get_conversation_summary(db, conv["id"]) is None
+
+    def test_editing_later_message_keeps_summary(self, db: sqlite3.Connection) -> None:
+        conv = create_conversation(db, title="Summary")
+        create_message(db, conv["id"], "user", "a")
+        second = create_message(db, conv["id"], "assistant", "b")
+        save_conversation_summary(db, conv["id"], "s", upto_position=0, covered_messages=1)
+        update_message_content(db, conv["id"], second["id"], "changed")
+        assert get_conversation_summary(db, conv["id"]) is not None
+
+    def test_rewind_into_covered_span_drops_summary(self, db: sqlite3.Connection) -> None:
+        conv = create_conversation(db, title="Summary")
+        for text in ("a", "b", "c", "d"):
+            create_message(db, conv["id"], "user", text)
+        save_conversation_summary(db, conv["id"], "s", upto_position=2, covered_messages=3)
+        delete_messages_after_position(db, conv["id"], 1)
+        assert get_conversation_summary(db, conv["id"]) is None
+
+
 class TestDeleteMessagesAfterPosition:
     def test_delete_messages_after_position(self, db: sqlite3.Connection) -> None:
         conv = create_conversation(db, title="Delete")
@@ -1,8 +1,12 @@
-"""Tests for _extract_streaming_content in chat router."""
+"""Tests for _extract_streaming_content and _StreamingStringField in chat router."""
 
 from __future__ import annotations
 
-from anteroom.routers.chat import _extract_streaming_content
+import json
+
+import pytest
+
+from anteroom.routers.chat import _extract_streaming_content, _StreamingStringField
 
 
 class TestExtractStreamingContent:
@@ -88,3 +92,48 @@ class TestExtractStreamingContent:
         assert results[3] == "hel"
         assert results[4] == "hello w"
         assert results[5] == "hello world"
+
+
+class TestStreamingStringField:
+    """_StreamingStringField — resumable extractor fed one delta at a time."""
+
+    _ARGS = json.dumps(
+        {"title": "Doc", "language": "python", "content": "def f():\n\treturn \"café \\\\ ☃\" + '/'\n"},
+        ensure_ascii=True,
+    )
+
+    @pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64])
+    def test_chunked_feed_matches_whole_value(self, size: int) -> None:
+        parser = _StreamingStringField("content")
+        pieces = [parser.feed(self._ARGS[i : i + size]) for i in range(0, len(self._ARGS), size)]
+        assert "".join(p for p in pieces if p) == json.loads(self._ARGS)["content"]
+        assert parser.started and parser.consumed == len(self._ARGS)
+
+    def test_escape_split_across_deltas(self) -> None:
+        parser = _StreamingStringField("content")
+        assert parser.feed('{"content": "a\\') == "a"
+        assert parser.feed("u00") == ""
+        assert parser.feed("e9\\") == "é"
+        assert parser.feed('n"}') == "\n"
+        assert parser.feed("trailing") == ""
+
+    def test_key_split_across_deltas(self) -> None:
+        parser = _StreamingStringField("content")
+        assert parser.feed('{"title": "x", "cont') is None
+        assert parser.feed('ent"') is None
+        assert parser.feed(" :") is None
+        assert parser.feed(' "') == ""
+        assert parser.feed("hi") == "hi"
+
+    def test_non_string_value_never_starts(self) -> None:
+        parser = _StreamingStringField("content")
+        assert parser.feed('{"content": 4') is None
+        assert parser.feed('2, "content": "x"}') is None
+        assert not parser.started
+
+    def test_head_keeps_raw_text_until_first_value_characters(self) -> None:
+        parser = _StreamingStringField("content")
+        parser.feed('{"language": "go", ')
+        parser.feed('"content": "pack')
+        parser.feed("age main")
+        assert parser.head == '{"language": "go", "content": "pack'
@@ -250,6 +250,26 @@ class TestSubagentHandler:
         assert result["elapsed_seconds"] >= 0
         assert result["tool_calls_made"] == []
 
+    @pytest.mark.asyncio
+    async def test_shared_http_client_left_open(self) -> None:
+        """The child's HTTP client is the shared connection pool and must not be closed."""
+        mock_registry = MagicMock()
+        mock_registry.get_openai_tools.return_value = []
+
+        async def mock_agent_loop(**kwargs):
+            yield AgentEvent(kind="done", data={})
+
+        with patch("anteroom.tools.subagent.run_agent_loop", side_effect=mock_agent_loop):
+            with patch("anteroom.tools.subagent.AIService") as mock_service_cls:
+                await handle(
+                    prompt="hi",
+                    _ai_service=_mock_ai(),
+                    _tool_registry=mock_registry,
+                    _limiter=_make_limiter(),
+                )
+
+        mock_service_cls.return_value.client.close.assert_not_called()
+
     @pytest.mark.asyncio
     async def test_model_override(self) -> None:
         mock_registry = MagicMock()
@@ -399,7 +419,7 @@ class TestSubagentHandler:
 
     @pytest.mark.asyncio
     async def test_cancel_event_propagated(self) -> None:
-        """Cancel event should be forwarded to the child agent loop."""
+        """Cancelling the parent should cancel the child agent loop."""
         mock_registry = MagicMock()
         mock_registry.get_openai_tools.return_value = []
 
@@ -407,7 +427,11 @@ class TestSubagentHandler:
         captured_cancel: list = []
 
         async def mock_agent_loop(**kwargs):
-            captured_cancel.append(kwargs.get("cancel_event"))
+            child_cancel = kwargs.get("cancel_event")
+            assert not child_cancel.is_set()
+            cancel.set()
+            await asyncio.wait_for(child_cancel.wait(), timeout=1)
+            captured_cancel.append(child_cancel)
             yield AgentEvent(kind="done", data={})
 
         with patch("anteroom.tools.subagent.run_agent_loop", side_effect=mock_agent_loop):
@@ -421,7 +445,7 @@ class TestSubagentHandler:
                     _limiter=_make_limiter(),
                 )
 
-        assert captured_cancel[0] is cancel
+        assert captured_cancel[0].is_set()
 
 
 class TestSubagentLimiter:
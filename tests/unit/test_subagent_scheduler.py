@@ -0,0 +1,456 @@
+"""Tests for the process-wide sub-agent scheduler (services/subagent_scheduler.py)."""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from anteroom.config import SubagentConfig
+from anteroom.services.agent_loop import AgentEvent
+from anteroom.services.subagent_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    SubagentAdmissionError,
+    SubagentScheduler,
+)
+from anteroom.tools.subagent import SubagentLimiter, handle
+
+
+async def _settle() -> None:
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def _mock_ai() -> MagicMock:
+    mock = MagicMock()
+    mock.config = MagicMock()
+    mock.config.model = "gpt-4"
+    mock.config.max_tools = 128
+    mock._token_provider = None
+    return mock
+
+
+def _registry() -> MagicMock:
+    registry = MagicMock()
+    registry.get_openai_tools.return_value = []
+    return registry
+
+
+class TestAdmission:
+    @pytest.mark.asyncio
+    async def test_global_cap_queues_and_release_dispatches(self) -> None:
+        scheduler = SubagentScheduler(max_concurrent=1, max_per_user=5)
+        scope = scheduler.scope(user="u1", conversation_id="c1")
+        assert await scope.acquire() < 0.1
+
+        second = asyncio.create_task(scope.acquire())
+        await _settle()
+        assert not second.done()
+        assert scheduler.stats()["queued"] == 1
+
+        scope.release()
+        assert await second >= 0
+        assert scheduler.stats()["running"] == 1
+        assert scheduler.stats()["queued"] == 0
+
+    @pytest.mark.asyncio
+    async def test_per_user_cap(self) -> None:
+        scheduler = SubagentScheduler(max_concurrent=10, max_per_user=1)
+        alice = scheduler.scope(user="alice", conversation_id="c1")
+        bob = scheduler.scope(user="bob", conversation_id="c2")
+        await alice.acquire()
+        blocked = asyncio.create_task(alice.acquire())
+        await bob.acquire()
+        await _settle()
+        assert not blocked.done()
+        alice.release()
+        await blocked
+        assert scheduler.stats()["running"] == 2
+
+    @pytest.mark.asyncio
+    async def test_interactive_served_before_background(self) -> None:
+        scheduler = SubagentScheduler(max_concurrent=1, max_per_user=5)
+        holder = scheduler.scope(user="u0")
+        await holder.acquire()
+        order: list[str] = []
+
+        async def _wait(name: str, priority: int) -> None:
+            scope = scheduler.scope(user=name, priority=priority)
+            await scope.acquire()
+            order.append(name)
+            scope.release()
+
+        background = asyncio.create_task(_wait("exec", PRIORITY_BACKGROUND))
+        await _settle()
+        interactive = asyncio.create_task(_wait("web", PRIORITY_INTERACTIVE))
+        await _settle()
+        assert scheduler.stats()["queued_by_priority"] == {"background": 1, "interactive": 1}
+
+        holder.release()
+        await asyncio.gather(background, interactive)
+        assert order == ["web", "exec"]
+
+    @pytest.mark.asyncio
+    async def test_fair_share_prefers_user_with_fewer_running(self) -> None:
+        scheduler = SubagentScheduler(max_concurrent=2, max_per_user=5)
+        heavy = scheduler.scope(user="heavy")
+        light = scheduler.scope(user="light")
+        await heavy.acquire()
+        await heavy.acquire()
+
+        heavy_waiter = asyncio.create_task(heavy.acquire())
+        await _settle()
+        light_waiter = asyncio.create_task(light.acquire())
+        await _settle()
+
+        heavy.release()
+        await light_waiter
+        assert not heavy_waiter.done()
+        light.release()
+        await heavy_waiter
+
+
+class TestQueueExit:
+    @pytest.mark.asyncio
+    async def test_queue_timeout(self) -> None:
+        scheduler = SubagentScheduler(max_concurrent=1, queue_timeout=0.05)
+        scope = scheduler.scope()
+        await scope.acquire()
+        with pytest.raises(SubagentAdmissionError, match="queue is full"):
+            await scope.acquire()
+        assert scheduler.stats()["queued"] == 0
+        assert scheduler.rejected == 1
+
+    @pytest.mark.asyncio
+    async def test_cancel_while_queued(self) -> None:
+        scheduler = SubagentScheduler(max_concurrent=1)
+        scope = scheduler.scope()
+        await scope.acquire()
+        cancel = asyncio.Event()
+        waiter = asyncio.create_task(scope.acquire(cancel))
+        await _settle()
+        cancel.set()
+        with pytest.raises(SubagentAdmissionError, match="cancelled"):
+            await waiter
+        scope.release()
+        stats = scheduler.stats()
+        assert (stats["running"], stats["queued"]) == (0, 0)
+
+    @pytest.mark.asyncio
+    async def test_task_cancellation_does_not_leak_a_slot(self) -> None:
+        scheduler = SubagentScheduler(max_concurrent=1)
+        scope = scheduler.scope()
+        await scope.acquire()
+        waiter = asyncio.create_task(scope.acquire())
+        await _settle()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        scope.release()
+        assert scheduler.stats()["running"] == 0
+        await scope.acquire()
+
+
+class TestTokenBudget:
+    @pytest.mark.asyncio
+    async def test_budget_rolls_up_per_conversation(self) -> None:
+        scheduler = SubagentScheduler(max_tokens_per_conversation=1000)
+        a = scheduler.scope(conversation_id="c1")
+        b = scheduler.scope(conversation_id="c1")
+        assert a.charge(600)
+        assert not b.charge(600)
+        assert a.tokens_used == 1200
+        assert scheduler.conversation_tokens("c2") == 0
+        with pytest.raises(SubagentAdmissionError, match="budget"):
+            await a.acquire()
+        await scheduler.scope(conversation_id="c2").acquire()
+
+    def test_zero_budget_is_unlimited(self) -> None:
+        scheduler = SubagentScheduler()
+        assert scheduler.charge("c1", 10**9)
+        assert not scheduler.budget_exhausted("c1")
+
+    @pytest.mark.asyncio
+    async def test_child_stopped_when_budget_spent(self) -> None:
+        scheduler = SubagentScheduler(max_tokens_per_conversation=100)
+        scope = scheduler.scope(conversation_id="c1")
+
+        async def mock_agent_loop(**kwargs):
+            yield AgentEvent(kind="token", data={"content": "partial"})
+            yield AgentEvent(kind="usage", data={"total_tokens": 150})
+            assert kwargs["cancel_event"].is_set()
+            yield AgentEvent(kind="done", data={})
+
+        with (
+            patch("anteroom.tools.subagent.run_agent_loop", side_effect=mock_agent_loop),
+            patch("anteroom.tools.subagent.AIService"),
+        ):
+            result = await handle(
+                prompt="go",
+                _ai_service=_mock_ai(),
+                _tool_registry=_registry(),
+                _limiter=SubagentLimiter(),
+                _schedule=scope,
+            )
+            assert "token budget" in result["error"]
+            assert result["tokens_used"] == 150
+            assert scheduler.stats()["running"] == 0
+
+            refused = await handle(
+                prompt="again",
+                _ai_service=_mock_ai(),
+                _tool_registry=_registry(),
+                _limiter=SubagentLimiter(),
+                _schedule=scope,
+            )
+        assert "budget" in refused["error"]
+
+
+class TestHandleIntegration:
+    @pytest.mark.asyncio
+    async def test_queue_wait_and_tokens_reported(self) -> None:
+        scheduler = SubagentScheduler(max_concurrent=1)
+        scope = scheduler.scope(conversation_id="c1")
+        events: list[AgentEvent] = []
+
+        async def sink(agent_id: str, event: AgentEvent) -> None:
+            events.append(event)
+
+        async def mock_agent_loop(**kwargs):
+            yield AgentEvent(kind="usage", data={"total_tokens": 42})
+            yield AgentEvent(kind="done", data={})
+
+        await scope.acquire()
+        with (
+            patch("anteroom.tools.subagent.run_agent_loop", side_effect=mock_agent_loop),
+            patch("anteroom.tools.subagent.AIService"),
+        ):
+            task = asyncio.create_task(
+                handle(
+                    prompt="go",
+                    _ai_service=_mock_ai(),
+                    _tool_registry=_registry(),
+                    _limiter=SubagentLimiter(),
+                    _event_sink=sink,
+                    _schedule=scope,
+                )
+            )
+            await asyncio.sleep(0.15)
+            scope.release()
+            result = await task
+
+        start = next(e for e in events if e.kind == "subagent_start")
+        end = next(e for e in events if e.kind == "subagent_end")
+        assert start.data["queue_wait_seconds"] >= 0.1
+        assert end.data["tokens_used"] == 42
+        assert result["tokens_used"] == 42
+        assert scope.tokens_used == 42
+        assert scheduler.stats()["running"] == 0
+
+    @pytest.mark.asyncio
+    async def test_nested_subagent_runs_under_parent_slot(self) -> None:
+        scheduler = SubagentScheduler(max_concurrent=1, queue_timeout=0.05)
+        scope = scheduler.scope()
+        await scope.acquire()
+
+        async def mock_agent_loop(**kwargs):
+            yield AgentEvent(kind="done", data={})
+
+        with (
+            patch("anteroom.tools.subagent.run_agent_loop", side_effect=mock_agent_loop),
+            patch("anteroom.tools.subagent.AIService"),
+        ):
+            result = await handle(
+                prompt="nested",
+                _ai_service=_mock_ai(),
+                _tool_registry=_registry(),
+                _limiter=SubagentLimiter(),
+                _depth=1,
+                _schedule=scope,
+            )
+        assert "error" not in result
+        assert scheduler.stats()["running"] == 1
+
+
+class TestPriorityContention:
+    @pytest.mark.asyncio
+    async def test_web_subagent_served_before_queued_workflow_step(self) -> None:
+        from anteroom.services.workflow_runners import execute_agent_runner
+
+        scheduler = SubagentScheduler(max_concurrent=1)
+        holder = scheduler.scope(user="web")
+        await holder.acquire()
+        started: list[str] = []
+
+        def _loop(name: str):
+            async def _run(**kwargs):
+                started.append(name)
+                yield AgentEvent(kind="usage", data={"total_tokens": 10})
+                yield AgentEvent(kind="done", data={})
+
+            return _run
+
+        with (
+            patch("anteroom.services.agent_loop.run_agent_loop", side_effect=_loop("workflow")),
+            patch("anteroom.tools.subagent.run_agent_loop", side_effect=_loop("subagent")),
+            patch("anteroom.tools.subagent.AIService"),
+        ):
+            step = asyncio.create_task(
+                execute_agent_runner(
+                    prompt="nightly report",
+                    ai_service=MagicMock(),
+                    tool_executor=MagicMock(),
+                    schedule=scheduler.scope(conversation_id="run-1", priority=PRIORITY_BACKGROUND),
+                )
+            )
+            await _settle()
+            subagent = asyncio.create_task(
+                handle(
+                    prompt="go",
+                    _ai_service=_mock_ai(),
+                    _tool_registry=_registry(),
+                    _limiter=SubagentLimiter(),
+                    _schedule=scheduler.scope(user="web", conversation_id="c1", priority=PRIORITY_INTERACTIVE),
+                )
+            )
+            for _ in range(50):
+                if scheduler.stats()["queued"] == 2:
+                    break
+                await asyncio.sleep(0.01)
+            assert scheduler.stats()["queued_by_priority"] == {"background": 1, "interactive": 1}
+
+            holder.release()
+            result, step_result = await asyncio.gather(subagent, step)
+
+        assert started == ["subagent", "workflow"]
+        assert "error" not in result
+        assert step_result.status == "success"
+        assert scheduler.conversation_tokens("run-1") == 10
+        assert scheduler.stats()["running"] == 0
+
+    @pytest.mark.asyncio
+    async def test_workflow_step_fails_when_not_admitted(self) -> None:
+        from anteroom.services.workflow_runners import execute_agent_runner
+
+        scheduler = SubagentScheduler(max_tokens_per_conversation=5)
+        scheduler.charge("run-1", 5)
+        result = await execute_agent_runner(
+            prompt="x",
+            ai_service=MagicMock(),
+            tool_executor=MagicMock(),
+            schedule=scheduler.scope(conversation_id="run-1", priority=PRIORITY_BACKGROUND),
+        )
+        assert result.status == "failed"
+        assert "budget" in result.summary
+
+    @pytest.mark.asyncio
+    async def test_queued_run_agent_holds_no_tool_permit(self) -> None:
+        from anteroom.services.tool_scheduler import ToolScheduler
+
+        scheduler = SubagentScheduler(max_concurrent=1)
+        holder = scheduler.scope()
+        await holder.acquire()
+        limited = ToolScheduler(max_parallel=1).limit(_queued_tool(scheduler))
+
+        queued = asyncio.create_task(limited("run_agent", {}))
+        await _settle()
+        assert await asyncio.wait_for(limited("read_file", {}), timeout=1) == "read_file"
+        holder.release()
+        assert await queued == "run_agent"
+
+    def test_one_scheduler_per_process(self) -> None:
+        from anteroom.services.subagent_scheduler import reset_shared_scheduler, shared_scheduler
+
+        reset_shared_scheduler()
+        try:
+            first = shared_scheduler(SubagentConfig(global_max_concurrent=3))
+            assert shared_scheduler(SubagentConfig(global_max_concurrent=9)) is first
+            assert first.max_concurrent == 3
+        finally:
+            reset_shared_scheduler()
+
+
+def _queued_tool(scheduler: SubagentScheduler):
+    async def _tool(name: str, arguments: dict) -> str:
+        if name == "run_agent":
+            scope = scheduler.scope()
+            await scope.acquire()
+            scope.release()
+        return name
+
+    return _tool
+
+
+class TestConfig:
+    def test_from_config(self) -> None:
+        cfg = SubagentConfig(
+            global_max_concurrent=3, max_concurrent_per_user=2, queue_timeout=9, max_tokens_per_conversation=500
+        )
+        scheduler = SubagentScheduler.from_config(cfg)
+        stats = scheduler.stats()
+        assert (stats["max_concurrent"], stats["max_per_user"]) == (3, 2)
+        assert scheduler.queue_timeout == 9.0
+        assert scheduler.max_tokens_per_conversation == 500
+
+    def test_load_config_clamps_scheduler_fields(self, tmp_path) -> None:
+        from anteroom.config import load_config
+
+        cfg_file = tmp_path / "config.yaml"
+        cfg_file.write_text(
+            "ai:\n  base_url: http://localhost:8080\n  api_key: test\n"
+            "safety:\n  subagent:\n    global_max_concurrent: 0\n    max_concurrent_per_user: 9999\n"
+            "    queue_timeout: abc\n    max_tokens_per_conversation: 20000\n"
+        )
+        config, _ = load_config(cfg_file)
+        sa = config.safety.subagent
+        assert sa.global_max_concurrent == 1
+        assert sa.max_concurrent_per_user == 200
+        assert sa.queue_timeout == 120
+        assert sa.max_tokens_per_conversation == 20000
+
+
+class TestQueueEndpoint:
+    @pytest.mark.asyncio
+    async def test_reports_queue_and_conversation_spend(self) -> None:
+        from anteroom.routers.chat import subagent_queue
+
+        scheduler = SubagentScheduler(max_tokens_per_conversation=1000)
+        conversation_id = "8f14e45f-ceea-4e7a-9a2b-2d7a1f1c6b10"
+        scheduler.charge(conversation_id, 250)
+        request = MagicMock()
+        request.app.state.subagent_scheduler = scheduler
+
+        with patch("anteroom.routers.chat.storage.get_conversation", return_value={"id": conversation_id}):
+            stats = await subagent_queue(request, conversation_id=conversation_id)
+        assert stats["enabled"] is True
+        assert stats["queued"] == 0
+        assert stats["conversation_tokens"] == 250
+        assert stats["max_tokens_per_conversation"] == 1000
+
+    @pytest.mark.asyncio
+    async def test_spend_of_another_database_conversation_is_not_reported(self) -> None:
+        from fastapi import HTTPException
+
+        from anteroom.routers.chat import subagent_queue
+
+        scheduler = SubagentScheduler()
+        conversation_id = "8f14e45f-ceea-4e7a-9a2b-2d7a1f1c6b10"
+        scheduler.charge(conversation_id, 250)
+        request = MagicMock()
+        request.app.state.subagent_scheduler = scheduler
+
+        with patch("anteroom.routers.chat.storage.get_conversation", return_value=None) as get_conversation:
+            with pytest.raises(HTTPException) as exc:
+                await subagent_queue(request, conversation_id=conversation_id)
+        assert exc.value.status_code == 404
+        assert get_conversation.call_args.args[1] == conversation_id
+
+    @pytest.mark.asyncio
+    async def test_disabled_without_scheduler(self) -> None:
+        from anteroom.routers.chat import subagent_queue
+
+        request = MagicMock()
+        request.app.state.subagent_scheduler = None
+        assert await subagent_queue(request) == {"enabled": False}
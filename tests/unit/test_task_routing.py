@@ -0,0 +1,217 @@
+"""Tests for cost-aware task routing of auxiliary calls (services/task_routing.py)."""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+
+from anteroom.config import AIConfig, TaskModelConfig
+from anteroom.services import task_routing
+from anteroom.services.ai_service import AIService
+from anteroom.services.task_routing import routed_config, task_stats
+from tests.unit.conftest import StubHTTPServer, StubRequest, chat_completion, json_response
+
+
+def _stub_provider(*, failing: set[str] | None = None, tokens: dict[str, int] | None = None) -> StubHTTPServer:
+    """A ``/v1/chat/completions`` stub serving several fake models.
+
+    Replies name the model that answered; models in *failing* return HTTP 400.
+    """
+
+    async def respond(request: StubRequest) -> AsyncIterator[bytes]:
+        model = request.body["model"]
+        if model in (failing or set()):
+            yield json_response({"error": {"message": f"{model} is unavailable", "type": "invalid_request"}}, 400)
+            return
+        total = (tokens or {}).get(model, 10)
+        usage = {"prompt_tokens": total - 2, "completion_tokens": 2, "total_tokens": total}
+        yield json_response(chat_completion(f"from {model}", model=model, usage=usage))
+
+    return StubHTTPServer(respond)
+
+
+def _models(stub: StubHTTPServer) -> list[str]:
+    return [r["model"] for r in stub.requests]
+
+
+def _config(base_url: str, **task_models: TaskModelConfig) -> AIConfig:
+    return AIConfig(
+        base_url=base_url,
+        api_key="k",
+        model="big-model",
+        retry_max_attempts=0,
+        task_models=dict(task_models),
+    )
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats():
+    task_stats.reset()
+    yield
+    task_stats.reset()
+
+
+class TestRouting:
+    @pytest.mark.asyncio
+    async def test_unrouted_calls_use_main_model(self) -> None:
+        async with _stub_provider() as stub:
+            service = AIService(_config(stub.base_url))
+            assert await service.generate_title("hello") == "from big-model"
+            assert await service.complete([{"role": "user", "content": "x"}], task="summarize") == "from big-model"
+        assert _models(stub) == ["big-model", "big-model"]
+        assert set(task_stats.snapshot()) == {"title", "summarize"}
+
+    @pytest.mark.asyncio
+    async def test_each_task_routed_to_its_model(self) -> None:
+        async with _stub_provider() as stub:
+            service = AIService(
+                _config(
+                    stub.base_url,
+                    title=TaskModelConfig(model="tiny-model"),
+                    summarize=TaskModelConfig(model="mid-model"),
+                )
+            )
+            messages = [{"role": "user", "content": "x"}]
+            assert await service.generate_title("hello") == "from tiny-model"
+            assert await service.complete(messages, task="summarize") == "from mid-model"
+            assert await service.complete(messages, task="classify") == "from big-model"
+            assert await service.complete(messages) == "from big-model"
+        assert _models(stub) == ["tiny-model", "mid-model", "big-model", "big-model"]
+
+    @pytest.mark.asyncio
+    async def test_routed_endpoint(self) -> None:
+        async with _stub_provider() as main, _stub_provider() as cheap:
+            service = AIService(_config(main.base_url, title=TaskModelConfig(model="tiny", base_url=cheap.base_url)))
+            assert await service.generate_title("hello") == "from tiny"
+        assert _models(main) == []
+        assert _models(cheap) == ["tiny"]
+
+    @pytest.mark.asyncio
+    async def test_routed_service_built_once(self) -> None:
+        async with _stub_provider() as stub:
+            service = AIService(_config(stub.base_url, title=TaskModelConfig(model="tiny-model")))
+            await service.generate_title("a")
+            routed = service._task_services["title"]
+            await service.generate_title("b")
+            assert service._task_services["title"] is routed
+
+    @pytest.mark.asyncio
+    async def test_unknown_task_runs_as_main(self) -> None:
+        async with _stub_provider() as stub:
+            service = AIService(_config(stub.base_url))
+            await service.complete([{"role": "user", "content": "x"}], task="rewrite")
+        assert list(task_stats.snapshot()) == ["main"]
+
+
+class TestFallback:
+    @pytest.mark.asyncio
+    async def test_failed_route_falls_back_to_main(self) -> None:
+        async with _stub_provider(failing={"tiny-model"}) as stub:
+            service = AIService(_config(stub.base_url, title=TaskModelConfig(model="tiny-model")))
+            assert await service.generate_title("hello") == "from big-model"
+        assert _models(stub) == ["tiny-model", "big-model"]
+        stats = task_stats.snapshot()["title"]
+        assert stats["tiny-model"]["errors"] == 1
+        assert stats["big-model"]["fallbacks"] == 1
+        assert stats["big-model"]["errors"] == 0
+
+    @pytest.mark.asyncio
+    async def test_fallback_disabled(self) -> None:
+        async with _stub_provider(failing={"tiny-model"}) as stub:
+            service = AIService(_config(stub.base_url, summarize=TaskModelConfig(model="tiny-model", fallback=False)))
+            assert await service.complete([{"role": "user", "content": "x"}], task="summarize") is None
+        assert _models(stub) == ["tiny-model"]
+
+    @pytest.mark.asyncio
+    async def test_blocked_route_uses_main_model(self) -> None:
+        async with _stub_provider() as stub:
+            config = _config(
+                stub.base_url, title=TaskModelConfig(model="tiny", base_url="https://elsewhere.example/v1")
+            )
+            config.allowed_domains = ["127.0.0.1"]
+            service = AIService(config)
+            assert await service.generate_title("hello") == "from big-model"
+            assert service._task_services["title"] is None
+        assert _models(stub) == ["big-model"]
+
+
+class TestStats:
+    @pytest.mark.asyncio
+    async def test_tokens_latency_and_errors_per_task(self) -> None:
+        async with _stub_provider(failing={"broken"}, tokens={"tiny": 7, "big-model": 50}) as stub:
+            service = AIService(
+                _config(
+                    stub.base_url,
+                    title=TaskModelConfig(model="tiny"),
+                    classify=TaskModelConfig(model="broken", fallback=False),
+                )
+            )
+            await service.generate_title("a")
+            await service.generate_title("b")
+            await service.complete([{"role": "user", "content": "x"}], task="classify")
+            await service.complete([{"role": "user", "content": "x"}])
+
+        stats = task_stats.snapshot()
+        assert stats["title"]["tiny"]["calls"] == 2
+        assert stats["title"]["tiny"]["tokens"] == 14
+        assert stats["title"]["tiny"]["p95_latency_ms"] > 0
+        assert stats["classify"]["broken"] == {
+            **stats["classify"]["broken"],
+            "calls": 1,
+            "errors": 1,
+            "error_rate": 1.0,
+            "tokens": 0,
+        }
+        assert stats["main"]["big-model"]["tokens"] == 50
+
+    def test_snapshot_percentiles(self) -> None:
+        for ms in range(1, 101):
+            task_stats.record("title", "m", latency=ms / 1000, tokens=1, error=False, fallback=False)
+        entry = task_stats.snapshot()["title"]["m"]
+        assert entry["avg_latency_ms"] == 50.5
+        assert entry["p95_latency_ms"] == 96.0
+        assert entry["tokens"] == 100
+
+    def test_routed_config_inherits_unset_fields(self) -> None:
+        config = _config("http://main/v1", title=TaskModelConfig(model="tiny", api_key="other"))
+        config.api_key_command = "get-token"
+        routed = routed_config(config, "title")
+        assert routed is not None
+        assert (routed.model, routed.base_url, routed.api_key, routed.api_key_command) == (
+            "tiny",
+            "http://main/v1",
+            "other",
+            "",
+        )
+        assert routed.task_models == {}
+        assert routed_config(config, "summarize") is None
+        assert task_routing.TASK_MAIN not in config.task_models
+
+
+class TestConfig:
+    def test_load_config_parses_task_models(self, tmp_path: Path) -> None:
+        from anteroom.config import load_config
+
+        cfg_file = tmp_path / "config.yaml"
+        cfg_file.write_text(
+            "ai:\n  base_url: http://localhost:8080\n  api_key: test\n"
+            "  task_models:\n"
+            "    title: small-model\n"
+            "    summarize:\n      model: mid-model\n      provider: bogus\n      fallback: false\n"
+            "    rewrite: other\n"
+            "    classify: {}\n"
+        )
+        config, _ = load_config(cfg_file)
+        assert set(config.ai.task_models) == {"title", "summarize"}
+        assert config.ai.task_models["title"] == TaskModelConfig(model="small-model")
+        summarize = config.ai.task_models["summarize"]
+        assert (summarize.model, summarize.provider, summarize.fallback) == ("mid-model", "", False)
+
+    def test_validator_warns_on_unknown_task(self) -> None:
+        from anteroom.services.config_validator import validate_config
+
+        result = validate_config({"ai": {"task_models": {"rewrite": "x", "title": {"modle": "y"}}}})
+        paths = {e.path for e in result.errors}
+        assert {"ai.task_models.rewrite", "ai.task_models.title.model", "ai.task_models.title.modle"} <= paths
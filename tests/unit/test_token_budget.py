@@ -57,7 +57,8 @@ def _make_db() -> _TestDB:
             prompt_tokens INTEGER DEFAULT NULL,
             completion_tokens INTEGER DEFAULT NULL,
             total_tokens INTEGER DEFAULT NULL,
-            model TEXT DEFAULT NULL
+            model TEXT DEFAULT NULL,
+            hedge_tokens INTEGER DEFAULT NULL
         )"""
     )
     return _TestDB(conn)
@@ -0,0 +1,125 @@
+"""Tests for services/token_counter.py."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from anteroom.services.token_counter import (
+    DEFAULT_ENCODING,
+    MESSAGE_OVERHEAD,
+    TokenCounter,
+    encoding_name_for,
+    get_token_counter,
+)
+
+
+class TestEncodingNameFor:
+    def test_claude_uses_default(self) -> None:
+        assert encoding_name_for("claude-sonnet-4-5") == DEFAULT_ENCODING
+
+    def test_anthropic_provider_uses_default(self) -> None:
+        assert encoding_name_for("my-proxy-model", provider="anthropic") == DEFAULT_ENCODING
+
+    def test_gpt4o_uses_o200k(self) -> None:
+        assert encoding_name_for("gpt-4o") == "o200k_base"
+
+    def test_prefixed_model_name(self) -> None:
+        assert encoding_name_for("openai/gpt-4o-mini") == "o200k_base"
+
+    def test_unknown_and_missing(self) -> None:
+        assert encoding_name_for("llama3.1:8b") == DEFAULT_ENCODING
+        assert encoding_name_for(None) == DEFAULT_ENCODING
+
+    def test_shared_counter_per_encoding(self) -> None:
+        assert get_token_counter("gpt-4o") is get_token_counter("gpt-4o-mini")
+        assert get_token_counter("gpt-4o") is not get_token_counter("claude-sonnet-4-5")
+
+
+class _CountingCounter(TokenCounter):
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.encoded: list[str] = []
+
+    def count_text(self, text: str) -> int:
+        self.encoded.append(text)
+        return len(text)
+
+
+class TestTokenCounter:
+    def test_empty(self) -> None:
+        assert TokenCounter().count_messages([]) == 0
+
+    def test_counts_content_and_tool_calls(self) -> None:
+        counter = _CountingCounter()
+        msg = {
+            "role": "assistant",
+            "content": "abc",
+            "tool_calls": [{"function": {"name": "read_file", "arguments": '{"p": 1}'}}],
+        }
+        assert counter.count_message(msg) == MESSAGE_OVERHEAD + 3 + len('{"p": 1}') + len("read_file")
+
+    def test_growing_history_only_counts_new_messages(self) -> None:
+        counter = _CountingCounter()
+        history = [{"role": "user", "content": f"message {i}"} for i in range(50)]
+        first = counter.count_messages(history)
+        assert len(counter.encoded) == 50
+
+        history.append({"role": "assistant", "content": "reply"})
+        second = counter.count_messages(history)
+        assert second == first + MESSAGE_OVERHEAD + len("reply")
+        assert counter.encoded[-1] == "reply"
+        assert len(counter.encoded) == 51
+        assert counter.hits == 50
+
+    def test_in_place_edit_is_recounted(self) -> None:
+        counter = _CountingCounter()
+        msg = {"role": "tool", "content": "x" * 100}
+        assert counter.count_message(msg) == MESSAGE_OVERHEAD + 100
+        msg["content"] = "x" * 10
+        assert counter.count_message(msg) == MESSAGE_OVERHEAD + 10
+
+    def test_in_place_list_edit_is_recounted(self) -> None:
+        counter = _CountingCounter()
+        parts = [{"type": "text", "text": "x" * 100}]
+        msg = {"role": "user", "content": parts}
+        first = counter.count_message(msg)
+        parts[0]["text"] = "x"
+        assert counter.count_message(msg) < first
+
+    def test_same_content_shares_an_entry_without_keeping_messages(self) -> None:
+        import gc
+        import weakref
+
+        class _Msg(dict):
+            pass
+
+        counter = _CountingCounter()
+        msg = _Msg(role="user", content="hello")
+        ref = weakref.ref(msg)
+        counter.count_message(msg)
+        assert counter.count_message({"role": "user", "content": "hello"}) == MESSAGE_OVERHEAD + 5
+        assert counter.encoded == ["hello"]
+        del msg
+        gc.collect()
+        assert ref() is None
+
+    def test_seed_skips_encoding(self) -> None:
+        counter = _CountingCounter()
+        msg = {"role": "user", "content": "stored"}
+        counter.seed(msg, 42)
+        assert counter.count_message(msg) == 42
+        assert counter.encoded == []
+
+    def test_cache_is_bounded(self) -> None:
+        counter = _CountingCounter(max_cached=3)
+        msgs = [{"role": "user", "content": str(i)} for i in range(5)]
+        counter.count_messages(msgs)
+        assert len(counter._cache) == 3
+
+    def test_fallback_without_encoding(self, monkeypatch: Any) -> None:
+        from anteroom.services import token_counter
+
+        monkeypatch.setitem(token_counter._encodings, "missing_enc", False)
+        counter = TokenCounter("missing_enc")
+        assert counter.count_text("abcdefgh") == 2
+        assert counter.encoding_name == token_counter.FALLBACK_ENCODING
@@ -0,0 +1,214 @@
+"""Tests for the per-conversation read-only tool result cache (services/tool_result_cache.py)."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from anteroom.services.agent_loop import run_agent_loop
+from anteroom.services.tool_result_cache import ToolResultCache
+
+
+def _touch(path: Path, content: str) -> None:
+    """Write *content* and bump the mtime so same-size rewrites are visible too."""
+    path.write_text(content)
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def _cache_with(tmp_path: Path, tool: str, args: dict[str, Any], call_id: str = "call_1") -> ToolResultCache:
+    cache = ToolResultCache(working_dir=str(tmp_path))
+    cache.record(tool, args, call_id, {"content": "x" * 400}, "success")
+    return cache
+
+
+class TestLookup:
+    def test_repeat_read_returns_stub(self, tmp_path: Path) -> None:
+        (tmp_path / "a.py").write_text("print(1)\n")
+        cache = _cache_with(tmp_path, "read_file", {"path": "a.py"})
+
+        stub = cache.lookup("read_file", {"path": str(tmp_path / "a.py"), "offset": 1}, {"call_1"})
+
+        assert stub is not None
+        assert stub["unchanged_since"] == "call_1"
+        assert "call_1" in stub["content"]
+        assert cache.hits == 1 and cache.lookups == 1
+        assert cache.tokens_saved > 0
+
+    def test_different_arguments_miss(self, tmp_path: Path) -> None:
+        (tmp_path / "a.py").write_text("print(1)\n")
+        cache = _cache_with(tmp_path, "read_file", {"path": "a.py"})
+        assert cache.lookup("read_file", {"path": "a.py", "offset": 5}, {"call_1"}) is None
+        assert cache.hit_rate == 0.0
+
+    def test_earlier_result_must_still_be_in_context(self, tmp_path: Path) -> None:
+        (tmp_path / "a.py").write_text("print(1)\n")
+        cache = _cache_with(tmp_path, "read_file", {"path": "a.py"})
+        assert cache.lookup("read_file", {"path": "a.py"}, set()) is None
+
+    def test_external_change_misses(self, tmp_path: Path) -> None:
+        target = tmp_path / "a.py"
+        target.write_text("print(1)\n")
+        cache = _cache_with(tmp_path, "read_file", {"path": "a.py"})
+        _touch(target, "print(2)\n")
+        assert cache.lookup("read_file", {"path": "a.py"}, {"call_1"}) is None
+        assert len(cache) == 0
+
+    def test_tree_search_sees_nested_changes(self, tmp_path: Path) -> None:
+        nested = tmp_path / "src" / "pkg"
+        nested.mkdir(parents=True)
+        (nested / "mod.py").write_text("x = 1\n")
+        cache = _cache_with(tmp_path, "grep", {"pattern": "x", "path": "src"})
+        assert cache.lookup("grep", {"pattern": "x", "path": "src", "context": 0}, {"call_1"}) is not None
+
+        _touch(nested / "mod.py", "x = 2\n")
+        assert cache.lookup("grep", {"pattern": "x", "path": "src"}, {"call_1"}) is None
+
+    def test_excluded_dirs_are_not_walked(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        deps = tmp_path / "node_modules" / "left-pad"
+        deps.mkdir(parents=True)
+        (deps / "index.js").write_text("x\n")
+        (tmp_path / "app.py").write_text("x = 1\n")
+        cache = _cache_with(tmp_path, "grep", {"pattern": "x"})
+        walked: list[str] = []
+        real_walk = os.walk
+
+        def _walk(top: str, *args: Any, **kwargs: Any) -> Any:
+            for root, dirs, files in real_walk(top, *args, **kwargs):
+                walked.append(root)
+                yield root, dirs, files
+
+        monkeypatch.setattr(os, "walk", _walk)
+        assert cache.lookup("grep", {"pattern": "x"}, {"call_1"}) is not None
+        monkeypatch.undo()
+        assert walked == [str(tmp_path)]
+        # Project files are still covered
+        _touch(tmp_path / "app.py", "x = 2\n")
+        assert cache.lookup("grep", {"pattern": "x"}, {"call_1"}) is None
+
+    def test_one_fingerprint_per_call(self, tmp_path: Path) -> None:
+        (tmp_path / "a.py").write_text("print(1)\n")
+        cache = ToolResultCache(working_dir=str(tmp_path))
+        calls: list[str] = []
+        real = cache._fingerprint
+
+        def _counting(tool_name: str, path: str) -> str | None:
+            calls.append(path)
+            return real(tool_name, path)
+
+        cache._fingerprint = _counting  # type: ignore[method-assign]
+        assert cache.lookup("read_file", {"path": "a.py"}, set()) is None
+        cache.record("read_file", {"path": "a.py"}, "call_1", {"content": "print(1)"}, "success")
+        assert len(calls) == 1
+        assert cache.lookup("read_file", {"path": "a.py"}, {"call_1"}) is not None
+        assert len(calls) == 2
+
+    def test_hits_are_reported(self, tmp_path: Path) -> None:
+        (tmp_path / "a.py").write_text("print(1)\n")
+        hits: list[tuple[str, dict[str, Any], dict[str, Any]]] = []
+        cache = ToolResultCache(working_dir=str(tmp_path), on_hit=lambda *hit: hits.append(hit))
+        cache.record("read_file", {"path": "a.py"}, "call_1", {"content": "print(1)"}, "success")
+        stub = cache.lookup("read_file", {"path": "a.py"}, {"call_1"})
+        assert hits == [("read_file", {"path": "a.py"}, stub)]
+
+    def test_errors_and_stubs_are_not_cached(self, tmp_path: Path) -> None:
+        (tmp_path / "a.py").write_text("")
+        cache = ToolResultCache(working_dir=str(tmp_path))
+        cache.record("read_file", {"path": "a.py"}, "c1", {"error": "denied"}, "success")
+        cache.record("read_file", {"path": "a.py"}, "c2", {"content": "x"}, "timeout")
+        cache.record("read_file", {"path": "missing.py"}, "c3", {"content": "x"}, "success")
+        assert len(cache) == 0
+
+
+class TestInvalidation:
+    def test_write_drops_file_and_containing_searches(self, tmp_path: Path) -> None:
+        (tmp_path / "src").mkdir()
+        for name in ("a.py", "b.py"):
+            (tmp_path / "src" / name).write_text("")
+        cache = ToolResultCache(working_dir=str(tmp_path))
+        cache.record("read_file", {"path": "src/a.py"}, "c1", {"content": ""}, "success")
+        cache.record("read_file", {"path": "src/b.py"}, "c2", {"content": ""}, "success")
+        cache.record("glob_files", {"pattern": "*.py", "path": "src"}, "c3", {"files": []}, "success")
+
+        cache.record("edit_file", {"path": "src/a.py"}, "c4", {"status": "ok"}, "success")
+
+        assert cache.lookup("read_file", {"path": "src/b.py"}, {"c2"}) is not None
+        assert cache.lookup("read_file", {"path": "src/a.py"}, {"c1"}) is None
+        assert cache.lookup("glob_files", {"pattern": "*.py", "path": "src"}, {"c3"}) is None
+
+    def test_bash_and_unknown_tools_clear_everything(self, tmp_path: Path) -> None:
+        (tmp_path / "a.py").write_text("")
+        cache = _cache_with(tmp_path, "read_file", {"path": "a.py"})
+        cache.record("introspect", {}, "c2", {"content": ""}, "success")
+        assert len(cache) == 1
+        cache.record("bash", {"command": "true"}, "c3", {"stdout": ""}, "success")
+        assert len(cache) == 0
+
+        cache = _cache_with(tmp_path, "read_file", {"path": "a.py"})
+        cache.record("mcp_fs_write", {"path": "a.py"}, "c4", {"result": "ok"}, "success")
+        assert len(cache) == 0
+
+
+class TestAgentLoop:
+    def test_reread_across_iterations_gets_stub_until_edit(self, tmp_path: Path) -> None:
+        (tmp_path / "a.py").write_text("print(1)\n")
+        turns = [
+            [("read_file", {"path": "a.py"})],
+            [("read_file", {"path": "a.py"})],
+            [("edit_file", {"path": "a.py"})],
+            [("read_file", {"path": "a.py"})],
+        ]
+
+        class _Model:
+            config = SimpleNamespace(model="stub", provider="openai")
+
+            def __init__(self) -> None:
+                self.turn = 0
+
+            async def stream_chat(self, messages: Any, **kwargs: Any) -> Any:
+                self.turn += 1
+                if self.turn > len(turns):
+                    yield {"event": "token", "data": {"content": "done"}}
+                    yield {"event": "done", "data": {}}
+                    return
+                for i, (name, args) in enumerate(turns[self.turn - 1]):
+                    yield {
+                        "event": "tool_call",
+                        "data": {"id": f"t{self.turn}_{i}", "function_name": name, "arguments": args},
+                    }
+
+        executed: list[str] = []
+
+        async def _executor(name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+            executed.append(name)
+            if name == "edit_file":
+                _touch(tmp_path / "a.py", "print(2)\n")
+                return {"status": "ok"}
+            return {"content": (tmp_path / arguments["path"]).read_text()}
+
+        cache = ToolResultCache(working_dir=str(tmp_path))
+        messages: list[dict[str, Any]] = [{"role": "user", "content": "read"}]
+
+        async def _run() -> None:
+            async for _ in run_agent_loop(
+                ai_service=_Model(),  # type: ignore[arg-type]
+                messages=messages,
+                tool_executor=_executor,
+                tools_openai=None,
+                result_cache=cache,
+            ):
+                pass
+
+        asyncio.run(_run())
+
+        assert executed == ["read_file", "edit_file", "read_file"]
+        results = {m["tool_call_id"]: json.loads(m["content"]) for m in messages if m["role"] == "tool"}
+        assert results["t2_0"]["unchanged_since"] == "t1_0"
+        assert results["t4_0"] == {"content": "print(2)\n"}
+        assert cache.hits == 1
@@ -0,0 +1,406 @@
+"""Tests for dependency-aware tool scheduling (services/tool_scheduler.py)."""
+
+from __future__ import annotations
+
+import asyncio
+import random
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+from anteroom.services.agent_loop import run_agent_loop
+from anteroom.services.tool_scheduler import (
+    READ,
+    WRITE,
+    ResourceClaim,
+    ToolScheduler,
+    claims_conflict,
+    released_permits,
+)
+
+# --- Helpers ---
+
+
+def _call(name: str, i: int = 0, **arguments: Any) -> dict[str, Any]:
+    return {"id": f"call_{i}", "function_name": name, "arguments": arguments}
+
+
+class _Tracker:
+    """Tool starter recording overall and per-group concurrency."""
+
+    def __init__(self, delay: float = 0.01, group: Any = None) -> None:
+        self.delay = delay
+        self.group = group or (lambda tc: tc["function_name"])
+        self.running: dict[str, int] = {}
+        self.peak: dict[str, int] = {}
+        self.total = 0
+        self.peak_total = 0
+        self.order: list[str] = []
+
+    async def __call__(self, tc: dict[str, Any]) -> dict[str, Any]:
+        key = self.group(tc)
+        self.running[key] = self.running.get(key, 0) + 1
+        self.peak[key] = max(self.peak.get(key, 0), self.running[key])
+        self.total += 1
+        self.peak_total = max(self.peak_total, self.total)
+        self.order.append(tc["id"])
+        await asyncio.sleep(self.delay)
+        self.running[key] -= 1
+        self.total -= 1
+        return tc
+
+
+async def _slow_edit(root: Path, tc: dict[str, Any], rng: random.Random) -> dict[str, Any]:
+    """Read-modify-write with a suspension in between, like a threaded or MCP file tool."""
+    path = root / tc["arguments"]["path"]
+    content = path.read_text()
+    await asyncio.sleep(rng.random() * 0.002)
+    path.write_text(content + tc["arguments"]["append"])
+    return {"status": "ok"}
+
+
+async def _gather(scheduler: ToolScheduler, calls: list[dict[str, Any]], start: Any) -> list[Any]:
+    """Schedule *calls* as one agent run: ordered by the scheduler, capped by one ``limit`` wrapper."""
+    limited = scheduler.limit(lambda _name, tc: start(tc))
+    return await asyncio.gather(*scheduler.schedule(calls, lambda tc: limited(tc["function_name"], tc)))
+
+
+# --- Resource inference ---
+
+
+class TestResources:
+    def test_file_tools_claim_paths_by_tier(self, tmp_path: Path) -> None:
+        scheduler = ToolScheduler(working_dir=str(tmp_path))
+        (read,) = scheduler.resources("read_file", {"path": "a.py"})
+        (edit,) = scheduler.resources("edit_file", {"path": "./a.py", "old_text": "x", "new_text": "y"})
+        assert read.mode == READ and edit.mode == WRITE
+        assert read.path == edit.path == str(tmp_path / "a.py")
+
+    def test_tree_tools_read_their_directory(self, tmp_path: Path) -> None:
+        scheduler = ToolScheduler(working_dir=str(tmp_path))
+        (grep,) = scheduler.resources("grep", {"pattern": "x", "path": "src"})
+        (root,) = scheduler.resources("glob_files", {"pattern": "*.py"})
+        assert grep == ResourceClaim("path:" + str(tmp_path / "src"), READ)
+        assert root.path == str(tmp_path)
+
+    def test_named_and_uninferable_resources(self) -> None:
+        scheduler = ToolScheduler()
+        assert scheduler.resources("patch_canvas", {"edits": []}) == [ResourceClaim("canvas", WRITE)]
+        assert scheduler.resources("ask_user", {"question": "?"}) == [ResourceClaim("user", WRITE)]
+        assert scheduler.resources("bash", {"command": "ls"}) == []
+        assert scheduler.resources("mcp_write", {"path": "a.py"}) == []
+
+    def test_conflict_rules(self) -> None:
+        a = ResourceClaim("path:/w/src/a.py", WRITE)
+        assert claims_conflict(a, ResourceClaim("path:/w/src/a.py", READ))
+        assert claims_conflict(a, ResourceClaim("path:/w/src", READ))
+        assert not claims_conflict(a, ResourceClaim("path:/w/src/ab.py", WRITE))
+        assert not claims_conflict(ResourceClaim("path:/w", READ), ResourceClaim("path:/w/a", READ))
+        assert claims_conflict(ResourceClaim("canvas"), ResourceClaim("canvas"))
+
+    def test_dependencies_only_point_backwards(self) -> None:
+        scheduler = ToolScheduler(working_dir="/w")
+        calls = [
+            _call("read_file", 0, path="a"),
+            _call("read_file", 1, path="a"),
+            _call("edit_file", 2, path="a"),
+            _call("read_file", 3, path="b"),
+            _call("grep", 4, pattern="x"),
+        ]
+        assert scheduler.dependencies(calls) == [[], [], [0, 1], [], [2]]
+
+
+# --- Scheduling ---
+
+
+class TestScheduling:
+    def test_reads_of_one_file_run_in_parallel(self) -> None:
+        tracker = _Tracker()
+        calls = [_call("read_file", i, path="same.py") for i in range(10)]
+        asyncio.run(_gather(ToolScheduler(), calls, tracker))
+        assert tracker.peak_total == 10
+
+    def test_read_after_write_waits_and_keeps_order(self) -> None:
+        tracker = _Tracker()
+        calls = [_call("write_file", 0, path="a.py", content=""), _call("read_file", 1, path="a.py")]
+        asyncio.run(_gather(ToolScheduler(), calls, tracker))
+        assert tracker.order == ["call_0", "call_1"]
+        assert tracker.peak_total == 1
+
+    def test_bash_is_capped(self) -> None:
+        tracker = _Tracker()
+        calls = [_call("bash", i, command="sleep 1") for i in range(12)]
+        asyncio.run(_gather(ToolScheduler(tool_limits={"bash": 3}), calls, tracker))
+        assert tracker.peak["bash"] == 3
+
+    def test_mcp_calls_capped_per_server(self) -> None:
+        servers = {"fs_read": "fs", "fs_list": "fs", "gh_issue": "github"}
+        tracker = _Tracker(group=lambda tc: servers[tc["function_name"]])
+        calls = [_call(name, i) for i in range(8) for name in servers]
+        scheduler = ToolScheduler(mcp_server_limit=2, resolve_server=servers.get)
+        asyncio.run(_gather(scheduler, calls, tracker))
+        assert tracker.peak == {"fs": 2, "github": 2}
+        assert tracker.peak_total == 4
+
+    def test_global_cap(self) -> None:
+        tracker = _Tracker()
+        calls = [_call("read_file", i, path=f"f{i}") for i in range(20)]
+        asyncio.run(_gather(ToolScheduler(max_parallel=5), calls, tracker))
+        assert tracker.peak_total == 5
+
+    def test_caps_are_shared_across_turns(self) -> None:
+        tracker = _Tracker()
+        scheduler = ToolScheduler(tool_limits={"bash": 2})
+
+        async def _two_turns() -> None:
+            turn = [_call("bash", i, command="x") for i in range(4)]
+            await asyncio.gather(_gather(scheduler, turn, tracker), _gather(scheduler, turn, tracker))
+
+        asyncio.run(_two_turns())
+        assert tracker.peak["bash"] == 2
+
+    def test_global_cap_is_per_run(self) -> None:
+        tracker = _Tracker()
+        scheduler = ToolScheduler(max_parallel=2)
+
+        async def _two_runs() -> None:
+            calls = [_call("read_file", i, path=f"f{i}") for i in range(6)]
+            await asyncio.gather(_gather(scheduler, calls, tracker), _gather(scheduler, calls, tracker))
+
+        asyncio.run(_two_runs())
+        assert tracker.peak_total == 4
+
+    def test_waiting_tools_are_not_capped(self) -> None:
+        tracker = _Tracker()
+        calls = [_call("run_agent", i, prompt="x") for i in range(4)] + [_call("ask_user", 9, question="?")]
+        asyncio.run(_gather(ToolScheduler(max_parallel=1, tool_limits={"run_agent": 1}), calls, tracker))
+        assert tracker.peak_total == 5
+
+    def test_limits_for_uncapped_tools_are_ignored(self, caplog: Any) -> None:
+        scheduler = ToolScheduler(tool_limits={"run_agent": 1, "grep": 2})
+        assert scheduler._caps("run_agent") == []
+        assert scheduler._caps("grep") == [("tool:grep", 2)]
+        assert "run_agent is never capped" in caplog.text
+
+    def test_approval_wait_gives_permits_back(self) -> None:
+        order: list[str] = []
+
+        async def _run() -> None:
+            approved = asyncio.Event()
+
+            async def _bash(name: str, arguments: dict[str, Any]) -> None:
+                if arguments.get("needs_approval"):
+                    async with released_permits():
+                        await approved.wait()
+                order.append(arguments["command"])
+
+            limited = ToolScheduler(tool_limits={"bash": 1}).limit(_bash)
+            first = asyncio.create_task(limited("bash", {"command": "rm", "needs_approval": True}))
+            await asyncio.sleep(0.01)
+            await asyncio.wait_for(limited("bash", {"command": "ls"}), timeout=1)
+            approved.set()
+            await first
+
+        asyncio.run(_run())
+        assert order == ["ls", "rm"]
+
+    def test_permit_wait_counts_against_the_tool_timeout(self) -> None:
+        from anteroom.services.agent_loop import _execute_tool
+
+        async def _run() -> str:
+            scheduler = ToolScheduler(tool_limits={"bash": 1})
+            release = asyncio.Event()
+
+            async def _bash(name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+                await release.wait()
+                return {}
+
+            holder = asyncio.create_task(scheduler.limit(_bash)("bash", {}))
+            await asyncio.sleep(0.01)
+            _tc, _result, status = await _execute_tool(
+                _call("bash", 1), scheduler.limit(_bash), asyncio.Event(), timeout=0.05
+            )
+            release.set()
+            await holder
+            return status
+
+        assert asyncio.run(_run()) == "timeout"
+
+    def test_started_tasks_are_reused_and_waited_on(self) -> None:
+        tracker = _Tracker()
+
+        async def _run() -> list[Any]:
+            scheduler = ToolScheduler()
+            read = _call("read_file", 0, path="a.py")
+            running = asyncio.create_task(tracker(read))
+            calls = [read, _call("edit_file", 1, path="a.py")]
+            tasks = scheduler.schedule(calls, tracker, started={0: running})
+            assert tasks[0] is running
+            return await asyncio.gather(*tasks)
+
+        asyncio.run(_run())
+        assert tracker.order == ["call_0", "call_1"]
+
+    def test_from_config(self) -> None:
+        from anteroom.config import CliConfig, ToolConcurrencyConfig
+
+        cli = CliConfig(
+            tool_concurrency=ToolConcurrencyConfig(max_parallel=3, bash=1, mcp_per_server=2, tool_limits={"x": 5})
+        )
+        scheduler = ToolScheduler.from_config(SimpleNamespace(cli=cli, safety=None))
+        assert scheduler._max_parallel == 3
+        assert scheduler._caps("bash") == [("tool:bash", 1)]
+        assert scheduler._caps("x") == [("tool:x", 5)]
+
+
+# --- Stress: conflicting edits ---
+
+
+class TestConflictingEditsStress:
+    def test_unscheduled_edits_lose_updates(self, tmp_path: Path) -> None:
+        """Control: without ordering, concurrent read-modify-write edits clobber each other."""
+        (tmp_path / "f.txt").write_text("")
+        rng = random.Random(0)
+        calls = [_call("edit_file", i, path="f.txt", append=f"<{i}>") for i in range(30)]
+
+        async def _run() -> None:
+            await asyncio.gather(*(_slow_edit(tmp_path, tc, rng) for tc in calls))
+
+        asyncio.run(_run())
+        assert (tmp_path / "f.txt").read_text() != "".join(f"<{i}>" for i in range(30))
+
+    def test_same_file_edits_apply_in_order(self, tmp_path: Path) -> None:
+        (tmp_path / "f.txt").write_text("")
+        rng = random.Random(1)
+        calls = [_call("edit_file", i, path="f.txt", append=f"<{i}>") for i in range(200)]
+        scheduler = ToolScheduler(working_dir=str(tmp_path))
+
+        asyncio.run(_gather(scheduler, calls, lambda tc: _slow_edit(tmp_path, tc, rng)))
+
+        assert (tmp_path / "f.txt").read_text() == "".join(f"<{i}>" for i in range(200))
+
+    def test_interleaved_files_with_reads(self, tmp_path: Path) -> None:
+        files = [f"f{n}.txt" for n in range(8)]
+        for name in files:
+            (tmp_path / name).write_text("")
+        rng = random.Random(2)
+        calls: list[dict[str, Any]] = []
+        expected = {name: "" for name in files}
+        reads_seen: dict[str, tuple[str, str]] = {}
+        for i in range(400):
+            name = rng.choice(files)
+            if rng.random() < 0.3:
+                calls.append(_call("read_file", i, path=name))
+                reads_seen[f"call_{i}"] = (name, expected[name])
+            else:
+                calls.append(_call("edit_file", i, path=name, append=f"<{i}>"))
+                expected[name] += f"<{i}>"
+        observed: dict[str, str] = {}
+        running = {"now": 0, "peak": 0}
+
+        async def _start(tc: dict[str, Any]) -> dict[str, Any]:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            try:
+                if tc["function_name"] == "read_file":
+                    await asyncio.sleep(rng.random() * 0.002)
+                    observed[tc["id"]] = (tmp_path / tc["arguments"]["path"]).read_text()
+                    return {"content": observed[tc["id"]]}
+                return await _slow_edit(tmp_path, tc, rng)
+            finally:
+                running["now"] -= 1
+
+        scheduler = ToolScheduler(working_dir=str(tmp_path), max_parallel=16)
+        asyncio.run(_gather(scheduler, calls, _start))
+
+        for name in files:
+            assert (tmp_path / name).read_text() == expected[name]
+        # Every read saw exactly the edits issued before it
+        for call_id, (_name, content) in reads_seen.items():
+            assert observed[call_id] == content
+        # Independent files still progressed concurrently
+        assert running["peak"] > 1
+
+    def test_agent_loop_orders_conflicting_edits(self, tmp_path: Path) -> None:
+        (tmp_path / "f.txt").write_text("")
+        rng = random.Random(3)
+        edits = [_call("edit_file", i, path="f.txt", append=f"<{i}>") for i in range(25)]
+
+        class _Model:
+            config = SimpleNamespace(model="stub", provider="openai")
+
+            def __init__(self) -> None:
+                self.turns = 0
+
+            async def stream_chat(self, messages: Any, **kwargs: Any) -> Any:
+                self.turns += 1
+                if self.turns == 1:
+                    for tc in edits:
+                        yield {"event": "tool_call", "data": tc}
+                    return
+                yield {"event": "token", "data": {"content": "done"}}
+                yield {"event": "done", "data": {}}
+
+        async def _executor(name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+            return await _slow_edit(tmp_path, {"arguments": arguments}, rng)
+
+        async def _run() -> list[Any]:
+            return [
+                e
+                async for e in run_agent_loop(
+                    ai_service=_Model(),  # type: ignore[arg-type]
+                    messages=[{"role": "user", "content": "edit"}],
+                    tool_executor=_executor,
+                    tools_openai=None,
+                    tool_scheduler=ToolScheduler(working_dir=str(tmp_path)),
+                )
+            ]
+
+        events = asyncio.run(_run())
+
+        assert (tmp_path / "f.txt").read_text() == "".join(f"<{i}>" for i in range(25))
+        assert [e.data["id"] for e in events if e.kind == "tool_call_end"] == [f"call_{i}" for i in range(25)]
+
+    def test_nested_run_agent_calls_do_not_deadlock(self) -> None:
+        scheduler = ToolScheduler(max_parallel=2)
+
+        class _Model:
+            config = SimpleNamespace(model="stub", provider="openai")
+
+            def __init__(self, calls: list[dict[str, Any]]) -> None:
+                self.calls = calls
+                self.turns = 0
+
+            async def stream_chat(self, messages: Any, **kwargs: Any) -> Any:
+                self.turns += 1
+                if self.turns == 1:
+                    for tc in self.calls:
+                        yield {"event": "tool_call", "data": tc}
+                    return
+                yield {"event": "token", "data": {"content": "done"}}
+                yield {"event": "done", "data": {}}
+
+        async def _loop(calls: list[dict[str, Any]]) -> list[Any]:
+            return [
+                e
+                async for e in run_agent_loop(
+                    ai_service=_Model(calls),  # type: ignore[arg-type]
+                    messages=[{"role": "user", "content": "go"}],
+                    tool_executor=_executor,
+                    tools_openai=None,
+                    tool_scheduler=scheduler,
+                )
+            ]
+
+        async def _executor(name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+            if name == "run_agent":
+                # A sub-agent's own loop, on the parent's scheduler
+                await _loop([_call("read_file", i, path=f"f{i}") for i in range(3)])
+                return {"output": "ok"}
+            await asyncio.sleep(0.01)
+            return {"content": ""}
+
+        events = asyncio.run(asyncio.wait_for(_loop([_call("run_agent", i, prompt="x") for i in range(2)]), 5))
+
+        ends = [e for e in events if e.kind == "tool_call_end"]
+        assert [e.data["status"] for e in ends] == ["success", "success"]
@@ -0,0 +1,254 @@
+"""Tests for per-run tool subset selection (services/tool_selection.py)."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+from unittest.mock import MagicMock
+
+import pytest
+
+from anteroom.services import history_selection
+from anteroom.services.agent_loop import run_agent_loop
+from anteroom.services.tool_selection import LOAD_ALL_TOOLS, ToolSelector, selector_for
+
+_PINNED = ["read_file", "bash"]
+
+
+def _tool(name: str, description: str, **params: str) -> dict[str, Any]:
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {
+                "type": "object",
+                "properties": {p: {"type": "string", "description": d} for p, d in params.items()},
+            },
+        },
+    }
+
+
+def _catalog() -> list[dict[str, Any]]:
+    return [
+        _tool("read_file", "Read a file from disk.", path="File path"),
+        _tool("bash", "Run a shell command.", command="Command line"),
+        _tool("jira_create_issue", "Create a Jira issue in a project.", summary="Issue summary"),
+        _tool("jira_search", "Search Jira issues with JQL.", jql="Query"),
+        _tool("slack_post_message", "Post a message to a Slack channel.", channel="Channel name"),
+        _tool("postgres_query", "Run a read-only SQL query against the Postgres database.", sql="SQL text"),
+        _tool("k8s_get_pods", "List Kubernetes pods in a namespace.", namespace="Namespace"),
+        _tool("github_create_pr", "Open a GitHub pull request.", title="PR title"),
+        _tool("calendar_create_event", "Create a calendar event with attendees.", when="Start time"),
+        _tool("weather_forecast", "Get the weather forecast for a city.", city="City name"),
+    ]
+
+
+def _names(tools: list[dict[str, Any]]) -> list[str]:
+    return [t["function"]["name"] for t in tools]
+
+
+def _ask(text: str) -> list[dict[str, Any]]:
+    return [{"role": "user", "content": text}]
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache() -> None:
+    history_selection.clear_embedding_cache()
+
+
+class TestSelect:
+    @pytest.mark.asyncio
+    async def test_small_catalog_is_sent_whole(self) -> None:
+        tools = _catalog()
+        assert await ToolSelector(top_n=20, pinned=_PINNED).select(tools, _ask("hi")) is tools
+
+    @pytest.mark.asyncio
+    async def test_pinned_plus_relevant_plus_meta_tool(self) -> None:
+        tools = _catalog()
+        selector = ToolSelector(top_n=2, pinned=_PINNED)
+
+        sent = await selector.select(tools, _ask("Find the Jira issues about the login bug and search them"))
+
+        names = _names(sent)
+        assert names[:2] == ["read_file", "bash"]
+        assert "jira_search" in names
+        assert names[-1] == LOAD_ALL_TOOLS
+        assert len(sent) == len(_PINNED) + 2 + 1
+        # Catalog order is kept
+        assert names[:-1] == [n for n in _names(tools) if n in names]
+        assert selector.last_hidden == len(tools) - len(_PINNED) - 2
+        assert f"{selector.last_hidden} more" in sent[-1]["function"]["description"]
+
+    @pytest.mark.asyncio
+    async def test_recently_used_tool_is_kept(self) -> None:
+        messages: list[dict[str, Any]] = [
+            {"role": "user", "content": "What's the forecast for Oslo?"},
+            {
+                "role": "assistant",
+                "content": "",
+                "tool_calls": [
+                    {
+                        "id": "c1",
+                        "type": "function",
+                        "function": {"name": "weather_forecast", "arguments": json.dumps({"city": "Oslo"})},
+                    }
+                ],
+            },
+            {"role": "tool", "tool_call_id": "c1", "content": "Rain"},
+            {"role": "assistant", "content": "Rain in Oslo."},
+            {"role": "user", "content": "And tomorrow?"},
+        ]
+        sent = await ToolSelector(top_n=1, pinned=_PINNED).select(_catalog(), messages)
+        assert "weather_forecast" in _names(sent)
+
+    @pytest.mark.asyncio
+    async def test_same_catalog_and_history_reuse_the_subset(self) -> None:
+        tools = _catalog()
+        messages = _ask("post a slack message to the team channel")
+        selector = ToolSelector(top_n=2, pinned=_PINNED)
+        first = await selector.select(tools, messages)
+        assert await selector.select(tools, messages) is first
+        assert selector.selections == 1
+        # Another history of the same length is ranked afresh
+        assert "k8s_get_pods" in _names(await selector.select(tools, _ask("list the kubernetes pods")))
+        await selector.select(tools, messages)
+        messages.append({"role": "assistant", "content": "ok"})
+        messages.append({"role": "user", "content": "now list the kubernetes pods"})
+        assert "k8s_get_pods" in _names(await selector.select(tools, messages))
+        assert selector.selections == 4
+
+    @pytest.mark.asyncio
+    async def test_expand_returns_catalog_names(self) -> None:
+        tools = _catalog()
+        selector = ToolSelector(top_n=2, pinned=_PINNED)
+        await selector.select(tools, _ask("run a sql query"))
+        result = selector.expand()
+        assert selector.expanded
+        assert result["loaded"] == len(tools)
+        assert result["tools"] == _names(tools)
+
+
+class _Embeddings:
+    """Bag-of-topics embeddings: one dimension per keyword."""
+
+    model = "stub-embed"
+    _TOPICS = ("jira", "slack", "sql", "kubernetes", "github", "calendar", "weather", "ticket", "meeting")
+
+    def __init__(self) -> None:
+        self.embedded: list[str] = []
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float] | None]:
+        self.embedded += texts
+        vectors = []
+        for t in texts:
+            low = t.lower().replace("ticket", "jira").replace("meeting", "calendar").replace("postgres", "sql")
+            vectors.append([float(topic in low) for topic in self._TOPICS] + [0.05])
+        return vectors
+
+
+class TestEmbeddings:
+    @pytest.mark.asyncio
+    async def test_ranks_by_embedding_and_embeds_tools_once(self) -> None:
+        embeddings = _Embeddings()
+        tools = _catalog()
+        selector = ToolSelector(top_n=1, pinned=_PINNED, embedding_service=embeddings)
+
+        sent = await selector.select(tools, _ask("book a meeting with the design team"))
+        first_calls = len(embeddings.embedded)
+        sent_again = await ToolSelector(top_n=1, pinned=_PINNED, embedding_service=embeddings).select(
+            tools, _ask("open a ticket for the crash")
+        )
+
+        assert "calendar_create_event" in _names(sent)
+        assert "jira_create_issue" in _names(sent_again) or "jira_search" in _names(sent_again)
+        # Only the new query was embedded the second time
+        assert len(embeddings.embedded) == first_calls + 1
+
+
+class TestAgentLoop:
+    def test_load_all_tools_switches_to_full_catalog(self) -> None:
+        tools = _catalog()
+        seen_tools: list[list[str]] = []
+        executed: list[str] = []
+
+        class _Model:
+            config = SimpleNamespace(model="stub", provider="openai")
+
+            async def stream_chat(self, msgs: Any, tools: Any = None, **kwargs: Any) -> Any:
+                seen_tools.append(_names(tools or []))
+                if len(seen_tools) == 1:
+                    yield {
+                        "event": "tool_call",
+                        "data": {"id": "m1", "function_name": LOAD_ALL_TOOLS, "arguments": {}},
+                    }
+                else:
+                    yield {"event": "token", "data": {"content": "Here is the forecast."}}
+                yield {"event": "done", "data": {}}
+
+        async def _executor(name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+            executed.append(name)
+            return {}
+
+        async def _run() -> list[Any]:
+            return [
+                event
+                async for event in run_agent_loop(
+                    ai_service=_Model(),  # type: ignore[arg-type]
+                    messages=_ask("post the release notes to slack"),
+                    tool_executor=_executor,
+                    tools_openai=tools,
+                    tool_selector=ToolSelector(top_n=2, pinned=_PINNED),
+                )
+            ]
+
+        events = asyncio.run(_run())
+
+        assert len(seen_tools) == 2
+        assert LOAD_ALL_TOOLS in seen_tools[0]
+        assert len(seen_tools[0]) == 5
+        assert seen_tools[1] == _names(tools)
+        assert executed == []
+        results = [e for e in events if e.kind == "tool_call_end"]
+        assert results and results[0].data["status"] == "success"
+
+
+class TestConfig:
+    def test_selector_for(self) -> None:
+        assert selector_for(MagicMock()) is None
+        off = SimpleNamespace(ai=SimpleNamespace(tool_selection=False))
+        assert selector_for(off) is None
+        on = SimpleNamespace(
+            ai=SimpleNamespace(tool_selection=True, tool_selection_top_n=5, tool_selection_pinned=["bash"])
+        )
+        selector = selector_for(on)
+        assert selector is not None
+        assert selector.top_n == 5
+        assert selector.pinned == frozenset({"bash"})
+
+    def test_load_config_parses_tool_selection(self, tmp_path: Path) -> None:
+        from anteroom.config import load_config
+
+        cfg_file = tmp_path / "config.yaml"
+        cfg_file.write_text(
+            "ai:\n  base_url: http://a:8000/v1\n  api_key: test\n"
+            "  tool_selection: true\n  tool_selection_top_n: 0\n"
+            "  tool_selection_pinned:\n    - read_file\n    - jira_search\n"
+        )
+        config, _ = load_config(cfg_file)
+        assert config.ai.tool_selection is True
+        assert config.ai.tool_selection_top_n == 1
+        assert config.ai.tool_selection_pinned == ["read_file", "jira_search"]
+
+    def test_defaults(self, tmp_path: Path) -> None:
+        from anteroom.config import load_config
+
+        cfg_file = tmp_path / "config.yaml"
+        cfg_file.write_text("ai:\n  base_url: http://a:8000/v1\n  api_key: test\n")
+        config, _ = load_config(cfg_file)
+        assert config.ai.tool_selection is False
+        assert config.ai.tool_selection_top_n == 24
+        assert "read_file" in config.ai.tool_selection_pinned
@@ -8,6 +8,7 @@ from anteroom.tools.tiers import (
     ApprovalMode,
     ToolTier,
     get_tool_tier,
+    is_speculation_safe,
     parse_approval_mode,
     should_require_approval,
 )
@@ -47,6 +48,25 @@ class TestGetToolTier:
         assert get_tool_tier("my_mcp_tool", tier_overrides={"my_mcp_tool": "read"}) == ToolTier.READ
 
 
+class TestIsSpeculationSafe:
+    def test_read_only_builtins(self) -> None:
+        for name in ("read_file", "glob_files", "grep"):
+            assert is_speculation_safe(name)
+
+    def test_side_effecting_read_tier_tools_excluded(self) -> None:
+        for name in ("create_canvas", "ask_user", "invoke_skill"):
+            assert DEFAULT_TOOL_TIERS[name] == ToolTier.READ
+            assert not is_speculation_safe(name)
+
+    def test_write_and_unknown_tools_excluded(self) -> None:
+        assert not is_speculation_safe("write_file")
+        assert not is_speculation_safe("bash")
+        assert not is_speculation_safe("some_mcp_tool")
+
+    def test_tier_override_disables(self) -> None:
+        assert not is_speculation_safe("read_file", {"read_file": "execute"})
+
+
 class TestParseApprovalMode:
     def test_all_valid_modes(self) -> None:
         assert parse_approval_mode("auto") == ApprovalMode.AUTO
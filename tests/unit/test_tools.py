@@ -571,6 +571,49 @@ class TestMetadataStripping:
         assert llm_result == "raw string"
 
 
+class TestFileChangeListeners:
+    @pytest.mark.asyncio
+    async def test_write_reports_resolved_path(self, tmp_path: Path) -> None:
+        reg = ToolRegistry()
+        register_default_tools(reg, working_dir=str(tmp_path))
+        seen: list[list[str] | None] = []
+        reg.add_file_change_listener(seen.append)
+        await reg.call_tool("write_file", {"path": "a.py", "content": "x = 1\n"})
+        assert len(seen) == 1
+        assert seen[0] is not None and seen[0][0].endswith("a.py")
+
+    @pytest.mark.asyncio
+    async def test_bash_reports_unknown_changes(self) -> None:
+        reg = ToolRegistry()
+
+        async def bash(**kwargs):
+            return {"stdout": "", "exit_code": 0}
+
+        reg.register("bash", bash, {"name": "bash", "description": ""})
+        seen: list[list[str] | None] = []
+        reg.add_file_change_listener(seen.append)
+        await reg.call_tool("bash", {"command": "true"})
+        assert seen == [None]
+
+    @pytest.mark.asyncio
+    async def test_errors_and_read_tools_not_reported(self) -> None:
+        reg = ToolRegistry()
+
+        async def failing(**kwargs):
+            return {"error": "nope", "path": "/x"}
+
+        async def reader(**kwargs):
+            return {"content": "", "path": "/x"}
+
+        reg.register("write_file", failing, {"name": "write_file", "description": ""})
+        reg.register("read_file", reader, {"name": "read_file", "description": ""})
+        seen: list[list[str] | None] = []
+        reg.add_file_change_listener(seen.append)
+        await reg.call_tool("write_file", {})
+        await reg.call_tool("read_file", {})
+        assert seen == []
+
+
 class TestValidatePath:
     def test_valid_relative_path(self) -> None:
         resolved, error = validate_path("file.txt", "/tmp")
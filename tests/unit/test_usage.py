@@ -53,7 +53,10 @@ def _make_db() -> _TestDB:
             prompt_tokens INTEGER DEFAULT NULL,
             completion_tokens INTEGER DEFAULT NULL,
             total_tokens INTEGER DEFAULT NULL,
-            model TEXT DEFAULT NULL
+            model TEXT DEFAULT NULL,
+            cache_read_tokens INTEGER DEFAULT NULL,
+            cache_write_tokens INTEGER DEFAULT NULL,
+            hedge_tokens INTEGER DEFAULT NULL
         )"""
     )
     return _TestDB(conn)
@@ -147,6 +150,18 @@ class TestUpdateMessageUsage:
         assert row[0] == 100
         assert row[1] == "new-model"
 
+    def test_records_and_aggregates_cache_tokens(self):
+        db = _make_db()
+        mid1 = _insert_message(db, msg_id="msg-1")
+        mid2 = _insert_message(db, msg_id="msg-2")
+        storage.update_message_usage(db, mid1, 1000, 10, 1010, "claude", cache_read_tokens=0, cache_write_tokens=900)
+        storage.update_message_usage(db, mid2, 1100, 10, 1110, "claude", cache_read_tokens=900, cache_write_tokens=150)
+
+        (stats,) = storage.get_usage_stats(db)
+        assert stats["cache_read_tokens"] == 900
+        assert stats["cache_write_tokens"] == 1050
+        assert stats["prompt_tokens"] == 2100
+
 
 # ---------------------------------------------------------------------------
 # storage.get_usage_stats tests
@@ -193,6 +193,16 @@ class TestVectorIndex:
         results = idx.search([0.1] * DIMS, limit=10)
         assert results == []
 
+    def test_get_vectors_returns_stored_vectors(self) -> None:
+        idx = _make_vec_index()
+        emb = [0.0] * DIMS
+        emb[3] = 1.0
+        idx.add("k1", emb)
+
+        found = idx.get_vectors(["k1", "missing"])
+        assert list(found) == ["k1"]
+        assert found["k1"][3] == pytest.approx(1.0)
+
     def test_dimension_mismatch_raises(self) -> None:
         idx = _make_vec_index(dims=384)
         with pytest.raises(ValueError, match="expected 384"):